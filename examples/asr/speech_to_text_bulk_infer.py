@@ -0,0 +1,70 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Transcribes a manifest with any ASR model on all the GPUs of a node, with one or more processes per GPU.
+
+Every process writes its results to `<output_dir>/transcripts_<shard>_of_<num_shards>.jsonl` as soon as a batch is
+transcribed. Running the same command again after a crash skips the files which are already transcribed.
+
+Usage:
+python speech_to_text_bulk_infer.py --asr_model=QuartzNet15x5Base-En --manifest=manifest.json --output_dir=out \
+    [--devices 0 1] [--processes_per_device=2] [--max_batch_duration=600] [--num_workers=4] [--amp]
+"""
+
+from argparse import ArgumentParser
+
+from nemo.collections.asr.parts.bulk_transcription import bulk_transcribe
+from nemo.utils import logging
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--asr_model", type=str, required=True, help="Path to a .nemo file or pretrained model name")
+    parser.add_argument("--manifest", type=str, required=True, help="Manifest of the audio files to transcribe")
+    parser.add_argument("--output_dir", type=str, required=True, help="Directory of the transcripts files")
+    parser.add_argument(
+        "--devices", type=str, nargs='+', default=None, help="GPU ids or 'cpu'. Defaults to all the GPUs"
+    )
+    parser.add_argument("--processes_per_device", type=int, default=1)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument(
+        "--max_batch_duration", type=float, default=None, help="Max padded duration of a batch, overrides batch_size"
+    )
+    parser.add_argument("--num_workers", type=int, default=4, help="Audio decoding workers per process")
+    parser.add_argument("--trim_silence", default=False, action='store_true')
+    parser.add_argument("--amp", default=False, action='store_true', help="Use automatic mixed precision")
+    args = parser.parse_args()
+
+    devices = None
+    if args.devices is not None:
+        devices = [device if device == 'cpu' else f'cuda:{device}' for device in args.devices]
+
+    paths = bulk_transcribe(
+        args.asr_model,
+        args.manifest,
+        args.output_dir,
+        devices=devices,
+        processes_per_device=args.processes_per_device,
+        batch_size=args.batch_size,
+        max_batch_duration=args.max_batch_duration,
+        num_workers=args.num_workers,
+        trim_silence=args.trim_silence,
+        amp=args.amp,
+    )
+    logging.info(f"Transcripts written to {paths}")
+
+
+if __name__ == '__main__':
+    main()  # noqa pylint: disable=no-value-for-parameter
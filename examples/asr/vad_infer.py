@@ -27,7 +27,6 @@ python vad_infer.py  --vad_model="MatchboxNet-VAD-3x2" --dataset=<FULL PATH OF M
 """
 
 
-import json
 import logging
 import os
 from argparse import ArgumentParser
@@ -35,19 +34,9 @@ from argparse import ArgumentParser
 import torch
 
 from nemo.collections.asr.models import EncDecClassificationModel
-from nemo.collections.asr.parts.vad_utils import get_vad_stream_status, prepare_manifest
+from nemo.collections.asr.parts.vad_utils import generate_vad_frame_pred, prepare_manifest
 from nemo.utils import logging
 
-try:
-    from torch.cuda.amp import autocast
-except ImportError:
-    from contextlib import contextmanager
-
-    @contextmanager
-    def autocast(enabled=None):
-        yield
-
-
 device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
 
 
@@ -125,43 +114,14 @@ def main():
     vad_model = vad_model.to(device)
     vad_model.eval()
 
-    time_unit = int(args.time_length / args.shift_length)
-    trunc = int(time_unit / 2)
-    trunc_l = time_unit - trunc
-    all_len = 0
-
-    data = []
-    for line in open(args.dataset, 'r'):
-        file = json.loads(line)['audio_filepath'].split("/")[-1]
-        data.append(file.split(".wav")[0])
-    logging.info(f"Inference on {len(data)} audio files/json lines!")
-
-    status = get_vad_stream_status(data)
-    for i, test_batch in enumerate(vad_model.test_dataloader()):
-        test_batch = [x.to(device) for x in test_batch]
-        with autocast():
-            log_probs = vad_model(input_signal=test_batch[0], input_signal_length=test_batch[1])
-            probs = torch.softmax(log_probs, dim=-1)
-            pred = probs[:, 1]
-
-            if status[i] == 'start':
-                to_save = pred[:-trunc]
-            elif status[i] == 'next':
-                to_save = pred[trunc:-trunc_l]
-            elif status[i] == 'end':
-                to_save = pred[trunc_l:]
-            else:
-                to_save = pred
-
-            all_len += len(to_save)
-            outpath = os.path.join(args.out_dir, data[i] + ".frame")
-            with open(outpath, "a") as fout:
-                for f in range(len(to_save)):
-                    fout.write('{0:0.4f}\n'.format(to_save[f]))
-        del test_batch
-        if status[i] == 'end' or status[i] == 'single':
-            logging.debug(f"Overall length of prediction of {data[i]} is {all_len}!")
-            all_len = 0
+    frame_preds = generate_vad_frame_pred(
+        vad_model=vad_model,
+        window_length_in_sec=args.time_length,
+        shift_length_in_sec=args.shift_length,
+        manifest_vad_input=manifest_vad_input,
+        out_dir=args.out_dir,
+    )
+    logging.info(f"Inference on {len(frame_preds)} audio files/json lines!")
 
 
 if __name__ == '__main__':
@@ -13,15 +13,20 @@
 # limitations under the License.
 import io
 import os
+import random
 from typing import Callable, Dict, List, Optional, Union
 
 import braceexpand
+import numpy as np
 import torch
 import webdataset as wd
 from torch.nn import functional as F
 
-from nemo.collections.asr.data import vocabs
+from nemo.collections.asr.data import samplers, vocabs
 from nemo.collections.asr.parts import collections, parsers
+from nemo.collections.asr.parts.audio_cache import DEFAULT_MAX_BYTES as DEFAULT_AUDIO_CACHE_MAX_BYTES
+from nemo.collections.asr.parts.audio_cache import DecodedAudioCache
+from nemo.collections.asr.parts.collate import pad_sequences, speech_collate
 from nemo.collections.asr.parts.features import WaveformFeaturizer
 from nemo.core.classes import Dataset, IterableDataset
 from nemo.core.neural_types import *
@@ -44,36 +49,57 @@ def _speech_collate_fn(batch, pad_id):
                encoded tokens, and encoded tokens length.  This collate func
                assumes the signals are 1d torch tensors (i.e. mono audio).
     """
-    _, audio_lengths, _, tokens_lengths = zip(*batch)
-    max_audio_len = 0
-    has_audio = audio_lengths[0] is not None
-    if has_audio:
-        max_audio_len = max(audio_lengths).item()
-    max_tokens_len = max(tokens_lengths).item()
-
-    audio_signal, tokens = [], []
-    for sig, sig_len, tokens_i, tokens_i_len in batch:
-        if has_audio:
-            sig_len = sig_len.item()
-            if sig_len < max_audio_len:
-                pad = (0, max_audio_len - sig_len)
-                sig = torch.nn.functional.pad(sig, pad)
-            audio_signal.append(sig)
-        tokens_i_len = tokens_i_len.item()
-        if tokens_i_len < max_tokens_len:
-            pad = (0, max_tokens_len - tokens_i_len)
-            tokens_i = torch.nn.functional.pad(tokens_i, pad, value=pad_id)
-        tokens.append(tokens_i)
-
-    if has_audio:
-        audio_signal = torch.stack(audio_signal)
-        audio_lengths = torch.stack(audio_lengths)
-    else:
-        audio_signal, audio_lengths = None, None
-    tokens = torch.stack(tokens)
-    tokens_lengths = torch.stack(tokens_lengths)
-
-    return audio_signal, audio_lengths, tokens, tokens_lengths
+    return speech_collate(batch, pad_id=pad_id)
+
+
+def _pack_by_length(lengths: List[float], max_batch_length: float) -> List[List[int]]:
+    """Greedily packs items of increasing `lengths` into batches whose padded length stays within `max_batch_length`.
+
+    Returns:
+        The list of batches of indices into `lengths`.
+    """
+    batches, batch = [], []
+    for idx, length in enumerate(lengths):
+        # Items are sorted, so the new item is the longest one in the batch.
+        if batch and length * (len(batch) + 1) > max_batch_length:
+            batches.append(batch)
+            batch = []
+        batch.append(idx)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _make_audio_text_collection(
+    manifest_filepath: str,
+    parser: Callable,
+    min_duration: Optional[float] = None,
+    max_duration: Optional[float] = None,
+    max_utts: int = 0,
+    index_by_file_id: bool = False,
+    use_manifest_index: bool = False,
+    manifest_index_dir: Optional[str] = None,
+):
+    """Builds either the eagerly parsed `ASRAudioText` or its lazy, memory-mapped `IndexedASRAudioText` variant."""
+    if use_manifest_index:
+        return collections.IndexedASRAudioText(
+            manifests_files=manifest_filepath.split(','),
+            parser=parser,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            max_number=max_utts,
+            index_by_file_id=index_by_file_id,
+            index_dir=manifest_index_dir,
+        )
+
+    return collections.ASRAudioText(
+        manifests_files=manifest_filepath.split(','),
+        parser=parser,
+        min_duration=min_duration,
+        max_duration=max_duration,
+        max_number=max_utts,
+        index_by_file_id=index_by_file_id,
+    )
 
 
 class _AudioTextDataset(Dataset):
@@ -101,6 +127,14 @@ class _AudioTextDataset(Dataset):
         eos_id: Id of end of sequence symbol to append if not None
         load_audio: Boolean flag indicate whether do or not load audio
         add_misc: True if add additional info dict.
+        use_manifest_index: If True, reads the manifest through a memory-mapped index that is built once next to
+            the manifest (or in manifest_index_dir) and parses and tokenizes lines lazily in __getitem__.
+        manifest_index_dir: Optional directory to store manifest indexes in.
+        use_audio_cache: If True, caches the decoded and resampled audio of every sample in a `DecodedAudioCache`
+            shared by all dataloader workers, so that later epochs skip decoding.
+        audio_cache_dir: Optional directory of the audio cache. Defaults to a directory in /dev/shm.
+        audio_cache_max_bytes: Byte budget of the audio cache.
+        audio_cache_dtype: Storage type of the cached samples, `float32` or `int16`.
     """
 
     @property
@@ -135,18 +169,34 @@ class _AudioTextDataset(Dataset):
         pad_id: int = 0,
         load_audio: bool = True,
         add_misc: bool = False,
+        use_manifest_index: bool = False,
+        manifest_index_dir: Optional[str] = None,
+        use_audio_cache: bool = False,
+        audio_cache_dir: Optional[str] = None,
+        audio_cache_max_bytes: int = DEFAULT_AUDIO_CACHE_MAX_BYTES,
+        audio_cache_dtype: str = 'float32',
     ):
         self.parser = parser
 
-        self.collection = collections.ASRAudioText(
-            manifests_files=manifest_filepath.split(','),
+        self.collection = _make_audio_text_collection(
+            manifest_filepath=manifest_filepath,
             parser=parser,
             min_duration=min_duration,
             max_duration=max_duration,
-            max_number=max_utts,
+            max_utts=max_utts,
+            use_manifest_index=use_manifest_index,
+            manifest_index_dir=manifest_index_dir,
         )
 
-        self.featurizer = WaveformFeaturizer(sample_rate=sample_rate, int_values=int_values, augmentor=augmentor)
+        audio_cache = None
+        if use_audio_cache:
+            audio_cache = DecodedAudioCache(
+                cache_dir=audio_cache_dir, max_bytes=audio_cache_max_bytes, dtype=audio_cache_dtype
+            )
+
+        self.featurizer = WaveformFeaturizer(
+            sample_rate=sample_rate, int_values=int_values, augmentor=augmentor, cache=audio_cache
+        )
         self.trim = trim
         self.eos_id = eos_id
         self.bos_id = bos_id
@@ -225,6 +275,14 @@ class AudioToCharDataset(_AudioTextDataset):
         eos_id: Id of end of sequence symbol to append if not None
         load_audio: Boolean flag indicate whether do or not load audio
         add_misc: True if add additional info dict.
+        use_manifest_index: If True, reads the manifest through a memory-mapped index that is built once next to
+            the manifest (or in manifest_index_dir) and parses and tokenizes lines lazily in __getitem__.
+        manifest_index_dir: Optional directory to store manifest indexes in.
+        use_audio_cache: If True, caches the decoded and resampled audio of every sample in a `DecodedAudioCache`
+            shared by all dataloader workers, so that later epochs skip decoding.
+        audio_cache_dir: Optional directory of the audio cache. Defaults to a directory in /dev/shm.
+        audio_cache_max_bytes: Byte budget of the audio cache.
+        audio_cache_dtype: Storage type of the cached samples, `float32` or `int16`.
     """
 
     @property
@@ -263,6 +321,12 @@ class AudioToCharDataset(_AudioTextDataset):
         load_audio: bool = True,
         parser: Union[str, Callable] = 'en',
         add_misc: bool = False,
+        use_manifest_index: bool = False,
+        manifest_index_dir: Optional[str] = None,
+        use_audio_cache: bool = False,
+        audio_cache_dir: Optional[str] = None,
+        audio_cache_max_bytes: int = DEFAULT_AUDIO_CACHE_MAX_BYTES,
+        audio_cache_dtype: str = 'float32',
     ):
         self.labels = labels
 
@@ -285,6 +349,12 @@ class AudioToCharDataset(_AudioTextDataset):
             pad_id=pad_id,
             load_audio=load_audio,
             add_misc=add_misc,
+            use_manifest_index=use_manifest_index,
+            manifest_index_dir=manifest_index_dir,
+            use_audio_cache=use_audio_cache,
+            audio_cache_dir=audio_cache_dir,
+            audio_cache_max_bytes=audio_cache_max_bytes,
+            audio_cache_dtype=audio_cache_dtype,
         )
 
 
@@ -391,6 +461,10 @@ class AudioToCharWithDursDataset(AudioToCharDataset):
         tensors = [tensor if isinstance(tensor, torch.Tensor) else torch.tensor(tensor) for tensor in tensors]
         dim = dim if dim != -1 else len(tensors[0].shape) - 1
         dtype = tensors[0].dtype if dtype is None else dtype
+        if dim == 0 and tensors[0].dim() == 1:
+            padded, _ = pad_sequences(tensors, pad_value=value, dtype=dtype)
+            return padded
+
         max_len = max(tensor.shape[dim] for tensor in tensors)
         new_tensors = []
         for tensor in tensors:
@@ -475,6 +549,14 @@ class AudioToBPEDataset(_AudioTextDataset):
         add_misc: True if add additional info dict.
         use_start_end_token: Boolean which dictates whether to add [BOS] and [EOS]
             tokens to beginning and ending of speech respectively.
+        use_manifest_index: If True, reads the manifest through a memory-mapped index that is built once next to
+            the manifest (or in manifest_index_dir) and parses and tokenizes lines lazily in __getitem__.
+        manifest_index_dir: Optional directory to store manifest indexes in.
+        use_audio_cache: If True, caches the decoded and resampled audio of every sample in a `DecodedAudioCache`
+            shared by all dataloader workers, so that later epochs skip decoding.
+        audio_cache_dir: Optional directory of the audio cache. Defaults to a directory in /dev/shm.
+        audio_cache_max_bytes: Byte budget of the audio cache.
+        audio_cache_dtype: Storage type of the cached samples, `float32` or `int16`.
     """
 
     @property
@@ -507,6 +589,12 @@ class AudioToBPEDataset(_AudioTextDataset):
         load_audio: bool = True,
         add_misc: bool = False,
         use_start_end_token: bool = True,
+        use_manifest_index: bool = False,
+        manifest_index_dir: Optional[str] = None,
+        use_audio_cache: bool = False,
+        audio_cache_dir: Optional[str] = None,
+        audio_cache_max_bytes: int = DEFAULT_AUDIO_CACHE_MAX_BYTES,
+        audio_cache_dtype: str = 'float32',
     ):
         if use_start_end_token and hasattr(tokenizer, 'bos_token'):
             bos_id = tokenizer.bos_id
@@ -546,6 +634,12 @@ class AudioToBPEDataset(_AudioTextDataset):
             trim=trim,
             load_audio=load_audio,
             add_misc=add_misc,
+            use_manifest_index=use_manifest_index,
+            manifest_index_dir=manifest_index_dir,
+            use_audio_cache=use_audio_cache,
+            audio_cache_dir=audio_cache_dir,
+            audio_cache_max_bytes=audio_cache_max_bytes,
+            audio_cache_dtype=audio_cache_dtype,
         )
 
 
@@ -634,6 +728,18 @@ class _TarredAudioToTextDataset(IterableDataset):
                 sampled at least once during 1 epoch.
         global_rank (int): Worker rank, used for partitioning shards. Defaults to 0.
         world_size (int): Total number of processes, used for partitioning shards. Defaults to 0.
+        use_manifest_index (bool): If True, reads the manifest through a memory-mapped index that is built once
+            next to the manifest (or in manifest_index_dir) and resolves tarred samples by file ID through it.
+            Defaults to False.
+        manifest_index_dir (str): Optional directory to store manifest indexes in. Defaults to None.
+        max_batch_duration (float): If set, the dataset yields collated batches instead of single samples, packed
+            so that the padded duration of a batch (batch size * longest sample) stays within this many seconds.
+            The DataLoader must then be created with `batch_size=None`. len() returns the number of batches
+            estimated from the manifest durations, and every rank yields exactly len() // world_size of them, by
+            dropping the batches beyond that count or repeating the last ones, so that DDP ranks stay in lockstep.
+            Defaults to None.
+        batching_buffer_size (int): Number of samples buffered and sorted by length before being packed into
+            batches when max_batch_duration is set. Defaults to 256.
     """
 
     def __init__(
@@ -656,14 +762,20 @@ class _TarredAudioToTextDataset(IterableDataset):
         shard_strategy: str = "scatter",
         global_rank: int = 0,
         world_size: int = 0,
+        use_manifest_index: bool = False,
+        manifest_index_dir: Optional[str] = None,
+        max_batch_duration: Optional[float] = None,
+        batching_buffer_size: int = 256,
     ):
-        self.collection = collections.ASRAudioText(
-            manifests_files=manifest_filepath.split(','),
+        self.collection = _make_audio_text_collection(
+            manifest_filepath=manifest_filepath,
             parser=parser,
             min_duration=min_duration,
             max_duration=max_duration,
-            max_number=max_utts,
+            max_utts=max_utts,
             index_by_file_id=True,  # Must set this so the manifest lines can be indexed by file ID
+            use_manifest_index=use_manifest_index,
+            manifest_index_dir=manifest_index_dir,
         )
 
         self.featurizer = WaveformFeaturizer(sample_rate=sample_rate, int_values=int_values, augmentor=augmentor)
@@ -672,6 +784,10 @@ class _TarredAudioToTextDataset(IterableDataset):
         self.bos_id = bos_id
         self.pad_id = pad_id
         self._add_misc = add_misc
+        self.max_batch_duration = max_batch_duration
+        self.batching_buffer_size = batching_buffer_size
+        self.world_size = max(world_size, 1)
+        self._num_batches = None
 
         valid_shard_strategies = ['scatter', 'replicate']
         if shard_strategy not in valid_shard_strategies:
@@ -733,6 +849,9 @@ class _TarredAudioToTextDataset(IterableDataset):
             .map(f=self._build_sample)
         )
 
+        if max_batch_duration is not None:
+            self._dataset = self._dataset.pipe(self._dynamic_batch)
+
     def _filter(self, iterator):
         """This function is used to remove samples that have been filtered out by ASRAudioText already.
         Otherwise, we would get a KeyError as _build_sample attempts to find the manifest entry for a sample
@@ -761,6 +880,55 @@ class _TarredAudioToTextDataset(IterableDataset):
     def _collate_fn(self, batch):
         return _speech_collate_fn(batch, self.pad_id)
 
+    def _dynamic_batch(self, iterator):
+        """Packs the samples of the stream into collated batches bounded by `max_batch_duration`.
+
+        Samples are accumulated in a buffer of `batching_buffer_size` samples and sorted by length, so that each
+        batch holds samples of similar length. The batches built from one buffer are yielded in random order.
+
+        Ranks (and the dataloader workers of a rank) read different shards, which pack into different numbers of
+        batches. DDP hangs at the end of the epoch if a rank runs out of batches before the others, so every rank
+        yields exactly len(self) // world_size batches, split between its workers. Batches beyond that count are
+        dropped, and if the shards run out first the batches of the last buffer are repeated.
+        """
+        max_batch_samples = self.max_batch_duration * self.featurizer.sample_rate
+
+        num_batches = max(len(self) // self.world_size, 1)
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is not None:
+            num_batches = num_batches // worker_info.num_workers + int(
+                worker_info.id < num_batches % worker_info.num_workers
+            )
+
+        def pack(buffer):
+            buffer.sort(key=lambda sample: sample[1].item())
+            batches = _pack_by_length([sample[1].item() for sample in buffer], max_batch_samples)
+            random.shuffle(batches)
+            return [self._collate_fn([buffer[idx] for idx in batch]) for batch in batches]
+
+        def stream():
+            buffer = []
+            for sample in iterator:
+                buffer.append(sample)
+                if len(buffer) >= self.batching_buffer_size:
+                    yield pack(buffer)
+                    buffer = []
+
+            if buffer:
+                yield pack(buffer)
+
+        count, batches = 0, []
+        for batches in stream():
+            for batch in batches:
+                if count == num_batches:
+                    return
+                yield batch
+                count += 1
+
+        while batches and count < num_batches:
+            yield batches[count % len(batches)]
+            count += 1
+
     def _build_sample(self, tup):
         """Builds the training sample by combining the data from the WebDataset with the manifest info.
         """
@@ -804,6 +972,17 @@ class _TarredAudioToTextDataset(IterableDataset):
         return self._dataset.__iter__()
 
     def __len__(self):
+        if self.max_batch_duration is not None:
+            if self._num_batches is None:
+                # Packs the manifest durations like `_dynamic_batch` packs the stream, buffer by buffer. The result
+                # only depends on the manifest, so it is the same on every rank.
+                durations = samplers.get_durations(self.collection)
+                num_batches = 0
+                for start in range(0, len(durations), self.batching_buffer_size):
+                    buffer = np.sort(durations[start : start + self.batching_buffer_size])
+                    num_batches += len(_pack_by_length(buffer.tolist(), self.max_batch_duration))
+                self._num_batches = max(num_batches, 1)
+            return self._num_batches
         return len(self.collection)
 
 
@@ -888,6 +1067,18 @@ class TarredAudioToCharDataset(_TarredAudioToTextDataset):
                 sampled at least once during 1 epoch.
         global_rank (int): Worker rank, used for partitioning shards. Defaults to 0.
         world_size (int): Total number of processes, used for partitioning shards. Defaults to 0.
+        use_manifest_index (bool): If True, reads the manifest through a memory-mapped index that is built once
+            next to the manifest (or in manifest_index_dir) and resolves tarred samples by file ID through it.
+            Defaults to False.
+        manifest_index_dir (str): Optional directory to store manifest indexes in. Defaults to None.
+        max_batch_duration (float): If set, the dataset yields collated batches instead of single samples, packed
+            so that the padded duration of a batch (batch size * longest sample) stays within this many seconds.
+            The DataLoader must then be created with `batch_size=None`. len() returns the number of batches
+            estimated from the manifest durations, and every rank yields exactly len() // world_size of them, by
+            dropping the batches beyond that count or repeating the last ones, so that DDP ranks stay in lockstep.
+            Defaults to None.
+        batching_buffer_size (int): Number of samples buffered and sorted by length before being packed into
+            batches when max_batch_duration is set. Defaults to 256.
     """
 
     def __init__(
@@ -914,6 +1105,10 @@ class TarredAudioToCharDataset(_TarredAudioToTextDataset):
         shard_strategy: str = "scatter",
         global_rank: int = 0,
         world_size: int = 0,
+        use_manifest_index: bool = False,
+        manifest_index_dir: Optional[str] = None,
+        max_batch_duration: Optional[float] = None,
+        batching_buffer_size: int = 256,
     ):
         self.labels = labels
 
@@ -940,6 +1135,10 @@ class TarredAudioToCharDataset(_TarredAudioToTextDataset):
             shard_strategy=shard_strategy,
             global_rank=global_rank,
             world_size=world_size,
+            use_manifest_index=use_manifest_index,
+            manifest_index_dir=manifest_index_dir,
+            max_batch_duration=max_batch_duration,
+            batching_buffer_size=batching_buffer_size,
         )
 
 
@@ -1012,6 +1211,18 @@ class TarredAudioToBPEDataset(_TarredAudioToTextDataset):
                 sampled at least once during 1 epoch.
         global_rank (int): Worker rank, used for partitioning shards. Defaults to 0.
         world_size (int): Total number of processes, used for partitioning shards. Defaults to 0.
+        use_manifest_index (bool): If True, reads the manifest through a memory-mapped index that is built once
+            next to the manifest (or in manifest_index_dir) and resolves tarred samples by file ID through it.
+            Defaults to False.
+        manifest_index_dir (str): Optional directory to store manifest indexes in. Defaults to None.
+        max_batch_duration (float): If set, the dataset yields collated batches instead of single samples, packed
+            so that the padded duration of a batch (batch size * longest sample) stays within this many seconds.
+            The DataLoader must then be created with `batch_size=None`. len() returns the number of batches
+            estimated from the manifest durations, and every rank yields exactly len() // world_size of them, by
+            dropping the batches beyond that count or repeating the last ones, so that DDP ranks stay in lockstep.
+            Defaults to None.
+        batching_buffer_size (int): Number of samples buffered and sorted by length before being packed into
+            batches when max_batch_duration is set. Defaults to 256.
     """
 
     def __init__(
@@ -1032,6 +1243,10 @@ class TarredAudioToBPEDataset(_TarredAudioToTextDataset):
         shard_strategy: str = "scatter",
         global_rank: int = 0,
         world_size: int = 0,
+        use_manifest_index: bool = False,
+        manifest_index_dir: Optional[str] = None,
+        max_batch_duration: Optional[float] = None,
+        batching_buffer_size: int = 256,
     ):
         if use_start_end_token and hasattr(tokenizer, 'bos_token'):
             bos_id = tokenizer.bos_id
@@ -1075,4 +1290,8 @@ class TarredAudioToBPEDataset(_TarredAudioToTextDataset):
             shard_strategy=shard_strategy,
             global_rank=global_rank,
             world_size=world_size,
+            use_manifest_index=use_manifest_index,
+            manifest_index_dir=manifest_index_dir,
+            max_batch_duration=max_batch_duration,
+            batching_buffer_size=batching_buffer_size,
         )
@@ -17,7 +17,9 @@ from typing import Optional
 import torch
 from omegaconf import DictConfig
 
-from nemo.collections.asr.data import audio_to_text, audio_to_text_dali
+from nemo.collections.asr.data import audio_to_text, audio_to_text_dali, feature_to_text, samplers
+from nemo.collections.asr.parts.audio_cache import DEFAULT_MAX_BYTES as DEFAULT_AUDIO_CACHE_MAX_BYTES
+from nemo.utils import logging
 
 
 def get_char_dataset(config: dict, augmentor: Optional['AudioAugmentor'] = None) -> audio_to_text.AudioToCharDataset:
@@ -47,6 +49,12 @@ def get_char_dataset(config: dict, augmentor: Optional['AudioAugmentor'] = None)
         load_audio=config.get('load_audio', True),
         parser=config.get('parser', 'en'),
         add_misc=config.get('add_misc', False),
+        use_manifest_index=config.get('use_manifest_index', False),
+        manifest_index_dir=config.get('manifest_index_dir', None),
+        use_audio_cache=config.get('use_audio_cache', False),
+        audio_cache_dir=config.get('audio_cache_dir', None),
+        audio_cache_max_bytes=config.get('audio_cache_max_bytes', DEFAULT_AUDIO_CACHE_MAX_BYTES),
+        audio_cache_dtype=config.get('audio_cache_dtype', 'float32'),
     )
     return dataset
 
@@ -78,6 +86,63 @@ def get_bpe_dataset(
         load_audio=config.get('load_audio', True),
         add_misc=config.get('add_misc', False),
         use_start_end_token=config.get('use_start_end_token', True),
+        use_manifest_index=config.get('use_manifest_index', False),
+        manifest_index_dir=config.get('manifest_index_dir', None),
+        use_audio_cache=config.get('use_audio_cache', False),
+        audio_cache_dir=config.get('audio_cache_dir', None),
+        audio_cache_max_bytes=config.get('audio_cache_max_bytes', DEFAULT_AUDIO_CACHE_MAX_BYTES),
+        audio_cache_dtype=config.get('audio_cache_dtype', 'float32'),
+    )
+    return dataset
+
+
+def get_feature_char_dataset(config: dict) -> feature_to_text.FeatureToCharDataset:
+    """
+    Instantiates a Character Encoding based FeatureToCharDataset which reads precomputed features.
+
+    Args:
+        config: Config of the FeatureToCharDataset.
+
+    Returns:
+        An instance of FeatureToCharDataset.
+    """
+    dataset = feature_to_text.FeatureToCharDataset(
+        manifest_filepath=config['manifest_filepath'],
+        labels=config['labels'],
+        max_duration=config.get('max_duration', None),
+        min_duration=config.get('min_duration', None),
+        max_utts=config.get('max_utts', 0),
+        blank_index=config.get('blank_index', -1),
+        unk_index=config.get('unk_index', -1),
+        normalize=config.get('normalize_transcripts', False),
+        pad_to=config.get('feature_pad_to', 16),
+        parser=config.get('parser', 'en'),
+        add_misc=config.get('add_misc', False),
+    )
+    return dataset
+
+
+def get_feature_bpe_dataset(config: dict, tokenizer: 'TokenizerSpec') -> feature_to_text.FeatureToBPEDataset:
+    """
+    Instantiates a Byte Pair Encoding / Word Piece Encoding based FeatureToBPEDataset which reads precomputed
+    features.
+
+    Args:
+        config: Config of the FeatureToBPEDataset.
+        tokenizer: An instance of a TokenizerSpec object.
+
+    Returns:
+        An instance of FeatureToBPEDataset.
+    """
+    dataset = feature_to_text.FeatureToBPEDataset(
+        manifest_filepath=config['manifest_filepath'],
+        tokenizer=tokenizer,
+        max_duration=config.get('max_duration', None),
+        min_duration=config.get('min_duration', None),
+        max_utts=config.get('max_utts', 0),
+        pad_to=config.get('feature_pad_to', 16),
+        add_misc=config.get('add_misc', False),
+        use_start_end_token=config.get('use_start_end_token', True),
     )
     return dataset
 
@@ -119,6 +184,10 @@ def get_tarred_char_dataset(
         shard_strategy=config.get('tarred_shard_strategy', 'scatter'),
         global_rank=global_rank,
         world_size=world_size,
+        use_manifest_index=config.get('use_manifest_index', False),
+        manifest_index_dir=config.get('manifest_index_dir', None),
+        max_batch_duration=config.get('max_batch_duration', None),
+        batching_buffer_size=config.get('batching_buffer_size', 256),
     )
     return dataset
 
@@ -163,10 +232,124 @@ def get_tarred_bpe_dataset(
         shard_strategy=config.get('tarred_shard_strategy', 'scatter'),
         global_rank=global_rank,
         world_size=world_size,
+        use_manifest_index=config.get('use_manifest_index', False),
+        manifest_index_dir=config.get('manifest_index_dir', None),
+        max_batch_duration=config.get('max_batch_duration', None),
+        batching_buffer_size=config.get('batching_buffer_size', 256),
     )
     return dataset
 
 
+def get_bucketing_batch_sampler(
+    config: dict, dataset: audio_to_text._AudioTextDataset, shuffle: bool, global_rank: int, world_size: int
+) -> Optional[samplers.DurationBucketingBatchSampler]:
+    """
+    Instantiates a DurationBucketingBatchSampler over the durations of the dataset if `use_bucketing` is set.
+
+    Args:
+        config: Config of the dataset. Reads `use_bucketing`, `batch_size`, `max_batch_duration`, `num_buckets`,
+            `bucket_boundaries`, `drop_last` and `bucketing_seed`.
+        dataset: A non-tarred audio-text dataset.
+        shuffle: Whether to shuffle utterances within buckets and batches across buckets.
+        global_rank: Global rank of this device.
+        world_size: Global world size in the training method.
+
+    Returns:
+        An instance of DurationBucketingBatchSampler, or None if bucketing is disabled.
+    """
+    if not config.get('use_bucketing', False):
+        return None
+
+    sampler = samplers.DurationBucketingBatchSampler(
+        durations=samplers.get_durations(dataset.collection),
+        batch_size=config['batch_size'],
+        max_batch_duration=config.get('max_batch_duration', None),
+        num_buckets=config.get('num_buckets', 10),
+        bucket_boundaries=config.get('bucket_boundaries', None),
+        shuffle=shuffle,
+        drop_last=config.get('drop_last', False),
+        num_replicas=world_size,
+        rank=global_rank,
+        seed=config.get('bucketing_seed', 0),
+    )
+    sampler.report_padding(batch_size=config['batch_size'])
+    return sampler
+
+
+def get_audio_to_text_dataloader(
+    config: dict,
+    dataset: torch.utils.data.Dataset,
+    shuffle: bool,
+    global_rank: int,
+    world_size: int,
+    trainer: Optional['Trainer'] = None,
+) -> torch.utils.data.DataLoader:
+    """
+    Instantiates the DataLoader of an audio-text dataset.
+
+    Non-tarred datasets are batched by a DurationBucketingBatchSampler if `use_bucketing` is set, and with a fixed
+    `batch_size` otherwise. Tarred datasets with `max_batch_duration` yield collated batches by themselves.
+
+    Args:
+        config: Config of the dataset.
+        dataset: The audio-text dataset to load.
+        shuffle: Whether to shuffle the dataset.
+        global_rank: Global rank of this device.
+        world_size: Global world size in the training method.
+        trainer: Optional trainer the DataLoader is used with. With DDP, it must not replace the bucketing sampler.
+
+    Returns:
+        An instance of DataLoader.
+
+    Raises:
+        ValueError: If bucketing is used with DDP and `trainer.replace_sampler_ddp` is set.
+    """
+    if config.get('is_tarred', False) and config.get('max_batch_duration', None) is not None:
+        return torch.utils.data.DataLoader(
+            dataset=dataset,
+            batch_size=None,
+            num_workers=config.get('num_workers', 0),
+            pin_memory=config.get('pin_memory', False),
+        )
+
+    batch_sampler = None
+    if not config.get('is_tarred', False):
+        batch_sampler = get_bucketing_batch_sampler(
+            config=config, dataset=dataset, shuffle=shuffle, global_rank=global_rank, world_size=world_size,
+        )
+        if batch_sampler is None and config.get('max_batch_duration', None) is not None:
+            logging.warning(
+                "`max_batch_duration` is ignored since `use_bucketing` is not set, batches hold `batch_size` "
+                "utterances instead. Set `use_bucketing: true` to bound the duration of batches."
+            )
+
+    if batch_sampler is not None:
+        # Lightning would replace the batch sampler with a `DistributedSampler` and silently yield single samples.
+        if world_size > 1 and trainer is not None and trainer.replace_sampler_ddp:
+            raise ValueError(
+                "Duration bucketing shards batches across ranks by itself and cannot be used with "
+                "`trainer.replace_sampler_ddp: true`. Set `replace_sampler_ddp: false` in the trainer config."
+            )
+
+        return torch.utils.data.DataLoader(
+            dataset=dataset,
+            batch_sampler=batch_sampler,
+            collate_fn=dataset.collate_fn,
+            num_workers=config.get('num_workers', 0),
+            pin_memory=config.get('pin_memory', False),
+        )
+
+    return torch.utils.data.DataLoader(
+        dataset=dataset,
+        batch_size=config['batch_size'],
+        collate_fn=dataset.collate_fn,
+        drop_last=config.get('drop_last', False),
+        shuffle=shuffle,
+        num_workers=config.get('num_workers', 0),
+        pin_memory=config.get('pin_memory', False),
+    )
+
+
 def get_dali_char_dataset(
     config: dict,
     shuffle: bool,
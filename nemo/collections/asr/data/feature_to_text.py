@@ -0,0 +1,274 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import Callable, Dict, List, Optional, Union
+
+import torch
+
+from nemo.collections.asr.parts import collections, parsers
+from nemo.collections.asr.parts.collate import pad_sequences
+from nemo.collections.asr.parts.feature_store import load_features
+from nemo.core.classes import Dataset
+from nemo.core.neural_types import *
+
+__all__ = [
+    'FeatureToCharDataset',
+    'FeatureToBPEDataset',
+]
+
+
+def _feature_collate_fn(batch, pad_id, pad_to=16, pad_value=0.0):
+    """collate batch of features, features len, tokens, tokens len
+    Args:
+        batch (FloatTensor, LongTensor, LongTensor, LongTensor):  A tuple of tuples of [D, T] features, number of
+               frames, encoded tokens, and encoded tokens length.
+        pad_id: Token id used to pad the tokens.
+        pad_to: The time dimension of the features is padded to a multiple of pad_to, as done by the preprocessor.
+        pad_value: Value used to pad the features.
+    """
+    features, features_lengths, tokens, _ = zip(*batch)
+
+    max_length = max(feature.shape[-1] for feature in features)
+    if pad_to > 0 and max_length % pad_to != 0:
+        max_length += pad_to - max_length % pad_to
+
+    padded = torch.full((len(features), features[0].shape[0], max_length), pad_value, dtype=torch.float)
+    for row, feature in zip(padded, features):
+        row[:, : feature.shape[-1]].copy_(feature)
+
+    tokens, tokens_lengths = pad_sequences(tokens, pad_value=pad_id)
+    return padded, torch.stack(features_lengths), tokens, tokens_lengths
+
+
+class _FeatureTextDataset(Dataset):
+    """
+    Dataset that loads precomputed features from a sharded feature store via a json file containing their locations,
+    transcripts, and durations (in seconds) of the original audio. Manifests and stores are written by
+    `scripts/extract_asr_features.py`. Each new line is a different sample. Example below:
+    {"audio_filepath": "/path/to/audio.wav", "text": "the transcription", "duration": 23.147,
+    "feature_filepath": "/path/to/features_00000.npy", "feature_offset": 1024, "feature_length": 2316}
+
+    Features are the output of the preprocessor (normalized log-mels), so models feed them directly to the encoder
+    and only spectrogram level augmentations (`SpectrogramAugmentation`) are applied.
+
+    Args:
+        manifest_filepath: Path to manifest json as described above. Can be comma-separated paths.
+        parser: Str for a language specific preprocessor or a callable.
+        max_duration: If audio exceeds this length, do not include in dataset
+        min_duration: If audio is less than this length, do not include in dataset
+        max_utts: Limit number of utterances
+        bos_id: Id of beginning of sequence symbol to append if not None
+        eos_id: Id of end of sequence symbol to append if not None
+        pad_id: Id of pad symbol. Defaults to 0
+        pad_to: Pads the time dimension of the features to a multiple of pad_to. Defaults to 16
+        add_misc: True if add additional info dict.
+    """
+
+    @property
+    def output_types(self) -> Optional[Dict[str, NeuralType]]:
+        """Returns definitions of module output ports.
+               """
+        return {
+            'processed_signal': NeuralType(('B', 'D', 'T'), MelSpectrogramType()),
+            'processed_length': NeuralType(tuple('B'), LengthsType()),
+            'transcripts': NeuralType(('B', 'T'), LabelsType()),
+            'transcript_length': NeuralType(tuple('B'), LengthsType()),
+        }
+
+    def __init__(
+        self,
+        manifest_filepath: str,
+        parser: Union[str, Callable],
+        max_duration: Optional[float] = None,
+        min_duration: Optional[float] = None,
+        max_utts: int = 0,
+        bos_id: Optional[int] = None,
+        eos_id: Optional[int] = None,
+        pad_id: int = 0,
+        pad_to: int = 16,
+        add_misc: bool = False,
+    ):
+        self.parser = parser
+        self.collection = collections.ASRFeatureText(
+            manifests_files=manifest_filepath.split(','),
+            parser=parser,
+            min_duration=min_duration,
+            max_duration=max_duration,
+            max_number=max_utts,
+        )
+
+        self.eos_id = eos_id
+        self.bos_id = bos_id
+        self.pad_id = pad_id
+        self.pad_to = pad_to
+        self._add_misc = add_misc
+
+    def __getitem__(self, index):
+        sample = self.collection[index]
+        features = load_features(sample.feature_file, sample.feature_offset, sample.feature_length)
+        f, fl = torch.tensor(features, dtype=torch.float), torch.tensor(sample.feature_length).long()
+
+        t, tl = sample.text_tokens, len(sample.text_tokens)
+        if self.bos_id is not None:
+            t = [self.bos_id] + t
+            tl += 1
+        if self.eos_id is not None:
+            t = t + [self.eos_id]
+            tl += 1
+
+        output = f, fl, torch.tensor(t).long(), torch.tensor(tl).long()
+
+        if self._add_misc:
+            misc = dict()
+            misc['id'] = sample.id
+            misc['text_raw'] = sample.text_raw
+            misc['speaker'] = sample.speaker
+            output = (output, misc)
+
+        return output
+
+    def __len__(self):
+        return len(self.collection)
+
+    def _collate_fn(self, batch):
+        return _feature_collate_fn(batch, pad_id=self.pad_id, pad_to=self.pad_to)
+
+
+class FeatureToCharDataset(_FeatureTextDataset):
+    """
+    Character encoding counterpart of `AudioToCharDataset` which reads precomputed features, see
+    `_FeatureTextDataset` for the manifest structure.
+
+    Args:
+        manifest_filepath: Path to manifest json as described above. Can
+            be comma-separated paths.
+        labels: String containing all the possible characters to map to
+        max_duration: If audio exceeds this length, do not include in dataset
+        min_duration: If audio is less than this length, do not include
+            in dataset
+        max_utts: Limit number of utterances
+        blank_index: blank character index, default = -1
+        unk_index: unk_character index, default = -1
+        normalize: whether to normalize transcript text (default): True
+        bos_id: Id of beginning of sequence symbol to append if not None
+        eos_id: Id of end of sequence symbol to append if not None
+        pad_id: Id of pad symbol. Defaults to 0
+        pad_to: Pads the time dimension of the features to a multiple of pad_to. Defaults to 16
+        parser: Str for a language specific preprocessor or a callable.
+        add_misc: True if add additional info dict.
+    """
+
+    def __init__(
+        self,
+        manifest_filepath: str,
+        labels: Union[str, List[str]],
+        max_duration: Optional[float] = None,
+        min_duration: Optional[float] = None,
+        max_utts: int = 0,
+        blank_index: int = -1,
+        unk_index: int = -1,
+        normalize: bool = True,
+        bos_id: Optional[int] = None,
+        eos_id: Optional[int] = None,
+        pad_id: int = 0,
+        pad_to: int = 16,
+        parser: Union[str, Callable] = 'en',
+        add_misc: bool = False,
+    ):
+        self.labels = labels
+
+        parser = parsers.make_parser(
+            labels=labels, name=parser, unk_id=unk_index, blank_id=blank_index, do_normalize=normalize
+        )
+
+        super().__init__(
+            manifest_filepath=manifest_filepath,
+            parser=parser,
+            max_duration=max_duration,
+            min_duration=min_duration,
+            max_utts=max_utts,
+            bos_id=bos_id,
+            eos_id=eos_id,
+            pad_id=pad_id,
+            pad_to=pad_to,
+            add_misc=add_misc,
+        )
+
+
+class FeatureToBPEDataset(_FeatureTextDataset):
+    """
+    Byte pair encoding counterpart of `AudioToBPEDataset` which reads precomputed features, see
+    `_FeatureTextDataset` for the manifest structure.
+
+    Args:
+        manifest_filepath: Path to manifest json as described above. Can
+            be comma-separated paths.
+        tokenizer: A subclass of the Tokenizer wrapper found in the common collection,
+            nemo.collections.common.tokenizers.TokenizerSpec. ASR Models support a subset of
+            all available tokenizers.
+        max_duration: If audio exceeds this length, do not include in dataset
+        min_duration: If audio is less than this length, do not include
+            in dataset
+        max_utts: Limit number of utterances
+        pad_to: Pads the time dimension of the features to a multiple of pad_to. Defaults to 16
+        add_misc: True if add additional info dict.
+        use_start_end_token: Boolean which dictates whether to add [BOS] and [EOS]
+            tokens to beginning and ending of speech respectively.
+    """
+
+    def __init__(
+        self,
+        manifest_filepath: str,
+        tokenizer: 'nemo.collections.common.tokenizers.TokenizerSpec',
+        max_duration: Optional[float] = None,
+        min_duration: Optional[float] = None,
+        max_utts: int = 0,
+        pad_to: int = 16,
+        add_misc: bool = False,
+        use_start_end_token: bool = True,
+    ):
+        if use_start_end_token and hasattr(tokenizer, 'bos_token'):
+            bos_id = tokenizer.bos_id
+        else:
+            bos_id = None
+
+        if use_start_end_token and hasattr(tokenizer, 'eos_token'):
+            eos_id = tokenizer.eos_id
+        else:
+            eos_id = None
+
+        if hasattr(tokenizer, 'pad_token'):
+            pad_id = tokenizer.pad_id
+        else:
+            pad_id = 0
+
+        class TokenizerWrapper:
+            def __init__(self, tokenizer):
+                self._tokenizer = tokenizer
+
+            def __call__(self, text):
+                t = self._tokenizer.text_to_ids(text)
+                return t
+
+        super().__init__(
+            manifest_filepath=manifest_filepath,
+            parser=TokenizerWrapper(tokenizer),
+            max_duration=max_duration,
+            min_duration=min_duration,
+            max_utts=max_utts,
+            bos_id=bos_id,
+            eos_id=eos_id,
+            pad_id=pad_id,
+            pad_to=pad_to,
+            add_misc=add_misc,
+        )
@@ -0,0 +1,215 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from nemo.utils import logging
+
+__all__ = ['DurationBucketingBatchSampler', 'get_durations', 'get_sorted_batches', 'padding_ratio']
+
+
+def get_durations(collection) -> np.ndarray:
+    """Returns the durations of all entries of an `AudioText`-like collection as a float64 array."""
+    if hasattr(collection, 'durations'):
+        return np.asarray(collection.durations, dtype=np.float64)
+    return np.asarray([entry.duration for entry in collection], dtype=np.float64)
+
+
+def padding_ratio(durations: np.ndarray, batches: Sequence[Sequence[int]]) -> float:
+    """Fraction of padded audio in `batches`, i.e. 1 - (sum of durations) / (sum of batch size * longest duration)."""
+    total, padded = 0.0, 0.0
+    for batch in batches:
+        batch_durations = durations[np.asarray(batch, dtype=np.int64)]
+        total += batch_durations.sum()
+        padded += len(batch) * batch_durations.max()
+    return 1.0 - total / padded if padded > 0 else 0.0
+
+
+def get_sorted_batches(
+    durations: Sequence[float], batch_size: Optional[int] = None, max_batch_duration: Optional[float] = None
+) -> List[List[int]]:
+    """Batches the indices of `durations` by decreasing duration, for inference over utterances of random lengths.
+
+    Batches are formed as by `DurationBucketingBatchSampler` with a single bucket, either with a fixed `batch_size`
+    or greedily so that the padded duration of a batch does not exceed `max_batch_duration` seconds. The longest
+    utterances come first, so that running out of memory happens at the start.
+
+    Args:
+        durations: Duration in seconds of every utterance.
+        batch_size: Number of utterances per batch. Ignored if `max_batch_duration` is set.
+        max_batch_duration: Maximum padded duration of a batch in seconds.
+
+    Returns:
+        The list of batches of indices.
+    """
+    durations = np.asarray(durations, dtype=np.float64)
+    sampler = DurationBucketingBatchSampler(
+        durations, batch_size=batch_size, max_batch_duration=max_batch_duration, bucket_boundaries=[], shuffle=False
+    )
+    return sampler._batchify(np.argsort(-durations, kind='stable'))
+
+
+class DurationBucketingBatchSampler(torch.utils.data.Sampler):
+    """Batch sampler which groups utterances of similar duration to reduce the padding in each batch.
+
+    Utterances are split into buckets by duration (either `num_buckets` buckets holding the same number of
+    utterances each, or explicit `bucket_boundaries` in seconds). Batches are formed inside a bucket, either with
+    a fixed `batch_size` or greedily so that the padded duration of a batch (batch size * longest utterance)
+    does not exceed `max_batch_duration` seconds. The order of batches is then shuffled across buckets.
+
+    In distributed training, every rank builds the same list of batches from a shared seed and takes every
+    `num_replicas`-th batch, so all ranks see the same number of batches per epoch. Since PyTorch Lightning
+    replaces samplers of map-style datasets with `DistributedSampler`, the trainer has to be configured with
+    `replace_sampler_ddp: false` when this sampler is used together with DDP; `get_audio_to_text_dataloader`
+    raises an error otherwise.
+
+    Args:
+        durations: Duration in seconds of every utterance of the dataset.
+        batch_size: Number of utterances per batch. Ignored if `max_batch_duration` is set.
+        max_batch_duration: Maximum padded duration of a batch in seconds.
+        num_buckets: Number of equally populated duration buckets. Ignored if `bucket_boundaries` is set.
+        bucket_boundaries: Optional sorted list of bucket boundaries in seconds.
+        shuffle: Whether to shuffle utterances within buckets and batches across buckets every epoch.
+        drop_last: Whether to drop the last, incomplete batch of every bucket in fixed `batch_size` mode.
+        num_replicas: Number of distributed processes.
+        rank: Rank of the current process.
+        seed: Random seed shared by all ranks.
+    """
+
+    def __init__(
+        self,
+        durations: Sequence[float],
+        batch_size: Optional[int] = None,
+        max_batch_duration: Optional[float] = None,
+        num_buckets: int = 10,
+        bucket_boundaries: Optional[List[float]] = None,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        num_replicas: int = 1,
+        rank: int = 0,
+        seed: int = 0,
+    ):
+        if batch_size is None and max_batch_duration is None:
+            raise ValueError("Either `batch_size` or `max_batch_duration` has to be provided.")
+        if max_batch_duration is not None and max_batch_duration <= 0:
+            raise ValueError(f"`max_batch_duration` must be positive, got {max_batch_duration}")
+
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.batch_size = batch_size
+        self.max_batch_duration = max_batch_duration
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.num_replicas = max(num_replicas, 1)
+        self.rank = rank
+        self.seed = seed
+        self.epoch = 0
+
+        if bucket_boundaries is None:
+            quantiles = np.linspace(0, 1, num_buckets + 1)[1:-1]
+            bucket_boundaries = np.unique(np.quantile(self.durations, quantiles)) if len(self.durations) else []
+        self.bucket_boundaries = np.asarray(bucket_boundaries, dtype=np.float64)
+
+        bucket_ids = np.searchsorted(self.bucket_boundaries, self.durations, side='right')
+        self.buckets = [np.flatnonzero(bucket_ids == i) for i in range(len(self.bucket_boundaries) + 1)]
+        self.buckets = [bucket for bucket in self.buckets if len(bucket) > 0]
+
+        self._batches = None
+        self._batches_epoch = None
+
+    def set_epoch(self, epoch: int):
+        """Sets the epoch used to seed shuffling. Otherwise the epoch is advanced after every full iteration."""
+        self.epoch = epoch
+
+    def _batchify(self, bucket: np.ndarray) -> List[List[int]]:
+        if self.max_batch_duration is None:
+            batches = [bucket[i : i + self.batch_size] for i in range(0, len(bucket), self.batch_size)]
+            if self.drop_last and len(batches) > 0 and len(batches[-1]) < self.batch_size:
+                batches = batches[:-1]
+            return [batch.tolist() for batch in batches]
+
+        batches, batch, longest = [], [], 0.0
+        for idx in bucket.tolist():
+            duration = self.durations[idx]
+            new_longest = max(longest, duration)
+            if batch and new_longest * (len(batch) + 1) > self.max_batch_duration:
+                batches.append(batch)
+                batch, new_longest = [], duration
+            batch.append(idx)
+            longest = new_longest
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _make_batches(self) -> List[List[int]]:
+        if self._batches_epoch == self.epoch:
+            return self._batches
+
+        rng = np.random.RandomState(self.seed + self.epoch)
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = rng.permutation(bucket)
+            batches.extend(self._batchify(bucket))
+
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+
+        # Every rank must see the same number of batches, otherwise DDP hangs on the last step.
+        num_batches = len(batches) // self.num_replicas * self.num_replicas
+        if num_batches < len(batches) and not self.drop_last:
+            num_batches += self.num_replicas
+        batches = [batches[i % len(batches)] for i in range(num_batches)]
+
+        self._batches = batches[self.rank :: self.num_replicas]
+        self._batches_epoch = self.epoch
+        return self._batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._make_batches()
+        yield from batches
+        self.epoch += 1
+
+    def __len__(self) -> int:
+        return len(self._make_batches())
+
+    def report_padding(self, batch_size: Optional[int] = None) -> Dict[str, float]:
+        """Compares the padding ratio of bucketed batches with uniformly sampled batches and logs it.
+
+        Args:
+            batch_size: Batch size of the uniformly sampled baseline. Defaults to the average bucketed batch size.
+
+        Returns:
+            A dict with `padding_ratio_before` (uniform sampling) and `padding_ratio_after` (bucketing).
+        """
+        batches = self._make_batches()
+        if batch_size is None:
+            batch_size = max(int(round(np.mean([len(batch) for batch in batches]))), 1) if batches else 1
+
+        rng = np.random.RandomState(self.seed)
+        order = rng.permutation(len(self.durations))
+        uniform_batches = [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
+
+        report = {
+            'padding_ratio_before': padding_ratio(self.durations, uniform_batches),
+            'padding_ratio_after': padding_ratio(self.durations, batches),
+        }
+        logging.info(
+            f"Duration bucketing with {len(self.buckets)} buckets: padding ratio "
+            f"{report['padding_ratio_before']:.2%} with uniform sampling, "
+            f"{report['padding_ratio_after']:.2%} with bucketing."
+        )
+        return report
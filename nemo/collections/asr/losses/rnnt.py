@@ -29,6 +29,7 @@
 
 import torch
 
+from nemo.collections.asr.losses.rnnt_pytorch import rnnt_loss
 from nemo.core.classes import Loss, typecheck
 from nemo.core.neural_types import LabelsType, LengthsType, LogprobsType, LossType, NeuralType
 
@@ -60,16 +61,17 @@ class RNNTLoss(Loss):
         """
         return {"loss": NeuralType(elements_type=LossType())}
 
-    def __init__(self, num_classes, reduction='mean_batch'):
+    def __init__(self, num_classes, reduction='mean_batch', backend='auto', fused_log_softmax=True):
         """
-        RNN-T Loss function based on https://github.com/HawkAaron/warp-transducer.
+        RNN-T Loss function based on https://github.com/HawkAaron/warp-transducer, or on its in-tree
+        implementation in `rnnt_pytorch.py`, which runs with Numba on CPU and with torch on GPU.
 
         Note:
-            Requires the pytorch bindings to be installed prior to calling this class.
+            The `warprnnt` backend requires the pytorch bindings to be installed prior to calling this class.
 
         Warning:
-            In the case that GPU memory is exhausted in order to compute RNNTLoss, it might cause
-            a core dump at the cuda level with the following error message.
+            With the `warprnnt` backend, in the case that GPU memory is exhausted in order to compute RNNTLoss,
+            it might cause a core dump at the cuda level with the following error message.
 
             ```
                 ...
@@ -87,10 +89,23 @@ class RNNTLoss(Loss):
 
             reduction: Type of reduction to perform on loss. Possibly values are `mean`, `sum` or None.
                 None will return a torch vector comprising the individual loss values of the batch.
+
+            backend: `warprnnt`, `pytorch` for the in-tree implementation, or `auto` to use `warprnnt`
+                if its bindings are installed and the in-tree implementation otherwise.
+
+            fused_log_softmax: Only used by the `pytorch` backend. If True, the log softmax of the joint is
+                computed within the loss, without materializing the log probabilities, like `warprnnt` does
+                on GPU. It is correct whether the joint outputs logits or log probabilities. If False, the joint
+                has to output log probabilities.
         """
         super(RNNTLoss, self).__init__()
 
-        if not WARP_RNNT_AVAILABLE:
+        if backend == 'auto':
+            backend = 'warprnnt' if WARP_RNNT_AVAILABLE else 'pytorch'
+        if backend not in ['warprnnt', 'pytorch']:
+            raise ValueError('`backend` must be one of [auto, warprnnt, pytorch]')
+
+        if backend == 'warprnnt' and not WARP_RNNT_AVAILABLE:
             raise ImportError(
                 "Could not import `warprnnt_pytorch`.\n"
                 "Please visit https://github.com/HawkAaron/warp-transducer "
@@ -104,7 +119,10 @@ class RNNTLoss(Loss):
 
         self._blank = num_classes
         self.reduction = reduction
-        self._loss = warprnnt.RNNTLoss(blank=self._blank, reduction='none')
+        self.backend = backend
+        self.fused_log_softmax = fused_log_softmax
+        if backend == 'warprnnt':
+            self._loss = warprnnt.RNNTLoss(blank=self._blank, reduction='none')
 
     @typecheck()
     def forward(self, log_probs, targets, input_lengths, target_lengths):
@@ -135,6 +153,17 @@ class RNNTLoss(Loss):
         if targets.shape[1] != max_targets_len:
             targets = targets.narrow(dim=1, start=0, length=max_targets_len)
 
+        if self.backend == 'pytorch':
+            return rnnt_loss(
+                acts=log_probs,
+                labels=targets,
+                act_lens=input_lengths,
+                label_lens=target_lengths,
+                blank=self._blank,
+                reduction=self.reduction,
+                fused_log_softmax=self.fused_log_softmax,
+            )
+
         # Loss reduction can be dynamic, so set it prior to call
         if self.reduction != 'mean_batch':
             self._loss.reduction = self.reduction
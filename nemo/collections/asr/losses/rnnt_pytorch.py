@@ -0,0 +1,257 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+In-tree RNNT loss, which does not require the `warprnnt_pytorch` bindings.
+
+The loss only depends on the log probabilities of two transitions per node (t, u) of the lattice: blank, and the next
+label. These are gathered from the joint into [B, T, U + 1] tensors, and the forward-backward recursions run on them:
+with Numba on CPU, and with torch on any device by processing every anti-diagonal t + u = n of the lattice at once.
+"""
+
+from typing import Optional, Tuple
+
+import torch
+
+try:
+    from nemo.collections.asr.parts import numba_utils
+
+    HAVE_NUMBA = True
+except (ImportError, ModuleNotFoundError):
+    HAVE_NUMBA = False
+
+__all__ = ['gather_lattice_log_probs', 'lattice_rnnt_loss', 'rnnt_forward_backward', 'rnnt_loss']
+
+
+def _skew(x: torch.Tensor, t_idx: torch.Tensor, u_idx: torch.Tensor, valid: torch.Tensor) -> torch.Tensor:
+    """Rearranges [B, T, U] into [B, N, U] such that row n holds the anti-diagonal t = n - u, -inf outside [0, T)."""
+    return x[:, t_idx, u_idx].masked_fill(~valid, float('-inf'))
+
+
+def rnnt_forward_backward(
+    blank_lp: torch.Tensor, label_lp: torch.Tensor, act_lens: torch.Tensor, label_lens: torch.Tensor
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Forward-backward of the RNNT loss in torch, vectorized over the batch and over the anti-diagonals of the lattice.
+
+    Args:
+        blank_lp: Log probabilities of blank at every node (t, u) of the lattice, of shape [B, T, U + 1].
+        label_lp: Log probabilities of the label u + 1 at every node (t, u) of the lattice, of shape [B, T, U].
+        act_lens: Number of frames of every utterance, of shape [B].
+        label_lens: Number of labels of every utterance, of shape [B].
+
+    Returns:
+        Negative log likelihoods of shape [B], and their gradients with respect to blank_lp and label_lp.
+    """
+    B, T, U1 = blank_lp.shape
+    N = T + U1
+    device = blank_lp.device
+    neg_inf = float('-inf')
+    act_lens = act_lens.long().to(device)
+    label_lens = label_lens.long().to(device)
+
+    # Transitions out of the lattice of every utterance are removed, so that its padding is unreachable
+    t_range = torch.arange(T, device=device)
+    u_range = torch.arange(U1, device=device)
+    in_time = t_range[None, :, None] < act_lens[:, None, None]
+    blank_lp = blank_lp.masked_fill(~(in_time & (u_range[None, None, :] <= label_lens[:, None, None])), neg_inf)
+    label_lp = torch.cat([label_lp, blank_lp.new_full((B, T, 1), neg_inf)], dim=-1)
+    label_lp = label_lp.masked_fill(~(in_time & (u_range[None, None, :] < label_lens[:, None, None])), neg_inf)
+
+    # Row n of the skewed tensors holds the nodes (n - u, u), so that all the predecessors of a row are in the previous
+    # row at the same index (blank) or at the previous index (label), and one step of the recursion is a row operation.
+    n_range = torch.arange(N, device=device)
+    t_idx = n_range[:, None] - u_range[None, :]
+    valid = (t_idx >= 0) & (t_idx < T)
+    t_idx = t_idx.clamp(0, T - 1)
+    u_idx = u_range[None, :].expand(N, U1)
+    blank_s = _skew(blank_lp, t_idx, u_idx, valid)
+    label_s = _skew(label_lp, t_idx, u_idx, valid)
+
+    # alphas[n, u] is the log probability of reaching the node (n - u, u). The final node (T_b, U_b) is one frame past
+    # the end of the utterance, so that its alpha is the log likelihood of the utterance.
+    alphas = blank_s.new_full((B, N, U1), neg_inf)
+    alphas[:, 0, 0] = 0.0
+    pad = blank_s.new_full((B, 1), neg_inf)
+    for n in range(1, N):
+        from_blank = alphas[:, n - 1] + blank_s[:, n - 1]
+        from_label = torch.cat([pad, alphas[:, n - 1, :-1] + label_s[:, n - 1, :-1]], dim=-1)
+        alphas[:, n] = torch.logaddexp(from_blank, from_label)
+    batch_range = torch.arange(B, device=device)
+    log_likelihood = alphas[batch_range, act_lens + label_lens, label_lens]
+
+    # betas[n, u] is the log probability of reaching the final node from the node (n - u, u)
+    betas = blank_s.new_full((B, N, U1), neg_inf)
+    betas[batch_range, act_lens + label_lens, label_lens] = 0.0
+    for n in range(N - 2, -1, -1):
+        to_blank = betas[:, n + 1] + blank_s[:, n]
+        to_label = torch.cat([betas[:, n + 1, 1:] + label_s[:, n, :-1], pad], dim=-1)
+        betas[:, n] = torch.logaddexp(betas[:, n], torch.logaddexp(to_blank, to_label))
+
+    # The gradient of the cost with respect to a transition is minus its posterior probability
+    log_likelihood = log_likelihood[:, None, None]
+    grad_blank_s = -torch.exp(alphas[:, :-1] + blank_s[:, :-1] + betas[:, 1:] - log_likelihood)
+    grad_label_s = -torch.exp(alphas[:, :-1, :-1] + label_s[:, :-1, :-1] + betas[:, 1:, 1:] - log_likelihood)
+
+    # Back to [B, T, U + 1], node (t, u) being in row t + u
+    n_idx = t_range[:, None] + u_range[None, :]
+    u_idx = u_range[None, :].expand(T, U1)
+    grad_blank = grad_blank_s[:, n_idx, u_idx]
+    grad_label = grad_label_s[:, n_idx[:, :-1], u_idx[:, :-1]]
+    return -log_likelihood.view(B), grad_blank, grad_label
+
+
+class _RNNTCost(torch.autograd.Function):
+    """Negative log likelihood of the lattice, differentiable with respect to its transitions."""
+
+    @staticmethod
+    def forward(ctx, blank_lp, label_lp, act_lens, label_lens):
+        if blank_lp.is_cuda or not HAVE_NUMBA:
+            costs, grad_blank, grad_label = rnnt_forward_backward(blank_lp, label_lp, act_lens, label_lens)
+        else:
+            costs, grad_blank, grad_label = numba_utils.rnnt_forward_backward(
+                blank_lp.detach().numpy(),
+                label_lp.detach().numpy(),
+                act_lens.long().cpu().numpy(),
+                label_lens.long().cpu().numpy(),
+            )
+            costs = torch.from_numpy(costs).to(blank_lp.dtype)
+            grad_blank, grad_label = torch.from_numpy(grad_blank), torch.from_numpy(grad_label)
+        ctx.save_for_backward(grad_blank, grad_label)
+        return costs
+
+    @staticmethod
+    def backward(ctx, grad_costs):
+        grad_blank, grad_label = ctx.saved_tensors
+        grad_costs = grad_costs.view(-1, 1, 1)
+        return grad_blank * grad_costs, grad_label * grad_costs, None, None
+
+
+class _FusedLogSoftmaxGather(torch.autograd.Function):
+    """
+    Log softmax of the joint, gathered at blank and at the next label of every node.
+
+    Only [B, T, U + 1] tensors are kept for the backward pass next to the joint, instead of the [B, T, U + 1, V + 1]
+    log softmax and the gradient of the gather. The gradient of the joint is computed in place in a single
+    [B, T, U + 1, V + 1] tensor.
+    """
+
+    @staticmethod
+    def forward(ctx, acts, labels, blank):
+        B, T, U1, _ = acts.shape
+        log_norm = torch.logsumexp(acts, dim=-1)
+        labels = labels[:, None, :, None].expand(B, T, U1 - 1, 1)
+        blank_lp = acts[..., blank] - log_norm
+        label_lp = acts[:, :, :-1].gather(dim=-1, index=labels).squeeze(-1) - log_norm[:, :, :-1]
+        ctx.save_for_backward(acts, labels, log_norm)
+        ctx.blank = blank
+        return blank_lp, label_lp
+
+    @staticmethod
+    def backward(ctx, grad_blank, grad_label):
+        acts, labels, log_norm = ctx.saved_tensors
+        # d log_softmax(x)_k / d x = onehot(k) - softmax(x)
+        grad = torch.sub(acts, log_norm.unsqueeze(-1)).exp_()
+        grad_total = grad_blank.clone()
+        grad_total[:, :, :-1] += grad_label
+        grad.mul_(-grad_total.unsqueeze(-1))
+        grad[..., ctx.blank] += grad_blank
+        grad[:, :, :-1].scatter_add_(-1, labels, grad_label.unsqueeze(-1))
+        return grad, None, None
+
+
+def gather_lattice_log_probs(
+    acts: torch.Tensor, labels: torch.Tensor, blank: int, fused_log_softmax: bool = True
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Gathers the log probabilities of the transitions of the lattice from joint outputs.
+
+    The joint can be split along time, since the log probabilities of frame t only depend on the joint at frame t.
+
+    Args:
+        acts: Joint outputs of shape [B, T, U + 1, V + 1].
+        labels: Labels of shape [B, U].
+        blank: Index of the blank token.
+        fused_log_softmax: If True, `acts` are logits and the log softmax is computed within the loss, without
+            materializing the log probabilities. It is also correct for log probabilities, since the log softmax of
+            log probabilities is themselves. If False, `acts` have to be log probabilities.
+
+    Returns:
+        The log probabilities of blank, of shape [B, T, U + 1], and of the next label, of shape [B, T, U].
+    """
+    labels = labels.long().clamp(0, acts.shape[-1] - 1)
+    if fused_log_softmax:
+        return _FusedLogSoftmaxGather.apply(acts, labels, blank)
+
+    blank_lp = acts[..., blank]
+    label_lp = acts[:, :, :-1].gather(dim=-1, index=labels[:, None, :, None].expand(-1, acts.shape[1], -1, 1))
+    return blank_lp, label_lp.squeeze(-1)
+
+
+def lattice_rnnt_loss(
+    blank_lp: torch.Tensor,
+    label_lp: torch.Tensor,
+    act_lens: torch.Tensor,
+    label_lens: torch.Tensor,
+    reduction: Optional[str] = 'mean_batch',
+) -> torch.Tensor:
+    """
+    RNNT loss of a batch, given the log probabilities of the transitions of its lattice.
+
+    Args:
+        blank_lp: Log probabilities of blank at every node (t, u) of the lattice, of shape [B, T, U + 1].
+        label_lp: Log probabilities of the label u + 1 at every node (t, u) of the lattice, of shape [B, T, U].
+        act_lens: Number of frames of every utterance, of shape [B].
+        label_lens: Number of labels of every utterance, of shape [B].
+        reduction: `mean_batch` or `mean` to average the loss over the batch, `sum`, or None to return the loss of
+            every utterance.
+
+    Returns:
+        The loss, reduced according to `reduction`.
+    """
+    costs = _RNNTCost.apply(blank_lp, label_lp, act_lens, label_lens)
+    if reduction in ('mean', 'mean_batch'):
+        return costs.mean()
+    if reduction == 'sum':
+        return costs.sum()
+    return costs
+
+
+def rnnt_loss(
+    acts: torch.Tensor,
+    labels: torch.Tensor,
+    act_lens: torch.Tensor,
+    label_lens: torch.Tensor,
+    blank: int,
+    reduction: Optional[str] = 'mean_batch',
+    fused_log_softmax: bool = True,
+) -> torch.Tensor:
+    """
+    RNNT loss of a batch of joint outputs.
+
+    Args:
+        acts: Joint outputs of shape [B, T, U + 1, V + 1].
+        labels: Labels of shape [B, U].
+        act_lens: Number of frames of every utterance, of shape [B].
+        label_lens: Number of labels of every utterance, of shape [B].
+        blank: Index of the blank token.
+        reduction: `mean_batch` or `mean` to average the loss over the batch, `sum`, or None to return the loss of
+            every utterance.
+        fused_log_softmax: See `gather_lattice_log_probs`.
+
+    Returns:
+        The loss, reduced according to `reduction`.
+    """
+    blank_lp, label_lp = gather_lattice_log_probs(acts, labels, blank, fused_log_softmax=fused_log_softmax)
+    return lattice_rnnt_loss(blank_lp, label_lp, act_lens, label_lens, reduction=reduction)
@@ -36,7 +36,9 @@ class AbstractRNNTDecoding(ABC):
             strategy: str value which represents the type of decoding that can occur.
                 Possible values are :
                 -   greedy, greedy_batch (for greedy decoding).
+                -   greedy_fused (for batched greedy decoding with a fused, TorchScript compatible loop).
                 -   beam, tsd, alsd (for beam search decoding).
+                -   tsd_batch (for time synchronous beam search decoding of all the samples of a batch together).
 
             compute_hypothesis_token_set: A bool flag, which determines whether to compute a list of decoded
                 tokens as well as the decoded string. Default is False in order to avoid double decoding
@@ -73,6 +75,9 @@ class AbstractRNNTDecoding(ABC):
                         By default, a float of 2.0 is used so that a target sequence can be at most twice
                         as long as the acoustic model output length T.
 
+                state_cache_size: optional int, the maximum number of token sequences whose prediction network
+                    outputs and states are cached during beam search. Set to 4096 by default.
+
         decoder: The Decoder/Prediction network module.
         joint: The Joint network module.
         blank_id: The id of the RNNT blank token.
@@ -84,7 +89,7 @@ class AbstractRNNTDecoding(ABC):
         self.blank_id = blank_id
         self.compute_hypothesis_token_set = self.cfg.get("compute_hypothesis_token_set", False)
 
-        possible_strategies = ['greedy', 'greedy_batch', 'beam', 'tsd', 'alsd']
+        possible_strategies = ['greedy', 'greedy_batch', 'greedy_fused', 'beam', 'tsd', 'tsd_batch', 'alsd']
         if self.cfg.strategy not in possible_strategies:
             raise ValueError(f"Decoding strategy must be one of {possible_strategies}")
 
@@ -104,6 +109,14 @@ class AbstractRNNTDecoding(ABC):
                 max_symbols_per_step=self.cfg.greedy.get('max_symbols', None),
             )
 
+        elif self.cfg.strategy == 'greedy_fused':
+            self.decoding = greedy_decode.GreedyFusedBatchedRNNTInfer(
+                decoder_model=decoder,
+                joint_model=joint,
+                blank_index=self.blank_id,
+                max_symbols_per_step=self.cfg.greedy.get('max_symbols', None),
+            )
+
         elif self.cfg.strategy == 'beam':
 
             self.decoding = beam_decode.BeamRNNTInfer(
@@ -113,6 +126,7 @@ class AbstractRNNTDecoding(ABC):
                 return_best_hypothesis=decoding_cfg.beam.get('return_best_hypothesis', True),
                 search_type='default',
                 score_norm=self.cfg.beam.get('score_norm', True),
+                state_cache_size=self.cfg.beam.get('state_cache_size', 4096),
             )
 
         elif self.cfg.strategy == 'tsd':
@@ -124,6 +138,19 @@ class AbstractRNNTDecoding(ABC):
                 return_best_hypothesis=decoding_cfg.beam.get('return_best_hypothesis', True),
                 search_type='tsd',
                 score_norm=self.cfg.beam.get('score_norm', True),
+                state_cache_size=self.cfg.beam.get('state_cache_size', 4096),
+                tsd_max_sym_exp_per_step=self.cfg.beam.get('tsd_max_sym_exp', 50),
+            )
+
+        elif self.cfg.strategy == 'tsd_batch':
+
+            self.decoding = beam_decode.BeamBatchedRNNTInfer(
+                decoder_model=decoder,
+                joint_model=joint,
+                beam_size=self.cfg.beam.beam_size,
+                return_best_hypothesis=decoding_cfg.beam.get('return_best_hypothesis', True),
+                score_norm=self.cfg.beam.get('score_norm', True),
+                state_cache_size=self.cfg.beam.get('state_cache_size', 4096),
                 tsd_max_sym_exp_per_step=self.cfg.beam.get('tsd_max_sym_exp', 50),
             )
 
@@ -136,6 +163,7 @@ class AbstractRNNTDecoding(ABC):
                 return_best_hypothesis=decoding_cfg.beam.get('return_best_hypothesis', True),
                 search_type='alsd',
                 score_norm=self.cfg.beam.get('score_norm', True),
+                state_cache_size=self.cfg.beam.get('state_cache_size', 4096),
                 alsd_max_target_len=self.cfg.beam.get('alsd_max_target_len', 2),
             )
 
@@ -261,7 +289,9 @@ class RNNTDecoding(AbstractRNNTDecoding):
             strategy: str value which represents the type of decoding that can occur.
                 Possible values are :
                 -   greedy, greedy_batch (for greedy decoding).
+                -   greedy_fused (for batched greedy decoding with a fused, TorchScript compatible loop).
                 -   beam, tsd, alsd (for beam search decoding).
+                -   tsd_batch (for time synchronous beam search decoding of all the samples of a batch together).
 
             compute_hypothesis_token_set: A bool flag, which determines whether to compute a list of decoded
                 tokens as well as the decoded string. Default is False in order to avoid double decoding
@@ -298,6 +328,9 @@ class RNNTDecoding(AbstractRNNTDecoding):
                         By default, a float of 2.0 is used so that a target sequence can be at most twice
                         as long as the acoustic model output length T.
 
+                state_cache_size: optional int, the maximum number of token sequences whose prediction network
+                    outputs and states are cached during beam search. Set to 4096 by default.
+
         decoder: The Decoder/Prediction network module.
         joint: The Joint network module.
         vocabulary: The vocabulary (excluding the RNNT blank token) which will be used for decoding.
@@ -37,7 +37,9 @@ class RNNTBPEDecoding(AbstractRNNTDecoding):
             strategy: str value which represents the type of decoding that can occur.
                 Possible values are :
                 -   greedy, greedy_batch (for greedy decoding).
+                -   greedy_fused (for batched greedy decoding with a fused, TorchScript compatible loop).
                 -   beam, tsd, alsd (for beam search decoding).
+                -   tsd_batch (for time synchronous beam search decoding of all the samples of a batch together).
 
             compute_hypothesis_token_set: A bool flag, which determines whether to compute a list of decoded
                 tokens as well as the decoded string. Default is False in order to avoid double decoding
@@ -74,6 +76,9 @@ class RNNTBPEDecoding(AbstractRNNTDecoding):
                         By default, a float of 2.0 is used so that a target sequence can be at most twice
                         as long as the acoustic model output length T.
 
+                state_cache_size: optional int, the maximum number of token sequences whose prediction network
+                    outputs and states are cached during beam search. Set to 4096 by default.
+
         decoder: The Decoder/Prediction network module.
         joint: The Joint network module.
         tokenizer: The tokenizer which will be used for decoding.
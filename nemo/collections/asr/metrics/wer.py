@@ -12,15 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List
+from itertools import accumulate
+from typing import List, Optional, Tuple
 
 import editdistance
+import numpy as np
 import torch
 from pytorch_lightning.metrics import Metric
 
 from nemo.utils import logging
 
-__all__ = ['word_error_rate', 'WER']
+__all__ = ['word_error_rate', 'ctc_greedy_collapse', 'WER']
 
 
 def word_error_rate(hypotheses: List[str], references: List[str], use_cer=False) -> float:
@@ -59,6 +61,45 @@ def word_error_rate(hypotheses: List[str], references: List[str], use_cer=False)
     return wer
 
 
+def ctc_greedy_collapse(
+    predictions: torch.Tensor, blank_id: int, predictions_len: Optional[torch.Tensor] = None
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Collapses repeated labels and removes blanks of a batch of greedy CTC predictions, on the device of the
+    predictions.
+
+    Args:
+        predictions: Tensor of shape [B, T] of the predicted label of every frame.
+        blank_id: Index of the CTC blank label.
+        predictions_len: Optional tensor of shape [B] of the number of valid frames of every prediction.
+
+    Returns:
+        A tuple of the kept labels of all the predictions concatenated in a 1-D tensor, and the [B] number of kept
+        labels of every prediction.
+    """
+    predictions = predictions.long()
+    keep = predictions != blank_id
+    keep[:, 1:] &= predictions[:, 1:] != predictions[:, :-1]
+    if predictions_len is not None:
+        frames = torch.arange(predictions.shape[1], device=predictions.device)
+        keep &= frames.unsqueeze(0) < predictions_len.to(predictions.device).unsqueeze(1)
+    return predictions[keep], keep.sum(dim=1)
+
+
+def _pack_labels(labels: torch.Tensor, labels_len: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    # Same output as `ctc_greedy_collapse`, for padded label sequences
+    labels = labels.long()
+    steps = torch.arange(labels.shape[1], device=labels.device)
+    keep = steps.unsqueeze(0) < labels_len.to(labels.device).unsqueeze(1)
+    return labels[keep], keep.sum(dim=1)
+
+
+def _split_packed(labels: torch.Tensor, counts: torch.Tensor) -> List[List[int]]:
+    labels = labels.cpu().tolist()
+    bounds = [0] + list(accumulate(counts.cpu().tolist()))
+    return [labels[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
 class WER(Metric):
     """
     This metric computes numerator and denominator for Overall Word Error Rate (WER) between prediction and reference texts.
@@ -107,6 +148,7 @@ class WER(Metric):
         self.batch_dim_index = batch_dim_index
         self.blank_id = len(vocabulary)
         self.labels_map = dict([(i, vocabulary[i]) for i in range(len(vocabulary))])
+        self._vocabulary = np.array(list(vocabulary), dtype=object)
         self.use_cer = use_cer
         self.ctc_decode = ctc_decode
         self.log_prediction = log_prediction
@@ -120,24 +162,22 @@ class WER(Metric):
         """
         Decodes a sequence of labels to words
         """
-        hypotheses = []
-        # Drop predictions to CPU
-        prediction_cpu_tensor = predictions.long().cpu()
-        # iterate over batch
-        for ind in range(prediction_cpu_tensor.shape[self.batch_dim_index]):
-            prediction = prediction_cpu_tensor[ind].detach().numpy().tolist()
-            if predictions_len is not None:
-                prediction = prediction[: predictions_len[ind]]
-            # CTC decoding procedure
-            decoded_prediction = []
-            previous = self.blank_id
-            for p in prediction:
-                if (p != previous or previous == self.blank_id) and p != self.blank_id:
-                    decoded_prediction.append(p)
-                previous = p
-            hypothesis = ''.join([self.labels_map[c] for c in decoded_prediction])
-            hypotheses.append(hypothesis)
-        return hypotheses
+        if self.batch_dim_index != 0:
+            predictions = predictions.transpose(0, self.batch_dim_index)
+        labels, counts = ctc_greedy_collapse(predictions.detach(), self.blank_id, predictions_len)
+        return self._labels_to_text(labels, counts)
+
+    def _labels_to_text(self, labels: torch.Tensor, counts: torch.Tensor) -> List[str]:
+        # Map the labels of all the samples at once, then join the characters of every sample
+        chars = self._vocabulary[labels.cpu().numpy()]
+        bounds = [0] + list(accumulate(counts.cpu().tolist()))
+        return [''.join(chars[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def decode_ids_to_str(self, ids: List[int]) -> str:
+        """
+        Converts a sequence of label ids, already CTC decoded, to text
+        """
+        return ''.join(self.labels_map[label] for label in ids)
 
     def update(
         self,
@@ -148,18 +188,10 @@ class WER(Metric):
     ) -> torch.Tensor:
         words = 0.0
         scores = 0.0
-        references = []
         with torch.no_grad():
-            # prediction_cpu_tensor = tensors[0].long().cpu()
-            targets_cpu_tensor = targets.long().cpu()
-            tgt_lenths_cpu_tensor = target_lengths.long().cpu()
-
-            # iterate over batch
-            for ind in range(targets_cpu_tensor.shape[self.batch_dim_index]):
-                tgt_len = tgt_lenths_cpu_tensor[ind].item()
-                target = targets_cpu_tensor[ind][:tgt_len].numpy().tolist()
-                reference = ''.join([self.labels_map[c] for c in target])
-                references.append(reference)
+            if self.batch_dim_index != 0:
+                targets = targets.transpose(0, self.batch_dim_index)
+            references = self._labels_to_text(*_pack_labels(targets, target_lengths))
             if self.ctc_decode:
                 hypotheses = self.ctc_decoder_predictions_tensor(predictions, predictions_lengths)
             else:
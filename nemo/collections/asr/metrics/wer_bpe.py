@@ -18,6 +18,7 @@ import editdistance
 import torch
 from pytorch_lightning.metrics import Metric
 
+from nemo.collections.asr.metrics.wer import _pack_labels, _split_packed, ctc_greedy_collapse
 from nemo.collections.common.tokenizers.tokenizer_spec import TokenizerSpec
 from nemo.utils import logging
 
@@ -83,24 +84,16 @@ class WERBPE(Metric):
         """
         Decodes a sequence of labels to words
         """
-        hypotheses = []
-        # Drop predictions to CPU
-        prediction_cpu_tensor = predictions.long().cpu()
-        # iterate over batch
-        for ind in range(prediction_cpu_tensor.shape[self.batch_dim_index]):
-            prediction = prediction_cpu_tensor[ind].detach().numpy().tolist()
-            if predictions_len is not None:
-                prediction = prediction[: predictions_len[ind]]
-            # CTC decoding procedure
-            decoded_prediction = []
-            previous = self.blank_id
-            for p in prediction:
-                if (p != previous or previous == self.blank_id) and p != self.blank_id:
-                    decoded_prediction.append(p)
-                previous = p
-            hypothesis = self.tokenizer.ids_to_text(decoded_prediction)
-            hypotheses.append(hypothesis)
-        return hypotheses
+        if self.batch_dim_index != 0:
+            predictions = predictions.transpose(0, self.batch_dim_index)
+        labels, counts = ctc_greedy_collapse(predictions.detach(), self.blank_id, predictions_len)
+        return [self.tokenizer.ids_to_text(ids) for ids in _split_packed(labels, counts)]
+
+    def decode_ids_to_str(self, ids: List[int]) -> str:
+        """
+        Converts a sequence of label ids, already CTC decoded, to text
+        """
+        return self.tokenizer.ids_to_text(ids)
 
     def update(
         self,
@@ -111,18 +104,12 @@ class WERBPE(Metric):
     ):
         words = 0.0
         scores = 0.0
-        references = []
         with torch.no_grad():
-            # prediction_cpu_tensor = tensors[0].long().cpu()
-            targets_cpu_tensor = targets.long().cpu()
-            tgt_lenths_cpu_tensor = target_lengths.long().cpu()
-
-            # iterate over batch
-            for ind in range(targets_cpu_tensor.shape[self.batch_dim_index]):
-                tgt_len = tgt_lenths_cpu_tensor[ind].item()
-                target = targets_cpu_tensor[ind][:tgt_len].numpy().tolist()
-                reference = self.tokenizer.ids_to_text(target)
-                references.append(reference)
+            if self.batch_dim_index != 0:
+                targets = targets.transpose(0, self.batch_dim_index)
+            references = [
+                self.tokenizer.ids_to_text(ids) for ids in _split_packed(*_pack_labels(targets, target_lengths))
+            ]
             if self.ctc_decode:
                 hypotheses = self.ctc_decoder_predictions_tensor(predictions, predictions_lengths)
             else:
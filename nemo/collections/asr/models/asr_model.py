@@ -13,10 +13,12 @@
 # limitations under the License.
 import os
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import torch
 
+from nemo.collections.asr.data.samplers import get_sorted_batches
+from nemo.collections.asr.parts.segment import get_audio_duration
 from nemo.core.classes import ModelPT
 from nemo.core.classes.exportable import Exportable
 
@@ -36,6 +38,37 @@ class ASRModel(ModelPT, ABC):
         """
         pass
 
+    def _setup_sorted_transcribe_dataloader(
+        self, config: Dict, max_batch_duration: Optional[float] = None
+    ) -> Tuple['torch.utils.data.DataLoader', List[List[int]]]:
+        """
+        Setup function for the temporary data loader of `transcribe`, which batches the audio files by decreasing
+        duration instead of in the given order, so that little compute is spent on padding.
+
+        Args:
+            config: The config of `_setup_transcribe_dataloader`, with the `paths2audio_files` in the order of the
+                temporary manifest.
+            max_batch_duration: Optional maximum padded duration of a batch in seconds, which replaces the fixed
+                `batch_size` of the config.
+
+        Returns:
+            A pytorch DataLoader for the given audio files, and the indices in `paths2audio_files` of the files of
+            each of its batches.
+        """
+        # Only the headers of the audio files are read
+        durations = [get_audio_duration(audio_file) for audio_file in config['paths2audio_files']]
+        batches = get_sorted_batches(durations, batch_size=config['batch_size'], max_batch_duration=max_batch_duration)
+
+        temporary_datalayer = self._setup_transcribe_dataloader(config)
+        temporary_datalayer = torch.utils.data.DataLoader(
+            dataset=temporary_datalayer.dataset,
+            batch_sampler=batches,
+            collate_fn=temporary_datalayer.collate_fn,
+            num_workers=temporary_datalayer.num_workers,
+            pin_memory=temporary_datalayer.pin_memory,
+        )
+        return temporary_datalayer, batches
+
     def multi_validation_epoch_end(self, outputs, dataloader_idx: int = 0):
         val_loss_mean = torch.stack([x['val_loss'] for x in outputs]).mean()
         wer_num = torch.stack([x['val_wer_num'] for x in outputs]).sum()
@@ -149,7 +149,7 @@ class _EncDecBaseModel(ASRModel, ExportableEncDecModel):
             )
         # Spec augment is not applied during evaluation/testing
         if self.spec_augmentation is not None and self.training:
-            processed_signal = self.spec_augmentation(input_spec=processed_signal)
+            processed_signal = self.spec_augmentation(input_spec=processed_signal, length=processed_signal_len)
         encoded, encoded_len = self.encoder(audio_signal=processed_signal, length=processed_signal_len)
         logits = self.decoder(encoder_output=encoded)
         return logits
@@ -170,10 +170,11 @@ class _EncDecBaseModel(ASRModel, ExportableEncDecModel):
             # If it's an int, we assume that the user has set it to something sane, i.e. <= # training batches,
             # and don't change it. Otherwise, adjust batches accordingly if it's a float (including 1.0).
             if isinstance(self._trainer.limit_train_batches, float):
-                self._trainer.limit_train_batches = int(
-                    self._trainer.limit_train_batches
-                    * ceil((len(self._train_dl.dataset) / self.world_size) / train_data_config['batch_size'])
-                )
+                num_batches = len(self._train_dl.dataset) / self.world_size
+                # Datasets which yield batches themselves (e.g. with `max_batch_duration`) already count batches
+                if self._train_dl.batch_size is not None:
+                    num_batches /= train_data_config['batch_size']
+                self._trainer.limit_train_batches = int(self._trainer.limit_train_batches * ceil(num_batches))
 
     def setup_validation_data(self, val_data_config: Optional[Union[DictConfig, Dict]]):
         if 'shuffle' not in val_data_config:
@@ -270,7 +271,13 @@ class _EncDecBaseModel(ASRModel, ExportableEncDecModel):
         )
 
     @torch.no_grad()
-    def transcribe(self, paths2audio_files: List[str], batch_size: int = 4, logprobs=False) -> List[str]:
+    def transcribe(
+        self,
+        paths2audio_files: List[str],
+        batch_size: int = 4,
+        logprobs=False,
+        max_batch_duration: Optional[float] = None,
+    ) -> List[str]:
         """
         Generate class labels for provided audio files. Use this method for debugging and prototyping.
 
@@ -279,16 +286,27 @@ class _EncDecBaseModel(ASRModel, ExportableEncDecModel):
                 Recommended length per file is approximately 1 second.
             batch_size: (int) batch size to use during inference. \
                 Bigger will result in better throughput performance but would use more memory.
+                Files are batched by decreasing duration, so that little compute is spent on padding.
             logprobs: (bool) pass True to get log probabilities instead of class labels.
+            max_batch_duration: (float) if set, batches are limited to this padded duration in seconds \
+                (batch size * longest file) instead of to batch_size files.
 
         Returns:
 
-            A list of transcriptions (or raw log probabilities if logprobs is True) in the same order as paths2audio_files
+            A list of transcriptions (or raw log probabilities if logprobs is True) in the same order as paths2audio_files.
+            With several top_k values, a list with one tensor per k of the labels of all the files.
+
+        .. note::
+            Earlier versions returned one tensor per k per batch with several top_k values, see CHANGELOG.md.
         """
         if paths2audio_files is None or len(paths2audio_files) == 0:
+            if not logprobs and len(self._accuracy.top_k) > 1:
+                # One empty tensor of labels per k, as with files
+                max_k = max(self._accuracy.top_k)
+                return [torch.empty(0, max_k, dtype=torch.long) for _ in self._accuracy.top_k]
             return []
-        # We will store transcriptions here
-        labels = []
+        # We will store transcriptions here, in the order of paths2audio_files
+        labels = [None] * len(paths2audio_files)
         # Model's mode and device
         mode = self.training
         device = next(self.parameters()).device
@@ -312,32 +330,38 @@ class _EncDecBaseModel(ASRModel, ExportableEncDecModel):
 
                 config = {'paths2audio_files': paths2audio_files, 'batch_size': batch_size, 'temp_dir': tmpdir}
 
-                temporary_datalayer = self._setup_transcribe_dataloader(config)
-                for test_batch in temporary_datalayer:
+                # Regression models have no accuracy metric, and only return logprobs
+                top_ks = None if logprobs else self._accuracy.top_k
+                temporary_datalayer, batches = self._setup_sorted_transcribe_dataloader(config, max_batch_duration)
+                for test_batch, indices in zip(temporary_datalayer, batches):
                     logits = self.forward(
                         input_signal=test_batch[0].to(device), input_signal_length=test_batch[1].to(device)
                     )
                     if logprobs:
                         # dump log probs per file
                         for idx in range(logits.shape[0]):
-                            labels.append(logits[idx])
+                            labels[indices[idx]] = logits[idx]
                     else:
                         labels_k = []
-                        top_ks = self._accuracy.top_k
                         for top_k_i in top_ks:
                             # replace top k value with current top k
                             self._accuracy.top_k = top_k_i
                             labels_k_i = self._accuracy.top_k_predicted_labels(logits)
                             labels_k.append(labels_k_i)
 
-                        # convenience: if only one top_k, pop out the nested list
-                        if len(top_ks) == 1:
-                            labels_k = labels_k[0]
-
-                        labels += labels_k
+                        # per file, the labels of each top k
+                        for idx in range(logits.shape[0]):
+                            labels[indices[idx]] = [labels_k_i[idx] for labels_k_i in labels_k]
                         # reset top k to orignal value
                         self._accuracy.top_k = top_ks
                     del test_batch
+
+                if not logprobs:
+                    if len(top_ks) == 1:
+                        # convenience: if only one top_k, pop out the nested list
+                        labels = [labels_file[0] for labels_file in labels]
+                    else:
+                        labels = [torch.stack([labels_file[k] for labels_file in labels]) for k in range(len(top_ks))]
         finally:
             # set mode back to its original value
             self.train(mode=mode)
@@ -770,7 +794,9 @@ class EncDecRegressionModel(_EncDecBaseModel):
         return {'test_loss': test_loss_mean, 'test_mse': test_mse, 'test_mae': test_mae, 'log': tensorboard_logs}
 
     @torch.no_grad()
-    def transcribe(self, paths2audio_files: List[str], batch_size: int = 4) -> List[float]:
+    def transcribe(
+        self, paths2audio_files: List[str], batch_size: int = 4, max_batch_duration: Optional[float] = None
+    ) -> List[float]:
         """
         Generate class labels for provided audio files. Use this method for debugging and prototyping.
 
@@ -779,12 +805,16 @@ class EncDecRegressionModel(_EncDecBaseModel):
                 Recommended length per file is approximately 1 second.
             batch_size: (int) batch size to use during inference. \
                 Bigger will result in better throughput performance but would use more memory.
+            max_batch_duration: (float) if set, batches are limited to this padded duration in seconds \
+                (batch size * longest file) instead of to batch_size files.
 
         Returns:
 
             A list of predictions in the same order as paths2audio_files
         """
-        predictions = super().transcribe(paths2audio_files, batch_size, logprobs=True)
+        predictions = super().transcribe(
+            paths2audio_files, batch_size, logprobs=True, max_batch_duration=max_batch_duration
+        )
         return [float(pred) for pred in predictions]
 
     def _update_decoder_config(self, labels, cfg):
@@ -32,10 +32,11 @@ from nemo.collections.asr.models.label_models import ExtractSpeakerEmbeddingsMod
 from nemo.collections.asr.parts.mixins import DiarizationMixin
 from nemo.collections.asr.parts.speaker_utils import audio_rttm_map, perform_diarization, write_rttm2manifest
 from nemo.collections.asr.parts.vad_utils import (
-    generate_overlap_vad_seq,
-    generate_vad_segment_table,
-    get_vad_stream_status,
+    generate_overlap_vad_seq_per_tensor,
+    generate_vad_frame_pred,
+    generate_vad_segment_table_per_tensor,
     prepare_manifest,
+    write_vad_pred_to_text,
 )
 from nemo.core.classes import Model
 from nemo.utils import logging, model_utils
@@ -145,64 +146,49 @@ class ClusteringDiarizer(Model, DiarizationMixin):
         self._vad_model = self._vad_model.to(self._device)
         self._vad_model.eval()
 
-        time_unit = int(self._vad_window_length_in_sec / self._vad_shift_length_in_sec)
-        trunc = int(time_unit / 2)
-        trunc_l = time_unit - trunc
-        all_len = 0
-        data = []
-        for line in open(manifest_file, 'r'):
-            file = os.path.basename(json.loads(line)['audio_filepath'])
-            data.append(os.path.splitext(file)[0])
-
-        status = get_vad_stream_status(data)
-        for i, test_batch in enumerate(tqdm(self._vad_model.test_dataloader())):
-            test_batch = [x.to(self._device) for x in test_batch]
-            with autocast():
-                log_probs = self._vad_model(input_signal=test_batch[0], input_signal_length=test_batch[1])
-                probs = torch.softmax(log_probs, dim=-1)
-                pred = probs[:, 1]
-                if status[i] == 'start':
-                    to_save = pred[:-trunc]
-                elif status[i] == 'next':
-                    to_save = pred[trunc:-trunc_l]
-                elif status[i] == 'end':
-                    to_save = pred[trunc_l:]
-                else:
-                    to_save = pred
-                all_len += len(to_save)
-                outpath = os.path.join(self._vad_dir, data[i] + ".frame")
-                with open(outpath, "a") as fout:
-                    for f in range(len(to_save)):
-                        fout.write('{0:0.4f}\n'.format(to_save[f]))
-            del test_batch
-            if status[i] == 'end' or status[i] == 'single':
-                all_len = 0
-
-        if not self._cfg.diarizer.vad.vad_decision_smoothing:
-            # Shift the window by 10ms to generate the frame and use the prediction of the window to represent the label for the frame;
-            self.vad_pred_dir = self._vad_dir
+        # Frame predictions stay in memory from the model output to the segment tables; exporting them as text
+        # (e.g. for scripts/vad_tune_threshold.py) is optional
+        save_vad_predictions = self._cfg.diarizer.vad.get('save_vad_predictions', False)
+        vad_preds = generate_vad_frame_pred(
+            vad_model=self._vad_model,
+            window_length_in_sec=self._vad_window_length_in_sec,
+            shift_length_in_sec=self._vad_shift_length_in_sec,
+            manifest_vad_input=manifest_file,
+            out_dir=self._vad_dir if save_vad_predictions else None,
+        )
+        self.vad_pred_dir = self._vad_dir
 
-        else:
+        if self._cfg.diarizer.vad.vad_decision_smoothing:
             # Generate predictions with overlapping input segments. Then a smoothing filter is applied to decide the label for a frame spanned by multiple segments.
             # smoothing_method would be either in majority vote (median) or average (mean)
             logging.info("Generating predictions with overlapping input segments")
-            smoothing_pred_dir = generate_overlap_vad_seq(
-                frame_pred_dir=self._vad_dir,
-                smoothing_method=self._cfg.diarizer.vad.smoothing_params.method,
-                overlap=self._cfg.diarizer.vad.smoothing_params.overlap,
-                seg_len=self._vad_window_length_in_sec,
-                shift_len=self._vad_shift_length_in_sec,
-                num_workers=self._cfg.num_workers,
+            smoothing_method = self._cfg.diarizer.vad.smoothing_params.method
+            overlap = self._cfg.diarizer.vad.smoothing_params.overlap
+            vad_preds = {
+                name: generate_overlap_vad_seq_per_tensor(
+                    frame,
+                    smoothing_method=smoothing_method,
+                    overlap=overlap,
+                    seg_len=self._vad_window_length_in_sec,
+                    shift_len=self._vad_shift_length_in_sec,
+                )
+                for name, frame in vad_preds.items()
+            }
+            self.vad_pred_dir = os.path.join(
+                self._vad_dir, "overlap_smoothing_output" + "_" + smoothing_method + "_" + str(overlap)
             )
-            self.vad_pred_dir = smoothing_pred_dir
+            if save_vad_predictions:
+                write_vad_pred_to_text(vad_preds, self.vad_pred_dir, smoothing_method)
 
         logging.info("Converting frame level prediction to speech/no-speech segment in start and end times format.")
-        table_out_dir = generate_vad_segment_table(
-            vad_pred_dir=self.vad_pred_dir,
-            threshold=self._cfg.diarizer.vad.threshold,
-            shift_len=self._vad_shift_length_in_sec,
-            num_workers=self._cfg.num_workers,
-        )
+        threshold = self._cfg.diarizer.vad.threshold
+        table_out_dir = os.path.join(self.vad_pred_dir, "table_output_" + str(threshold))
+        os.makedirs(table_out_dir, exist_ok=True)
+        for name, pred in vad_preds.items():
+            seg_speech_table = generate_vad_segment_table_per_tensor(
+                pred, threshold=threshold, shift_len=self._vad_shift_length_in_sec
+            )
+            seg_speech_table.to_csv(os.path.join(table_out_dir, name + ".txt"), sep='\t', index=False, header=False)
 
         vad_table_list = [os.path.join(table_out_dir, key + ".txt") for key in self.AUDIO_RTTM_MAP]
         write_rttm2manifest(self._cfg.diarizer.paths2audio_files, vad_table_list, self._vad_out_file)
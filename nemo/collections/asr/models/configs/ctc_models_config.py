@@ -39,6 +39,31 @@ class EncDecCTCDatasetConfig(nemo.core.classes.dataset.DatasetConfig):
     tarred_shard_strategy: str = "scatter"
     shuffle_n: int = 0
 
+    # Memory-mapped manifest index support
+    use_manifest_index: bool = False
+    manifest_index_dir: Optional[str] = None
+
+    # Decoded audio cache support
+    use_audio_cache: bool = False
+    audio_cache_dir: Optional[str] = None
+    audio_cache_max_bytes: int = 8 * 2 ** 30
+    audio_cache_dtype: str = 'float32'
+
+    # Precomputed feature store support
+    use_feature_store: bool = False
+    feature_pad_to: int = 16
+
+    # Batched on-device augmentation support
+    augment_on_device: bool = False
+
+    # Duration bucketing support
+    use_bucketing: bool = False
+    num_buckets: int = 10
+    bucket_boundaries: Optional[List[float]] = None
+    max_batch_duration: Optional[float] = None
+    bucketing_seed: int = 0
+    batching_buffer_size: int = 256
+
     # Optional
     int_values: Optional[int] = None
     augmentor: Optional[Dict[str, Any]] = None
@@ -93,7 +93,8 @@ class EncDecCTCModelBPE(EncDecCTCModel, ASRBPEMixin):
         )
 
     def _setup_dataloader_from_config(self, config: Optional[Dict]):
-        if 'augmentor' in config:
+        # With `augment_on_device`, the augmentor is applied to whole batches in `training_step` instead.
+        if 'augmentor' in config and not config.get('augment_on_device', False):
             augmentor = process_augmentations(config['augmentor'])
         else:
             augmentor = None
@@ -126,18 +127,20 @@ class EncDecCTCModelBPE(EncDecCTCModel, ASRBPEMixin):
                 logging.warning(f"Could not load dataset as `manifest_filepath` was None. Provided config : {config}")
                 return None
 
-            dataset = audio_to_text_dataset.get_bpe_dataset(
-                config=config, tokenizer=self.tokenizer, augmentor=augmentor
-            )
+            if config.get('use_feature_store', False):
+                dataset = audio_to_text_dataset.get_feature_bpe_dataset(config=config, tokenizer=self.tokenizer)
+            else:
+                dataset = audio_to_text_dataset.get_bpe_dataset(
+                    config=config, tokenizer=self.tokenizer, augmentor=augmentor
+                )
 
-        return torch.utils.data.DataLoader(
+        return audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config,
             dataset=dataset,
-            batch_size=config['batch_size'],
-            collate_fn=dataset.collate_fn,
-            drop_last=config.get('drop_last', False),
             shuffle=shuffle,
-            num_workers=config.get('num_workers', 0),
-            pin_memory=config.get('pin_memory', False),
+            global_rank=self.global_rank,
+            world_size=self.world_size,
+            trainer=self._trainer,
         )
 
     def _setup_transcribe_dataloader(self, config: Dict) -> 'torch.utils.data.DataLoader':
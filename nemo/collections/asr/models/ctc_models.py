@@ -16,7 +16,7 @@ import json
 import os
 import tempfile
 from math import ceil
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterator, List, Optional, Union
 
 import torch
 from omegaconf import DictConfig, OmegaConf, open_dict
@@ -25,9 +25,11 @@ from pytorch_lightning import Trainer
 from nemo.collections.asr.data import audio_to_text_dataset
 from nemo.collections.asr.data.audio_to_text_dali import DALIOutputs
 from nemo.collections.asr.losses.ctc import CTCLoss
-from nemo.collections.asr.metrics.wer import WER
+from nemo.collections.asr.metrics.wer import WER, ctc_greedy_collapse
 from nemo.collections.asr.models.asr_model import ASRModel, ExportableEncDecModel
 from nemo.collections.asr.parts.perturb import process_augmentations
+from nemo.collections.asr.parts.perturb_batch import process_batch_augmentations
+from nemo.collections.asr.parts.segment import AudioSegment, get_audio_duration
 from nemo.core.classes.common import PretrainedModelInfo, typecheck
 from nemo.core.neural_types import AudioSignal, LabelsType, LengthsType, LogprobsType, NeuralType, SpectrogramType
 from nemo.utils import logging
@@ -129,7 +131,15 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
         )
 
     @torch.no_grad()
-    def transcribe(self, paths2audio_files: List[str], batch_size: int = 4, logprobs=False) -> List[str]:
+    def transcribe(
+        self,
+        paths2audio_files: List[str],
+        batch_size: int = 4,
+        logprobs=False,
+        chunk_len_in_secs: Optional[float] = None,
+        chunk_context_in_secs: float = 2.0,
+        max_batch_duration: Optional[float] = None,
+    ) -> List[str]:
         """
         Uses greedy decoding to transcribe audio files. Use this method for debugging and prototyping.
 
@@ -137,19 +147,39 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
 
             paths2audio_files: (a list) of paths to audio files. \
         Recommended length per file is between 5 and 25 seconds. \
-        But it is possible to pass a few hours long file if enough GPU memory is available.
+        But it is possible to pass a few hours long file if enough GPU memory is available, or with chunk_len_in_secs.
             batch_size: (int) batch size to use during inference. \
         Bigger will result in better throughput performance but would use more memory.
+        Files are batched by decreasing duration, so that little compute is spent on padding.
             logprobs: (bool) pass True to get log probabilities instead of transcripts.
+            chunk_len_in_secs: (float) if set, every file is read and transcribed in chunks of this duration, \
+        so that memory does not grow with the duration of the files. See `transcribe_chunked`.
+            chunk_context_in_secs: (float) duration of the audio added on each side of every chunk.
+            max_batch_duration: (float) if set, batches are limited to this padded duration in seconds \
+        (batch size * longest file) instead of to batch_size files.
 
         Returns:
 
             A list of transcriptions (or raw log probabilities if logprobs is True) in the same order as paths2audio_files
         """
         if paths2audio_files is None or len(paths2audio_files) == 0:
-            return {}
-        # We will store transcriptions here
-        hypotheses = []
+            return []
+
+        if chunk_len_in_secs is not None:
+            hypotheses = []
+            for audio_file in paths2audio_files:
+                chunks = self._chunked_log_probs(audio_file, chunk_len_in_secs, chunk_context_in_secs, batch_size)
+                if logprobs:
+                    hypotheses.append(torch.cat(list(chunks)))
+                else:
+                    transcript = ''
+                    for transcript in self._stream_transcripts(chunks):
+                        pass
+                    hypotheses.append(transcript)
+            return hypotheses
+
+        # We will store transcriptions here, in the order of paths2audio_files
+        hypotheses = [None] * len(paths2audio_files)
         # Model's mode and device
         mode = self.training
         device = next(self.parameters()).device
@@ -172,19 +202,21 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
 
                 config = {'paths2audio_files': paths2audio_files, 'batch_size': batch_size, 'temp_dir': tmpdir}
 
-                temporary_datalayer = self._setup_transcribe_dataloader(config)
-                for test_batch in temporary_datalayer:
+                temporary_datalayer, batches = self._setup_sorted_transcribe_dataloader(config, max_batch_duration)
+                for test_batch, indices in zip(temporary_datalayer, batches):
                     logits, logits_len, greedy_predictions = self.forward(
                         input_signal=test_batch[0].to(device), input_signal_length=test_batch[1].to(device)
                     )
                     if logprobs:
                         # dump log probs per file
                         for idx in range(logits.shape[0]):
-                            hypotheses.append(logits[idx][: logits_len[idx]])
+                            hypotheses[indices[idx]] = logits[idx][: logits_len[idx]]
                     else:
-                        hypotheses += self._wer.ctc_decoder_predictions_tensor(
+                        transcripts = self._wer.ctc_decoder_predictions_tensor(
                             greedy_predictions, predictions_len=logits_len
                         )
+                        for idx, transcript in zip(indices, transcripts):
+                            hypotheses[idx] = transcript
                     del test_batch
         finally:
             # set mode back to its original value
@@ -194,6 +226,126 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
             logging.set_verbosity(logging_level)
         return hypotheses
 
+    def transcribe_chunked(
+        self,
+        path2audio_file: str,
+        chunk_len_in_secs: float = 10.0,
+        chunk_context_in_secs: float = 2.0,
+        batch_size: int = 4,
+    ) -> Iterator[str]:
+        """
+        Transcribes a long audio file with greedy decoding, chunk by chunk, and yields the transcript of the audio
+        decoded so far after every chunk.
+
+        The file is read in overlapping windows of `chunk_len_in_secs` plus `chunk_context_in_secs` on each side,
+        `batch_size` windows at a time, so that memory does not depend on the duration of the file. Only the log
+        probabilities of the frames of the central chunk of every window are kept, and they are stitched before
+        decoding, so that words which span chunk boundaries are decoded with acoustic context on both sides.
+
+        Args:
+            path2audio_file: Path to the audio file.
+            chunk_len_in_secs: Duration of the audio of every chunk.
+            chunk_context_in_secs: Duration of the audio added on each side of every chunk.
+            batch_size: Number of windows processed at once.
+
+        Returns:
+            Generator of the transcript of the audio decoded so far, one per chunk. The last one is the transcript of
+            the whole file.
+        """
+        chunks = self._chunked_log_probs(path2audio_file, chunk_len_in_secs, chunk_context_in_secs, batch_size)
+        return self._stream_transcripts(chunks)
+
+    def _stream_transcripts(self, chunks: Iterator[torch.Tensor]) -> Iterator[str]:
+        blank_id = self._wer.blank_id
+        transcript = ''
+        previous_labels = []
+        last_label = blank_id
+        for log_probs in chunks:
+            # Collapse the predictions of the chunk after the last label of the previous chunk, which is dropped
+            predictions = torch.cat([torch.tensor([last_label]), log_probs.argmax(dim=-1)])
+            chunk_labels, _ = ctc_greedy_collapse(predictions.unsqueeze(0), blank_id)
+            chunk_labels = chunk_labels.tolist()
+            new_labels = chunk_labels[1:] if last_label != blank_id else chunk_labels
+            last_label = int(predictions[-1])
+            if not new_labels:
+                yield transcript
+                continue
+
+            # Only the new labels are decoded. They are decoded after the last decoded label and the text of that
+            # label is then stripped, so that tokenizers which render a token depending on its predecessor (e.g.
+            # word boundaries of subwords) produce the same text as decoding the whole utterance.
+            context = self._wer.decode_ids_to_str(previous_labels)
+            text = self._wer.decode_ids_to_str(previous_labels + new_labels)
+            if text.startswith(context):
+                transcript += text[len(context) :]
+            else:
+                transcript += self._wer.decode_ids_to_str(new_labels)
+            previous_labels = new_labels[-1:]
+            yield transcript
+
+    @torch.no_grad()
+    def _chunked_log_probs(
+        self, path2audio_file: str, chunk_len_in_secs: float, chunk_context_in_secs: float, batch_size: int
+    ) -> Iterator[torch.Tensor]:
+        """Yields the [T, V + 1] log probabilities of the frames of every chunk of the file, on the CPU."""
+        if chunk_len_in_secs <= 0 or chunk_context_in_secs < 0:
+            raise ValueError("`chunk_len_in_secs` must be positive and `chunk_context_in_secs` non-negative.")
+
+        sample_rate = self.preprocessor._sample_rate
+        # Only the header of the file is read, every window is then decoded on its own
+        duration = get_audio_duration(path2audio_file)
+
+        chunk_len = int(chunk_len_in_secs * sample_rate)
+        context = int(chunk_context_in_secs * sample_rate)
+        num_samples = int(duration * sample_rate)
+        chunk_starts = list(range(0, num_samples, chunk_len))
+
+        mode = self.training
+        device = next(self.parameters()).device
+        dither_value = self.preprocessor.featurizer.dither
+        pad_to_value = self.preprocessor.featurizer.pad_to
+        try:
+            self.preprocessor.featurizer.dither = 0.0
+            self.preprocessor.featurizer.pad_to = 0
+            self.eval()
+
+            for batch_start in range(0, len(chunk_starts), batch_size):
+                windows, signals = [], []
+                for chunk_start in chunk_starts[batch_start : batch_start + batch_size]:
+                    chunk_end = min(chunk_start + chunk_len, num_samples)
+                    start, end = max(chunk_start - context, 0), min(chunk_end + context, num_samples)
+                    signal = AudioSegment.from_file(
+                        path2audio_file,
+                        target_sr=sample_rate,
+                        offset=start / sample_rate,
+                        duration=(end - start) / sample_rate,
+                    ).samples
+                    windows.append((chunk_start - start, chunk_end - start))
+                    signals.append(torch.as_tensor(signal, dtype=torch.float32))
+
+                lengths = torch.tensor([len(signal) for signal in signals], dtype=torch.long)
+                batch = torch.zeros(len(signals), int(lengths.max()))
+                for row, signal in zip(batch, signals):
+                    row[: len(signal)] = signal
+
+                log_probs, encoded_len, _ = self.forward(
+                    input_signal=batch.to(device), input_signal_length=lengths.to(device)
+                )
+                log_probs, encoded_len = log_probs.cpu(), encoded_len.cpu()
+
+                for window_log_probs, num_frames, num_window_samples, (keep_start, keep_end) in zip(
+                    log_probs, encoded_len.tolist(), lengths.tolist(), windows
+                ):
+                    # Keep the frames whose center lies in the chunk, so that consecutive chunks neither skip nor
+                    # repeat frames
+                    centers = (torch.arange(num_frames, dtype=torch.float64) + 0.5) * num_window_samples / num_frames
+                    keep = (centers >= keep_start) & (centers < keep_end)
+                    yield window_log_probs[:num_frames][keep]
+        finally:
+            self.train(mode=mode)
+            self.preprocessor.featurizer.dither = dither_value
+            self.preprocessor.featurizer.pad_to = pad_to_value
+
     def change_vocabulary(self, new_vocabulary: List[str]):
         """
         Changes vocabulary used during CTC decoding process. Use this method when fine-tuning on from pre-trained model.
@@ -246,7 +398,8 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
             logging.info(f"Changed decoder to output to {self.decoder.vocabulary} vocabulary.")
 
     def _setup_dataloader_from_config(self, config: Optional[Dict]):
-        if 'augmentor' in config:
+        # With `augment_on_device`, the augmentor is applied to whole batches in `training_step` instead.
+        if 'augmentor' in config and not config.get('augment_on_device', False):
             augmentor = process_augmentations(config['augmentor'])
         else:
             augmentor = None
@@ -290,16 +443,18 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
                 logging.warning(f"Could not load dataset as `manifest_filepath` was None. Provided config : {config}")
                 return None
 
-            dataset = audio_to_text_dataset.get_char_dataset(config=config, augmentor=augmentor)
+            if config.get('use_feature_store', False):
+                dataset = audio_to_text_dataset.get_feature_char_dataset(config=config)
+            else:
+                dataset = audio_to_text_dataset.get_char_dataset(config=config, augmentor=augmentor)
 
-        return torch.utils.data.DataLoader(
+        return audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config,
             dataset=dataset,
-            batch_size=config['batch_size'],
-            collate_fn=dataset.collate_fn,
-            drop_last=config.get('drop_last', False),
             shuffle=shuffle,
-            num_workers=config.get('num_workers', 0),
-            pin_memory=config.get('pin_memory', False),
+            global_rank=self.global_rank,
+            world_size=self.world_size,
+            trainer=self._trainer,
         )
 
     def setup_training_data(self, train_data_config: Optional[Union[DictConfig, Dict]]):
@@ -311,6 +466,13 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
 
         self._train_dl = self._setup_dataloader_from_config(config=train_data_config)
 
+        if 'augmentor' in train_data_config and train_data_config.get('augment_on_device', False):
+            self._batch_augmentor = process_batch_augmentations(
+                train_data_config['augmentor'], sample_rate=train_data_config['sample_rate']
+            )
+        else:
+            self._batch_augmentor = None
+
         # Need to set this because if using an IterableDataset, the length of the dataloader is the total number
         # of samples rather than the number of batches, and this messes up the tqdm progress bar.
         # So we set the number of steps manually (to the correct number) to fix this.
@@ -319,10 +481,11 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
             # If it's an int, we assume that the user has set it to something sane, i.e. <= # training batches,
             # and don't change it. Otherwise, adjust batches accordingly if it's a float (including 1.0).
             if isinstance(self._trainer.limit_train_batches, float):
-                self._trainer.limit_train_batches = int(
-                    self._trainer.limit_train_batches
-                    * ceil((len(self._train_dl.dataset) / self.world_size) / train_data_config['batch_size'])
-                )
+                num_batches = len(self._train_dl.dataset) / self.world_size
+                # Datasets which yield batches themselves (e.g. with `max_batch_duration`) already count batches
+                if self._train_dl.batch_size is not None:
+                    num_batches /= train_data_config['batch_size']
+                self._trainer.limit_train_batches = int(self._trainer.limit_train_batches * ceil(num_batches))
 
     def setup_validation_data(self, val_data_config: Optional[Union[DictConfig, Dict]]):
         if 'shuffle' not in val_data_config:
@@ -381,7 +544,7 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
             )
 
         if self.spec_augmentation is not None and self.training:
-            processed_signal = self.spec_augmentation(input_spec=processed_signal)
+            processed_signal = self.spec_augmentation(input_spec=processed_signal, length=processed_signal_length)
 
         encoded, encoded_len = self.encoder(audio_signal=processed_signal, length=processed_signal_length)
         log_probs = self.decoder(encoder_output=encoded)
@@ -392,7 +555,10 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
     # PTL-specific methods
     def training_step(self, batch, batch_nb):
         signal, signal_len, transcript, transcript_len = batch
-        if isinstance(batch, DALIOutputs) and batch.has_processed_signal:
+        if getattr(self, '_batch_augmentor', None) is not None and signal.dim() == 2:
+            signal, signal_len = self._batch_augmentor(signal, signal_len)
+        # DALI and feature store batches hold [B, D, T] features, which skip the preprocessor.
+        if (isinstance(batch, DALIOutputs) and batch.has_processed_signal) or signal.dim() == 3:
             log_probs, encoded_len, predictions = self.forward(
                 processed_signal=signal, processed_signal_length=signal_len
             )
@@ -424,7 +590,8 @@ class EncDecCTCModel(ASRModel, ExportableEncDecModel):
 
     def validation_step(self, batch, batch_idx, dataloader_idx=0):
         signal, signal_len, transcript, transcript_len = batch
-        if isinstance(batch, DALIOutputs) and batch.has_processed_signal:
+        # DALI and feature store batches hold [B, D, T] features, which skip the preprocessor.
+        if (isinstance(batch, DALIOutputs) and batch.has_processed_signal) or signal.dim() == 3:
             log_probs, encoded_len, predictions = self.forward(
                 processed_signal=signal, processed_signal_length=signal_len
             )
@@ -29,13 +29,6 @@ from nemo.collections.asr.parts.perturb import process_augmentations
 from nemo.core.classes.common import PretrainedModelInfo
 from nemo.utils import logging, model_utils
 
-try:
-    import warprnnt_pytorch as warprnnt
-
-    WARP_RNNT_AVAILABLE = True
-except (ImportError, ModuleNotFoundError):
-    WARP_RNNT_AVAILABLE = False
-
 
 class EncDecRNNTBPEModel(EncDecRNNTModel, ASRBPEMixin):
     """Base class for encoder decoder RNNT-based models with subword tokenization."""
@@ -52,16 +45,6 @@ class EncDecRNNTBPEModel(EncDecRNNTModel, ASRBPEMixin):
         return result
 
     def __init__(self, cfg: DictConfig, trainer: Trainer = None):
-        # Required loss function
-        if not WARP_RNNT_AVAILABLE:
-            raise ImportError(
-                "Could not import `warprnnt_pytorch`.\n"
-                "Please visit https://github.com/HawkAaron/warp-transducer "
-                "and follow the steps in the readme to build and install the "
-                "pytorch bindings for RNNT Loss, or use the provided docker "
-                "container that supports RNN-T loss."
-            )
-
         # Convert to Hydra 1.0 compatible DictConfig
         cfg = model_utils.convert_model_config_to_dict_config(cfg)
         cfg = model_utils.maybe_update_config_version(cfg)
@@ -161,7 +144,9 @@ class EncDecRNNTBPEModel(EncDecRNNTModel, ASRBPEMixin):
         self.decoder = EncDecRNNTBPEModel.from_config_dict(new_decoder_config)
 
         del self.loss
-        self.loss = RNNTLoss(num_classes=self.joint.num_classes_with_blank - 1)
+        self.loss = RNNTLoss(
+            num_classes=self.joint.num_classes_with_blank - 1, backend=self.cfg.get('loss_backend', 'auto')
+        )
 
         if decoding_cfg is None:
             # Assume same decoding config as before
@@ -233,7 +218,8 @@ class EncDecRNNTBPEModel(EncDecRNNTModel, ASRBPEMixin):
         logging.info(f"Changed decoding strategy to \n{OmegaConf.to_yaml(self.cfg.decoding)}")
 
     def _setup_dataloader_from_config(self, config: Optional[Dict]):
-        if 'augmentor' in config:
+        # With `augment_on_device`, the augmentor is applied to whole batches in `training_step` instead.
+        if 'augmentor' in config and not config.get('augment_on_device', False):
             augmentor = process_augmentations(config['augmentor'])
         else:
             augmentor = None
@@ -266,18 +252,20 @@ class EncDecRNNTBPEModel(EncDecRNNTModel, ASRBPEMixin):
                 logging.warning(f"Could not load dataset as `manifest_filepath` was None. Provided config : {config}")
                 return None
 
-            dataset = audio_to_text_dataset.get_bpe_dataset(
-                config=config, tokenizer=self.tokenizer, augmentor=augmentor
-            )
+            if config.get('use_feature_store', False):
+                dataset = audio_to_text_dataset.get_feature_bpe_dataset(config=config, tokenizer=self.tokenizer)
+            else:
+                dataset = audio_to_text_dataset.get_bpe_dataset(
+                    config=config, tokenizer=self.tokenizer, augmentor=augmentor
+                )
 
-        return torch.utils.data.DataLoader(
+        return audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config,
             dataset=dataset,
-            batch_size=config['batch_size'],
-            collate_fn=dataset.collate_fn,
-            drop_last=config.get('drop_last', False),
             shuffle=shuffle,
-            num_workers=config.get('num_workers', 0),
-            pin_memory=config.get('pin_memory', False),
+            global_rank=self.global_rank,
+            world_size=self.world_size,
+            trainer=self._trainer,
         )
 
     def _setup_transcribe_dataloader(self, config: Dict) -> 'torch.utils.data.DataLoader':
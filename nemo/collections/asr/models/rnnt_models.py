@@ -17,7 +17,7 @@ import json
 import os
 import tempfile
 from math import ceil
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
 from omegaconf import DictConfig, OmegaConf, open_dict
@@ -29,17 +29,11 @@ from nemo.collections.asr.losses.rnnt import RNNTLoss
 from nemo.collections.asr.metrics.rnnt_wer import RNNTWER, RNNTDecoding
 from nemo.collections.asr.models.asr_model import ASRModel
 from nemo.collections.asr.parts.perturb import process_augmentations
+from nemo.collections.asr.parts.perturb_batch import process_batch_augmentations
 from nemo.core.classes.common import PretrainedModelInfo, typecheck
 from nemo.core.neural_types import AcousticEncodedRepresentation, AudioSignal, LengthsType, NeuralType, SpectrogramType
 from nemo.utils import logging
 
-try:
-    import warprnnt_pytorch as warprnnt
-
-    WARP_RNNT_AVAILABLE = True
-except (ImportError, ModuleNotFoundError):
-    WARP_RNNT_AVAILABLE = False
-
 
 class EncDecRNNTModel(ASRModel):
     """Base class for encoder decoder RNNT-based models."""
@@ -56,16 +50,6 @@ class EncDecRNNTModel(ASRModel):
         return result
 
     def __init__(self, cfg: DictConfig, trainer: Trainer = None):
-        # Required loss function
-        if not WARP_RNNT_AVAILABLE:
-            raise ImportError(
-                "Could not import `warprnnt_pytorch`.\n"
-                "Please visit https://github.com/HawkAaron/warp-transducer "
-                "and follow the steps in the readme to build and install the "
-                "pytorch bindings for RNNT Loss, or use the provided docker "
-                "container that supports RNN-T loss."
-            )
-
         # Get global rank and total number of GPU workers for IterableDataset partitioning, if applicable
         self.global_rank = 0
         self.world_size = 1
@@ -93,7 +77,9 @@ class EncDecRNNTModel(ASRModel):
 
         self.decoder = EncDecRNNTModel.from_config_dict(self.cfg.decoder)
         self.joint = EncDecRNNTModel.from_config_dict(self.cfg.joint)
-        self.loss = RNNTLoss(num_classes=self.joint.num_classes_with_blank - 1)
+        self.loss = RNNTLoss(
+            num_classes=self.joint.num_classes_with_blank - 1, backend=self.cfg.get('loss_backend', 'auto')
+        )
 
         if hasattr(self.cfg, 'spec_augment') and self._cfg.spec_augment is not None:
             self.spec_augmentation = EncDecRNNTModel.from_config_dict(self.cfg.spec_augment)
@@ -134,8 +120,12 @@ class EncDecRNNTModel(ASRModel):
 
     @torch.no_grad()
     def transcribe(
-        self, paths2audio_files: List[str], batch_size: int = 4, return_hypotheses: bool = False
-    ) -> List[str]:
+        self,
+        paths2audio_files: List[str],
+        batch_size: int = 4,
+        return_hypotheses: bool = False,
+        max_batch_duration: Optional[float] = None,
+    ) -> Tuple[List[str], Optional[List[List[str]]]]:
         """
         Uses greedy decoding to transcribe audio files. Use this method for debugging and prototyping.
 
@@ -146,16 +136,25 @@ class EncDecRNNTModel(ASRModel):
         But it is possible to pass a few hours long file if enough GPU memory is available.
             batch_size: (int) batch size to use during inference. \
         Bigger will result in better throughput performance but would use more memory.
+        Files are batched by decreasing duration, so that little compute is spent on padding.
             return_hypotheses: (bool) Either return hypotheses or text
         With hypotheses can do some postprocessing like getting timestamp or rescoring
+            max_batch_duration: (float) if set, batches are limited to this padded duration in seconds \
+        (batch size * longest file) instead of to batch_size files.
         Returns:
 
-            A list of transcriptions in the same order as paths2audio_files
+            A tuple of the list of transcriptions in the same order as paths2audio_files, and of the list of \
+        all beam search hypotheses of every file if the decoding returns them, otherwise None
+
+        .. note::
+            Earlier versions returned the (best, all) tuples of every batch concatenated into one list, see \
+        CHANGELOG.md.
         """
         if paths2audio_files is None or len(paths2audio_files) == 0:
-            return {}
-        # We will store transcriptions here
-        hypotheses = []
+            return [], None
+        # We will store transcriptions here, in the order of paths2audio_files
+        hypotheses = [None] * len(paths2audio_files)
+        all_hypotheses = None
         # Model's mode and device
         mode = self.training
         device = next(self.parameters()).device
@@ -173,20 +172,27 @@ class EncDecRNNTModel(ASRModel):
 
                 config = {'paths2audio_files': paths2audio_files, 'batch_size': batch_size, 'temp_dir': tmpdir}
 
-                temporary_datalayer = self._setup_transcribe_dataloader(config)
-                for test_batch in temporary_datalayer:
+                temporary_datalayer, batches = self._setup_sorted_transcribe_dataloader(config, max_batch_duration)
+                for test_batch, indices in zip(temporary_datalayer, batches):
                     encoded, encoded_len = self.forward(
                         input_signal=test_batch[0].to(device), input_signal_length=test_batch[1].to(device)
                     )
-                    hypotheses += self.decoding.rnnt_decoder_predictions_tensor(
+                    best_hyp, all_hyp = self.decoding.rnnt_decoder_predictions_tensor(
                         encoded, encoded_len, return_hypotheses=return_hypotheses
                     )
+                    for batch_idx, idx in enumerate(indices):
+                        hypotheses[idx] = best_hyp[batch_idx]
+                    if all_hyp is not None:
+                        if all_hypotheses is None:
+                            all_hypotheses = [None] * len(paths2audio_files)
+                        for batch_idx, idx in enumerate(indices):
+                            all_hypotheses[idx] = all_hyp[batch_idx]
                     del test_batch
         finally:
             # set mode back to its original value
             self.train(mode=mode)
             logging.set_verbosity(logging_level)
-        return hypotheses
+        return hypotheses, all_hypotheses
 
     def change_vocabulary(self, new_vocabulary: List[str], decoding_cfg: Optional[DictConfig] = None):
         """
@@ -224,7 +230,9 @@ class EncDecRNNTModel(ASRModel):
             self.decoder = EncDecRNNTModel.from_config_dict(new_decoder_config)
 
             del self.loss
-            self.loss = RNNTLoss(num_classes=self.joint.num_classes_with_blank - 1)
+            self.loss = RNNTLoss(
+                num_classes=self.joint.num_classes_with_blank - 1, backend=self.cfg.get('loss_backend', 'auto')
+            )
 
             if decoding_cfg is None:
                 # Assume same decoding config as before
@@ -296,7 +304,8 @@ class EncDecRNNTModel(ASRModel):
         logging.info(f"Changed decoding strategy to \n{OmegaConf.to_yaml(self.cfg.decoding)}")
 
     def _setup_dataloader_from_config(self, config: Optional[Dict]):
-        if 'augmentor' in config:
+        # With `augment_on_device`, the augmentor is applied to whole batches in `training_step` instead.
+        if 'augmentor' in config and not config.get('augment_on_device', False):
             augmentor = process_augmentations(config['augmentor'])
         else:
             augmentor = None
@@ -340,16 +349,18 @@ class EncDecRNNTModel(ASRModel):
                 logging.warning(f"Could not load dataset as `manifest_filepath` was None. Provided config : {config}")
                 return None
 
-            dataset = audio_to_text_dataset.get_char_dataset(config=config, augmentor=augmentor)
+            if config.get('use_feature_store', False):
+                dataset = audio_to_text_dataset.get_feature_char_dataset(config=config)
+            else:
+                dataset = audio_to_text_dataset.get_char_dataset(config=config, augmentor=augmentor)
 
-        return torch.utils.data.DataLoader(
+        return audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config,
             dataset=dataset,
-            batch_size=config['batch_size'],
-            collate_fn=dataset.collate_fn,
-            drop_last=config.get('drop_last', False),
             shuffle=shuffle,
-            num_workers=config.get('num_workers', 0),
-            pin_memory=config.get('pin_memory', False),
+            global_rank=self.global_rank,
+            world_size=self.world_size,
+            trainer=self._trainer,
         )
 
     def setup_training_data(self, train_data_config: Optional[Union[DictConfig, Dict]]):
@@ -361,6 +372,13 @@ class EncDecRNNTModel(ASRModel):
 
         self._train_dl = self._setup_dataloader_from_config(config=train_data_config)
 
+        if 'augmentor' in train_data_config and train_data_config.get('augment_on_device', False):
+            self._batch_augmentor = process_batch_augmentations(
+                train_data_config['augmentor'], sample_rate=train_data_config['sample_rate']
+            )
+        else:
+            self._batch_augmentor = None
+
         # Need to set this because if using an IterableDataset, the length of the dataloader is the total number
         # of samples rather than the number of batches, and this messes up the tqdm progress bar.
         # So we set the number of steps manually (to the correct number) to fix this.
@@ -369,10 +387,11 @@ class EncDecRNNTModel(ASRModel):
             # If it's an int, we assume that the user has set it to something sane, i.e. <= # training batches,
             # and don't change it. Otherwise, adjust batches accordingly if it's a float (including 1.0).
             if isinstance(self._trainer.limit_train_batches, float):
-                self._trainer.limit_train_batches = int(
-                    self._trainer.limit_train_batches
-                    * ceil((len(self._train_dl.dataset) / self.world_size) / train_data_config['batch_size'])
-                )
+                num_batches = len(self._train_dl.dataset) / self.world_size
+                # Datasets which yield batches themselves (e.g. with `max_batch_duration`) already count batches
+                if self._train_dl.batch_size is not None:
+                    num_batches /= train_data_config['batch_size']
+                self._trainer.limit_train_batches = int(self._trainer.limit_train_batches * ceil(num_batches))
 
     def setup_validation_data(self, val_data_config: Optional[Union[DictConfig, Dict]]):
         if 'shuffle' not in val_data_config:
@@ -432,7 +451,7 @@ class EncDecRNNTModel(ASRModel):
 
         # Spec augment is not applied during evaluation/testing
         if self.spec_augmentation is not None and self.training:
-            processed_signal = self.spec_augmentation(input_spec=processed_signal)
+            processed_signal = self.spec_augmentation(input_spec=processed_signal, length=processed_signal_length)
 
         encoded, encoded_len = self.encoder(audio_signal=processed_signal, length=processed_signal_length)
         return encoded, encoded_len
@@ -440,9 +459,12 @@ class EncDecRNNTModel(ASRModel):
     # PTL-specific methods
     def training_step(self, batch, batch_nb):
         signal, signal_len, transcript, transcript_len = batch
+        if getattr(self, '_batch_augmentor', None) is not None and signal.dim() == 2:
+            signal, signal_len = self._batch_augmentor(signal, signal_len)
 
         # forward() only performs encoder forward
-        if isinstance(batch, DALIOutputs) and batch.has_processed_signal:
+        # DALI and feature store batches hold [B, D, T] features, which skip the preprocessor.
+        if (isinstance(batch, DALIOutputs) and batch.has_processed_signal) or signal.dim() == 3:
             encoded, encoded_len = self.forward(processed_signal=signal, processed_signal_length=signal_len)
         else:
             encoded, encoded_len = self.forward(input_signal=signal, input_signal_length=signal_len)
@@ -505,7 +527,8 @@ class EncDecRNNTModel(ASRModel):
         signal, signal_len, transcript, transcript_len = batch
 
         # forward() only performs encoder forward
-        if isinstance(batch, DALIOutputs) and batch.has_processed_signal:
+        # DALI and feature store batches hold [B, D, T] features, which skip the preprocessor.
+        if (isinstance(batch, DALIOutputs) and batch.has_processed_signal) or signal.dim() == 3:
             encoded, encoded_len = self.forward(processed_signal=signal, processed_signal_length=signal_len)
         else:
             encoded, encoded_len = self.forward(input_signal=signal, input_signal_length=signal_len)
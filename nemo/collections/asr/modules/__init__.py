@@ -18,7 +18,7 @@ from nemo.collections.asr.modules.audio_preprocessing import (
     CropOrPadSpectrogramAugmentation,
     SpectrogramAugmentation,
 )
-from nemo.collections.asr.modules.beam_search_decoder import BeamSearchDecoderWithLM
+from nemo.collections.asr.modules.beam_search_decoder import BeamSearchDecoderWithLM, CTCPrefixBeamSearchDecoder
 from nemo.collections.asr.modules.conformer_encoder import ConformerEncoder
 from nemo.collections.asr.modules.conv_asr import (
     ConvASRDecoder,
@@ -419,6 +419,17 @@ class SpectrogramAugmentation(NeuralModule):
         rect_time (int): maximum size of cut rectangles along the time
             dimension
             Defaults to 25.
+        use_vectorized_code (bool): draws all the masks of a batch at once
+            and applies them with a single masked fill, instead of looping
+            over every sample and mask in Python. Masks are drawn from the
+            same distribution, but never land in the padding of the samples
+            when `length` is passed.
+            Defaults to False.
+        fix_rect_axes (bool): bounds the size of cut rectangles by
+            `rect_freq` along the frequency dimension and by `rect_time`
+            along the time dimension. By default the two sizes are swapped,
+            as in earlier versions.
+            Defaults to False.
     """
 
     def save_to(self, save_path: str):
@@ -432,7 +443,10 @@ class SpectrogramAugmentation(NeuralModule):
     def input_types(self):
         """Returns definitions of module input types
         """
-        return {"input_spec": NeuralType(('B', 'D', 'T'), SpectrogramType())}
+        return {
+            "input_spec": NeuralType(('B', 'D', 'T'), SpectrogramType()),
+            "length": NeuralType(tuple('B'), LengthsType(), optional=True),
+        }
 
     @property
     def output_types(self):
@@ -451,14 +465,23 @@ class SpectrogramAugmentation(NeuralModule):
         rect_freq=20,
         rng=None,
         mask_value=0.0,
+        use_vectorized_code: bool = False,
+        fix_rect_axes: bool = False,
     ):
         super().__init__()
 
         if rect_masks > 0:
-            self.spec_cutout = SpecCutout(rect_masks=rect_masks, rect_time=rect_time, rect_freq=rect_freq, rng=rng,)
+            self.spec_cutout = SpecCutout(
+                rect_masks=rect_masks,
+                rect_time=rect_time,
+                rect_freq=rect_freq,
+                rng=rng,
+                use_vectorized_code=use_vectorized_code,
+                fix_rect_axes=fix_rect_axes,
+            )
             # self.spec_cutout.to(self._device)
         else:
-            self.spec_cutout = lambda x: x
+            self.spec_cutout = lambda x, length=None: x
 
         if freq_masks + time_masks > 0:
             self.spec_augment = SpecAugment(
@@ -468,14 +491,15 @@ class SpectrogramAugmentation(NeuralModule):
                 time_width=time_width,
                 rng=rng,
                 mask_value=mask_value,
+                use_vectorized_code=use_vectorized_code,
             )
         else:
-            self.spec_augment = lambda x: x
+            self.spec_augment = lambda x, length=None: x
 
     @typecheck()
-    def forward(self, input_spec):
-        augmented_spec = self.spec_cutout(input_spec)
-        augmented_spec = self.spec_augment(augmented_spec)
+    def forward(self, input_spec, length=None):
+        augmented_spec = self.spec_cutout(input_spec, length=length)
+        augmented_spec = self.spec_augment(augmented_spec, length=length)
         return augmented_spec
 
 
@@ -610,6 +634,8 @@ class SpectrogramAugmentationConfig:
     rect_freq: int = 0
     mask_value: float = 0
     rng: Optional[Any] = None  # random.Random() type
+    use_vectorized_code: bool = False
+    fix_rect_axes: bool = False
 
 
 @dataclass
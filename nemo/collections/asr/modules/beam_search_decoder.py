@@ -14,6 +14,7 @@
 
 import torch
 
+from nemo.collections.asr.parts.ctc_beam_decoding import CTCPrefixBeamSearch
 from nemo.core.classes import NeuralModule, typecheck
 from nemo.core.neural_types import LengthsType, LogprobsType, NeuralType, PredictionsType
 
@@ -66,7 +67,8 @@ class BeamSearchDecoderWithLM(NeuralModule):
             raise ModuleNotFoundError(
                 "BeamSearchDecoderWithLM requires the "
                 "installation of ctc_decoders "
-                "from scripts/install_ctc_decoders.sh"
+                "from scripts/install_ctc_decoders.sh. "
+                "CTCPrefixBeamSearchDecoder works without it."
             )
 
         super().__init__()
@@ -102,3 +104,83 @@ class BeamSearchDecoderWithLM(NeuralModule):
             cutoff_top_n=self.cutoff_top_n,
         )
         return res
+
+
+class CTCPrefixBeamSearchDecoder(NeuralModule):
+    """Neural Module that does CTC prefix beam search with an optional N-gram language model and hotwords, without
+    external dependencies. It has the interface of `BeamSearchDecoderWithLM`: it takes a batch of log
+    probabilities and outputs a list of size batch_size. Each element in the list is a list of size beam_width, and
+    each element in that list is a tuple of (final_log_prob, hyp_string).
+    See `nemo.collections.asr.parts.ctc_beam_decoding.CTCPrefixBeamSearch` for the search itself.
+
+    Args:
+        vocab (list): List of characters that can be output by the ASR model. For English, this is the 28 character set
+            {a-z '}. The CTC blank symbol is automatically added.
+        beam_width (int): Size of beams to keep and expand upon. Larger beams result in more accurate but slower
+            predictions
+        alpha (float): The amount of importance to place on the N-gram language model. Larger alpha means more
+            importance on the LM and less importance on the acoustic model.
+        beta (float): A bonus given to every word of the sequences when a language model is used.
+        lm_path (str): Optional path to an ARPA file of a word level N-gram language model
+        num_cpus (int): Number of processes decoding the utterances of a batch in parallel
+        cutoff_prob (float): Cutoff probability in vocabulary pruning, default 1.0, no pruning
+        cutoff_top_n (int): Cutoff number in pruning, only top cutoff_top_n characters with highest probs in
+            vocabulary will be used in beam search, default 40.
+        input_tensor (bool): Set to True if you intend to pass PyTorch Tensors, set to False if you intend to pass
+            NumPy arrays.
+        hotwords (list): Optional list of words whose hypotheses are boosted.
+        hotword_weight (float): Log score added for every hotword of a hypothesis.
+    """
+
+    @property
+    def input_types(self):
+        """Returns definitions of module input ports.
+        """
+        return {
+            "log_probs": NeuralType(('B', 'T', 'D'), LogprobsType()),
+            "log_probs_length": NeuralType(tuple('B'), LengthsType()),
+        }
+
+    @property
+    def output_types(self):
+        """Returns definitions of module output ports.
+        """
+        return {"predictions": [NeuralType(elements_type=PredictionsType())]}
+
+    def __init__(
+        self,
+        vocab,
+        beam_width,
+        alpha=0.5,
+        beta=1.0,
+        lm_path=None,
+        num_cpus=1,
+        cutoff_prob=1.0,
+        cutoff_top_n=40,
+        input_tensor=False,
+        hotwords=None,
+        hotword_weight=5.0,
+    ):
+        super().__init__()
+
+        self.search = CTCPrefixBeamSearch(
+            vocab=vocab,
+            beam_width=beam_width,
+            alpha=alpha,
+            beta=beta,
+            lm_path=lm_path,
+            cutoff_prob=cutoff_prob,
+            cutoff_top_n=cutoff_top_n,
+            hotwords=hotwords,
+            hotword_weight=hotword_weight,
+            num_processes=num_cpus,
+        )
+        self.input_tensor = input_tensor
+
+    @typecheck(ignore_collections=True)
+    @torch.no_grad()
+    def forward(self, log_probs, log_probs_length):
+        if self.input_tensor:
+            log_probs = log_probs.float().cpu().numpy()
+            log_probs_length = log_probs_length.cpu().tolist()
+        return self.search.decode_batch(log_probs, log_probs_length)
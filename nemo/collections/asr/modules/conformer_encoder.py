@@ -14,6 +14,8 @@
 
 import math
 from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List
 
 import torch
 import torch.nn as nn
@@ -26,7 +28,28 @@ from nemo.core.classes.exportable import Exportable
 from nemo.core.classes.module import NeuralModule
 from nemo.core.neural_types import AcousticEncodedRepresentation, LengthsType, NeuralType, SpectrogramType
 
-__all__ = ['ConformerEncoder']
+__all__ = ['ConformerEncoder', 'ConformerStreamingState']
+
+
+@dataclass
+class ConformerStreamingState:
+    """Caches of a batch of streams processed chunk by chunk by `ConformerEncoder.stream_step`.
+
+    att_cache: (n_layers, 2, batch, n_heads, left context, d_model // n_heads) keys and values of the last frames
+        attended to by every layer.
+
+    conv_cache: (n_layers, batch, d_model, conv_kernel_size - 1) inputs of the causal depthwise convolution of every
+        layer at the last frames.
+
+    pre_encode_cache: List of the last input frames of every causal striding convolution of the subsampling.
+
+    num_frames: Number of encoded frames of the streams processed so far.
+    """
+
+    att_cache: torch.Tensor
+    conv_cache: torch.Tensor
+    pre_encode_cache: List[torch.Tensor]
+    num_frames: int = 0
 
 
 class ConformerEncoder(NeuralModule, Exportable):
@@ -70,6 +93,21 @@ class ConformerEncoder(NeuralModule, Exportable):
             Defaults to 0.1.
         dropout_att (float): the dropout rate used for the attention layer
             Defaults to 0.0.
+        att_context_size (list): the [left, right] context of the self-attention, in subsampled frames.
+            With a non-negative right context, frames are grouped in chunks of right + 1 frames and every frame
+            attends to all the frames of its chunk and to the left frames before its chunk. -1 stands for an
+            unlimited context. Defaults to [-1, -1], the full utterance.
+        causal_downsampling (bool): whether the striding subsampling only looks at the current and past frames
+            Defaults to False.
+        causal_convolutions (bool): whether the depthwise convolutions only look at the current and past frames
+            Defaults to False.
+
+    Models trained with a limited left and right context, causal downsampling (or no subsampling), causal
+    convolutions and relative positional encodings can transcribe streams with `stream_step`, chunk by chunk, with
+    the same outputs as on the whole utterance. The keys and values of the last left context frames of every layer
+    and the inputs of the last frames of every convolution are cached between chunks, so that the computation and
+    memory per chunk do not depend on the duration of the stream. The encoded chunks can be decoded by CTC and RNNT
+    decoders alike.
     """
 
     def _prepare_for_export(self):
@@ -125,13 +163,26 @@ class ConformerEncoder(NeuralModule, Exportable):
         dropout=0.1,
         dropout_emb=0.1,
         dropout_att=0.0,
+        att_context_size=None,
+        causal_downsampling=False,
+        causal_convolutions=False,
     ):
         super().__init__()
 
         d_ff = d_model * ff_expansion_factor
         self.d_model = d_model
+        self.n_heads = n_heads
+        self.conv_kernel_size = conv_kernel_size
         self.scale = math.sqrt(self.d_model)
 
+        if att_context_size is None:
+            att_context_size = [-1, -1]
+        if len(att_context_size) != 2 or min(att_context_size) < -1:
+            raise ValueError(f"Not valid att_context_size: {att_context_size}!")
+        self.att_context_size = list(att_context_size)
+        self.causal_convolutions = causal_convolutions
+        self.self_attention_model = self_attention_model
+
         if xscaling:
             self.xscale = math.sqrt(d_model)
         else:
@@ -147,11 +198,14 @@ class ConformerEncoder(NeuralModule, Exportable):
                 feat_out=d_model,
                 conv_channels=subsampling_conv_channels,
                 activation=nn.ReLU(),
+                is_causal=causal_downsampling,
             )
+            self.subsampling_factor = subsampling_factor
             self._feat_out = d_model
         else:
             self._feat_out = d_model
             self.pre_encode = nn.Linear(feat_in, d_model)
+            self.subsampling_factor = 1
 
         if not untie_biases and self_attention_model == "rel_pos":
             d_head = d_model // n_heads
@@ -192,6 +246,7 @@ class ConformerEncoder(NeuralModule, Exportable):
                 dropout_att=dropout_att,
                 pos_bias_u=pos_bias_u,
                 pos_bias_v=pos_bias_v,
+                causal_conv=causal_convolutions,
             )
             self.layers.append(layer)
 
@@ -209,7 +264,7 @@ class ConformerEncoder(NeuralModule, Exportable):
         if isinstance(self.pre_encode, ConvSubsampling):
             audio_signal, length = self.pre_encode(audio_signal, length)
         else:
-            audio_signal = self.embed(audio_signal)
+            audio_signal = self.pre_encode(audio_signal)
 
         audio_signal, pos_emb = self.pos_enc(audio_signal)
         bs, xmax, idim = audio_signal.size()
@@ -217,7 +272,10 @@ class ConformerEncoder(NeuralModule, Exportable):
         # Create the self-attention and padding masks
         pad_mask = self.make_pad_mask(length, max_time=xmax, device=audio_signal.device)
         xx_mask = pad_mask.unsqueeze(1).repeat([1, xmax, 1])
-        xx_mask = ~(xx_mask & xx_mask.transpose(1, 2))
+        xx_mask = xx_mask & xx_mask.transpose(1, 2)
+        if self.att_context_size != [-1, -1]:
+            xx_mask = xx_mask & self.make_att_context_mask(xmax, device=audio_signal.device).unsqueeze(0)
+        xx_mask = ~xx_mask
         pad_mask = ~pad_mask
 
         for lth, layer in enumerate(self.layers):
@@ -229,6 +287,122 @@ class ConformerEncoder(NeuralModule, Exportable):
         audio_signal = torch.transpose(audio_signal, 1, 2)
         return audio_signal, length
 
+    def make_att_context_mask(self, max_time, device=None):
+        """Returns the (max_time, max_time) mask of the keys each query may attend to with `att_context_size`."""
+        left, right = self.att_context_size
+        positions = torch.arange(max_time, device=device)
+        if right >= 0:
+            # Every frame sees its whole chunk, the left context is counted from the start of the chunk
+            chunk_size = right + 1
+            starts = positions - positions % chunk_size
+            mask = positions.unsqueeze(0) < (starts + chunk_size).unsqueeze(1)
+        else:
+            starts = positions
+            mask = torch.ones(max_time, max_time, dtype=torch.bool, device=device)
+        if left >= 0:
+            mask = mask & (positions.unsqueeze(0) >= (starts - left).unsqueeze(1))
+        return mask
+
+    @property
+    def streaming_chunk_size(self):
+        """Number of input frames of the chunks of `stream_step`."""
+        return (self.att_context_size[1] + 1) * self.subsampling_factor
+
+    def get_initial_cache_state(self, batch_size=1, dtype=torch.float32, device=None):
+        """Returns the state of `stream_step` at the start of `batch_size` streams.
+
+        Raises:
+            ValueError: If the encoder cannot process streams chunk by chunk, see the class docstring.
+        """
+        left, right = self.att_context_size
+        if left < 0 or right < 0:
+            raise ValueError("Streaming requires a limited left and right att_context_size.")
+        if self.self_attention_model != 'rel_pos':
+            raise ValueError("Streaming requires relative positional encodings (rel_pos).")
+        if not self.causal_convolutions:
+            raise ValueError("Streaming requires causal convolutions.")
+        if isinstance(self.pre_encode, ConvSubsampling):
+            pre_encode_cache = self.pre_encode.get_initial_cache_state(batch_size, dtype=dtype, device=device)
+        else:
+            pre_encode_cache = []
+
+        n_layers = len(self.layers)
+        d_head = self.d_model // self.n_heads
+        return ConformerStreamingState(
+            att_cache=torch.zeros(n_layers, 2, batch_size, self.n_heads, left, d_head, dtype=dtype, device=device),
+            conv_cache=torch.zeros(
+                n_layers, batch_size, self.d_model, self.conv_kernel_size - 1, dtype=dtype, device=device
+            ),
+            pre_encode_cache=pre_encode_cache,
+        )
+
+    def stream_step(self, audio_signal, length, state):
+        """Encodes the next chunk of a batch of streams.
+
+        Every chunk has to be of `streaming_chunk_size` frames, except for the last chunk of the streams, which may
+        be shorter. The outputs of all chunks are the same as the output of `forward` on the whole streams.
+
+        Args:
+            audio_signal (torch.Tensor): (batch, feat_in, time) chunk of the streams
+            length (torch.Tensor): (batch,) lengths of the chunk
+            state (ConformerStreamingState): state returned by the previous step, or by `get_initial_cache_state`
+                for the first chunk
+
+        Returns:
+            outputs (torch.Tensor): (batch, feat_out, encoded time) encoded chunk
+            encoded_lengths (torch.Tensor): (batch,) encoded lengths of the chunk
+            state (ConformerStreamingState): state for the next step
+        """
+        if audio_signal.size(-1) > self.streaming_chunk_size:
+            raise ValueError(
+                f"Chunks of {audio_signal.size(-1)} frames are longer than the {self.streaming_chunk_size} frames of "
+                f"the att_context_size {self.att_context_size}."
+            )
+        audio_signal = torch.transpose(audio_signal, 1, 2)
+
+        if isinstance(self.pre_encode, ConvSubsampling):
+            audio_signal, length, pre_encode_cache = self.pre_encode.stream_step(
+                audio_signal, length, state.pre_encode_cache
+            )
+        else:
+            audio_signal, pre_encode_cache = self.pre_encode(audio_signal), state.pre_encode_cache
+
+        cache_size = state.att_cache.size(4)
+        audio_signal, pos_emb = self.pos_enc(audio_signal, cache_len=cache_size)
+        bs, xmax, idim = audio_signal.size()
+
+        # The cached frames before the start of the streams are masked out
+        pad_mask = self.make_pad_mask(length, max_time=xmax, device=audio_signal.device)
+        cache_mask = torch.arange(cache_size, device=audio_signal.device) >= cache_size - state.num_frames
+        key_mask = torch.cat([cache_mask.unsqueeze(0).expand(bs, -1), pad_mask], dim=1)
+        xx_mask = ~(pad_mask.unsqueeze(2) & key_mask.unsqueeze(1))
+        pad_mask = ~pad_mask
+
+        att_cache, conv_cache = [], []
+        for lth, layer in enumerate(self.layers):
+            audio_signal, layer_att_cache, layer_conv_cache = layer(
+                x=audio_signal,
+                att_mask=xx_mask,
+                pos_emb=pos_emb,
+                pad_mask=pad_mask,
+                att_cache=state.att_cache[lth],
+                conv_cache=state.conv_cache[lth],
+            )
+            att_cache.append(layer_att_cache)
+            conv_cache.append(layer_conv_cache)
+
+        if self.out_proj is not None:
+            audio_signal = self.out_proj(audio_signal)
+
+        audio_signal = torch.transpose(audio_signal, 1, 2)
+        state = ConformerStreamingState(
+            att_cache=torch.stack(att_cache),
+            conv_cache=torch.stack(conv_cache),
+            pre_encode_cache=pre_encode_cache,
+            num_frames=state.num_frames + xmax,
+        )
+        return audio_signal, length, state
+
     @staticmethod
     def make_pad_mask(seq_lens, max_time, device=None):
         """Make masking for padding."""
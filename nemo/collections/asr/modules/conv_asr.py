@@ -13,7 +13,7 @@
 # limitations under the License.
 from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -22,6 +22,7 @@ from omegaconf import MISSING, ListConfig, OmegaConf
 
 from nemo.collections.asr.parts.jasper import (
     JasperBlock,
+    JasperBlockStreamingState,
     MaskedConv1d,
     StatsPoolLayer,
     init_weights,
@@ -50,6 +51,22 @@ class ConvASREncoder(NeuralModule, Exportable):
     Based on these papers:
         https://arxiv.org/pdf/1904.03288.pdf
         https://arxiv.org/pdf/1910.10261.pdf
+
+    Args:
+        trim_padding: Whether to trim the batch to its longest sequence before encoding it, instead of running every
+            convolution over the padding. The output lengths of the convolutions grow with their input lengths,
+            so every block, including the strided ones, then runs on its longest valid output only.
+        pack_padding_ratio: If set, the batch is split into groups of sequences of similar lengths, which are encoded
+            one after the other, each trimmed to its longest sequence. The padding of a group is at most this
+            fraction of its valid frames, unless it is a single sequence. A few long outliers then cost about as
+            much as their own frames rather than slowing down the whole batch. Note that during training, batch
+            normalization then computes its statistics over each group.
+
+        With `conv_mask`, convolutions only see the valid frames of every sequence, so in eval mode both options
+        leave the valid output frames unchanged. Global squeeze-and-excitation otherwise pools over the padded
+        length of the batch, so with either option it pools over the valid frames of every sequence instead, and
+        every sequence is then encoded as if it were alone in the batch. Squeeze-and-excitation with a
+        `se_context_size` window interpolates its context over the padded length, and does not support them.
     """
 
     def _prepare_for_export(self):
@@ -58,6 +75,9 @@ class ConvASREncoder(NeuralModule, Exportable):
             if isinstance(m, MaskedConv1d):
                 m.use_mask = False
                 m_count += 1
+            elif isinstance(m, JasperBlock):
+                # Lengths are no longer updated, so squeeze-and-excitation must not mask with them
+                m.se_mask_padding = False
         logging.warning(f"Turned off {m_count} masked convolutions")
 
     def input_example(self):
@@ -120,6 +140,8 @@ class ConvASREncoder(NeuralModule, Exportable):
         frame_splicing: int = 1,
         init_mode: Optional[str] = 'xavier_uniform',
         quantize: bool = False,
+        trim_padding: bool = False,
+        pack_padding_ratio: Optional[float] = None,
     ):
         super().__init__()
         if isinstance(jasper, ListConfig):
@@ -129,6 +151,18 @@ class ConvASREncoder(NeuralModule, Exportable):
         feat_in = feat_in * frame_splicing
 
         self._feat_in = feat_in
+        self.trim_padding = trim_padding
+        self.pack_padding_ratio = pack_padding_ratio
+
+        if pack_padding_ratio is not None and pack_padding_ratio < 0:
+            raise ValueError("`pack_padding_ratio` must be non-negative")
+        if (trim_padding or pack_padding_ratio is not None) and any(
+            lcfg.get('se', False) and lcfg.get('se_context_size', -1) > 0 for lcfg in jasper
+        ):
+            raise ValueError(
+                "`trim_padding` and `pack_padding_ratio` are not supported with a squeeze-and-excitation "
+                "`se_context_size`, whose context depends on the padded length of the batch"
+            )
 
         residual_panes = []
         encoder_layers = []
@@ -175,6 +209,7 @@ class ConvASREncoder(NeuralModule, Exportable):
                     kernel_size_factor=kernel_size_factor,
                     stride_last=stride_last,
                     quantize=quantize,
+                    se_mask_padding=trim_padding or pack_padding_ratio is not None,
                 )
             )
             feat_in = lcfg['filters']
@@ -186,12 +221,95 @@ class ConvASREncoder(NeuralModule, Exportable):
 
     @typecheck()
     def forward(self, audio_signal, length=None):
+        if length is not None and self.pack_padding_ratio is not None:
+            return self._forward_packed(audio_signal, length)
+
+        if length is not None and self.trim_padding:
+            audio_signal = audio_signal[:, :, : int(length.max())]
+
         s_input, length = self.encoder(([audio_signal], length))
         if length is None:
             return s_input[-1]
 
         return s_input[-1], length
 
+    def _forward_packed(self, audio_signal: torch.Tensor, length: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Encodes groups of sequences of similar lengths one after the other, each trimmed to its longest sequence.
+
+        Args:
+            audio_signal: (batch, feat_in, time) padded input features.
+            length: (batch) valid lengths of the input features.
+
+        Returns:
+            A tuple of the (batch, feat_out, encoded time) encoded features, zero beyond the encoded lengths of each
+            sequence, and the (batch) encoded lengths.
+        """
+        lengths = length.tolist()
+
+        group_outputs = []
+        for group in self._get_packing_groups(lengths):
+            index = torch.tensor(group, dtype=torch.long, device=audio_signal.device)
+            group_signal = audio_signal.index_select(0, index)[:, :, : lengths[group[0]]]
+            s_input, group_length = self.encoder(([group_signal], length.index_select(0, index)))
+            group_outputs.append((index, s_input[-1], group_length))
+
+        max_time = max(group_output.size(-1) for _, group_output, _ in group_outputs)
+        outputs = audio_signal.new_zeros(audio_signal.size(0), self._feat_out, max_time)
+        encoded_lengths = length.new_zeros(length.size(0))
+        for index, group_output, group_length in group_outputs:
+            outputs[index, :, : group_output.size(-1)] = group_output.to(outputs.dtype)
+            encoded_lengths[index] = group_length.to(encoded_lengths.dtype)
+
+        return outputs, encoded_lengths
+
+    def _get_packing_groups(self, lengths: List[int]) -> List[List[int]]:
+        """Greedily groups the indices of the sequences by decreasing length, so that the padding of each group to its
+        longest sequence stays within `pack_padding_ratio` of its valid frames."""
+        groups = []
+        group, group_frames = [], 0
+        for idx in sorted(range(len(lengths)), key=lambda i: -lengths[i]):
+            if group and (len(group) + 1) * lengths[group[0]] > (1 + self.pack_padding_ratio) * (
+                group_frames + lengths[idx]
+            ):
+                groups.append(group)
+                group, group_frames = [], 0
+            group.append(idx)
+            group_frames += lengths[idx]
+        if group:
+            groups.append(group)
+        return groups
+
+    def get_initial_cache_state(self) -> List[JasperBlockStreamingState]:
+        """Returns the state of `stream_step` at the start of a stream."""
+        return [block.get_initial_cache_state() for block in self.encoder]
+
+    def stream_step(
+        self, audio_signal: torch.Tensor, state: List[JasperBlockStreamingState], flush: bool = False
+    ) -> Tuple[torch.Tensor, List[JasperBlockStreamingState]]:
+        """Encodes the next chunk of a batch of streams, which may be of any number of frames.
+
+        Every convolution buffers the frames its next outputs depend on, instead of the whole sequence required by
+        the symmetric padding of `forward`. Each chunk returns the encoded frames whose receptive field was fully
+        received, so an encoded frame comes out as soon as the frames of its right context arrived, and the last
+        ones come out with `flush=True`. The outputs of all chunks are the outputs of `forward` on the whole streams,
+        except for blocks with squeeze and excitation, whose global context is approximated by the average of the
+        frames seen so far.
+
+        The streams of a batch are fed in lockstep, and the encoder has to be in eval mode.
+
+        Args:
+            audio_signal: (batch, feat_in, time) next chunk of the streams.
+            state: The state of the previous chunk, or of `get_initial_cache_state`. Updated in place.
+            flush: Whether this is the last chunk of the streams.
+
+        Returns:
+            A tuple of the (batch, feat_out, encoded time) new encoded frames, and the state for the next chunk.
+        """
+        xs = [audio_signal]
+        for block, block_state in zip(self.encoder, state):
+            xs, _ = block.stream_step(xs, block_state, flush=flush)
+        return xs[-1], state
+
 
 class ConvASRDecoder(NeuralModule, Exportable):
     """Simple ASR Decoder for use with CTC-based models such as JasperNet and QuartzNet
@@ -475,6 +593,8 @@ class ConvASREncoderConfig:
     conv_mask: bool = True
     frame_splicing: int = 1
     init_mode: Optional[str] = "xavier_uniform"
+    trim_padding: bool = False
+    pack_padding_ratio: Optional[float] = None
 
 
 @dataclass
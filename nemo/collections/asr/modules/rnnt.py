@@ -29,7 +29,10 @@
 from typing import Any, Dict, List, Optional, Tuple, Union
 
 import torch
+from packaging import version
+from torch.utils.checkpoint import checkpoint
 
+from nemo.collections.asr.losses import rnnt_pytorch
 from nemo.collections.asr.modules import rnnt_abstract
 from nemo.collections.asr.parts import rnnt_utils
 from nemo.collections.common.parts import rnn
@@ -46,6 +49,29 @@ from nemo.core.neural_types import (
 )
 from nemo.utils import logging
 
+# Non-reentrant activation checkpointing is recommended from PyTorch 1.11 on, older versions reject the argument.
+_CHECKPOINT_KWARGS = {'use_reentrant': False} if version.parse(torch.__version__) >= version.parse('1.11') else {}
+
+
+def _get_cached_hypothesis(
+    cache: Union[Dict[Tuple[int], Any], rnnt_utils.RNNTStateCache], hypothesis: rnnt_utils.Hypothesis
+) -> Optional[Tuple[torch.Tensor, List[torch.Tensor]]]:
+    # RNNTStateCache looks the hypothesis up from its trie node, plain dicts are keyed by the token sequence.
+    if isinstance(cache, rnnt_utils.RNNTStateCache):
+        return cache.get_hypothesis(hypothesis)
+    return cache.get(tuple(hypothesis.y_sequence))
+
+
+def _set_cached_hypothesis(
+    cache: Union[Dict[Tuple[int], Any], rnnt_utils.RNNTStateCache],
+    hypothesis: rnnt_utils.Hypothesis,
+    value: Tuple[torch.Tensor, List[torch.Tensor]],
+):
+    if isinstance(cache, rnnt_utils.RNNTStateCache):
+        cache.set_hypothesis(hypothesis, value)
+    else:
+        cache[tuple(hypothesis.y_sequence)] = value
+
 
 class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
     """A Recurrent Neural Network Transducer Decoder / Prediction Network (RNN-T Prediction Network).
@@ -307,7 +333,7 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
         return state
 
     def score_hypothesis(
-        self, hypothesis: rnnt_utils.Hypothesis, cache: Dict[Tuple[int], Any]
+        self, hypothesis: rnnt_utils.Hypothesis, cache: Union[Dict[Tuple[int], Any], rnnt_utils.RNNTStateCache]
     ) -> (torch.Tensor, List[torch.Tensor], torch.Tensor):
         """
         Similar to the predict() method, instead this method scores a Hypothesis during beam search.
@@ -315,7 +341,7 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
 
         Args:
             hypothesis: Refer to rnnt_utils.Hypothesis.
-            cache: Dict which contains a cache to avoid duplicate computations.
+            cache: Dict or rnnt_utils.RNNTStateCache which contains a cache to avoid duplicate computations.
 
         Returns:
             Returns a tuple (y, states, lm_token) such that:
@@ -339,11 +365,9 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
         target = torch.full([1, 1], fill_value=hypothesis.y_sequence[-1], device=device, dtype=torch.long)
         lm_token = target[:, -1]  # [1]
 
-        # Convert current hypothesis into a tuple to preserve in cache
-        sequence = tuple(hypothesis.y_sequence)
-
-        if sequence in cache:
-            y, new_state = cache[sequence]
+        cached = _get_cached_hypothesis(cache, hypothesis)
+        if cached is not None:
+            y, new_state = cached
         else:
             # Obtain score for target token and new states
             if blank_state:
@@ -355,19 +379,22 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
                 )  # [1, 1, H]
 
             y = y[:, -1:, :]  # Extract just last state : [1, 1, H]
-            cache[sequence] = (y, new_state)
+            _set_cached_hypothesis(cache, hypothesis, (y, new_state))
 
         return y, new_state, lm_token
 
     def batch_score_hypothesis(
-        self, hypotheses: List[rnnt_utils.Hypothesis], cache: Dict[Tuple[int], Any], batch_states: List[torch.Tensor]
+        self,
+        hypotheses: List[rnnt_utils.Hypothesis],
+        cache: Union[Dict[Tuple[int], Any], rnnt_utils.RNNTStateCache],
+        batch_states: List[torch.Tensor],
     ) -> (torch.Tensor, List[torch.Tensor], torch.Tensor):
         """
         Used for batched beam search algorithms. Similar to score_hypothesis method.
 
         Args:
             hypothesis: List of Hypotheses. Refer to rnnt_utils.Hypothesis.
-            cache: Dict which contains a cache to avoid duplicate computations.
+            cache: Dict or rnnt_utils.RNNTStateCache which contains a cache to avoid duplicate computations.
             batch_states: List of torch.Tensor which represent the states of the RNN for this batch.
                 Each state is of shape [L, B, H]
 
@@ -393,13 +420,12 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
 
         # For each hypothesis, cache the last token of the sequence and the current states
         for i, hyp in enumerate(hypotheses):
-            sequence = tuple(hyp.y_sequence)
-
-            if sequence in cache:
-                done[i] = cache[sequence]
+            cached = _get_cached_hypothesis(cache, hyp)
+            if cached is not None:
+                done[i] = cached
             else:
                 tokens.append(hyp.y_sequence[-1])
-                process.append((sequence, hyp.dec_state))
+                process.append((hyp, hyp.dec_state))
 
         if process:
             batch = len(process)
@@ -407,7 +433,7 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
             # convert list of tokens to torch.Tensor, then reshape.
             tokens = torch.tensor(tokens, device=device, dtype=torch.long).view(batch, -1)
             dec_states = self.initialize_state(tokens.to(dtype=dtype))  # [L, B, H]
-            dec_states = self.batch_initialize_states(dec_states, [d_state for seq, d_state in process])
+            dec_states = self.batch_initialize_states(dec_states, [d_state for hyp, d_state in process])
 
             y, dec_states = self.predict(
                 tokens, state=dec_states, add_sos=False, batch_size=batch
@@ -417,21 +443,19 @@ class RNNTDecoder(rnnt_abstract.AbstractRNNTDecoder):
         j = 0
         for i in range(final_batch):
             if done[i] is None:
-                # Select sample's state from the batch state list
-                new_state = self.batch_select_state(dec_states, j)
-
-                # Cache [1, H] scores of the current y_j, and its corresponding state
-                done[i] = (y[j], new_state)
-                cache[process[j][0]] = (y[j], new_state)
+                # Cache [1, 1, H] scores of the current y_j, and its corresponding [L, 1, H] states
+                done[i] = (y[j : j + 1], [state[:, j : j + 1, :] for state in dec_states])
+                _set_cached_hypothesis(cache, process[j][0], done[i])
 
                 j += 1
 
         # Set the incoming batch states with the new states obtained from `done`.
-        batch_states = self.batch_initialize_states(batch_states, [d_state for y_j, d_state in done])
+        for state_id in range(len(batch_states)):
+            batch_states[state_id][...] = torch.cat([d_state[state_id] for y_j, d_state in done], dim=1)
 
         # Create batch of all output scores
         # List[1, 1, H] -> [B, 1, H]
-        batch_y = torch.stack([y_j for y_j, d_state in done])
+        batch_y = torch.cat([y_j for y_j, d_state in done])
 
         # Extract the last tokens from all hypotheses and convert to a tensor
         lm_tokens = torch.tensor([h.y_sequence[-1] for h in hypotheses], device=device, dtype=torch.long).view(
@@ -543,6 +567,17 @@ class RNNTJoint(rnnt_abstract.AbstractRNNTJoint):
 
         fused_batch_size: Optional int, required if `fuse_loss_wer` flag is set. Determines the size of the
             sub-batches. Should be any value below the actual batch size per GPU.
+
+        fused_recompute: Optional bool, set to False by default. Only used if `fuse_loss_wer` flag is set.
+            Recomputes the joint of every sub-batch (or time chunk) during the backward pass instead of keeping
+            its activations, so that peak memory grows with the size of a sub-batch rather than of the batch.
+            Dropout masks are replayed, so the loss and gradients are the same as without recomputation.
+
+        fused_time_chunk_size: Optional int, set to None by default. Only used if `fuse_loss_wer` flag is set.
+            Further splits every sub-batch into chunks of this many encoder frames. Only the log probabilities
+            of blank and of the next label are gathered from the joint of each chunk, so the joint of a whole
+            sub-batch is never materialized. Requires the `pytorch` backend of `RNNTLoss`, and is most useful
+            together with `fused_recompute`.
     """
 
     @property
@@ -584,6 +619,8 @@ class RNNTJoint(rnnt_abstract.AbstractRNNTJoint):
         preserve_memory: bool = False,
         experimental_fuse_loss_wer: bool = False,
         fused_batch_size: Optional[int] = None,
+        fused_recompute: bool = False,
+        fused_time_chunk_size: Optional[int] = None,
     ):
         super().__init__()
 
@@ -594,6 +631,8 @@ class RNNTJoint(rnnt_abstract.AbstractRNNTJoint):
 
         self._fuse_loss_wer = experimental_fuse_loss_wer
         self._fused_batch_size = fused_batch_size
+        self._fused_recompute = fused_recompute
+        self._fused_time_chunk_size = fused_time_chunk_size
 
         if experimental_fuse_loss_wer and (fused_batch_size is None):
             raise ValueError("If `fuse_loss_wer` is set, then `fused_batch_size` cannot be None!")
@@ -665,7 +704,7 @@ class RNNTJoint(rnnt_abstract.AbstractRNNTJoint):
 
         else:
             # At least the loss module must be supplied during fused joint
-            if self._loss is None or self._wer is None:
+            if self._loss is None or (compute_wer and self._wer is None):
                 raise ValueError("`fuse_loss_wer` flag is set, but `loss` and `wer` modules were not provided! ")
 
             # If fused joint step is required, fused batch size is required as well
@@ -717,34 +756,18 @@ class RNNTJoint(rnnt_abstract.AbstractRNNTJoint):
                     if sub_dec.shape[1] != max_sub_transcript_length + 1:
                         sub_dec = sub_dec.narrow(dim=1, start=0, length=max_sub_transcript_length + 1)
 
-                    # Perform joint => [sub-batch, T', U', V + 1]
-                    sub_joint = self.joint(sub_enc, sub_dec)
-
-                    del sub_dec
-
                     # Reduce transcript length to correct alignment
                     # Transcript: [sub-batch, L] -> [sub-batch, L']; L' <= L
                     if sub_transcripts.shape[1] != max_sub_transcript_length:
                         sub_transcripts = sub_transcripts.narrow(dim=1, start=0, length=max_sub_transcript_length)
 
-                    # Compute sub batch loss
-                    # preserve loss reduction type
-                    loss_reduction = self.loss.reduction
-
-                    # override loss reduction to sum
-                    self.loss.reduction = None
-
-                    # compute and preserve loss
-                    loss_batch = self.loss(
-                        log_probs=sub_joint,
-                        targets=sub_transcripts,
-                        input_lengths=sub_enc_lens,
-                        target_lengths=sub_transcript_lens,
+                    # Perform joint => [sub-batch, T', U', V + 1] and compute and preserve sub batch loss
+                    loss_batch = self._fused_sub_batch_loss(
+                        sub_enc, sub_dec, sub_transcripts, sub_enc_lens, sub_transcript_lens
                     )
                     losses.append(loss_batch)
 
-                    # reset loss reduction type
-                    self.loss.reduction = loss_reduction
+                    del sub_dec
 
                 else:
                     losses = None
@@ -796,6 +819,74 @@ class RNNTJoint(rnnt_abstract.AbstractRNNTJoint):
 
             return losses, wer, wer_num, wer_denom
 
+    def _fused_sub_batch_loss(
+        self,
+        enc: torch.Tensor,
+        dec: torch.Tensor,
+        transcripts: torch.Tensor,
+        enc_lens: torch.Tensor,
+        transcript_lens: torch.Tensor,
+    ) -> torch.Tensor:
+        """
+        Computes the loss of every sample of a sub-batch of the fused joint step.
+
+        Args:
+            enc: Encoder outputs of shape [sub-batch, T', H1].
+            dec: Decoder outputs of shape [sub-batch, U' + 1, H2].
+            transcripts: Transcripts of shape [sub-batch, U'].
+            enc_lens: Encoder lengths of shape [sub-batch].
+            transcript_lens: Transcript lengths of shape [sub-batch].
+
+        Returns:
+            The loss of every sample, of shape [sub-batch].
+        """
+        if self._fused_time_chunk_size is None:
+
+            def sub_batch_loss(enc, dec):
+                # preserve loss reduction type, and override it to compute the loss of every sample
+                loss_reduction = self.loss.reduction
+                self.loss.reduction = None
+                loss_batch = self.loss(
+                    log_probs=self.joint(enc, dec),
+                    targets=transcripts,
+                    input_lengths=enc_lens,
+                    target_lengths=transcript_lens,
+                )
+                # reset loss reduction type
+                self.loss.reduction = loss_reduction
+                return loss_batch
+
+            return self._maybe_recompute(sub_batch_loss, enc, dec)
+
+        if getattr(self.loss, 'backend', None) != 'pytorch':
+            raise ValueError("`fused_time_chunk_size` requires the `pytorch` backend of `RNNTLoss`!")
+
+        def chunk_lattice(enc, dec):
+            # Force cast joint to float32, as RNNTLoss does
+            return rnnt_pytorch.gather_lattice_log_probs(
+                self.joint(enc, dec).float(),
+                transcripts,
+                blank=self._vocab_size,
+                fused_log_softmax=self.loss.fused_log_softmax,
+            )
+
+        blank_lp, label_lp = [], []
+        for start in range(0, enc.shape[1], self._fused_time_chunk_size):
+            enc_chunk = enc.narrow(dim=1, start=start, length=min(self._fused_time_chunk_size, enc.shape[1] - start))
+            blank_lp_chunk, label_lp_chunk = self._maybe_recompute(chunk_lattice, enc_chunk, dec)
+            blank_lp.append(blank_lp_chunk)
+            label_lp.append(label_lp_chunk)
+
+        return rnnt_pytorch.lattice_rnnt_loss(
+            torch.cat(blank_lp, dim=1), torch.cat(label_lp, dim=1), enc_lens, transcript_lens, reduction=None
+        )
+
+    def _maybe_recompute(self, function, *inputs):
+        """Calls `function`, through activation checkpointing if `fused_recompute` is set and grads are required."""
+        if self._fused_recompute and torch.is_grad_enabled() and any(x.requires_grad for x in inputs):
+            return checkpoint(function, *inputs, **_CHECKPOINT_KWARGS)
+        return function(*inputs)
+
     def joint(self, f: torch.Tensor, g: torch.Tensor) -> torch.Tensor:
         """
         Compute the joint step of the network.
@@ -172,7 +172,7 @@ class AbstractRNNTDecoder(NeuralModule, ABC):
 
         Args:
             hypothesis: Refer to rnnt_utils.Hypothesis.
-            cache: Dict which contains a cache to avoid duplicate computations.
+            cache: Dict or rnnt_utils.RNNTStateCache which contains a cache to avoid duplicate computations.
 
         Returns:
             Returns a tuple (y, states, lm_token) such that:
@@ -190,7 +190,7 @@ class AbstractRNNTDecoder(NeuralModule, ABC):
 
         Args:
             hypothesis: List of Hypotheses. Refer to rnnt_utils.Hypothesis.
-            cache: Dict which contains a cache to avoid duplicate computations.
+            cache: Dict or rnnt_utils.RNNTStateCache which contains a cache to avoid duplicate computations.
             batch_states: List of torch.Tensor which represent the states of the RNN for this batch.
                 Each state is of shape [L, B, H]
 
@@ -0,0 +1,159 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from nemo.collections.asr.parts.segment import AudioSegment
+from nemo.utils import logging
+
+__all__ = ['AudioBank']
+
+DEFAULT_MAX_BYTES = 2 * 2 ** 30
+_ARRAYS = ('samples', 'lengths', 'rms_db')
+
+
+class AudioBank:
+    """Preloaded bank of noise or room impulse response recordings, decoded and resampled once.
+
+    Perturbations sample from the bank instead of reading and decoding a random file on every call. All recordings
+    are stored back to back in a single float32 array, along with their int64 lengths and float32 RMS levels (in dB)
+    in separate arrays, so that sampling a recording does not touch the disk and noise mixing does not recompute its
+    level.
+
+    The bank is built when the perturbation is created, i.e. in the main process before dataloader workers fork, so
+    workers share its pages. If `bank_dir` is set, the bank is also written to a directory there, one `.npy` file
+    per array, and read with `mmap_mode='r'`, so that all workers and ranks of a node, and later runs, share one
+    copy. The directory name is derived from the entries of the manifest, the sample rate, the size cap and the seed,
+    which invalidates stale banks.
+
+    Args:
+        manifest: `collections.ASRAudioText` of the recordings.
+        sample_rate: Sample rate the recordings are resampled to.
+        max_bytes: Size cap of the samples of the bank. With larger corpora, a random subset of the recordings which
+            fits the cap is loaded.
+        bank_dir: Optional directory of the bank file.
+        seed: Seed of the random subset of recordings loaded when the corpus exceeds `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        manifest,
+        sample_rate: int,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        bank_dir: Optional[str] = None,
+        seed: int = 0,
+    ):
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+
+        bank_path = None
+        if bank_dir is not None:
+            bank_dir = os.path.abspath(os.path.expanduser(bank_dir))
+            os.makedirs(bank_dir, exist_ok=True)
+            bank_path = os.path.join(bank_dir, f'audio_bank_{self._bank_key(manifest, seed)}')
+
+        if bank_path is not None and os.path.isdir(bank_path):
+            arrays = self._load(bank_path)
+            logging.info(f"Loaded audio bank from {bank_path}")
+        else:
+            arrays = self._build(manifest, seed)
+            if bank_path is not None:
+                self._save(bank_path, arrays)
+                arrays = self._load(bank_path)
+
+        self._samples = arrays['samples']
+        self._lengths = np.array(arrays['lengths'], dtype=np.int64)
+        self.rms_db = np.array(arrays['rms_db'], dtype=np.float32)
+        self._offsets = np.concatenate([[0], np.cumsum(self._lengths)[:-1]])
+
+    @staticmethod
+    def _load(bank_path: str) -> Dict[str, np.ndarray]:
+        return {name: np.load(os.path.join(bank_path, name + '.npy'), mmap_mode='r') for name in _ARRAYS}
+
+    @staticmethod
+    def _save(bank_path: str, arrays: Dict[str, np.ndarray]):
+        tmp_path = tempfile.mkdtemp(prefix=os.path.basename(bank_path) + '.', dir=os.path.dirname(bank_path))
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp_path, name + '.npy'), arrays[name])
+        try:
+            os.rename(tmp_path, bank_path)
+        except OSError:
+            # Another process wrote the same bank first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def _bank_key(self, manifest, seed: int) -> str:
+        key = hashlib.sha1(f'{self.sample_rate}|{self.max_bytes}|{seed}'.encode('utf-8'))
+        for entry in manifest.data:
+            # Files which are replaced or re-encoded in place change the key as well
+            stat = os.stat(entry.audio_file)
+            key.update(
+                f'|{entry.audio_file}|{entry.offset}|{entry.duration}|{stat.st_mtime}|{stat.st_size}'.encode('utf-8')
+            )
+        return key.hexdigest()
+
+    def _build(self, manifest, seed: int) -> Dict[str, np.ndarray]:
+        entries = list(manifest.data)
+        random.Random(seed).shuffle(entries)
+
+        recordings, num_bytes = [], 0
+        for entry in entries:
+            # Skip recordings which cannot fit before decoding them, when the manifest has their duration.
+            if entry.duration and entry.duration * self.sample_rate * 4 > self.max_bytes - num_bytes:
+                continue
+            samples = AudioSegment.from_file(
+                entry.audio_file,
+                target_sr=self.sample_rate,
+                offset=0 if entry.offset is None else entry.offset,
+                duration=0 if entry.duration is None else entry.duration,
+            ).samples
+            if len(samples) == 0 or samples.nbytes > self.max_bytes - num_bytes:
+                continue
+            recordings.append(samples)
+            num_bytes += samples.nbytes
+
+        if not recordings:
+            raise ValueError(f"No recording of the manifest fits in an audio bank of {self.max_bytes} bytes.")
+        if len(recordings) < len(entries):
+            logging.warning(
+                f"Audio bank holds {len(recordings)} of {len(entries)} recordings, the others exceed its "
+                f"{self.max_bytes} bytes cap."
+            )
+        logging.info(f"Built audio bank of {len(recordings)} recordings ({num_bytes} bytes)")
+
+        return dict(
+            samples=np.concatenate(recordings).astype(np.float32, copy=False),
+            lengths=np.array([len(samples) for samples in recordings], dtype=np.int64),
+            rms_db=np.array([10 * np.log10(np.mean(samples ** 2)) for samples in recordings], dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self._lengths)
+
+    @property
+    def num_bytes(self) -> int:
+        return self._samples.nbytes
+
+    def sample(self, rng: random.Random) -> Tuple[AudioSegment, float]:
+        """Returns a copy of a random recording of the bank as an `AudioSegment`, and its RMS level in dB."""
+        index = rng.randrange(len(self._lengths))
+        offset, length = self._offsets[index], self._lengths[index]
+        samples = np.array(self._samples[offset : offset + length], dtype=np.float32)
+        return AudioSegment(samples, self.sample_rate), float(self.rms_db[index])
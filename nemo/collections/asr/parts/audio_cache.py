@@ -0,0 +1,237 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from nemo.utils import logging
+
+__all__ = ['DecodedAudioCache']
+
+DEFAULT_MAX_BYTES = 8 * 2 ** 30
+# Fraction of the budget the cache is shrunk to when it overflows, so that eviction does not run on every insert.
+_LOW_WATERMARK = 0.9
+
+
+def _default_cache_dir() -> str:
+    # /dev/shm is a tmpfs on Linux, so cached samples live in shared memory and are mapped without copies.
+    base_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base_dir, 'nemo_audio_cache')
+
+
+class DecodedAudioCache:
+    """Cache of decoded and resampled audio, shared by all dataloader workers through the file system.
+
+    Every entry is a `.npy` file holding the samples of one (audio file, offset, duration, sample rate) segment,
+    before any augmentation. Entries are written atomically and read with `mmap_mode='r'`, so workers of all ranks
+    of a node share a single copy of each segment. By default the cache lives in `/dev/shm`, i.e. in shared memory;
+    pointing `cache_dir` at a local disk turns it into an mmap'd on-disk spill.
+
+    The cache is bounded by `max_bytes`. Hits refresh the modification time of the entry, and when the cache grows
+    past its budget the least recently used entries are removed. The size of the cache is a counter in the cache
+    directory shared by all processes, and entries are written while holding a lock on it, so the budget holds
+    across all workers and ranks. The directory is only scanned to evict entries or to initialize the counter.
+
+    Hit and miss counts are kept per process, see `stats`, and logged every `log_every` lookups.
+
+    Args:
+        cache_dir: Directory of the cache. Defaults to `/dev/shm/nemo_audio_cache`, or a temporary directory if
+            `/dev/shm` does not exist.
+        max_bytes: Byte budget of the cache.
+        dtype: Storage type of the samples, either `float32` or `int16`. `int16` halves the memory footprint at the
+            cost of quantizing the samples to 16 bits.
+        log_every: Number of lookups between two hit rate logs. Set to 0 to disable logging.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        dtype: str = 'float32',
+        log_every: int = 10000,
+    ):
+        if dtype not in ('float32', 'int16'):
+            raise ValueError(f"`dtype` must be either 'float32' or 'int16', got {dtype}")
+
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir or _default_cache_dir()))
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.log_every = log_every
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(
+        audio_file: str, offset: float, duration: float, sample_rate: int, int_values: bool = False, trim: bool = False
+    ) -> str:
+        """Returns the cache key of a segment. The size and modification time of the file invalidate stale entries."""
+        stat = os.stat(audio_file)
+        return '|'.join(
+            str(value)
+            for value in (
+                os.path.abspath(audio_file),
+                stat.st_size,
+                stat.st_mtime,
+                offset,
+                duration,
+                sample_rate,
+                int_values,
+                trim,
+            )
+        )
+
+    def _entry_path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.npy')
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Returns the read-only, memory-mapped samples cached under `key`, or None on a miss.
+
+        Samples are returned in the storage `dtype`, `AudioSegment` scales int16 samples back to [-1, 1].
+        """
+        path = self._entry_path(key)
+        try:
+            samples = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except FileNotFoundError:
+            samples = None
+        except (OSError, ValueError):
+            # Truncated or otherwise unreadable entry, e.g. from a process killed while the disk was full.
+            self._remove(path)
+            samples = None
+
+        if samples is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        if self.log_every > 0 and (self.hits + self.misses) % self.log_every == 0:
+            stats = self.stats()
+            logging.info(
+                f"Decoded audio cache (pid {os.getpid()}): {stats['hit_rate']:.2%} hit rate over "
+                f"{stats['hits'] + stats['misses']} lookups."
+            )
+        return samples
+
+    def put(self, key: str, samples: np.ndarray):
+        """Stores the float32 `samples` under `key` and evicts least recently used entries if over budget."""
+        if self.dtype == np.int16:
+            samples = np.clip(np.round(samples * 2 ** 15), -(2 ** 15), 2 ** 15 - 1)
+        samples = np.ascontiguousarray(samples, dtype=self.dtype)
+        if samples.nbytes > self.max_bytes:
+            return
+
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with self._lock() as fd:
+            num_bytes = self._read_num_bytes(fd)
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, samples)
+                size = os.path.getsize(tmp_path)
+                if os.path.exists(path):
+                    # Entry written by another process since the lookup.
+                    self._remove(tmp_path)
+                    return
+
+                if num_bytes + size > self.max_bytes:
+                    num_bytes = self._evict(self.max_bytes * _LOW_WATERMARK - size)
+                os.replace(tmp_path, path)
+                num_bytes += size
+            except OSError as e:
+                logging.warning(f"Could not write to the decoded audio cache at {self.cache_dir}: {e}")
+                self._remove(tmp_path)
+            finally:
+                self._write_num_bytes(fd, num_bytes)
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is below its low watermark."""
+        with self._lock() as fd:
+            self._write_num_bytes(fd, self._evict(self.max_bytes * _LOW_WATERMARK))
+
+    def clear(self):
+        """Removes all entries of the cache."""
+        with self._lock() as fd:
+            for _, _, path in self._scan()[0]:
+                self._remove(path)
+            self._write_num_bytes(fd, 0)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the hits, misses and hit rate of the current process."""
+        lookups = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, hit_rate=self.hits / lookups if lookups > 0 else 0.0)
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Holds an exclusive lock on the file storing the size of the cache and yields its descriptor."""
+        # Opened on every call, since descriptors inherited by forked workers would share the lock.
+        fd = os.open(os.path.join(self.cache_dir, 'num_bytes'), os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _read_num_bytes(self, fd: int) -> int:
+        data = os.pread(fd, 8, 0)
+        if len(data) < 8:
+            # New cache, or one written by a version without the shared counter.
+            return self._scan()[1]
+        return int.from_bytes(data, 'little')
+
+    @staticmethod
+    def _write_num_bytes(fd: int, num_bytes: int):
+        os.pwrite(fd, max(int(num_bytes), 0).to_bytes(8, 'little'), 0)
+
+    def _evict(self, target: float) -> int:
+        # Entries removed outside of `put`, e.g. unreadable ones, are only accounted for here, by re-measuring.
+        entries, num_bytes = self._scan()
+        for _, size, path in sorted(entries):
+            if num_bytes <= target:
+                break
+            self._remove(path)
+            num_bytes -= size
+        return num_bytes
+
+    def _scan(self):
+        entries, num_bytes = [], 0
+        for sub_dir in os.scandir(self.cache_dir):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if not entry.name.endswith('.npy'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                num_bytes += stat.st_size
+        return entries, num_bytes
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
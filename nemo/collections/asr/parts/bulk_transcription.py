@@ -0,0 +1,306 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bulk transcription of a manifest with any `ASRModel`, sharded across devices and processes.
+
+Every process transcribes the manifest lines `shard_id::num_shards`. Audio is decoded by dataloader workers while the
+model runs on the previous batches, batches are formed by decreasing duration, and the results of every batch are
+appended to the shard's `transcripts_<shard_id>_of_<num_shards>.jsonl` file as soon as they are computed. Entries
+found in any transcripts file of the output directory are skipped, so a crashed run resumes where it stopped, even
+with a different number of shards.
+"""
+
+import glob
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import hydra
+import torch
+
+from nemo.collections.asr.data.samplers import get_sorted_batches
+from nemo.collections.asr.models.asr_model import ASRModel
+from nemo.collections.asr.models.classification_models import EncDecClassificationModel, EncDecRegressionModel
+from nemo.collections.asr.models.ctc_models import EncDecCTCModel
+from nemo.collections.asr.models.rnnt_models import EncDecRNNTModel
+from nemo.collections.asr.parts.collate import pad_sequences
+from nemo.collections.asr.parts.features import WaveformFeaturizer
+from nemo.collections.asr.parts.segment import get_audio_duration
+from nemo.utils import logging
+
+try:
+    from torch.cuda.amp import autocast
+except ImportError:
+
+    @contextmanager
+    def autocast(enabled=None):
+        yield
+
+
+__all__ = ['bulk_transcribe', 'get_entry_key', 'load_asr_model', 'read_completed_keys', 'transcribe_manifest_shard']
+
+TRANSCRIPTS_PATTERN = 'transcripts_*_of_*.jsonl'
+
+
+def get_entry_key(entry: Dict[str, Any]) -> str:
+    """Returns the key identifying a manifest entry in the transcripts, which accounts for segments of a recording."""
+    return f"{entry['audio_filepath']}|{entry.get('offset', 0)}|{entry.get('duration', '')}"
+
+
+def read_completed_keys(output_dir: str) -> Set[str]:
+    """Returns the keys of the entries already written to any transcripts file of `output_dir`.
+
+    A line which is not valid json, as the last line of a file written by a process that crashed, is ignored.
+    """
+    keys = set()
+    for path in glob.glob(os.path.join(output_dir, TRANSCRIPTS_PATTERN)):
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    keys.add(get_entry_key(json.loads(line)))
+                except (ValueError, KeyError):
+                    continue
+    return keys
+
+
+def _remove_partial_line(path: str):
+    """Truncates a transcripts file after its last complete line, so that appending to it yields valid jsonl."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+class _ManifestAudioDataset(torch.utils.data.Dataset):
+    """Decodes the audio of manifest entries, for use with dataloader workers.
+
+    Args:
+        entries: Manifest entries with `audio_filepath` and optional `offset` and `duration` keys.
+        sample_rate: Target sample rate of the model.
+        trim_silence: Whether to trim the leading and trailing silence of the audio.
+    """
+
+    def __init__(self, entries: Sequence[Dict[str, Any]], sample_rate: int, trim_silence: bool = False):
+        self.entries = entries
+        self.featurizer = WaveformFeaturizer(sample_rate=sample_rate)
+        self.trim_silence = trim_silence
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        entry = self.entries[index]
+        signal = self.featurizer.process(
+            entry['audio_filepath'],
+            offset=entry.get('offset', 0),
+            duration=entry.get('duration', 0) if 'offset' in entry else 0,
+            trim=self.trim_silence,
+        )
+        return signal, index
+
+    @staticmethod
+    def collate_fn(batch):
+        signals, indices = zip(*batch)
+        signal, signal_len = pad_sequences(signals)
+        return signal, signal_len, list(indices)
+
+
+def _get_duration(entry: Dict[str, Any]) -> float:
+    if entry.get('duration') is not None:
+        return float(entry['duration'])
+    # Only the header is read
+    return get_audio_duration(entry['audio_filepath'])
+
+
+def _predict_batch(model: ASRModel, signal: torch.Tensor, signal_len: torch.Tensor) -> List[Any]:
+    """Returns the greedy transcripts, class labels or regression values of a batch of audio signals."""
+    if isinstance(model, EncDecCTCModel):
+        log_probs, encoded_len, greedy_predictions = model(input_signal=signal, input_signal_length=signal_len)
+        return model._wer.ctc_decoder_predictions_tensor(greedy_predictions, predictions_len=encoded_len)
+    if isinstance(model, EncDecRNNTModel):
+        encoded, encoded_len = model(input_signal=signal, input_signal_length=signal_len)
+        best_hyp, _ = model.decoding.rnnt_decoder_predictions_tensor(encoded, encoded_len)
+        return best_hyp
+    if isinstance(model, EncDecRegressionModel):
+        return [float(pred) for pred in model(input_signal=signal, input_signal_length=signal_len)]
+    if isinstance(model, EncDecClassificationModel):
+        logits = model(input_signal=signal, input_signal_length=signal_len)
+        return [model.cfg.labels[label] for label in logits.argmax(dim=-1).tolist()]
+    raise ValueError(f"Bulk transcription is not supported for models of type {type(model).__name__}")
+
+
+@torch.no_grad()
+def transcribe_manifest_shard(
+    model: ASRModel,
+    manifest_filepath: str,
+    output_dir: str,
+    shard_id: int = 0,
+    num_shards: int = 1,
+    batch_size: int = 32,
+    max_batch_duration: Optional[float] = None,
+    num_workers: int = 4,
+    trim_silence: bool = False,
+    amp: bool = False,
+    pred_text_key: str = 'pred_text',
+) -> int:
+    """Transcribes the entries `shard_id::num_shards` of a manifest which are not in the output directory yet.
+
+    Every output line is the manifest entry with its prediction under `pred_text_key`. Lines are appended, flushed
+    and synced after every batch, so a crash loses at most one batch.
+
+    Args:
+        model: The model, on the device to transcribe on.
+        manifest_filepath: Path of the manifest, with `audio_filepath` and optional `offset` and `duration` keys.
+        output_dir: Directory of the transcripts files.
+        shard_id: Index of the shard transcribed by this process.
+        num_shards: Total number of shards.
+        batch_size: Number of files per batch. Ignored if `max_batch_duration` is set.
+        max_batch_duration: Optional maximum padded duration of a batch in seconds.
+        num_workers: Number of dataloader workers decoding the audio.
+        trim_silence: Whether to trim the leading and trailing silence of the audio.
+        amp: Whether to run the model under automatic mixed precision.
+        pred_text_key: Key of the prediction in the output entries.
+
+    Returns:
+        The number of entries transcribed by this call.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    completed = read_completed_keys(output_dir)
+    entries = []
+    with open(manifest_filepath, 'r') as f:
+        for idx, line in enumerate(f):
+            if idx % num_shards != shard_id or not line.strip():
+                continue
+            entry = json.loads(line)
+            if get_entry_key(entry) not in completed:
+                entries.append(entry)
+    if len(entries) == 0:
+        logging.info(f"Shard {shard_id} of {num_shards}: nothing left to transcribe")
+        return 0
+
+    device = next(model.parameters()).device
+    batches = get_sorted_batches(
+        [_get_duration(entry) for entry in entries], batch_size=batch_size, max_batch_duration=max_batch_duration
+    )
+    dataset = _ManifestAudioDataset(entries, sample_rate=model.preprocessor._sample_rate, trim_silence=trim_silence)
+    dataloader = torch.utils.data.DataLoader(
+        dataset=dataset,
+        batch_sampler=batches,
+        collate_fn=dataset.collate_fn,
+        num_workers=num_workers,
+        pin_memory=device.type == 'cuda',
+    )
+
+    output_path = os.path.join(output_dir, f'transcripts_{shard_id}_of_{num_shards}.jsonl')
+    _remove_partial_line(output_path)
+
+    mode = model.training
+    dither_value = model.preprocessor.featurizer.dither
+    pad_to_value = model.preprocessor.featurizer.pad_to
+    num_done = 0
+    start = time.time()
+    try:
+        model.preprocessor.featurizer.dither = 0.0
+        model.preprocessor.featurizer.pad_to = 0
+        model.eval()
+        with open(output_path, 'a') as fout:
+            for signal, signal_len, indices in dataloader:
+                signal = signal.to(device, non_blocking=True)
+                signal_len = signal_len.to(device, non_blocking=True)
+                with autocast(enabled=amp):
+                    predictions = _predict_batch(model, signal, signal_len)
+                for idx, prediction in zip(indices, predictions):
+                    entry = entries[idx]
+                    entry[pred_text_key] = prediction
+                    fout.write(json.dumps(entry) + '\n')
+                fout.flush()
+                os.fsync(fout.fileno())
+                num_done += len(indices)
+                logging.info(
+                    f"Shard {shard_id} of {num_shards}: {num_done}/{len(entries)} files "
+                    f"({num_done / (time.time() - start):.1f} files/s)"
+                )
+    finally:
+        model.train(mode=mode)
+        model.preprocessor.featurizer.dither = dither_value
+        model.preprocessor.featurizer.pad_to = pad_to_value
+    return num_done
+
+
+def load_asr_model(model_name: str, map_location: Optional[torch.device] = None) -> ASRModel:
+    """Restores an ASR model of any class from a .nemo file or from the name of a pretrained model."""
+    if model_name.endswith('.nemo'):
+        cfg = ASRModel.restore_from(model_name, return_config=True)
+        return hydra.utils.get_class(cfg.target).restore_from(model_name, map_location=map_location)
+
+    subclasses = list(ASRModel.__subclasses__())
+    while len(subclasses) > 0:
+        subclass = subclasses.pop()
+        subclasses.extend(subclass.__subclasses__())
+        for model_info in subclass.list_available_models() or []:
+            if model_info.pretrained_model_name == model_name:
+                return subclass.from_pretrained(model_name, map_location=map_location)
+    raise FileNotFoundError(f"Model {model_name} is neither a .nemo file nor the name of a pretrained ASR model.")
+
+
+def _bulk_transcribe_worker(
+    rank: int, model_name: str, devices: List[str], processes_per_device: int, num_shards: int, kwargs: Dict
+):
+    device = torch.device(devices[rank // processes_per_device])
+    if device.type == 'cuda':
+        torch.cuda.set_device(device)
+    model = load_asr_model(model_name, map_location=device)
+    transcribe_manifest_shard(model.to(device), shard_id=rank, num_shards=num_shards, **kwargs)
+
+
+def bulk_transcribe(
+    model_name: str,
+    manifest_filepath: str,
+    output_dir: str,
+    devices: Optional[List[str]] = None,
+    processes_per_device: int = 1,
+    **kwargs,
+) -> List[str]:
+    """Transcribes a manifest with one process per shard, and returns the paths of the transcripts files.
+
+    Args:
+        model_name: Path to a .nemo file or name of a pretrained model.
+        manifest_filepath: Path of the manifest to transcribe.
+        output_dir: Directory of the transcripts files.
+        devices: Devices to transcribe on, such as ['cuda:0', 'cuda:1']. Defaults to all the GPUs, or to the CPU.
+        processes_per_device: Number of processes, each with its own model, per device.
+        kwargs: Other arguments of `transcribe_manifest_shard`.
+    """
+    if devices is None:
+        if torch.cuda.is_available():
+            devices = [f'cuda:{idx}' for idx in range(torch.cuda.device_count())]
+        else:
+            devices = ['cpu']
+    num_shards = len(devices) * processes_per_device
+    # The transcripts of a previous run with another number of shards are not appended to by any process
+    for path in glob.glob(os.path.join(output_dir, TRANSCRIPTS_PATTERN)):
+        _remove_partial_line(path)
+    kwargs = dict(kwargs, manifest_filepath=manifest_filepath, output_dir=output_dir)
+    args = (model_name, devices, processes_per_device, num_shards, kwargs)
+
+    if num_shards == 1:
+        _bulk_transcribe_worker(0, *args)
+    else:
+        torch.multiprocessing.spawn(_bulk_transcribe_worker, args=args, nprocs=num_shards, join=True)
+    return sorted(glob.glob(os.path.join(output_dir, f'transcripts_*_of_{num_shards}.jsonl')))
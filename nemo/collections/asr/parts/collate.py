@@ -0,0 +1,94 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List, Optional, Sequence, Tuple, Union
+
+import torch
+
+__all__ = ['pad_sequences', 'speech_collate']
+
+
+def pad_sequences(
+    sequences: Sequence[torch.Tensor],
+    pad_value: float = 0,
+    max_length: Optional[int] = None,
+    dtype: Optional[torch.dtype] = None,
+    lengths: Optional[Union[torch.Tensor, Sequence[int]]] = None,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Pads a list of 1d tensors into a single [B, T] tensor.
+
+    The output is allocated once, uninitialized, and every sequence is copied into its row with only the tail of
+    the row filled with `pad_value`. This avoids the per-sample `pad` allocations and the final `stack` copy.
+
+    Args:
+        sequences: List of 1d tensors.
+        pad_value: Value used for padding.
+        max_length: Length T of the output. Longer sequences are truncated. Defaults to the longest sequence.
+        dtype: Output dtype. Defaults to the dtype of the first sequence.
+        lengths: Optional valid length of every sequence, e.g. the lengths returned by a dataset. Only the first
+            `lengths[i]` values of a sequence are copied. Defaults to the lengths of the sequences.
+
+    Returns:
+        A tuple of the padded [B, T] tensor and the [B] long tensor of (possibly truncated) lengths.
+    """
+    if lengths is None:
+        lengths = [sequence.shape[0] for sequence in sequences]
+    elif isinstance(lengths, torch.Tensor):
+        lengths = lengths.tolist()
+    if max_length is None:
+        max_length = max(lengths, default=0)
+    lengths = [min(length, max_length) for length in lengths]
+
+    if dtype is None:
+        dtype = sequences[0].dtype if len(sequences) > 0 else torch.float
+    device = sequences[0].device if len(sequences) > 0 else None
+
+    padded = torch.empty((len(sequences), max_length), dtype=dtype, device=device)
+    for row, sequence, length in zip(padded, sequences, lengths):
+        row[:length].copy_(sequence[:length])
+        row[length:].fill_(pad_value)
+    return padded, torch.tensor(lengths, dtype=torch.long)
+
+
+def speech_collate(
+    batch: List[Tuple[Optional[torch.Tensor], Optional[torch.Tensor], torch.Tensor, torch.Tensor]], pad_id: int,
+) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor], torch.Tensor, torch.Tensor]:
+    """Collates a batch of (audio signal, audio length, tokens, tokens length) tuples.
+
+    Signals and tokens are padded to the longest of the given lengths, which are returned as they are. Scalar
+    targets (e.g. the class labels of `audio_to_label` datasets) are stacked instead of padded.
+
+    Args:
+        batch: List of tuples of 1d audio signal (or None), its length (or None), 1d or scalar tokens and their
+            length.
+        pad_id: Token id used to pad the tokens.
+
+    Returns:
+        Padded audio signal (or None), audio lengths (or None), padded tokens and tokens lengths.
+    """
+    audio_signals, audio_lengths, tokens, tokens_lengths = zip(*batch)
+
+    audio_signal = None
+    if audio_signals[0] is not None:
+        audio_lengths = torch.stack(audio_lengths)
+        audio_signal, _ = pad_sequences(audio_signals, lengths=audio_lengths)
+    else:
+        audio_lengths = None
+
+    tokens_lengths = torch.stack(tokens_lengths)
+    if tokens[0].dim() == 0:
+        tokens = torch.stack(tokens)
+    else:
+        tokens, _ = pad_sequences(tokens, pad_value=pad_id, lengths=tokens_lengths)
+    return audio_signal, audio_lengths, tokens, tokens_lengths
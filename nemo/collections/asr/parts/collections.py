@@ -13,13 +13,16 @@
 # limitations under the License.
 
 import collections
+import collections.abc
 import json
 import os
 from typing import Any, Dict, List, Optional, Union
 
+import numpy as np
 import pandas as pd
 
 from nemo.collections.asr.parts import manifest, parsers
+from nemo.collections.asr.parts.manifest_index import ManifestIndex
 from nemo.utils import logging
 
 
@@ -202,6 +205,282 @@ class ASRAudioText(AudioText):
         super().__init__(ids, audio_files, durations, texts, offsets, speakers, orig_srs, *args, **kwargs)
 
 
+class IndexedASRAudioText(collections.abc.Sequence):
+    """Lazy counterpart of `ASRAudioText` backed by memory-mapped `ManifestIndex` files.
+
+    Opening the collection only touches the index arrays, whose size does not depend on transcripts. Json lines
+    are parsed and tokenized on access, so `__getitem__` returns the same `AudioTextEntity` tuples as
+    `ASRAudioText`. Duration filters, `max_number` and sorting are applied on the durations array.
+
+    Note that transcripts the parser fails to tokenize cannot be filtered out upfront; such entries are
+    returned with empty `text_tokens` instead.
+    """
+
+    OUTPUT_TYPE = AudioText.OUTPUT_TYPE
+
+    def __init__(
+        self,
+        manifests_files: Union[str, List[str]],
+        parser: parsers.CharParser,
+        min_duration: Optional[float] = None,
+        max_duration: Optional[float] = None,
+        max_number: Optional[int] = None,
+        do_sort_by_duration: bool = False,
+        index_by_file_id: bool = False,
+        index_dir: Optional[str] = None,
+    ):
+        """Opens (building them if needed) the indexes of the manifests and applies the filters.
+
+        Args:
+            manifests_files: Either single string file or list of such - manifests to index.
+            parser: Instance of `CharParser` to convert string to tokens.
+            min_duration: Minimum duration to keep entry with (default: None).
+            max_duration: Maximum duration to keep entry with (default: None).
+            max_number: Maximum number of samples to collect.
+            do_sort_by_duration: True if sort samples list by duration. Not compatible with index_by_file_id.
+            index_by_file_id: If True, exposes a `mapping` from filename base (ID) to index in data.
+            index_dir: Optional directory to store the indexes in. Defaults to the directories of the manifests.
+        """
+        if isinstance(manifests_files, str):
+            manifests_files = [manifests_files]
+
+        self.parser = parser
+        self.indexes = [ManifestIndex(manifest_file, index_dir=index_dir) for manifest_file in manifests_files]
+        self._index_starts = np.cumsum([0] + [len(index) for index in self.indexes])
+
+        if len(self.indexes) == 1:
+            durations = self.indexes[0].durations
+        else:
+            durations = np.concatenate([index.durations for index in self.indexes])
+
+        keep = np.ones(len(durations), dtype=bool)
+        if min_duration is not None:
+            keep &= durations >= min_duration
+        if max_duration is not None:
+            keep &= durations <= max_duration
+
+        # `None` stands for the identity mapping, so unfiltered collections allocate nothing per entry.
+        rows = None if keep.all() else np.flatnonzero(keep)
+        if max_number:
+            rows = (np.arange(len(durations)) if rows is None else rows)[:max_number]
+
+        if do_sort_by_duration:
+            if index_by_file_id:
+                logging.warning("Tried to sort dataset by duration, but cannot since index_by_file_id is set.")
+            else:
+                rows = np.arange(len(durations)) if rows is None else rows
+                rows = rows[np.argsort(durations[rows], kind='stable')]
+
+        self._rows = rows
+        self.durations = durations if rows is None else durations[rows]
+
+        if index_by_file_id:
+            self.mapping = _IndexedFileIdMapping(self)
+
+        total_duration = float(self.durations.sum())
+        logging.info("Dataset loaded with %d files totalling %.2f hours", len(self), total_duration / 3600)
+        logging.info(
+            "%d files were filtered totalling %.2f hours",
+            len(durations) - len(self),
+            (float(durations.sum()) - total_duration) / 3600,
+        )
+
+    def __len__(self):
+        return len(self.durations)
+
+    def _locate(self, row: int):
+        index_id = int(np.searchsorted(self._index_starts, row, side='right')) - 1
+        return self.indexes[index_id], row - int(self._index_starts[index_id])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"Index {idx} is out of range for collection of size {len(self)}")
+
+        row = idx if self._rows is None else int(self._rows[idx])
+        index, local_row = self._locate(row)
+        item = index.get_item(local_row)
+
+        text_tokens = self.parser(item['text'])
+        if text_tokens is None:
+            logging.warning("Fail to parse '%s' text line.", item['text'])
+            text_tokens = []
+
+        return self.OUTPUT_TYPE(
+            row,
+            item['audio_file'],
+            item['duration'],
+            text_tokens,
+            item['offset'],
+            item['text'],
+            item['speaker'],
+            item['orig_sr'],
+        )
+
+
+class _IndexedFileIdMapping:
+    """Read-only `file_id -> index in data` mapping of an `IndexedASRAudioText`, resolved through the index."""
+
+    def __init__(self, collection: IndexedASRAudioText):
+        self._collection = collection
+
+    def _find(self, file_id: str) -> int:
+        collection = self._collection
+        for index, index_start in zip(reversed(collection.indexes), reversed(collection._index_starts[:-1])):
+            local_row = index.find_file_id(file_id)
+            if local_row < 0:
+                continue
+
+            row = int(index_start) + local_row
+            if collection._rows is None:
+                return row if row < len(collection) else -1
+
+            # Rows are kept in manifest order since sorting is disabled together with `index_by_file_id`.
+            position = int(np.searchsorted(collection._rows, row))
+            if position < len(collection._rows) and collection._rows[position] == row:
+                return position
+            return -1
+        return -1
+
+    def __contains__(self, file_id: str) -> bool:
+        return self._find(file_id) >= 0
+
+    def __getitem__(self, file_id: str) -> int:
+        position = self._find(file_id)
+        if position < 0:
+            raise KeyError(file_id)
+        return position
+
+
+class FeatureText(_Collection):
+    """List of precomputed features-transcript text correspondence with preprocessing."""
+
+    OUTPUT_TYPE = collections.namedtuple(
+        typename='FeatureTextEntity',
+        field_names='id feature_file feature_offset feature_length duration text_tokens text_raw speaker',
+    )
+
+    def __init__(
+        self,
+        ids: List[int],
+        feature_files: List[str],
+        feature_offsets: List[int],
+        feature_lengths: List[int],
+        durations: List[float],
+        texts: List[str],
+        speakers: List[Optional[int]],
+        parser: parsers.CharParser,
+        min_duration: Optional[float] = None,
+        max_duration: Optional[float] = None,
+        max_number: Optional[int] = None,
+        do_sort_by_duration: bool = False,
+    ):
+        """Instantiates features-text manifest with filters and preprocessing.
+
+        Args:
+            ids: List of examples positions.
+            feature_files: List of feature store shards.
+            feature_offsets: List of first frames of the utterances in their shards.
+            feature_lengths: List of number of frames of the utterances.
+            durations: List of float durations of the original audio.
+            texts: List of raw text transcripts.
+            speakers: List of optional speakers ids.
+            parser: Instance of `CharParser` to convert string to tokens.
+            min_duration: Minimum duration to keep entry with (default: None).
+            max_duration: Maximum duration to keep entry with (default: None).
+            max_number: Maximum number of samples to collect.
+            do_sort_by_duration: True if sort samples list by duration.
+        """
+
+        output_type = self.OUTPUT_TYPE
+        data, duration_filtered, num_filtered, total_duration = [], 0.0, 0, 0.0
+        for id_, feature_file, feature_offset, feature_length, duration, text, speaker in zip(
+            ids, feature_files, feature_offsets, feature_lengths, durations, texts, speakers
+        ):
+            # Duration filters.
+            if min_duration is not None and duration < min_duration:
+                duration_filtered += duration
+                num_filtered += 1
+                continue
+
+            if max_duration is not None and duration > max_duration:
+                duration_filtered += duration
+                num_filtered += 1
+                continue
+
+            text_tokens = parser(text)
+            if text_tokens is None:
+                duration_filtered += duration
+                num_filtered += 1
+                continue
+
+            total_duration += duration
+
+            data.append(
+                output_type(id_, feature_file, feature_offset, feature_length, duration, text_tokens, text, speaker)
+            )
+
+            # Max number of entities filter.
+            if len(data) == max_number:
+                break
+
+        if do_sort_by_duration:
+            data.sort(key=lambda entity: entity.duration)
+
+        logging.info("Dataset loaded with %d files totalling %.2f hours", len(data), total_duration / 3600)
+        logging.info("%d files were filtered totalling %.2f hours", num_filtered, duration_filtered / 3600)
+
+        super().__init__(data)
+
+
+class ASRFeatureText(FeatureText):
+    """`FeatureText` collector from asr structured json files written by `scripts/extract_asr_features.py`."""
+
+    def __init__(self, manifests_files: Union[str, List[str]], *args, **kwargs):
+        """Parse lists of feature locations, durations and transcripts texts.
+
+        Args:
+            manifests_files: Either single string file or list of such -
+                manifests to yield items from.
+            *args: Args to pass to `FeatureText` constructor.
+            **kwargs: Kwargs to pass to `FeatureText` constructor.
+        """
+
+        ids, feature_files, feature_offsets, feature_lengths, durations, texts, speakers = [], [], [], [], [], [], []
+        for item in manifest.item_iter(manifests_files, parse_func=self.__parse_item):
+            ids.append(item['id'])
+            feature_files.append(item['feature_file'])
+            feature_offsets.append(item['feature_offset'])
+            feature_lengths.append(item['feature_length'])
+            durations.append(item['duration'])
+            texts.append(item['text'])
+            speakers.append(item['speaker'])
+
+        super().__init__(
+            ids, feature_files, feature_offsets, feature_lengths, durations, texts, speakers, *args, **kwargs
+        )
+
+    @staticmethod
+    def __parse_item(line: str, manifest_file: str) -> Dict[str, Any]:
+        item = manifest.parse_item(line, manifest_file)
+        raw = json.loads(line)
+        for key in ('feature_filepath', 'feature_offset', 'feature_length'):
+            if key not in raw:
+                raise ValueError(
+                    f"Manifest file {manifest_file} has invalid json line structure: {line} without {key} key. "
+                    f"Feature manifests are written by scripts/extract_asr_features.py."
+                )
+
+        item['feature_file'] = os.path.expanduser(raw['feature_filepath'])
+        item['feature_offset'] = int(raw['feature_offset'])
+        item['feature_length'] = int(raw['feature_length'])
+        return item
+
+
 class SpeechLabel(_Collection):
     """List of audio-label correspondence with preprocessing."""
 
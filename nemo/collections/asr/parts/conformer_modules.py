@@ -32,6 +32,7 @@ class ConformerLayer(torch.nn.Module):
         conv_kernel_size (int): kernel size for depthwise convolution in convolution module
         dropout (float): dropout probabilities for linear layers
         dropout_att (float): dropout probabilities for attention distributions
+        causal_conv (bool): whether the depthwise convolution only looks at the current and past frames
     """
 
     def __init__(
@@ -45,6 +46,7 @@ class ConformerLayer(torch.nn.Module):
         dropout_att,
         pos_bias_u,
         pos_bias_v,
+        causal_conv=False,
     ):
         super(ConformerLayer, self).__init__()
 
@@ -58,7 +60,7 @@ class ConformerLayer(torch.nn.Module):
 
         # convolution module
         self.norm_conv = LayerNorm(d_model)
-        self.conv = ConformerConvolution(d_model=d_model, kernel_size=conv_kernel_size)
+        self.conv = ConformerConvolution(d_model=d_model, kernel_size=conv_kernel_size, causal=causal_conv)
 
         # multi-headed self-attention module
         self.norm_self_att = LayerNorm(d_model)
@@ -78,15 +80,20 @@ class ConformerLayer(torch.nn.Module):
         self.dropout = nn.Dropout(dropout)
         self.norm_out = LayerNorm(d_model)
 
-    def forward(self, x, att_mask=None, pos_emb=None, pad_mask=None):
+    def forward(self, x, att_mask=None, pos_emb=None, pad_mask=None, att_cache=None, conv_cache=None):
         """
         Args:
             x (torch.Tensor): input signals (B, T, d_model)
-            att_mask (torch.Tensor): attention masks(B, T, T)
+            att_mask (torch.Tensor): attention masks(B, T, T), or (B, T, cache_size + T) with caches
             pos_emb (torch.Tensor): (L, 1, d_model)
             pad_mask (torch.tensor): padding mask
+            att_cache (torch.Tensor): optional (2, B, n_heads, cache_size, d_model // n_heads) keys and values of
+                the previous frames, used for streaming together with conv_cache
+            conv_cache (torch.Tensor): optional (B, d_model, conv_kernel_size - 1) inputs of the depthwise
+                convolution at the previous frames, requires causal_conv
         Returns:
             x (torch.Tensor): (B, T, d_model)
+            att_cache (torch.Tensor), conv_cache (torch.Tensor): the updated caches, only returned if they are given
         """
         residual = x
         x = self.norm_feed_forward1(x)
@@ -96,16 +103,21 @@ class ConformerLayer(torch.nn.Module):
         residual = x
         x = self.norm_self_att(x)
         if self.self_attention_model == 'rel_pos':
-            x = self.self_attn(query=x, key=x, value=x, mask=att_mask, pos_emb=pos_emb)
+            x = self.self_attn(query=x, key=x, value=x, mask=att_mask, pos_emb=pos_emb, cache=att_cache)
         elif self.self_attention_model == 'abs_pos':
-            x = self.self_attn(query=x, key=x, value=x, mask=att_mask)
+            x = self.self_attn(query=x, key=x, value=x, mask=att_mask, cache=att_cache)
         else:
             x = None
+        if att_cache is not None:
+            x, att_cache = x
         x = self.dropout(x) + residual
 
         residual = x
         x = self.norm_conv(x)
-        x = self.conv(x, pad_mask)
+        if conv_cache is not None:
+            x, conv_cache = self.conv(x, pad_mask, cache=conv_cache)
+        else:
+            x = self.conv(x, pad_mask)
         x = self.dropout(x) + residual
 
         residual = x
@@ -114,6 +126,8 @@ class ConformerLayer(torch.nn.Module):
         x = self.fc_factor * self.dropout(x) + residual
 
         x = self.norm_out(x)
+        if att_cache is not None or conv_cache is not None:
+            return x, att_cache, conv_cache
         return x
 
 
@@ -122,12 +136,16 @@ class ConformerConvolution(nn.Module):
     Args:
         d_model (int): hidden dimension
         kernel_size (int): kernel size for depthwise convolution
+        causal (bool): whether the depthwise convolution only looks at the current and past frames, which allows to
+            process a stream chunk by chunk with a cache of the last kernel_size - 1 frames
     """
 
-    def __init__(self, d_model, kernel_size):
+    def __init__(self, d_model, kernel_size, causal=False):
         super(ConformerConvolution, self).__init__()
         assert (kernel_size - 1) % 2 == 0
         self.d_model = d_model
+        self.kernel_size = kernel_size
+        self.causal = causal
 
         self.pointwise_conv1 = nn.Conv1d(
             in_channels=d_model, out_channels=d_model * 2, kernel_size=1, stride=1, padding=0, bias=True
@@ -137,7 +155,7 @@ class ConformerConvolution(nn.Module):
             out_channels=d_model,
             kernel_size=kernel_size,
             stride=1,
-            padding=(kernel_size - 1) // 2,
+            padding=0 if causal else (kernel_size - 1) // 2,
             groups=d_model,
             bias=True,
         )
@@ -147,7 +165,17 @@ class ConformerConvolution(nn.Module):
             in_channels=d_model, out_channels=d_model, kernel_size=1, stride=1, padding=0, bias=True
         )
 
-    def forward(self, x, pad_mask=None):
+    def forward(self, x, pad_mask=None, cache=None):
+        """
+        Args:
+            x (torch.Tensor): (B, T, d_model)
+            pad_mask (torch.Tensor): optional (B, T) padding mask
+            cache (torch.Tensor): optional (B, d_model, kernel_size - 1) inputs of the depthwise convolution at the
+                previous frames, only supported by causal convolutions
+        Returns:
+            x (torch.Tensor): (B, T, d_model)
+            cache (torch.Tensor): the updated cache, only returned if `cache` is given
+        """
         x = x.transpose(1, 2)
         x = self.pointwise_conv1(x)
         x = nn.functional.glu(x, dim=1)
@@ -155,11 +183,21 @@ class ConformerConvolution(nn.Module):
         if pad_mask is not None:
             x.masked_fill_(pad_mask.unsqueeze(1), 0.0)
 
+        if cache is not None:
+            if not self.causal:
+                raise ValueError("Only causal convolutions can be computed with a cache.")
+            x = torch.cat([cache, x], dim=-1)
+            cache = x[:, :, x.size(-1) - (self.kernel_size - 1) :]
+        elif self.causal:
+            x = nn.functional.pad(x, pad=(self.kernel_size - 1, 0))
+
         x = self.depthwise_conv(x)
         x = self.batch_norm(x)
         x = self.activation(x)
         x = self.pointwise_conv2(x)
         x = x.transpose(1, 2)
+        if cache is not None:
+            return x, cache
         return x
 
 
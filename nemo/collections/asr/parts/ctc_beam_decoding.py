@@ -0,0 +1,375 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+import multiprocessing
+import weakref
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nemo.utils import logging
+
+__all__ = ['NGramLanguageModel', 'CTCPrefixBeamSearch']
+
+LOG_10 = math.log(10.0)
+
+
+class NGramLanguageModel:
+    """Word level back-off n-gram language model read from an ARPA file.
+
+    Args:
+        arpa_path: Path to the ARPA file of the language model.
+        unk_log10_prob: log10 probability of words missing from the model, used if it has no `<unk>` entry.
+    """
+
+    def __init__(self, arpa_path: str, unk_log10_prob: float = -10.0):
+        self.ngrams: Dict[Tuple[str, ...], Tuple[float, float]] = {}
+        self.order = 0
+
+        order = 0
+        with open(arpa_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('ngram ') or line in ('\\data\\', '\\end\\'):
+                    continue
+                if line.startswith('\\') and line.endswith('-grams:'):
+                    order = int(line[1 : line.index('-')])
+                    self.order = max(self.order, order)
+                    continue
+                if order == 0:
+                    continue
+
+                fields = line.split()
+                log10_prob = float(fields[0])
+                words = tuple(fields[1 : order + 1])
+                backoff = float(fields[order + 1]) if len(fields) > order + 1 else 0.0
+                self.ngrams[words] = (log10_prob, backoff)
+
+        if self.order == 0:
+            raise ValueError(f"No n-gram found in {arpa_path}")
+
+        self.unk_log10_prob = self.ngrams[('<unk>',)][0] if ('<unk>',) in self.ngrams else unk_log10_prob
+        logging.info(f"Loaded {self.order}-gram language model with {len(self.ngrams)} n-grams from {arpa_path}")
+
+    def log10_prob(self, words: Tuple[str, ...]) -> float:
+        """Returns the log10 probability of the last of `words` given the previous ones, with back-off."""
+        words = words[-self.order :]
+        log10_backoff = 0.0
+        while True:
+            entry = self.ngrams.get(words)
+            if entry is not None:
+                return log10_backoff + entry[0]
+            if len(words) == 1:
+                return log10_backoff + self.unk_log10_prob
+
+            context = self.ngrams.get(words[:-1])
+            if context is not None:
+                log10_backoff += context[1]
+            words = words[1:]
+
+    def score(self, context: Tuple[str, ...], word: str) -> float:
+        """Returns the natural log probability of `word` following the `context` words."""
+        return self.log10_prob(context + (word,)) * LOG_10
+
+
+class _PrefixTree:
+    # Prefixes of the beams are nodes of a tree, indexed by int ids. Every node stores its text score: the weighted
+    # language model score and word insertion bonus of its completed words, and the hotword bonus of its words.
+    def __init__(self):
+        self.parent = [-1]
+        self.label = [-1]
+        self.text_score = [0.0]
+        self.context = [('<s>',)]
+        self.partial = ['']
+        self.partial_bonus = [0.0]
+        self.children: Dict[Tuple[int, int], int] = {}
+
+    def labels(self, node: int) -> List[int]:
+        labels = []
+        while node > 0:
+            labels.append(self.label[node])
+            node = self.parent[node]
+        return labels[::-1]
+
+
+class CTCPrefixBeamSearch:
+    """CTC prefix beam search over the log probabilities of a character based CTC model.
+
+    For every frame, the labels are pruned to the `cutoff_top_n` most likely ones whose cumulative probability is
+    within `cutoff_prob`, and the scores of all the extensions of all the beams are computed at once with numpy.
+    Prefixes which end with the same labels are merged, as in the `ctc_decoders` package.
+
+    When a word is completed, i.e. a space is appended or the search ends, the prefix is scored with
+    `alpha * log P_lm(word | previous words) + beta` if a language model is given, and hotwords add `hotword_weight`
+    for every occurrence. Partially decoded words which are the beginning of a hotword get the matching fraction of
+    the bonus, so that the beam keeps them.
+
+    Args:
+        vocab: List of the characters of the model, excluding the CTC blank which is the last label.
+        beam_width: Number of prefixes kept after every frame.
+        alpha: Weight of the language model.
+        beta: Bonus of every word, when a language model is used.
+        lm_path: Optional path to an ARPA file of a word level n-gram language model.
+        cutoff_prob: Cumulative probability of the labels kept for every frame, 1.0 disables this pruning.
+        cutoff_top_n: Maximum number of labels kept for every frame.
+        hotwords: Optional list of words to boost. Phrases are boosted word by word.
+        hotword_weight: Log score added for every hotword of a prefix.
+        num_processes: Number of processes which decode the utterances of a batch in parallel. The process pool is
+            created on the first batch and reused by the following ones, until `close` is called or the decoder is
+            garbage collected. Workers are spawned and get a pickled copy of the decoder when the pool is created,
+            so `close` has to be called for changes of its parameters to reach them.
+    """
+
+    def __init__(
+        self,
+        vocab: Sequence[str],
+        beam_width: int = 32,
+        alpha: float = 0.5,
+        beta: float = 1.0,
+        lm_path: Optional[str] = None,
+        cutoff_prob: float = 1.0,
+        cutoff_top_n: int = 40,
+        hotwords: Optional[Sequence[str]] = None,
+        hotword_weight: float = 5.0,
+        num_processes: int = 1,
+    ):
+        if beam_width < 1:
+            raise ValueError(f"`beam_width` must be positive, got {beam_width}")
+
+        self.vocab = list(vocab)
+        self.blank_id = len(self.vocab)
+        self.space_id = self.vocab.index(' ') if ' ' in self.vocab else -1
+        self.beam_width = beam_width
+        self.alpha = alpha
+        self.beta = beta
+        self.cutoff_prob = cutoff_prob
+        self.cutoff_top_n = cutoff_top_n
+        self.num_processes = num_processes
+        self.lm = NGramLanguageModel(lm_path) if lm_path is not None else None
+        self._pool = None
+        self._pool_finalizer = None
+
+        self.hotword_weight = hotword_weight
+        self.hotwords = set()
+        self._hotword_prefixes: Dict[str, float] = {}
+        for hotword in hotwords or []:
+            for word in hotword.split():
+                self.hotwords.add(word)
+                for end in range(1, len(word) + 1):
+                    ratio = end / len(word)
+                    self._hotword_prefixes[word[:end]] = max(self._hotword_prefixes.get(word[:end], 0.0), ratio)
+
+    def _word_score(self, context: Tuple[str, ...], word: str) -> float:
+        score = 0.0
+        if self.lm is not None:
+            score += self.alpha * self.lm.score(context, word) + self.beta
+        if word in self.hotwords:
+            score += self.hotword_weight
+        return score
+
+    def _space_delta(self, tree: _PrefixTree, node: int) -> float:
+        # Change of the text score when a space completes the partial word of the prefix
+        partial = tree.partial[node]
+        if not partial:
+            return 0.0
+        return self._word_score(tree.context[node], partial) - tree.partial_bonus[node]
+
+    def _extend(self, tree: _PrefixTree, node: int, label: int) -> int:
+        key = (node, label)
+        child = tree.children.get(key)
+        if child is not None:
+            return child
+
+        context, partial = tree.context[node], tree.partial[node]
+        text_score = tree.text_score[node]
+        if label == self.space_id:
+            text_score += self._space_delta(tree, node)
+            if partial and self.lm is not None:
+                context = (context + (partial,))[-max(self.lm.order - 1, 1) :]
+            partial, partial_bonus = '', 0.0
+        else:
+            partial = partial + self.vocab[label]
+            partial_bonus = self.hotword_weight * self._hotword_prefixes.get(partial, 0.0)
+            text_score += partial_bonus - tree.partial_bonus[node]
+
+        child = len(tree.parent)
+        tree.children[key] = child
+        tree.parent.append(node)
+        tree.label.append(label)
+        tree.text_score.append(text_score)
+        tree.context.append(context)
+        tree.partial.append(partial)
+        tree.partial_bonus.append(partial_bonus)
+        return child
+
+    def _final_score(self, tree: _PrefixTree, node: int) -> float:
+        # Complete the last word and the sentence
+        context, partial = tree.context[node], tree.partial[node]
+        score = tree.text_score[node] + self._space_delta(tree, node)
+        if self.lm is not None:
+            if partial:
+                context = context + (partial,)
+            score += self.alpha * self.lm.score(context, '</s>')
+        return score
+
+    def _pruned_labels(self, log_probs: np.ndarray) -> np.ndarray:
+        top_n = min(self.cutoff_top_n, log_probs.shape[0])
+        labels = np.argpartition(-log_probs, top_n - 1)[:top_n]
+        labels = labels[np.argsort(-log_probs[labels])]
+        if self.cutoff_prob < 1.0:
+            cumulative = np.cumsum(np.exp(log_probs[labels]))
+            labels = labels[: int(np.searchsorted(cumulative, self.cutoff_prob)) + 1]
+        return labels[labels != self.blank_id]
+
+    def _text_deltas(self, tree: _PrefixTree, nodes: List[int], labels: np.ndarray) -> np.ndarray:
+        # Change of the text score of every extension of every beam, non-zero for spaces and hotword characters
+        deltas = np.zeros([len(nodes), len(labels)])
+        space_columns = np.nonzero(labels == self.space_id)[0]
+        if len(space_columns) > 0 and (self.lm is not None or self.hotwords):
+            deltas[:, space_columns[0]] = [self._space_delta(tree, node) for node in nodes]
+
+        if self.hotwords:
+            columns = {label: column for column, label in enumerate(labels.tolist())}
+            for beam, node in enumerate(nodes):
+                partial, partial_bonus = tree.partial[node], tree.partial_bonus[node]
+                for label, column in columns.items():
+                    if label != self.space_id:
+                        ratio = self._hotword_prefixes.get(partial + self.vocab[label], 0.0)
+                        deltas[beam, column] = self.hotword_weight * ratio - partial_bonus
+        return deltas
+
+    def decode(self, log_probs: np.ndarray) -> List[Tuple[float, str]]:
+        """Decodes the [T, V + 1] log probabilities of one utterance.
+
+        Returns:
+            List of up to `beam_width` tuples of (score, text), best first.
+        """
+        tree = _PrefixTree()
+        blank_id = self.blank_id
+        column_of_label = np.full(blank_id + 2, -1)
+
+        # Beams: prefix node ids, and log probabilities of the prefix ending with a blank / with its last label
+        nodes = [0]
+        p_blank = np.zeros(1)
+        p_label = np.full(1, -np.inf)
+
+        for frame in np.asarray(log_probs, dtype=np.float64):
+            labels = self._pruned_labels(frame)
+            num_beams, num_labels = len(nodes), len(labels)
+            p_total = np.logaddexp(p_blank, p_label)
+            last = np.array([tree.label[node] for node in nodes])
+            text = np.array([tree.text_score[node] for node in nodes])
+
+            # Extensions of every beam with every pruned label. A repeated label only extends the prefix after a blank
+            extend = np.where(last[:, None] == labels[None, :], p_blank[:, None], p_total[:, None]) + frame[labels]
+
+            # Same prefix: ends with a blank, or collapses a repeated label
+            stay_blank = p_total + frame[blank_id]
+            stay_label = np.where(last >= 0, p_label + frame[last], -np.inf)
+
+            # Extensions which are prefixes of other beams are merged into them
+            column_of_label[labels] = np.arange(num_labels)
+            beam_of_node = {node: beam for beam, node in enumerate(nodes)}
+            parent_beam = np.array([beam_of_node.get(tree.parent[node], -1) for node in nodes])
+            column = column_of_label[last]
+            merged = np.nonzero((parent_beam >= 0) & (column >= 0))[0]
+            if len(merged) > 0:
+                rows, columns = parent_beam[merged], column[merged]
+                stay_label[merged] = np.logaddexp(stay_label[merged], extend[rows, columns])
+                extend[rows, columns] = -np.inf
+            column_of_label[labels] = -1
+
+            # Keep the best of the beams and their extensions
+            scores = np.concatenate(
+                [
+                    np.logaddexp(stay_blank, stay_label) + text,
+                    (extend + text[:, None] + self._text_deltas(tree, nodes, labels)).ravel(),
+                ]
+            )
+            best = np.nonzero(scores > -np.inf)[0]
+            if len(best) > self.beam_width:
+                best = best[np.argpartition(-scores[best], self.beam_width - 1)[: self.beam_width]]
+
+            new_nodes, new_blank, new_label = [], [], []
+            for index in best.tolist():
+                if index < num_beams:
+                    new_nodes.append(nodes[index])
+                    new_blank.append(stay_blank[index])
+                    new_label.append(stay_label[index])
+                else:
+                    beam, column = divmod(index - num_beams, num_labels)
+                    new_nodes.append(self._extend(tree, nodes[beam], int(labels[column])))
+                    new_blank.append(-np.inf)
+                    new_label.append(extend[beam, column])
+            nodes, p_blank, p_label = new_nodes, np.array(new_blank), np.array(new_label)
+
+        p_total = np.logaddexp(p_blank, p_label)
+        results = [
+            (float(score + self._final_score(tree, node)), ''.join(self.vocab[label] for label in tree.labels(node)))
+            for node, score in zip(nodes, p_total)
+        ]
+        return sorted(results, key=lambda result: result[0], reverse=True)
+
+    def decode_batch(
+        self, log_probs: Sequence[np.ndarray], log_probs_length: Optional[Sequence[int]] = None
+    ) -> List[List[Tuple[float, str]]]:
+        """Decodes a batch of [T, V + 1] log probabilities, in parallel if `num_processes` > 1.
+
+        Args:
+            log_probs: Array of shape [B, T, V + 1], or list of [T_i, V + 1] arrays.
+            log_probs_length: Optional number of valid frames of every utterance.
+
+        Returns:
+            List of the decoded beams of every utterance, see `decode`.
+        """
+        if log_probs_length is not None:
+            log_probs = [utterance[:length] for utterance, length in zip(log_probs, log_probs_length)]
+        log_probs = [np.asarray(utterance) for utterance in log_probs]
+
+        if self.num_processes <= 1 or len(log_probs) <= 1:
+            return [self.decode(utterance) for utterance in log_probs]
+
+        if self._pool is None:
+            # Workers get the decoder, including its language model, once. They are spawned rather than forked,
+            # since forking a process which already runs torch or Numba threads can deadlock.
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(processes=self.num_processes, initializer=_init_worker, initargs=(self,))
+            self._pool_finalizer = weakref.finalize(self, self._pool.terminate)
+        return self._pool.map(_decode_in_worker, log_probs)
+
+    def close(self):
+        """Terminates the worker processes, if any. A new pool is created by the next parallel `decode_batch`."""
+        if self._pool_finalizer is not None:
+            self._pool_finalizer()
+        self._pool = None
+        self._pool_finalizer = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_finalizer'] = None
+        return state
+
+
+_worker_decoder = None
+
+
+def _init_worker(decoder: CTCPrefixBeamSearch):
+    global _worker_decoder
+    _worker_decoder = decoder
+
+
+def _decode_in_worker(log_probs: np.ndarray) -> List[Tuple[float, str]]:
+    return _worker_decoder.decode(log_probs)
@@ -0,0 +1,120 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import os
+from typing import Dict, List
+
+import numpy as np
+
+__all__ = ['FeatureStoreWriter', 'load_features']
+
+# Maximum number of memory-mapped shards kept open by `load_features` in a process.
+_MAX_OPEN_SHARDS = 128
+
+
+@functools.lru_cache(maxsize=_MAX_OPEN_SHARDS)
+def _open_shard(feature_file: str) -> np.ndarray:
+    # The least recently used shards are dropped from the cache, and unmapped once no returned view refers to them.
+    return np.load(feature_file, mmap_mode='r')
+
+
+def load_features(feature_file: str, offset: int, length: int) -> np.ndarray:
+    """Reads the [D, T] features of one utterance from a shard written by `FeatureStoreWriter`.
+
+    Shards are opened with `mmap_mode='r'` and the last `_MAX_OPEN_SHARDS` of them are kept open per process, so
+    only the pages of the requested frames are read and dataloader workers share the page cache.
+
+    Args:
+        feature_file: Path to the `.npy` shard.
+        offset: Index of the first frame of the utterance in the shard.
+        length: Number of frames of the utterance.
+
+    Returns:
+        A read-only [D, T] view of the features in the storage dtype of the shard.
+    """
+    return _open_shard(feature_file)[offset : offset + length].T
+
+
+class FeatureStoreWriter:
+    """Writes per-utterance [D, T] features into a sharded store readable with `load_features`.
+
+    Every shard is a single `.npy` array of shape [total frames, D] holding the frames of `shard_size` consecutive
+    utterances back to back, so that each utterance is a contiguous span of the memory-mapped file. `add` returns
+    the location of the utterance, which is stored in the manifest as `feature_filepath`, `feature_offset` and
+    `feature_length`.
+
+    Args:
+        output_dir: Directory to write the shards to.
+        shard_size: Number of utterances per shard.
+        dtype: Storage dtype of the features, e.g. `float16` to halve the size of the store.
+        prefix: File name prefix of the shards.
+    """
+
+    def __init__(self, output_dir: str, shard_size: int = 10000, dtype: str = 'float16', prefix: str = 'features'):
+        if shard_size <= 0:
+            raise ValueError(f"`shard_size` must be positive, got {shard_size}")
+
+        self.output_dir = os.path.abspath(os.path.expanduser(output_dir))
+        self.shard_size = shard_size
+        self.dtype = np.dtype(dtype)
+        self.prefix = prefix
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        self.shard_paths: List[str] = []
+        self._shard_id = 0
+        self._frames: List[np.ndarray] = []
+        self._num_frames = 0
+
+    def _shard_path(self, shard_id: int) -> str:
+        return os.path.join(self.output_dir, f'{self.prefix}_{shard_id:05d}.npy')
+
+    def add(self, features: np.ndarray) -> Dict[str, object]:
+        """Appends the [D, T] features of one utterance and returns its location in the store."""
+        location = dict(
+            feature_filepath=self._shard_path(self._shard_id),
+            feature_offset=self._num_frames,
+            feature_length=features.shape[-1],
+        )
+        self._frames.append(np.ascontiguousarray(features.T, dtype=self.dtype))
+        self._num_frames += features.shape[-1]
+
+        if len(self._frames) == self.shard_size:
+            self.flush()
+        return location
+
+    def flush(self):
+        """Writes the current shard, if it holds any utterance, and starts a new one."""
+        if not self._frames:
+            return
+
+        path = self._shard_path(self._shard_id)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.concatenate(self._frames, axis=0))
+        os.replace(tmp_path, path)
+
+        self.shard_paths.append(path)
+        self._shard_id += 1
+        self._frames = []
+        self._num_frames = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -97,15 +97,25 @@ def splice_frames(x, frame_splicing):
 
 
 class WaveformFeaturizer(object):
-    def __init__(self, sample_rate=16000, int_values=False, augmentor=None):
+    def __init__(self, sample_rate=16000, int_values=False, augmentor=None, cache=None):
         self.augmentor = augmentor if augmentor is not None else AudioAugmentor()
         self.sample_rate = sample_rate
         self.int_values = int_values
+        # Optional DecodedAudioCache of the samples before augmentation.
+        self.cache = cache
 
     def max_augmentation_length(self, length):
         return self.augmentor.max_augmentation_length(length)
 
     def process(self, file_path, offset=0, duration=0, trim=False, orig_sr=None):
+        key = None
+        if self.cache is not None and isinstance(file_path, str):
+            key = self.cache.make_key(file_path, offset, duration, self.sample_rate, self.int_values, trim)
+            samples = self.cache.get(key)
+            if samples is not None:
+                audio = AudioSegment(samples, self.sample_rate, orig_sr=orig_sr)
+                return self.process_segment(audio)
+
         audio = AudioSegment.from_file(
             file_path,
             target_sr=self.sample_rate,
@@ -115,6 +125,8 @@ class WaveformFeaturizer(object):
             trim=trim,
             orig_sr=orig_sr,
         )
+        if key is not None:
+            self.cache.put(key, audio.samples)
         return self.process_segment(audio)
 
     def process_segment(self, audio_segment):
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 
+from dataclasses import dataclass, field
 from typing import Callable, List, Optional, Tuple
 
 import torch
@@ -76,6 +77,82 @@ def get_same_padding(kernel_size, stride, dilation):
     return kernel_size // 2
 
 
+@dataclass
+class JasperBlockStreamingState:
+    """Buffers of a JasperBlock which processes a stream chunk by chunk, see `JasperBlock.stream_step`.
+
+    conv_buffers: For every convolution of the block, the received input frames which are needed by its next
+        outputs, starting with the left padding. None before the first chunk.
+
+    res_conv_buffers: Same as conv_buffers, for the convolution of every residual branch.
+
+    res_pending: Outputs of every residual branch which wait for the corresponding outputs of the convolutions, which
+        are delayed by their right padding.
+
+    se_sum: (batch, channels) sum over the frames seen so far of the input of the squeeze and excitation.
+
+    se_count: Number of frames in se_sum.
+    """
+
+    conv_buffers: List[Optional[Tensor]]
+    res_conv_buffers: List[Optional[Tensor]] = field(default_factory=list)
+    res_pending: List[Optional[Tensor]] = field(default_factory=list)
+    se_sum: Optional[Tensor] = None
+    se_count: int = 0
+
+
+def stream_conv1d(conv: nn.Module, x: Tensor, buffer: Optional[Tensor], flush: bool = False):
+    """Applies a `MaskedConv1d` or `nn.Conv1d` with symmetric padding to the next chunk of a stream.
+
+    The input frames are appended to the buffer of the previous chunks, and all the outputs whose input window was
+    fully received are computed, so that concatenating the outputs of all chunks gives the output of the convolution
+    on the whole stream.
+
+    Args:
+        conv: The convolution.
+        x: (batch, channels, time) next chunk of the stream.
+        buffer: The buffer returned for the previous chunk, or None for the first chunk.
+        flush: Whether this is the last chunk of the stream, in which case the right padding is appended.
+
+    Returns:
+        A tuple of the (batch, out channels, time) new outputs, and the buffer for the next chunk.
+    """
+    heads = -1
+    if isinstance(conv, MaskedConv1d):
+        heads, out_channels = conv.heads, conv.real_out_channels
+        conv = conv.conv
+    else:
+        out_channels = conv.out_channels
+
+    padding = conv.padding[0]
+    if buffer is None:
+        buffer = x.new_zeros(x.size(0), x.size(1), padding)
+    x = torch.cat([buffer, x], dim=-1)
+    if flush:
+        x = nn.functional.pad(x, (0, padding))
+
+    span = conv.dilation[0] * (conv.kernel_size[0] - 1)
+    stride = conv.stride[0]
+    num_outputs = max((x.size(-1) - span - 1) // stride + 1, 0)
+    if not flush:
+        # The frames skipped by the stride after the last output have to be received first
+        num_outputs = min(num_outputs, x.size(-1) // stride)
+    buffer = x[:, :, num_outputs * stride :]
+    if num_outputs == 0:
+        return x.new_zeros(x.size(0), out_channels, 0), buffer
+
+    x = x[:, :, : (num_outputs - 1) * stride + span + 1]
+    sh = x.shape
+    if heads != -1:
+        x = x.reshape(-1, heads, sh[-1])
+
+    out = nn.functional.conv1d(x, conv.weight, conv.bias, conv.stride, 0, conv.dilation, conv.groups)
+
+    if heads != -1:
+        out = out.view(sh[0], out_channels, -1)
+    return out, buffer
+
+
 class StatsPoolLayer(nn.Module):
     def __init__(self, feat_in, pool_mode='xvector'):
         super().__init__()
@@ -244,7 +321,8 @@ class SqueezeExcite(nn.Module):
             reduction_ratio: Reduction ratio for "squeeze" layer.
             context_window: Integer number of timesteps that the context
                 should be computed over, using stride 1 average pooling.
-                If value < 1, then global context is computed.
+                If value < 1, then global context is computed, over the
+                valid frames of every sequence when their lengths are given.
             interpolation_mode: Interpolation mode of timestep dimension.
                 Used only if context window is > 1.
                 The modes available for resizing are: `nearest`, `linear` (3D-only),
@@ -298,10 +376,16 @@ class SqueezeExcite(nn.Module):
                 nn.Linear(channels // reduction_ratio, channels, bias=False),
             )
 
-    def forward(self, x):
+    def forward(self, x, lengths: Optional[Tensor] = None):
         # The use of negative indices on the transpose allow for expanded SqueezeExcite
         batch, channels, timesteps = x.size()[:3]
-        y = self.pool(x)  # [B, C, T - context_window + 1]
+        if lengths is not None and self.context_window <= 0:
+            # Global context of the valid frames only, so that it does not depend on the padding of the batch
+            mask = torch.arange(timesteps, device=x.device).unsqueeze(0) < lengths.to(x.device).unsqueeze(1)
+            scale = timesteps / lengths.to(device=x.device, dtype=x.dtype).clamp(min=1)
+            y = self.pool(x.masked_fill(~mask.unsqueeze(1), 0.0)) * scale.view(-1, 1, 1)  # [B, C, 1]
+        else:
+            y = self.pool(x)  # [B, C, T - context_window + 1]
         y = y.transpose(1, -1)  # [B, T - context_window + 1, C]
         y = self.fc(y)  # [B, T - context_window + 1, C]
         y = y.transpose(1, -1)  # [B, C, T - context_window + 1]
@@ -313,9 +397,37 @@ class SqueezeExcite(nn.Module):
 
         return x * y
 
+    def stream_step(self, x, se_sum: Optional[Tensor], se_count: int):
+        """Scales the next chunk of a stream with the average of the frames seen so far.
+
+        This approximates the global context of `forward`, which is not known until the end of the stream.
+
+        Args:
+            x: (batch, channels, time) next chunk of the stream.
+            se_sum: (batch, channels) sum of the previous frames, or None for the first chunk.
+            se_count: Number of previous frames.
+
+        Returns:
+            A tuple of the scaled chunk, the sum and the number of frames seen so far.
+        """
+        if self.context_window > 0:
+            raise ValueError("Only squeeze and excitation with a global context can be applied to a stream.")
+        if se_sum is None:
+            se_sum = x.new_zeros(x.shape[:2])
+
+        timesteps = x.size(-1)
+        if timesteps == 0:
+            return x, se_sum, se_count
+
+        cumsum = se_sum.unsqueeze(-1) + torch.cumsum(x, dim=-1)
+        counts = torch.arange(se_count + 1, se_count + timesteps + 1, dtype=x.dtype, device=x.device)
+        y = self.fc((cumsum / counts).transpose(1, -1)).transpose(1, -1)  # [B, C, T]
+        y = torch.sigmoid(y)
+        return x * y, cumsum[:, :, -1], se_count + timesteps
+
 
 class JasperBlock(nn.Module):
-    __constants__ = ["conv_mask", "separable", "residual_mode", "res", "mconv"]
+    __constants__ = ["conv_mask", "se_mask_padding", "separable", "residual_mode", "res", "mconv"]
 
     def __init__(
         self,
@@ -344,6 +456,7 @@ class JasperBlock(nn.Module):
         se_interpolation_mode='nearest',
         stride_last=False,
         quantize=False,
+        se_mask_padding=False,
     ):
         super(JasperBlock, self).__init__()
 
@@ -358,6 +471,8 @@ class JasperBlock(nn.Module):
 
         padding_val = get_same_padding(kernel_size[0], stride[0], dilation[0])
         self.conv_mask = conv_mask
+        # Squeeze-and-excitation pools over the valid frames only, instead of the padded length of the batch
+        self.se_mask_padding = se_mask_padding
         self.separable = separable
         self.residual_mode = residual_mode
         self.se = se
@@ -467,6 +582,72 @@ class JasperBlock(nn.Module):
 
         self.mout = nn.Sequential(*self._get_act_dropout_layer(drop_prob=dropout, activation=activation))
 
+    def get_initial_cache_state(self) -> JasperBlockStreamingState:
+        """Returns the state of `stream_step` at the start of a stream."""
+        if self.quantize:
+            raise ValueError("Quantized blocks cannot be applied to a stream.")
+        num_convs = sum(isinstance(l, (MaskedConv1d, nn.Conv1d)) for l in self.mconv)
+        num_panes = len(self.res) if self.res is not None else 0
+        return JasperBlockStreamingState(
+            conv_buffers=[None] * num_convs, res_conv_buffers=[None] * num_panes, res_pending=[None] * num_panes
+        )
+
+    def stream_step(
+        self, xs: List[Tensor], state: JasperBlockStreamingState, flush: bool = False
+    ) -> Tuple[List[Tensor], JasperBlockStreamingState]:
+        """Applies the block to the next chunk of a stream, see `stream_conv1d`.
+
+        The block is in eval mode, and every convolution keeps the input frames its next outputs depend on in
+        `state`, so that the outputs of all chunks are the outputs of `forward` on the whole stream. Squeeze and
+        excitation is approximated, see `SqueezeExcite.stream_step`.
+
+        Args:
+            xs: The new frames of the inputs of the block, of different lengths with dense residual connections.
+            state: The state of the previous chunk, or of `get_initial_cache_state`. Updated in place.
+            flush: Whether this is the last chunk of the stream.
+
+        Returns:
+            A tuple of the new frames of the outputs of the block, and its state.
+        """
+        out = xs[-1]
+        conv_idx = 0
+        for l in self.mconv:
+            if isinstance(l, (MaskedConv1d, nn.Conv1d)):
+                out, state.conv_buffers[conv_idx] = stream_conv1d(l, out, state.conv_buffers[conv_idx], flush)
+                conv_idx += 1
+            elif isinstance(l, SqueezeExcite):
+                out, state.se_sum, state.se_count = l.stream_step(out, state.se_sum, state.se_count)
+            elif out.size(-1) > 0:
+                out = l(out)
+
+        if self.res is not None:
+            for i, layer in enumerate(self.res):
+                res_out = xs[i]
+                for res_layer in layer:
+                    if isinstance(res_layer, (MaskedConv1d, nn.Conv1d)):
+                        res_out, state.res_conv_buffers[i] = stream_conv1d(
+                            res_layer, res_out, state.res_conv_buffers[i], flush
+                        )
+                    elif res_out.size(-1) > 0:
+                        res_out = res_layer(res_out)
+
+                # The residual branch has no padding, it is aligned with the delayed output of the convolutions
+                if state.res_pending[i] is not None:
+                    res_out = torch.cat([state.res_pending[i], res_out], dim=-1)
+                res_out, state.res_pending[i] = res_out[:, :, : out.size(-1)], res_out[:, :, out.size(-1) :]
+
+                if self.residual_mode == 'add' or self.residual_mode == 'stride_add':
+                    out = out + res_out
+                else:
+                    out = torch.max(out, res_out)
+
+        if out.size(-1) > 0:
+            out = self.mout(out)
+        if self.res is not None and self.dense_residual:
+            return xs + [out], state
+
+        return [out], state
+
     def _get_conv(
         self,
         in_channels,
@@ -625,6 +806,9 @@ class JasperBlock(nn.Module):
             # if (i % 4) == 0 and self.conv_mask:
             if isinstance(l, MaskedConv1d):
                 out, lens = l(out, lens)
+            elif isinstance(l, SqueezeExcite):
+                # Lengths are only updated by masked convolutions
+                out = l(out, lens if self.conv_mask and self.se_mask_padding else None)
             else:
                 out = l(out)
 
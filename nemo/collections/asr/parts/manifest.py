@@ -75,6 +75,19 @@ def item_iter(
                 yield item
 
 
+def parse_item(line: str, manifest_file: Optional[str] = None) -> Dict[str, Any]:
+    """Parses a single json line of an ASR manifest, see `item_iter` for the expected structure.
+
+    Args:
+        line: A single json line of a manifest.
+        manifest_file: Optional path of the manifest the line belongs to, used in error messages.
+
+    Returns:
+        Parsed key to value item dict (without the 'id' key).
+    """
+    return __parse_item(line, manifest_file)
+
+
 def __parse_item(line: str, manifest_file: str) -> Dict[str, Any]:
     item = json.loads(line)
 
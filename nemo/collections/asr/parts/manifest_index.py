@@ -0,0 +1,242 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from nemo.collections.asr.parts import manifest
+from nemo.utils import logging
+
+__all__ = ['ManifestIndex', 'file_id_hash']
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.idx'
+
+
+def file_id_hash(file_id: str) -> int:
+    """Returns a stable 64-bit hash of an audio file ID (audio filename without directory and extension)."""
+    return int.from_bytes(hashlib.blake2b(file_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _file_id(audio_file: str) -> str:
+    file_id, _ = os.path.splitext(os.path.basename(audio_file))
+    return file_id
+
+
+class ManifestIndex:
+    """Compiled, memory-mapped columnar index of a single ASR json lines manifest.
+
+    The index is a directory next to the manifest (or inside `index_dir`) holding one NumPy array per column:
+
+        - `line_starts` / `line_ends` (int64): byte span of every non-empty json line in the manifest.
+        - `durations` (float64): duration of every line, used for filtering and bucketing.
+        - `file_id_hashes` (uint64): 64-bit hash of the audio file ID, used for tarred lookups by file ID.
+        - `sorted_file_id_hashes` (uint64) / `file_id_order` (int64): the hashes in increasing order and the rows
+          they come from, so that lookups by file ID are binary searches in the shared pages.
+
+    Arrays are opened with `mmap_mode='r'`, so opening an index is O(1) in the number of lines and the pages are
+    shared between all dataloader workers of a node. Transcripts, speakers and other fields are not stored; they
+    are re-parsed from the manifest line on access, which keeps the index independent of the tokenizer.
+
+    The index is rebuilt automatically when the manifest size or modification time changes. `index_path` is a
+    symlink to the directory of the latest build, which is replaced atomically. The previous build is only removed
+    by the rebuild after next, so processes still reading an older build are never left with a deleted index.
+
+    Args:
+        manifest_file: Path to the json lines manifest.
+        index_dir: Optional directory to store the index in. Defaults to the directory of the manifest.
+    """
+
+    _COLUMNS = ('line_starts', 'line_ends', 'durations', 'file_id_hashes', 'sorted_file_id_hashes', 'file_id_order')
+
+    def __init__(self, manifest_file: str, index_dir: Optional[str] = None):
+        self.manifest_file = os.path.abspath(os.path.expanduser(manifest_file))
+        self.index_path = self.get_index_path(self.manifest_file, index_dir)
+
+        if not self.is_valid(self.manifest_file, self.index_path):
+            self.build(self.manifest_file, self.index_path)
+
+        self._load_columns()
+
+        # Opened lazily, per process, see `_get_buffer`.
+        self._buffer = None
+        self._buffer_pid = None
+
+    def _load_columns(self):
+        # All the columns are read from the same build. A concurrent rebuild may delete that build between resolving
+        # the link and opening the arrays, in which case the new build is read instead.
+        for attempt in range(2):
+            build_path = os.path.realpath(self.index_path)
+            try:
+                for name in self._COLUMNS:
+                    setattr(self, name, np.load(os.path.join(build_path, name + '.npy'), mmap_mode='r'))
+                return
+            except FileNotFoundError:
+                if attempt > 0:
+                    raise
+
+    @staticmethod
+    def get_index_path(manifest_file: str, index_dir: Optional[str] = None) -> str:
+        """Returns the directory the index of `manifest_file` is stored in."""
+        manifest_file = os.path.abspath(os.path.expanduser(manifest_file))
+        if index_dir is None:
+            return manifest_file + INDEX_SUFFIX
+
+        # Different manifests may share a basename, so disambiguate with a hash of the full path.
+        path_hash = hashlib.md5(manifest_file.encode('utf-8')).hexdigest()[:8]
+        return os.path.join(index_dir, f'{os.path.basename(manifest_file)}-{path_hash}{INDEX_SUFFIX}')
+
+    @staticmethod
+    def _source_meta(manifest_file: str) -> Dict[str, Any]:
+        stat = os.stat(manifest_file)
+        return dict(version=INDEX_VERSION, manifest=manifest_file, size=stat.st_size, mtime=stat.st_mtime)
+
+    @classmethod
+    def is_valid(cls, manifest_file: str, index_path: str) -> bool:
+        """Checks whether `index_path` holds an up to date index of `manifest_file`."""
+        meta_path = os.path.join(index_path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return False
+
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+
+        source_meta = cls._source_meta(manifest_file)
+        return all(meta.get(key) == source_meta[key] for key in ('version', 'size', 'mtime'))
+
+    @classmethod
+    def build(cls, manifest_file: str, index_path: str):
+        """Parses `manifest_file` once and writes its index to `index_path`.
+
+        The index is written to a new build directory first, and the `index_path` symlink is then atomically
+        replaced to point at it. The previous build is kept and the older ones are removed. Concurrent builds from
+        several ranks are safe, and readers never observe a partially written or deleted index.
+        """
+        logging.info(f"Building manifest index for {manifest_file} at {index_path}")
+        source_meta = cls._source_meta(manifest_file)
+
+        line_starts, line_ends, durations, file_id_hashes = [], [], [], []
+        with open(manifest_file, 'rb') as f:
+            position = 0
+            for line in f:
+                start, position = position, position + len(line)
+                if not line.strip():
+                    continue
+
+                item = manifest.parse_item(line.decode('utf-8'), manifest_file)
+                line_starts.append(start)
+                line_ends.append(position)
+                durations.append(item['duration'])
+                file_id_hashes.append(file_id_hash(_file_id(item['audio_file'])))
+
+        columns = dict(
+            line_starts=np.asarray(line_starts, dtype=np.int64),
+            line_ends=np.asarray(line_ends, dtype=np.int64),
+            durations=np.asarray(durations, dtype=np.float64),
+            file_id_hashes=np.asarray(file_id_hashes, dtype=np.uint64),
+        )
+        columns['file_id_order'] = np.argsort(columns['file_id_hashes'], kind='stable').astype(np.int64)
+        columns['sorted_file_id_hashes'] = columns['file_id_hashes'][columns['file_id_order']]
+
+        parent_dir = os.path.dirname(index_path)
+        os.makedirs(parent_dir, exist_ok=True)
+        build_path = tempfile.mkdtemp(prefix=os.path.basename(index_path) + '.', dir=parent_dir)
+        for name, column in columns.items():
+            np.save(os.path.join(build_path, name + '.npy'), column)
+
+        source_meta['num_lines'] = len(line_starts)
+        with open(os.path.join(build_path, 'meta.json'), 'w') as f:
+            json.dump(source_meta, f)
+
+        previous_build_path = os.path.realpath(index_path) if os.path.islink(index_path) else None
+        if os.path.isdir(index_path) and not os.path.islink(index_path):
+            # Index of a version which did not use a symlink yet, moved out of the way and reclaimed by a later build.
+            os.replace(index_path, build_path + '.stale')
+
+        link_path = build_path + '.link'
+        os.symlink(os.path.basename(build_path), link_path)
+        os.replace(link_path, index_path)
+
+        # The previous build is kept, since readers may have resolved the link to it without having opened its arrays
+        # yet. The builds it replaced are reclaimed instead.
+        if previous_build_path is not None:
+            cls._reclaim_builds(index_path, keep=(previous_build_path, build_path))
+
+        logging.info(f"Manifest index with {len(line_starts)} lines written to {index_path}")
+
+    @staticmethod
+    def _reclaim_builds(index_path: str, keep: Tuple[str, ...]):
+        """Removes the builds of `index_path` which are older than all the builds in `keep`."""
+        parent_dir = os.path.dirname(index_path)
+        oldest_kept = min(os.path.getmtime(path) for path in keep)
+        prefix = os.path.basename(index_path) + '.'
+        for name in os.listdir(parent_dir):
+            path = os.path.join(parent_dir, name)
+            if not name.startswith(prefix) or path in keep or os.path.islink(path) or not os.path.isdir(path):
+                continue
+            try:
+                # Builds of concurrent processes which are still being written are newer than the kept builds.
+                if os.path.getmtime(path) < oldest_kept:
+                    shutil.rmtree(path, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self):
+        return len(self.line_starts)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffer'] = None
+        state['_buffer_pid'] = None
+        return state
+
+    def _get_buffer(self) -> mmap.mmap:
+        # Memory maps must not be shared across forked dataloader workers, so each process opens its own.
+        if self._buffer is None or self._buffer_pid != os.getpid():
+            with open(self.manifest_file, 'rb') as f:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buffer_pid = os.getpid()
+        return self._buffer
+
+    def get_line(self, row: int) -> str:
+        """Returns the raw json line of the `row`-th manifest entry."""
+        return self._get_buffer()[self.line_starts[row] : self.line_ends[row]].decode('utf-8')
+
+    def get_item(self, row: int) -> Dict[str, Any]:
+        """Parses the `row`-th manifest entry, see `manifest.item_iter` for the structure of the returned dict."""
+        return manifest.parse_item(self.get_line(row), self.manifest_file)
+
+    def find_file_id(self, file_id: str) -> int:
+        """Returns the last row whose audio file ID equals `file_id`, or -1 if there is none."""
+        key = np.uint64(file_id_hash(file_id))
+        left = np.searchsorted(self.sorted_file_id_hashes, key, side='left')
+        right = np.searchsorted(self.sorted_file_id_hashes, key, side='right')
+        candidates = self.file_id_order[left:right]
+        if len(candidates) == 0:
+            return -1
+        if len(candidates) == 1:
+            return int(candidates[0])
+
+        # Duplicated file IDs or (very unlikely) 64-bit hash collisions: resolve by parsing the candidate lines.
+        for row in sorted(candidates, reverse=True):
+            if _file_id(self.get_item(row)['audio_file']) == file_id:
+                return int(row)
+        return -1
@@ -116,19 +116,44 @@ class MultiHeadAttention(nn.Module):
 
         return self.linear_out(x)  # (batch, time1, d_model)
 
-    def forward(self, query, key, value, mask, pos_emb=None):
+    def update_cache(self, k, v, cache):
+        """Prepends the cached keys and values to `k` and `v`, and returns the keys and values to cache next.
+        Args:
+            k (torch.Tensor): (batch, head, time2, d_k)
+            v (torch.Tensor): (batch, head, time2, d_k)
+            cache (torch.Tensor): (2, batch, head, cache_size, d_k) keys and values of the previous frames
+        returns:
+            k (torch.Tensor): (batch, head, cache_size + time2, d_k)
+            v (torch.Tensor): (batch, head, cache_size + time2, d_k)
+            cache (torch.Tensor): (2, batch, head, cache_size, d_k) keys and values of the last cache_size frames
+        """
+        cache_size = cache.size(3)
+        k = torch.cat([cache[0], k], dim=2)
+        v = torch.cat([cache[1], v], dim=2)
+        cache = torch.stack([k[:, :, k.size(2) - cache_size :], v[:, :, v.size(2) - cache_size :]])
+        return k, v, cache
+
+    def forward(self, query, key, value, mask, pos_emb=None, cache=None):
         """Compute 'Scaled Dot Product Attention'.
         Args:
             query (torch.Tensor): (batch, time1, size)
             key (torch.Tensor): (batch, time2, size)
             value(torch.Tensor): (batch, time2, size)
-            mask (torch.Tensor): (batch, time1, time2)
+            mask (torch.Tensor): (batch, time1, time2), or (batch, time1, cache_size + time2) with a cache
+            cache (torch.Tensor): optional (2, batch, head, cache_size, d_k) keys and values of the previous frames
         returns:
             output (torch.Tensor): transformed `value` (batch, time1, d_model) weighted by the query dot key attention
+            cache (torch.Tensor): the updated cache, only returned if `cache` is given
         """
         q, k, v = self.forward_qkv(query, key, value)
+        if cache is not None:
+            k, v, cache = self.update_cache(k, v, cache)
+
         scores = torch.matmul(q, k.transpose(-2, -1)) / math.sqrt(self.d_k)
-        return self.forward_attention(v, scores, mask)
+        output = self.forward_attention(v, scores, mask)
+        if cache is not None:
+            return output, cache
+        return output
 
 
 class RelPositionMultiHeadAttention(MultiHeadAttention):
@@ -161,27 +186,33 @@ class RelPositionMultiHeadAttention(MultiHeadAttention):
     def rel_shift(self, x):
         """Compute relative positional encoding.
         Args:
-            x (torch.Tensor): (batch, nheads, time, 2*time-1)
+            x (torch.Tensor): (batch, nheads, time1, time1+time2-1), where time2 is the number of keys
         """
         qlen = x.size(2)
         pos_len = x.size(-1)
+        klen = pos_len - qlen + 1
         x = x.view(x.size(0), x.size(1), -1)
         x = torch.nn.functional.pad(x, pad=(0, qlen))
         x = x.view(x.size(0), x.size(1), qlen, pos_len + 1)
-        return x[:, :, :, 0:qlen].flip(dims=[-1])
+        return x[:, :, :, 0:klen].flip(dims=[-1])
 
-    def forward(self, query, key, value, mask, pos_emb):
+    def forward(self, query, key, value, mask, pos_emb, cache=None):
         """Compute 'Scaled Dot Product Attention' with rel. positional encoding.
         Args:
             query (torch.Tensor): (batch, time1, size)
             key (torch.Tensor): (batch, time2, size)
             value(torch.Tensor): (batch, time2, size)
-            mask (torch.Tensor): (batch, time1, time2)
-            pos_emb (torch.Tensor) : (batch, time1, size)
+            mask (torch.Tensor): (batch, time1, time2), or (batch, time1, cache_size + time2) with a cache
+            pos_emb (torch.Tensor) : (batch, time1 + time2 - 1, size), or (batch, time1 + cache_size + time2 - 1,
+                size) with a cache
+            cache (torch.Tensor): optional (2, batch, head, cache_size, d_k) keys and values of the previous frames
         Returns:
             output (torch.Tensor): transformed `value` (batch, time1, d_model) weighted by the query dot key attention
+            cache (torch.Tensor): the updated cache, only returned if `cache` is given
         """
         q, k, v = self.forward_qkv(query, key, value)
+        if cache is not None:
+            k, v, cache = self.update_cache(k, v, cache)
         q = q.transpose(1, 2)  # (batch, time1, head, d_k)
 
         n_batch_pos = pos_emb.size(0)
@@ -206,7 +237,10 @@ class RelPositionMultiHeadAttention(MultiHeadAttention):
 
         scores = (matrix_ac + matrix_bd) / math.sqrt(self.d_k)  # (batch, head, time1, time2)
 
-        return self.forward_attention(v, scores, mask)
+        output = self.forward_attention(v, scores, mask)
+        if cache is not None:
+            return output, cache
+        return output
 
 
 class PositionalEncoding(torch.nn.Module):
@@ -289,29 +323,33 @@ class RelPositionalEncoding(PositionalEncoding):
 
         self.max_len = max_len
 
-    def extend_pe(self, x):
+    def extend_pe(self, x, cache_len=0):
         """Reset and extend the positional encodings if needed."""
-        needed_size = 2 * x.size(1) - 1
+        input_len = x.size(1) + cache_len
+        needed_size = 2 * input_len - 1
         if self.pe is None or self.pe.size(1) < needed_size:
-            positions = torch.arange(-(x.size(1) - 1), x.size(1), 1.0, dtype=torch.float32).unsqueeze(1)
+            positions = torch.arange(-(input_len - 1), input_len, 1.0, dtype=torch.float32).unsqueeze(1)
             self.pe = self.create_pe(pos_length=needed_size, positions=positions)
         if self.pe.dtype != x.dtype or self.pe.device != x.device:
             self.pe = self.pe.to(device=x.device, dtype=x.dtype)
 
-    def forward(self, x):
+    def forward(self, x, cache_len=0):
         """Compute positional encoding.
         Args:
             x (torch.Tensor): Input. Its shape is (batch, time, feature_size)
+            cache_len (int): number of cached frames which precede x and are attended to, see
+                RelPositionMultiHeadAttention
         Returns:
             x (torch.Tensor): Its shape is (batch, time, feature_size)
-            pos_emb (torch.Tensor): Its shape is (1, time, feature_size)
+            pos_emb (torch.Tensor): Its shape is (1, 2 * time + cache_len - 1, feature_size)
         """
-        self.extend_pe(x)
+        self.extend_pe(x, cache_len)
         if self.xscale:
             x = x * self.xscale
 
-        start_pos = (self.pe.size(1) + 1) // 2 - x.size(1)
-        pos_emb = self.pe[:, start_pos:-start_pos]
+        # Relative positions from -(time - 1) to time + cache_len - 1, the center of pe being position 0
+        center_pos = (self.pe.size(1) - 1) // 2
+        pos_emb = self.pe[:, center_pos - x.size(1) + 1 : center_pos + x.size(1) + cache_len]
         if self.dropout_emb:
             pos_emb = self.dropout_emb(pos_emb)
         return self.dropout(x), pos_emb
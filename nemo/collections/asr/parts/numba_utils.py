@@ -86,3 +86,77 @@ def _phase_vocoder_kernel(D, time_steps, phi_advance, d_stretch, phase_acc, scal
         phase_acc += phi_advance + dphase
 
     return d_stretch
+
+
+@jit(nopython=True, nogil=True)
+def _logaddexp(a, b):
+    if a == -np.inf:
+        return b
+    if b == -np.inf:
+        return a
+    if a > b:
+        return a + np.log1p(np.exp(b - a))
+    return b + np.log1p(np.exp(a - b))
+
+
+@jit(nopython=True, nogil=True)
+def rnnt_forward_backward(blank_lp, label_lp, act_lens, label_lens):
+    """
+    Numba optimized forward-backward of the RNNT loss, given the log probabilities of the transitions of the lattice.
+    The recursions accumulate in float64. Utterances are processed sequentially: Numba's parallel threading layers
+    can hang processes which fork after running the kernel, such as dataloader workers.
+    Args:
+        blank_lp: Log probabilities of blank at every node (t, u) of the lattice, of shape [B, T, U + 1].
+        label_lp: Log probabilities of the label u + 1 at every node (t, u) of the lattice, of shape [B, T, U].
+        act_lens: Number of frames of every utterance, of shape [B].
+        label_lens: Number of labels of every utterance, of shape [B].
+    Returns:
+        Negative log likelihoods of shape [B], and their gradients with respect to blank_lp and label_lp.
+    """
+    costs = np.zeros(blank_lp.shape[0], dtype=np.float64)
+    grad_blank = np.zeros(blank_lp.shape, dtype=blank_lp.dtype)
+    grad_label = np.zeros(label_lp.shape, dtype=label_lp.dtype)
+
+    for b in range(blank_lp.shape[0]):
+        T = act_lens[b]
+        U = label_lens[b] + 1
+
+        alphas = np.full((T, U), -np.inf)
+        alphas[0, 0] = 0.0
+        for t in range(T):
+            for u in range(U):
+                if t == 0 and u == 0:
+                    continue
+                alpha = -np.inf
+                if t > 0:
+                    alpha = alphas[t - 1, u] + blank_lp[b, t - 1, u]
+                if u > 0:
+                    alpha = _logaddexp(alpha, alphas[t, u - 1] + label_lp[b, t, u - 1])
+                alphas[t, u] = alpha
+
+        betas = np.full((T, U), -np.inf)
+        betas[T - 1, U - 1] = blank_lp[b, T - 1, U - 1]
+        for t in range(T - 1, -1, -1):
+            for u in range(U - 1, -1, -1):
+                if t == T - 1 and u == U - 1:
+                    continue
+                beta = -np.inf
+                if t < T - 1:
+                    beta = betas[t + 1, u] + blank_lp[b, t, u]
+                if u < U - 1:
+                    beta = _logaddexp(beta, betas[t, u + 1] + label_lp[b, t, u])
+                betas[t, u] = beta
+
+        log_likelihood = betas[0, 0]
+        costs[b] = -log_likelihood
+
+        # The gradient of the cost with respect to a transition is minus its posterior probability
+        for t in range(T):
+            for u in range(U):
+                if t < T - 1:
+                    grad_blank[b, t, u] = -np.exp(alphas[t, u] + blank_lp[b, t, u] + betas[t + 1, u] - log_likelihood)
+                if u < U - 1:
+                    grad_label[b, t, u] = -np.exp(alphas[t, u] + label_lp[b, t, u] + betas[t, u + 1] - log_likelihood)
+        grad_blank[b, T - 1, U - 1] = -np.exp(alphas[T - 1, U - 1] + blank_lp[b, T - 1, U - 1] - log_likelihood)
+
+    return costs, grad_blank, grad_label
@@ -34,6 +34,7 @@
 # This file contains code artifacts adapted from https://github.com/ryanleary/patter
 import copy
 import io
+import math
 import os
 import random
 import subprocess
@@ -49,6 +50,8 @@ from scipy import signal
 from torch.utils.data import IterableDataset
 
 from nemo.collections.asr.parts import collections, parsers
+from nemo.collections.asr.parts.audio_bank import DEFAULT_MAX_BYTES as DEFAULT_BANK_MAX_BYTES
+from nemo.collections.asr.parts.audio_bank import AudioBank
 from nemo.collections.asr.parts.segment import AudioSegment
 from nemo.utils import logging
 
@@ -104,6 +107,9 @@ class SpeedPerturbation(Perturbation):
                 For better speed using `resampy`'s fast resampling method, use `resample_type='kaiser_fast'`.
                 For high-quality resampling, set `resample_type='kaiser_best'`.
                 To use `scipy.signal.resample`, set `resample_type='fft'` or `resample_type='scipy'`
+                For the fastest option, set `resample_type='polyphase'`, which uses `scipy.signal.resample_poly`
+                with a polyphase filter precomputed for every discrete rate. With uniformly sampled rates, the
+                target sampling rate is rounded to a multiple of sr / 100 and filters are cached once built.
             min_speed_rate: Minimum sampling rate modifier.
             max_speed_rate: Maximum sampling rate modifier.
             num_rates: Number of discrete rates to allow. Can be a positive or negative
@@ -124,8 +130,10 @@ class SpeedPerturbation(Perturbation):
         if min_rate < 0.0:
             raise ValueError("Minimum sampling rate modifier must be > 0.")
 
-        if resample_type not in ('kaiser_best', 'kaiser_fast', 'fft', 'scipy'):
-            raise ValueError("Supported `resample_type` values are ('kaiser_best', 'kaiser_fast', 'fft', 'scipy')")
+        if resample_type not in ('kaiser_best', 'kaiser_fast', 'fft', 'scipy', 'polyphase'):
+            raise ValueError(
+                "Supported `resample_type` values are ('kaiser_best', 'kaiser_fast', 'fft', 'scipy', 'polyphase')"
+            )
 
         self._sr = sr
         self._min_rate = min_speed_rate
@@ -136,10 +144,27 @@ class SpeedPerturbation(Perturbation):
         self._res_type = resample_type
         self._rng = random.Random() if rng is None else rng
 
+        # Polyphase filters, keyed by the reduced (up, down) resampling factors.
+        self._filters = {}
+        if resample_type == 'polyphase' and num_rates > 0:
+            for rate in self._rates:
+                if rate != 1.0:
+                    self._get_polyphase_filter(int(self._sr * rate))
+
     def max_augmentation_length(self, length):
         return length * self._max_rate
 
-    def perturb(self, data):
+    def _get_polyphase_filter(self, new_sr):
+        gcd = math.gcd(new_sr, self._sr)
+        up, down = new_sr // gcd, self._sr // gcd
+        if (up, down) not in self._filters:
+            # Same low-pass filter as the default design of `scipy.signal.resample_poly`.
+            max_rate = max(up, down)
+            window = signal.firwin(20 * max_rate + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+            self._filters[(up, down)] = window.astype(np.float32)
+        return up, down, self._filters[(up, down)]
+
+    def _sample_new_sr(self):
         # Select speed rate either from choice or random sample
         if self._num_rates < 0:
             speed_rate = self._rng.uniform(self._min_rate, self._max_rate)
@@ -148,10 +173,56 @@ class SpeedPerturbation(Perturbation):
 
         # Skip perturbation in case of identity speed rate
         if speed_rate == 1.0:
-            return
+            return None
 
         new_sr = int(self._sr * speed_rate)
-        data._samples = librosa.core.resample(data._samples, self._sr, new_sr, res_type=self._res_type)
+        if self._res_type == 'polyphase' and self._num_rates < 0:
+            step = max(self._sr // 100, 1)
+            new_sr = int(round(new_sr / step)) * step
+        return new_sr if new_sr != self._sr else None
+
+    def _resample(self, samples, new_sr):
+        if self._res_type == 'polyphase':
+            up, down, window = self._get_polyphase_filter(new_sr)
+            return signal.resample_poly(samples, up, down, axis=-1, window=window).astype(np.float32)
+        return librosa.core.resample(samples, self._sr, new_sr, res_type=self._res_type)
+
+    def perturb(self, data):
+        new_sr = self._sample_new_sr()
+        if new_sr is None:
+            return
+
+        data._samples = self._resample(data._samples, new_sr)
+
+    def perturb_batch(self, segments: List[AudioSegment]):
+        """Perturbs many segments in one call, each with its own random rate.
+
+        With `resample_type='polyphase'`, the segments which draw the same rate are zero padded and resampled
+        together as a single 2-D array, which gives the same samples as perturbing them one by one.
+
+        Args:
+            segments: List of `AudioSegment`, perturbed in place.
+        """
+        groups = {}
+        for segment in segments:
+            new_sr = self._sample_new_sr()
+            if new_sr is not None:
+                groups.setdefault(new_sr, []).append(segment)
+
+        for new_sr, group in groups.items():
+            if self._res_type != 'polyphase':
+                for segment in group:
+                    segment._samples = self._resample(segment._samples, new_sr)
+                continue
+
+            lengths = [segment.num_samples for segment in group]
+            padded = np.zeros((len(group), max(lengths)), dtype=np.float32)
+            for row, segment in zip(padded, group):
+                row[: segment.num_samples] = segment._samples
+
+            resampled = self._resample(padded, new_sr)
+            for segment, length, row in zip(group, lengths, resampled):
+                segment._samples = np.ascontiguousarray(row[: -(-length * new_sr // self._sr)])
 
 
 class TimeStretchPerturbation(Perturbation):
@@ -272,8 +343,41 @@ class GainPerturbation(Perturbation):
         data._samples = data._samples * (10.0 ** (gain / 20.0))
 
 
+def _make_audio_bank(manifest, tarred_audio, use_bank, bank_dir, bank_max_bytes, bank_sample_rate):
+    if not use_bank:
+        return None
+    if tarred_audio:
+        raise ValueError("Audio banks are built from manifests of audio files and do not support tarred audio.")
+    return AudioBank(manifest, sample_rate=bank_sample_rate, max_bytes=bank_max_bytes, bank_dir=bank_dir)
+
+
 class ImpulsePerturbation(Perturbation):
-    def __init__(self, manifest_path=None, rng=None, audio_tar_filepaths=None, shuffle_n=128, shift_impulse=False):
+    def __init__(
+        self,
+        manifest_path=None,
+        rng=None,
+        audio_tar_filepaths=None,
+        shuffle_n=128,
+        shift_impulse=False,
+        use_bank=False,
+        bank_dir=None,
+        bank_max_bytes=DEFAULT_BANK_MAX_BYTES,
+        bank_sample_rate=16000,
+    ):
+        """
+        Convolves audio with a random Room Impulse Response.
+
+        Args:
+            manifest_path: Manifest file of the RIRs.
+            rng: Random number generator.
+            audio_tar_filepaths: Tar files, if RIR audio files are tarred.
+            shuffle_n: Shuffle buffer size of the tarred RIRs.
+            shift_impulse: Whether to shift the peak of the RIRs to their start.
+            use_bank: Whether to preload the RIRs in an `AudioBank` instead of reading one from disk per call.
+            bank_dir: Optional directory of the memory-mapped bank file, shared by all workers.
+            bank_max_bytes: Size cap of the bank.
+            bank_sample_rate: Sample rate of the bank. Audio of other sample rates reads RIRs from disk.
+        """
         self._manifest = collections.ASRAudioText(manifest_path, parser=parsers.make_parser([]), index_by_file_id=True)
         self._audiodataset = None
         self._tarred_audio = False
@@ -286,15 +390,19 @@ class ImpulsePerturbation(Perturbation):
             self._data_iterator = iter(self._audiodataset)
 
         self._rng = random.Random() if rng is None else rng
+        self._bank = _make_audio_bank(
+            self._manifest, self._tarred_audio, use_bank, bank_dir, bank_max_bytes, bank_sample_rate
+        )
 
-    def perturb(self, data):
-        impulse = read_one_audiosegment(
-            self._manifest,
-            data.sample_rate,
-            self._rng,
-            tarred_audio=self._tarred_audio,
-            audio_dataset=self._data_iterator,
+    def get_one_impulse(self, target_sr):
+        if self._bank is not None and self._bank.sample_rate == target_sr:
+            return self._bank.sample(self._rng)[0]
+        return read_one_audiosegment(
+            self._manifest, target_sr, self._rng, tarred_audio=self._tarred_audio, audio_dataset=self._data_iterator
         )
+
+    def perturb(self, data):
+        impulse = self.get_one_impulse(data.sample_rate)
         if not self._shift_impulse:
             impulse_norm = (impulse.samples - min(impulse.samples)) / (max(impulse.samples) - min(impulse.samples))
             data._samples = signal.fftconvolve(data._samples, impulse_norm, "same")
@@ -340,7 +448,28 @@ class NoisePerturbation(Perturbation):
         audio_tar_filepaths=None,
         shuffle_n=100,
         orig_sr=16000,
+        use_bank=False,
+        bank_dir=None,
+        bank_max_bytes=DEFAULT_BANK_MAX_BYTES,
+        bank_sample_rate=16000,
     ):
+        """
+        Adds a random noise recording at a random SNR.
+
+        Args:
+            manifest_path: Manifest file of the noise recordings.
+            min_snr_db: Minimum SNR of the noise.
+            max_snr_db: Maximum SNR of the noise.
+            max_gain_db: Maximum gain applied to the noise.
+            rng: Random number generator.
+            audio_tar_filepaths: Tar files, if noise audio files are tarred.
+            shuffle_n: Shuffle buffer size of the tarred noise.
+            orig_sr: Original sampling rate of the noise audio.
+            use_bank: Whether to preload the noise in an `AudioBank` instead of reading one file from disk per call.
+            bank_dir: Optional directory of the memory-mapped bank file, shared by all workers.
+            bank_max_bytes: Size cap of the bank.
+            bank_sample_rate: Sample rate of the bank. Audio of other sample rates reads noise from disk.
+        """
         self._manifest = collections.ASRAudioText(manifest_path, parser=parsers.make_parser([]), index_by_file_id=True)
         self._audiodataset = None
         self._tarred_audio = False
@@ -356,31 +485,37 @@ class NoisePerturbation(Perturbation):
         self._min_snr_db = min_snr_db
         self._max_snr_db = max_snr_db
         self._max_gain_db = max_gain_db
+        self._bank = _make_audio_bank(
+            self._manifest, self._tarred_audio, use_bank, bank_dir, bank_max_bytes, bank_sample_rate
+        )
 
     @property
     def orig_sr(self):
         return self._orig_sr
 
     def get_one_noise_sample(self, target_sr):
-        return read_one_audiosegment(
+        return self.get_one_noise_sample_and_rms(target_sr)[0]
+
+    def get_one_noise_sample_and_rms(self, target_sr):
+        """Returns a random noise segment and its RMS level in dB, precomputed when the noise comes from a bank."""
+        if self._bank is not None and self._bank.sample_rate == target_sr:
+            return self._bank.sample(self._rng)
+        noise = read_one_audiosegment(
             self._manifest, target_sr, self._rng, tarred_audio=self._tarred_audio, audio_dataset=self._data_iterator
         )
+        return noise, noise.rms_db
 
     def perturb(self, data):
-        noise = read_one_audiosegment(
-            self._manifest,
-            data.sample_rate,
-            self._rng,
-            tarred_audio=self._tarred_audio,
-            audio_dataset=self._data_iterator,
-        )
-        self.perturb_with_input_noise(data, noise)
+        noise, noise_rms = self.get_one_noise_sample_and_rms(data.sample_rate)
+        self.perturb_with_input_noise(data, noise, noise_rms=noise_rms)
 
-    def perturb_with_input_noise(self, data, noise, data_rms=None):
+    def perturb_with_input_noise(self, data, noise, data_rms=None, noise_rms=None):
         snr_db = self._rng.uniform(self._min_snr_db, self._max_snr_db)
         if data_rms is None:
             data_rms = data.rms_db
-        noise_gain_db = min(data_rms - noise.rms_db - snr_db, self._max_gain_db)
+        if noise_rms is None:
+            noise_rms = noise.rms_db
+        noise_gain_db = min(data_rms - noise_rms - snr_db, self._max_gain_db)
         # logging.debug("noise: %s %s %s", snr_db, noise_gain_db, noise_record.audio_file)
 
         # calculate noise segment to use
@@ -399,13 +534,15 @@ class NoisePerturbation(Perturbation):
             data._samples += noise._samples
 
     def perturb_with_foreground_noise(
-        self, data, noise, data_rms=None, max_noise_dur=2, max_additions=1,
+        self, data, noise, data_rms=None, max_noise_dur=2, max_additions=1, noise_rms=None,
     ):
         snr_db = self._rng.uniform(self._min_snr_db, self._max_snr_db)
         if not data_rms:
             data_rms = data.rms_db
+        if noise_rms is None:
+            noise_rms = noise.rms_db
 
-        noise_gain_db = min(data_rms - noise.rms_db - snr_db, self._max_gain_db)
+        noise_gain_db = min(data_rms - noise_rms - snr_db, self._max_gain_db)
         n_additions = self._rng.randint(1, max_additions)
 
         for i in range(n_additions):
@@ -456,6 +593,10 @@ class RirAndNoisePerturbation(Perturbation):
         bg_max_snr_db=50,
         bg_noise_tar_filepaths=None,
         bg_orig_sample_rate=None,
+        use_bank=False,
+        bank_dir=None,
+        bank_max_bytes=DEFAULT_BANK_MAX_BYTES,
+        bank_sample_rate=16000,
     ):
         """
         RIR augmentation with additive foreground and background noise.
@@ -484,8 +625,15 @@ class RirAndNoisePerturbation(Perturbation):
             bg_max_snr_db: max SNR for background noise
             bg_noise_tar_filepaths: tar files, if noise files are tarred
             bg_orig_sample_rate: original sampling rate of background noise audio
+            use_bank: whether to preload RIRs and noises in audio banks instead of reading them from disk per call
+            bank_dir: optional directory of the memory-mapped bank files, shared by all workers
+            bank_max_bytes: size cap of each of the RIR, foreground and background noise banks
+            bank_sample_rate: sample rate of the banks
 
         """
+        bank_kwargs = dict(
+            use_bank=use_bank, bank_dir=bank_dir, bank_max_bytes=bank_max_bytes, bank_sample_rate=bank_sample_rate
+        )
         logging.info("Called Rir aug init")
         self._rir_prob = rir_prob
         self._rng = random.Random()
@@ -494,6 +642,7 @@ class RirAndNoisePerturbation(Perturbation):
             audio_tar_filepaths=rir_tar_filepaths,
             shuffle_n=rir_shuffle_n,
             shift_impulse=True,
+            **bank_kwargs,
         )
         self._fg_noise_perturbers = {}
         self._bg_noise_perturbers = {}
@@ -509,6 +658,7 @@ class RirAndNoisePerturbation(Perturbation):
                     max_snr_db=max_snr_db[i],
                     audio_tar_filepaths=noise_tar_filepaths[i],
                     orig_sr=orig_sr,
+                    **bank_kwargs,
                 )
         self._max_additions = max_additions
         self._max_duration = max_duration
@@ -524,6 +674,7 @@ class RirAndNoisePerturbation(Perturbation):
                     max_snr_db=bg_max_snr_db[i],
                     audio_tar_filepaths=bg_noise_tar_filepaths[i],
                     orig_sr=orig_sr,
+                    **bank_kwargs,
                 )
 
         self._apply_noise_rir = apply_noise_rir
@@ -545,14 +696,20 @@ class RirAndNoisePerturbation(Perturbation):
         bg_perturber = self._bg_noise_perturbers[orig_sr]
 
         data_rms = data.rms_db
-        noise = fg_perturber.get_one_noise_sample(data.sample_rate)
+        noise, noise_rms = fg_perturber.get_one_noise_sample_and_rms(data.sample_rate)
         if self._apply_noise_rir:
             self._rir_perturber.perturb(noise)
+            noise_rms = None
         fg_perturber.perturb_with_foreground_noise(
-            data, noise, data_rms=data_rms, max_noise_dur=self._max_duration, max_additions=self._max_additions
+            data,
+            noise,
+            data_rms=data_rms,
+            max_noise_dur=self._max_duration,
+            max_additions=self._max_additions,
+            noise_rms=noise_rms,
         )
-        noise = bg_perturber.get_one_noise_sample(data.sample_rate)
-        bg_perturber.perturb_with_input_noise(data, noise, data_rms=data_rms)
+        noise, noise_rms = bg_perturber.get_one_noise_sample_and_rms(data.sample_rate)
+        bg_perturber.perturb_with_input_noise(data, noise, data_rms=data_rms, noise_rms=noise_rms)
 
 
 class TranscodePerturbation(Perturbation):
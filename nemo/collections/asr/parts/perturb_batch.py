@@ -0,0 +1,454 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Batched, torch based counterparts of the waveform perturbations of `perturb.py`.
+
+They operate on a padded [B, T] batch of audio with its [B] lengths, after collation and on the device of the batch,
+instead of on a single `AudioSegment` inside the dataloader workers. Every sample of the batch draws whether a
+perturbation is applied and its parameters independently.
+"""
+
+import copy
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from omegaconf import DictConfig, OmegaConf
+
+from nemo.collections.asr.parts import perturb
+from nemo.utils import logging
+
+__all__ = [
+    'BatchPerturbation',
+    'BatchSpeedPerturbation',
+    'BatchGainPerturbation',
+    'BatchShiftPerturbation',
+    'BatchWhiteNoisePerturbation',
+    'BatchNoisePerturbation',
+    'BatchImpulsePerturbation',
+    'BatchAudioAugmentor',
+    'process_batch_augmentations',
+    'resample_batch',
+]
+
+
+def _length_mask(lengths: torch.Tensor, max_length: int) -> torch.Tensor:
+    return torch.arange(max_length, device=lengths.device)[None, :] < lengths[:, None]
+
+
+def _sinc_resample_kernel(
+    orig_freq: int, new_freq: int, lowpass_filter_width: int, rolloff: float = 0.99
+) -> Tuple[torch.Tensor, int]:
+    # Polyphase windowed sinc filter bank: kernel `i` computes output samples i, i + new_freq, ... from input frames
+    # strided by orig_freq, so that the whole resampling is a single strided conv1d.
+    base_freq = min(orig_freq, new_freq) * rolloff
+    width = math.ceil(lowpass_filter_width * orig_freq / base_freq)
+    idx = torch.arange(-width, width + orig_freq, dtype=torch.float64)[None, None] / orig_freq
+    t = torch.arange(0, -new_freq, -1, dtype=torch.float64)[:, None, None] / new_freq + idx
+    t = (t * base_freq).clamp(-lowpass_filter_width, lowpass_filter_width)
+
+    window = torch.cos(t * math.pi / lowpass_filter_width / 2) ** 2
+    t = t * math.pi
+    kernels = torch.where(t == 0, torch.ones_like(t), torch.sin(t) / t)
+    kernels = kernels * window * (base_freq / orig_freq)
+    return kernels.float(), width
+
+
+_RESAMPLE_KERNELS: Dict[Tuple[int, int, int], Tuple[torch.Tensor, int]] = {}
+
+
+def resample_batch(signal: torch.Tensor, orig_freq: int, new_freq: int, lowpass_filter_width: int = 6) -> torch.Tensor:
+    """Resamples a [B, T] batch of audio from `orig_freq` to `new_freq` with a band-limited polyphase filter.
+
+    Kernels are cached per (reduced) rate pair, so the discrete rates of speed perturbation are only built once.
+
+    Args:
+        signal: [B, T] float tensor.
+        orig_freq: Original sample rate.
+        new_freq: Target sample rate.
+        lowpass_filter_width: Number of zero crossings of the sinc filter on each side. Larger is sharper.
+
+    Returns:
+        [B, ceil(T * new_freq / orig_freq)] resampled tensor.
+    """
+    if orig_freq == new_freq:
+        return signal
+
+    gcd = math.gcd(int(orig_freq), int(new_freq))
+    orig_freq, new_freq = int(orig_freq) // gcd, int(new_freq) // gcd
+
+    key = (orig_freq, new_freq, lowpass_filter_width)
+    if key not in _RESAMPLE_KERNELS:
+        _RESAMPLE_KERNELS[key] = _sinc_resample_kernel(orig_freq, new_freq, lowpass_filter_width)
+    kernel, width = _RESAMPLE_KERNELS[key]
+    kernel = kernel.to(device=signal.device, dtype=signal.dtype)
+
+    num_signals, length = signal.shape
+    padded = torch.nn.functional.pad(signal, (width, width + orig_freq))
+    resampled = torch.nn.functional.conv1d(padded[:, None], kernel, stride=orig_freq)
+    resampled = resampled.transpose(1, 2).reshape(num_signals, -1)
+    return resampled[:, : math.ceil(new_freq * length / orig_freq)]
+
+
+class BatchPerturbation(object):
+    """Base class of batched perturbations.
+
+    `perturb` receives only the samples of the batch the perturbation was drawn for, and returns the perturbed
+    samples and their lengths. The returned batch may be longer or shorter than the input one.
+    """
+
+    def max_augmentation_length(self, length):
+        return length
+
+    def perturb(
+        self, signal: torch.Tensor, lengths: torch.Tensor, generator: torch.Generator
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        raise NotImplementedError
+
+
+class BatchSpeedPerturbation(BatchPerturbation):
+    """Batched `SpeedPerturbation`. Samples are grouped by their drawn rate and resampled with `resample_batch`.
+
+    When `num_rates` is not positive, rates are drawn uniformly and the target sample rate is rounded to a multiple
+    of sr / 100, which bounds the size of the polyphase filters.
+
+    Args:
+        sr: Original sampling rate.
+        resample_type: `kaiser_best` uses a sharper (and slower) filter than the other resample types.
+        min_speed_rate: Minimum sampling rate modifier.
+        max_speed_rate: Maximum sampling rate modifier.
+        num_rates: Number of discrete rates to allow, see `SpeedPerturbation`.
+        rng: Unused, randomness comes from the generator of `BatchAudioAugmentor`.
+    """
+
+    def __init__(self, sr, resample_type, min_speed_rate=0.9, max_speed_rate=1.1, num_rates=5, rng=None):
+        min_rate = min(min_speed_rate, max_speed_rate)
+        if min_rate < 0.0:
+            raise ValueError("Minimum sampling rate modifier must be > 0.")
+
+        if resample_type not in ('kaiser_best', 'kaiser_fast', 'fft', 'scipy', 'polyphase'):
+            raise ValueError(
+                "Supported `resample_type` values are ('kaiser_best', 'kaiser_fast', 'fft', 'scipy', 'polyphase')"
+            )
+
+        self._sr = sr
+        self._min_rate = min_speed_rate
+        self._max_rate = max_speed_rate
+        self._num_rates = num_rates
+        if num_rates > 0:
+            self._rates = np.linspace(self._min_rate, self._max_rate, self._num_rates, endpoint=True)
+        self._lowpass_filter_width = 16 if resample_type == 'kaiser_best' else 6
+
+    def max_augmentation_length(self, length):
+        return length * self._max_rate
+
+    def perturb(self, signal, lengths, generator):
+        num_signals = signal.shape[0]
+        if self._num_rates < 0:
+            rates = self._min_rate + (self._max_rate - self._min_rate) * torch.rand(
+                num_signals, device=signal.device, generator=generator
+            )
+            step = max(self._sr // 100, 1)
+            new_srs = [int(round(self._sr * rate / step)) * step for rate in rates.tolist()]
+        else:
+            choices = torch.randint(len(self._rates), (num_signals,), device=signal.device, generator=generator)
+            new_srs = [int(self._sr * self._rates[choice]) for choice in choices.tolist()]
+
+        new_lengths = torch.tensor(
+            [math.ceil(length * new_sr / self._sr) for length, new_sr in zip(lengths.tolist(), new_srs)],
+            dtype=lengths.dtype,
+            device=lengths.device,
+        )
+        output = signal.new_zeros(num_signals, int(new_lengths.max()))
+        new_srs = np.asarray(new_srs)
+        for new_sr in np.unique(new_srs):
+            rows = torch.from_numpy(np.flatnonzero(new_srs == new_sr)).to(signal.device)
+            resampled = resample_batch(signal[rows], self._sr, int(new_sr), self._lowpass_filter_width)
+            num_frames = min(resampled.shape[1], output.shape[1])
+            output[rows, :num_frames] = resampled[:, :num_frames]
+
+        return output * _length_mask(new_lengths, output.shape[1]), new_lengths
+
+
+class BatchGainPerturbation(BatchPerturbation):
+    """Batched `GainPerturbation`."""
+
+    def __init__(self, min_gain_dbfs=-10, max_gain_dbfs=10, rng=None):
+        self._min_gain_dbfs = min_gain_dbfs
+        self._max_gain_dbfs = max_gain_dbfs
+
+    def perturb(self, signal, lengths, generator):
+        gain = self._min_gain_dbfs + (self._max_gain_dbfs - self._min_gain_dbfs) * torch.rand(
+            signal.shape[0], dtype=signal.dtype, device=signal.device, generator=generator
+        )
+        return signal * (10.0 ** (gain / 20.0))[:, None], lengths
+
+
+class BatchShiftPerturbation(BatchPerturbation):
+    """Batched `ShiftPerturbation`. Samples are shifted within their own length, not the padded length."""
+
+    def __init__(self, sample_rate=16000, min_shift_ms=-5.0, max_shift_ms=5.0, rng=None):
+        self._sample_rate = sample_rate
+        self._min_shift_ms = min_shift_ms
+        self._max_shift_ms = max_shift_ms
+
+    def perturb(self, signal, lengths, generator):
+        shift_ms = self._min_shift_ms + (self._max_shift_ms - self._min_shift_ms) * torch.rand(
+            signal.shape[0], device=signal.device, generator=generator
+        )
+        shift = (shift_ms * self._sample_rate / 1000).floor().long()
+        # Shifts longer than the utterance are skipped, as in `ShiftPerturbation`.
+        shift = shift.masked_fill(shift.abs() > lengths, 0)
+
+        max_length = signal.shape[1]
+        index = torch.arange(max_length, device=signal.device)[None, :] + shift[:, None]
+        valid = (index >= 0) & (index < lengths[:, None]) & _length_mask(lengths, max_length)
+        shifted = torch.gather(signal, 1, index.clamp(0, max_length - 1))
+        return shifted * valid, lengths
+
+
+class BatchWhiteNoisePerturbation(BatchPerturbation):
+    """Batched `WhiteNoisePerturbation`."""
+
+    def __init__(self, min_level=-90, max_level=-46, rng=None):
+        self.min_level = int(min_level)
+        self.max_level = int(max_level)
+
+    def perturb(self, signal, lengths, generator):
+        noise_level_db = torch.randint(
+            self.min_level, self.max_level, (signal.shape[0],), device=signal.device, generator=generator
+        )
+        scale = (10.0 ** (noise_level_db.float() / 20.0)).to(signal)
+        noise = torch.randn(signal.shape, dtype=signal.dtype, device=signal.device, generator=generator)
+        noise = noise * scale[:, None]
+        return signal + noise * _length_mask(lengths, signal.shape[1]), lengths
+
+
+class BatchNoisePerturbation(BatchPerturbation):
+    """Batched `NoisePerturbation`.
+
+    Noise segments are still read by the wrapped `NoisePerturbation` on the CPU, one per perturbed sample, and
+    gathered into a single (pinned, for CUDA batches) tensor copied to the device at once. The RMS, SNR gains and
+    mixing are computed for the whole batch on its device.
+
+    Args:
+        sample_rate: Sample rate of the batches.
+        **kwargs: Arguments of `NoisePerturbation`.
+    """
+
+    def __init__(self, sample_rate=16000, **kwargs):
+        self._sample_rate = sample_rate
+        self._noise = perturb.NoisePerturbation(**kwargs)
+
+    def perturb(self, signal, lengths, generator):
+        num_signals, max_length = signal.shape
+        # Positions of the noise windows, drawn for the whole batch at once.
+        positions = torch.rand(num_signals, device=signal.device, generator=generator).tolist()
+
+        pin_memory = signal.is_cuda
+        noise = torch.zeros(num_signals, max_length, pin_memory=pin_memory)
+        noise_rms_db = torch.zeros(num_signals, pin_memory=pin_memory)
+        for i, (length, position) in enumerate(zip(lengths.tolist(), positions)):
+            segment, noise_rms_db[i] = self._noise.get_one_noise_sample_and_rms(self._sample_rate)
+            samples = segment.samples
+
+            # Random noise window for long noises, random position in the utterance for short ones.
+            if len(samples) > length:
+                start = int(position * (len(samples) - length + 1))
+                noise[i, :length] = torch.from_numpy(samples[start : start + length])
+            else:
+                start = int(position * (length - len(samples) + 1))
+                noise[i, start : start + len(samples)] = torch.from_numpy(samples)
+        noise = noise.to(device=signal.device, dtype=signal.dtype, non_blocking=True)
+        noise_rms_db = noise_rms_db.to(device=signal.device, dtype=signal.dtype, non_blocking=True)
+
+        mask = _length_mask(lengths, max_length)
+        mean_square = (signal.pow(2) * mask).sum(1) / lengths.clamp(min=1)
+        data_rms_db = 10 * torch.log10(mean_square)
+
+        snr_db = self._noise._min_snr_db + (self._noise._max_snr_db - self._noise._min_snr_db) * torch.rand(
+            num_signals, dtype=signal.dtype, device=signal.device, generator=generator
+        )
+        noise_gain_db = torch.clamp(data_rms_db - (noise_rms_db + snr_db), max=self._noise._max_gain_db)
+        return signal + noise * (10.0 ** (noise_gain_db / 20.0))[:, None], lengths
+
+
+class BatchImpulsePerturbation(BatchPerturbation):
+    """Batched `ImpulsePerturbation`. Impulse responses are read on the CPU and convolved on the device with FFTs.
+
+    Args:
+        sample_rate: Sample rate of the batches.
+        **kwargs: Arguments of `ImpulsePerturbation`.
+    """
+
+    def __init__(self, sample_rate=16000, **kwargs):
+        self._sample_rate = sample_rate
+        self._impulse = perturb.ImpulsePerturbation(**kwargs)
+
+    def _read_impulse(self) -> np.ndarray:
+        impulse = self._impulse.get_one_impulse(self._sample_rate).samples
+        impulse = (impulse - impulse.min()) / (impulse.max() - impulse.min())
+        if self._impulse._shift_impulse:
+            impulse = impulse[np.argmax(np.abs(impulse)) :]
+        return impulse
+
+    def perturb(self, signal, lengths, generator):
+        num_signals, max_length = signal.shape
+        impulses = [self._read_impulse() for _ in range(num_signals)]
+        impulse_length = max(len(impulse) for impulse in impulses)
+
+        kernels = torch.zeros(num_signals, impulse_length)
+        for row, impulse in zip(kernels, impulses):
+            row[: len(impulse)] = torch.from_numpy(impulse)
+
+        fft_length = 2 ** math.ceil(math.log2(max_length + impulse_length - 1))
+        spectrum = torch.fft.rfft(signal, n=fft_length) * torch.fft.rfft(kernels.to(signal), n=fft_length)
+        convolved = torch.fft.irfft(spectrum, n=fft_length)
+
+        if self._impulse._shift_impulse:
+            # Peak-aligned impulses: keep the start of the full convolution.
+            offsets = torch.zeros(num_signals, dtype=torch.long)
+        else:
+            # scipy's "same" mode: the output is centered on the full convolution of every sample's own impulse.
+            offsets = torch.tensor([(len(impulse) - 1) // 2 for impulse in impulses])
+        index = torch.arange(max_length)[None, :] + offsets[:, None]
+        convolved = torch.gather(convolved, 1, index.to(signal.device))
+        return convolved * _length_mask(lengths, max_length), lengths
+
+
+batch_perturbation_types = {
+    "speed": BatchSpeedPerturbation,
+    "gain": BatchGainPerturbation,
+    "impulse": BatchImpulsePerturbation,
+    "shift": BatchShiftPerturbation,
+    "noise": BatchNoisePerturbation,
+    "white_noise": BatchWhiteNoisePerturbation,
+}
+
+# Batched perturbations which need the sample rate of the batch, which `AudioSegment` carries for the CPU ones.
+_NEEDS_SAMPLE_RATE = (BatchShiftPerturbation, BatchNoisePerturbation, BatchImpulsePerturbation)
+
+
+class BatchAudioAugmentor(object):
+    """Applies a pipeline of batched perturbations to a padded batch of audio.
+
+    Every perturbation is applied to each sample of the batch with its probability, drawn independently per
+    sample, and perturbed samples draw their own parameters.
+
+    Args:
+        perturbations: List of (probability, `BatchPerturbation`) pairs, applied in order.
+        seed: Optional seed of the random generators. Parameters are drawn on the device of the batch, from one
+            generator per device.
+    """
+
+    def __init__(self, perturbations: Optional[List[Tuple[float, BatchPerturbation]]] = None, seed=None):
+        self._pipeline = perturbations if perturbations is not None else []
+        self._seed = seed
+        self._generators: Dict[torch.device, torch.Generator] = {}
+
+    def _get_generator(self, device: torch.device) -> torch.Generator:
+        generator = self._generators.get(device)
+        if generator is None:
+            generator = torch.Generator(device=device)
+            if self._seed is not None:
+                generator.manual_seed(self._seed)
+            else:
+                generator.seed()
+            self._generators[device] = generator
+        return generator
+
+    def __call__(self, signal: torch.Tensor, lengths: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        return self.perturb(signal, lengths)
+
+    def perturb(self, signal: torch.Tensor, lengths: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Perturbs a [B, T] batch of audio with [B] lengths and returns the new batch and lengths."""
+        lengths = lengths.clone()
+        generator = self._get_generator(signal.device)
+        for prob, perturbation in self._pipeline:
+            draws = torch.rand(signal.shape[0], device=signal.device, generator=generator)
+            rows = torch.nonzero(draws < prob).squeeze(1)
+            if len(rows) == 0:
+                continue
+
+            perturbed, perturbed_lengths = perturbation.perturb(signal[rows], lengths[rows], generator)
+            # The rows are written to a new tensor, never to the batch of the caller
+            if perturbed.shape[1] > signal.shape[1]:
+                signal = torch.nn.functional.pad(signal, (0, perturbed.shape[1] - signal.shape[1]))
+            else:
+                if perturbed.shape[1] < signal.shape[1]:
+                    perturbed = torch.nn.functional.pad(perturbed, (0, signal.shape[1] - perturbed.shape[1]))
+                signal = signal.clone()
+
+            signal[rows] = perturbed
+            lengths[rows] = perturbed_lengths
+
+        return signal[:, : int(lengths.max())] if len(lengths) > 0 else signal, lengths
+
+    def max_augmentation_length(self, length):
+        newlen = length
+        for (prob, p) in self._pipeline:
+            newlen = p.max_augmentation_length(newlen)
+        return newlen
+
+
+def process_batch_augmentations(augmenter, sample_rate: int = 16000, seed=None) -> Optional[BatchAudioAugmentor]:
+    """Builds a `BatchAudioAugmentor` from the augmentor config schema of `perturb.process_augmentations`.
+
+    Args:
+        augmenter: Dictionary of perturbation name -> kwargs, each with a `prob` key, as used by
+            `process_augmentations`. Only the perturbations listed in `batch_perturbation_types` are supported.
+        sample_rate: Sample rate of the batches to augment.
+        seed: Optional seed of the random generator.
+
+    Returns: BatchAudioAugmentor object
+    """
+    if augmenter is None:
+        return None
+
+    if isinstance(augmenter, BatchAudioAugmentor):
+        return augmenter
+
+    if not type(augmenter) in {dict, DictConfig}:
+        raise ValueError("Cannot parse augmenter. Must be a dict or a BatchAudioAugmentor object ")
+
+    if isinstance(augmenter, DictConfig):
+        augmenter = OmegaConf.to_container(augmenter, resolve=True)
+
+    augmenter = copy.deepcopy(augmenter)
+
+    augmentations = []
+    for augment_name, augment_kwargs in augmenter.items():
+        prob = augment_kwargs.pop('prob', None)
+        if prob is None:
+            raise KeyError(
+                f'Augmentation "{augment_name}" will not be applied as '
+                f'keyword argument "prob" was not defined for this augmentation.'
+            )
+        if prob < 0.0 or prob > 1.0:
+            raise ValueError("`prob` must be a float value between 0 and 1.")
+
+        if augment_name not in batch_perturbation_types:
+            raise KeyError(
+                f"Perturbation {augment_name} has no batched implementation. "
+                f"Allowed values : {batch_perturbation_types.keys()}"
+            )
+
+        perturbation_cls = batch_perturbation_types[augment_name]
+        if issubclass(perturbation_cls, _NEEDS_SAMPLE_RATE):
+            augment_kwargs['sample_rate'] = sample_rate
+        augmentations.append([prob, perturbation_cls(**augment_kwargs)])
+
+    logging.info(f"Batched audio augmentations: {[name for name in augmenter]}")
+    return BatchAudioAugmentor(perturbations=augmentations, seed=seed)
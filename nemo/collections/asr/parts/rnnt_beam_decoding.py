@@ -67,6 +67,7 @@ class BeamRNNTInfer(Typing):
         alsd_max_target_len: Union[int, float] = 1.0,
         nsc_max_timesteps_expansion: int = 1,
         nsc_prefix_alpha: int = 1,
+        state_cache_size: int = 4096,
     ):
         """
         Beam Search implementation ported from ESPNet implementation -
@@ -137,6 +138,9 @@ class BeamRNNTInfer(Typing):
             nsc_max_timesteps_expansion: Unused int.
 
             nsc_prefix_alpha: Unused int.
+
+            state_cache_size: Maximum number of token sequences whose prediction network outputs and states are
+                cached during the search. See rnnt_utils.RNNTStateCache, available as `state_cache`.
         """
         self.decoder = decoder_model
         self.joint = joint_model
@@ -151,6 +155,7 @@ class BeamRNNTInfer(Typing):
 
         self.beam_size = beam_size
         self.score_norm = score_norm
+        self.state_cache = rnnt_utils.RNNTStateCache(max_size=state_cache_size)
 
         if self.beam_size == 1:
             self.search_algorithm = self.greedy_search
@@ -212,6 +217,9 @@ class BeamRNNTInfer(Typing):
             self.decoder.eval()
             self.joint.eval()
 
+            # Cached states are only valid for the current weights of the decoder
+            self.state_cache.clear()
+
             hypotheses = []
             with tqdm(
                 range(encoder_output.size(0)),
@@ -276,7 +284,7 @@ class BeamRNNTInfer(Typing):
         hyp = Hypothesis(
             score=0.0, y_sequence=[self.blank], dec_state=dec_state, timestep=[-1], length=encoded_lengths
         )
-        cache = {}
+        cache = self.state_cache
 
         # Initialize state and first token
         y, state, _ = self.decoder.score_hypothesis(hyp, cache)
@@ -311,6 +319,8 @@ class BeamRNNTInfer(Typing):
                     y, state, _ = self.decoder.score_hypothesis(hyp, cache)
                 symbols_added += 1
 
+            cache.prune([hyp.y_sequence])
+
         return [hyp]
 
     def default_beam_search(self, h: torch.Tensor, encoded_lengths: torch.Tensor) -> List[Hypothesis]:
@@ -342,7 +352,7 @@ class BeamRNNTInfer(Typing):
 
         # Initialize first hypothesis for the beam (blank)
         kept_hyps = [Hypothesis(score=0.0, y_sequence=[self.blank], dec_state=dec_state, timestep=[-1], length=0)]
-        cache = {}
+        cache = self.state_cache
 
         for i in range(int(encoded_lengths)):
             hi = h[:, i : i + 1, :]  # [1, 1, D]
@@ -375,6 +385,7 @@ class BeamRNNTInfer(Typing):
                     new_hyp = Hypothesis(
                         score=(max_hyp.score + float(logp)),
                         y_sequence=max_hyp.y_sequence[:],
+                        cache_node=max_hyp.cache_node,
                         dec_state=max_hyp.dec_state,
                         lm_state=max_hyp.lm_state,
                         timestep=max_hyp.timestep[:],
@@ -402,6 +413,9 @@ class BeamRNNTInfer(Typing):
                     kept_hyps = kept_most_prob
                     break
 
+            # Drop the cached states which no kept hypothesis can reach
+            cache.prune([hyp.y_sequence for hyp in kept_hyps])
+
         return self.sort_nbest(kept_hyps)
 
     def time_sync_decoding(self, h: torch.Tensor, encoded_lengths: torch.Tensor) -> List[Hypothesis]:
@@ -440,7 +454,7 @@ class BeamRNNTInfer(Typing):
                 length=0,
             )
         ]
-        cache = {}
+        cache = self.state_cache
 
         for i in range(int(encoded_lengths)):
             hi = h[:, i : i + 1, :]
@@ -474,6 +488,7 @@ class BeamRNNTInfer(Typing):
                             Hypothesis(
                                 score=(hyp.score + float(beam_logp[j, self.blank])),
                                 y_sequence=hyp.y_sequence[:],
+                                cache_node=hyp.cache_node,
                                 dec_state=hyp.dec_state,
                                 lm_state=hyp.lm_state,
                                 timestep=hyp.timestep[:],
@@ -498,6 +513,7 @@ class BeamRNNTInfer(Typing):
                             new_hyp = Hypothesis(
                                 score=(hyp.score + float(logp)),
                                 y_sequence=(hyp.y_sequence + [int(k)]),
+                                cache_node=hyp.cache_node,
                                 dec_state=self.decoder.batch_select_state(beam_state, j),
                                 lm_state=hyp.lm_state,
                                 timestep=hyp.timestep[:] + [i],
@@ -512,6 +528,9 @@ class BeamRNNTInfer(Typing):
             # Prune beam
             B = sorted(A, key=lambda x: x.score, reverse=True)[:beam]
 
+            # Drop the cached states which no hypothesis of the beam can reach
+            cache.prune([hyp.y_sequence for hyp in B])
+
         return self.sort_nbest(B)
 
     def align_length_sync_decoding(self, h: torch.Tensor, encoded_lengths: torch.Tensor) -> List[Hypothesis]:
@@ -562,7 +581,7 @@ class BeamRNNTInfer(Typing):
         ]
 
         final = []
-        cache = {}
+        cache = self.state_cache
 
         # ALSD runs for T + U_max steps
         for i in range(h_length + u_max):
@@ -634,6 +653,7 @@ class BeamRNNTInfer(Typing):
                     new_hyp = Hypothesis(
                         score=(hyp.score + float(beam_logp[j, self.blank])),
                         y_sequence=hyp.y_sequence[:],
+                        cache_node=hyp.cache_node,
                         dec_state=hyp.dec_state,
                         lm_state=hyp.lm_state,
                         timestep=hyp.timestep[:],
@@ -663,6 +683,7 @@ class BeamRNNTInfer(Typing):
                         new_hyp = Hypothesis(
                             score=(hyp.score + float(logp)),
                             y_sequence=(hyp.y_sequence[:] + [int(k)]),
+                            cache_node=hyp.cache_node,
                             dec_state=self.decoder.batch_select_state(beam_state, h_states_idx),
                             lm_state=hyp.lm_state,
                             timestep=hyp.timestep[:] + [i],
@@ -677,6 +698,9 @@ class BeamRNNTInfer(Typing):
                 B = sorted(A, key=lambda x: x.score, reverse=True)[:beam]
                 B = self.recombine_hypotheses(B)
 
+                # Drop the cached states which no hypothesis of the beam can reach
+                cache.prune([hyp.y_sequence for hyp in B])
+
             # If B_ is empty list, then we may be able to early exit
             elif len(batch_ids) == len(batch_removal_ids):
                 break
@@ -708,3 +732,207 @@ class BeamRNNTInfer(Typing):
                 final.append(hyp)
 
         return hypotheses
+
+
+class BeamBatchedRNNTInfer(BeamRNNTInfer):
+    """Time synchronous beam search which decodes all the utterances of a batch together.
+
+    Performs the same search as `BeamRNNTInfer` with `search_type='tsd'`, but at every timestep and symmetric
+    expansion, the hypotheses of all utterances still within their length are scored with a single decoder call and
+    a single joint call, instead of one call per utterance. The decoder cache is shared by the whole batch, since
+    the prediction network state only depends on the token sequence.
+
+    Args:
+        decoder_model: rnnt_utils.AbstractRNNTDecoder implementation. Must support the blank token as pad value.
+        joint_model: rnnt_utils.AbstractRNNTJoint implementation.
+        beam_size: number of beams for beam search. Must be a positive integer >= 1.
+        score_norm: bool, whether to normalize the scores of the log probabilities.
+        return_best_hypothesis: bool, decides whether to return a single hypothesis (the best out of N),
+            or a NBestHypotheses container with all N hypotheses (sorted with best score first).
+        tsd_max_sym_exp_per_step: The maximum symmetric expansions allowed per timestep, as in `BeamRNNTInfer`.
+        state_cache_size: Maximum number of token sequences whose prediction network outputs and states are cached.
+    """
+
+    def __init__(
+        self,
+        decoder_model: rnnt_abstract.AbstractRNNTDecoder,
+        joint_model: rnnt_abstract.AbstractRNNTJoint,
+        beam_size: int,
+        score_norm: bool = True,
+        return_best_hypothesis: bool = True,
+        tsd_max_sym_exp_per_step: Optional[int] = 50,
+        state_cache_size: int = 4096,
+    ):
+        super().__init__(
+            decoder_model=decoder_model,
+            joint_model=joint_model,
+            beam_size=beam_size,
+            search_type='tsd',
+            score_norm=score_norm,
+            return_best_hypothesis=return_best_hypothesis,
+            tsd_max_sym_exp_per_step=tsd_max_sym_exp_per_step,
+            state_cache_size=state_cache_size,
+        )
+        self.search_algorithm = self.batched_time_sync_decoding
+
+    @typecheck()
+    def __call__(
+        self, encoder_output: torch.Tensor, encoded_lengths: torch.Tensor
+    ) -> Union[Hypothesis, NBestHypotheses]:
+        """Perform batched beam search.
+
+        Args:
+            encoder_output: Encoded speech features (B, D_enc, T_max)
+            encoded_lengths: Lengths of the encoder outputs
+
+        Returns:
+            Either a list containing a single Hypothesis per sample (when `return_best_hypothesis=True`),
+            otherwise a list containing a NBestHypotheses per sample.
+        """
+        # Preserve decoder and joint training state
+        decoder_training_state = self.decoder.training
+        joint_training_state = self.joint.training
+
+        with torch.no_grad():
+            encoder_output = encoder_output.transpose(1, 2)  # (B, T, D)
+
+            self.decoder.eval()
+            self.joint.eval()
+
+            # Cached states are only valid for the current weights of the decoder
+            self.state_cache.clear()
+
+            with self.decoder.as_frozen(), self.joint.as_frozen():
+                batch_nbest_hyps = self.search_algorithm(encoder_output, encoded_lengths)
+
+            hypotheses = []
+            for nbest_hyps in batch_nbest_hyps:
+                if self.return_best_hypothesis:
+                    hypotheses.append(nbest_hyps[0])
+                else:
+                    hypotheses.append(NBestHypotheses(nbest_hyps))
+
+        self.decoder.train(decoder_training_state)
+        self.joint.train(joint_training_state)
+
+        return (hypotheses,)
+
+    def batched_time_sync_decoding(self, h: torch.Tensor, encoded_lengths: torch.Tensor) -> List[List[Hypothesis]]:
+        """Time synchronous beam search over a batch of utterances.
+
+        Args:
+            h: Encoded speech features (B, T_max, D_enc)
+            encoded_lengths: Lengths of the encoder outputs (B)
+
+        Returns:
+            A list of the sorted N-best decoding results of every utterance.
+        """
+        # Precompute some constants for blank position
+        ids = list(range(self.vocab_size + 1))
+        ids.remove(self.blank)
+
+        # Used when blank token is first vs last token
+        if self.blank == 0:
+            index_incr = 1
+        else:
+            index_incr = 0
+
+        beam = min(self.beam_size, self.vocab_size)
+        batch_size = h.size(0)
+        lengths = encoded_lengths.tolist()
+        init_state = self.decoder.initialize_state(torch.zeros(1, device=h.device, dtype=h.dtype))
+
+        # Initialize first hypothesis for the beam (blank) of every utterance
+        B = [
+            [
+                Hypothesis(
+                    y_sequence=[self.blank],
+                    score=0.0,
+                    dec_state=self.decoder.batch_select_state(init_state, 0),
+                    timestep=[-1],
+                    length=0,
+                )
+            ]
+            for _ in range(batch_size)
+        ]
+        cache = self.state_cache
+
+        for i in range(max(lengths, default=0)):
+            # Utterances which are shorter than the current timestep are done
+            active = [b for b in range(batch_size) if i < lengths[b]]
+
+            A = {b: [] for b in active}
+            C = {b: B[b] for b in active}
+
+            # For a limited number of symmetric expansions per timestep "i"
+            for v in range(self.tsd_max_symmetric_expansion_per_step):
+                D = {b: [] for b in active}
+
+                # Flatten the hypotheses of all active utterances into a single batch
+                flat_ids = [b for b in active for _ in C[b]]
+                flat_hyps = [hyp for b in active for hyp in C[b]]
+
+                # Decode a batch of beam states and scores
+                beam_state = self.decoder.initialize_state(torch.zeros(len(flat_hyps), device=h.device, dtype=h.dtype))
+                beam_y, beam_state, beam_lm_tokens = self.decoder.batch_score_hypothesis(flat_hyps, cache, beam_state)
+
+                # Extract the log probabilities and the predicted tokens
+                h_enc = h[flat_ids, i : i + 1, :]  # [N, 1, D]
+                beam_logp = torch.log_softmax(self.joint.joint(h_enc, beam_y), dim=-1)  # [N, 1, 1, V + 1]
+                beam_logp = beam_logp[:, 0, 0, :]  # [N, V + 1]
+                beam_topk = beam_logp[:, ids].topk(beam, dim=-1)
+
+                blank_logp = beam_logp[:, self.blank].tolist()
+                topk_logp = beam_topk[0].tolist()
+                topk_ids = (beam_topk[1] + index_incr).tolist()
+
+                seq_A = {b: [hyp.y_sequence for hyp in A[b]] for b in active}
+
+                for j, (b, hyp) in enumerate(zip(flat_ids, flat_hyps)):
+                    # create a new hypothesis in A
+                    if hyp.y_sequence not in seq_A[b]:
+                        # If the sequence is not in seq_A, add it as the blank token
+                        # In this step, we dont add a token but simply update score
+                        A[b].append(
+                            Hypothesis(
+                                score=(hyp.score + blank_logp[j]),
+                                y_sequence=hyp.y_sequence[:],
+                                cache_node=hyp.cache_node,
+                                dec_state=hyp.dec_state,
+                                lm_state=hyp.lm_state,
+                                timestep=hyp.timestep[:],
+                                length=encoded_lengths[b],
+                            )
+                        )
+                    else:
+                        # merge the existing blank hypothesis score with current score.
+                        dict_pos = seq_A[b].index(hyp.y_sequence)
+
+                        A[b][dict_pos].score = np.logaddexp(A[b][dict_pos].score, (hyp.score + blank_logp[j]))
+
+                    # extract the top token score and top token id for the jth hypothesis
+                    # Note: This loop does *not* include the blank token!
+                    for logp, k in zip(topk_logp[j], topk_ids[j]):
+                        D[b].append(
+                            Hypothesis(
+                                score=(hyp.score + logp),
+                                y_sequence=(hyp.y_sequence + [int(k)]),
+                                cache_node=hyp.cache_node,
+                                dec_state=self.decoder.batch_select_state(beam_state, j),
+                                lm_state=hyp.lm_state,
+                                timestep=hyp.timestep[:] + [i],
+                                length=encoded_lengths[b],
+                            )
+                        )
+
+                # Prune beam
+                C = {b: sorted(D[b], key=lambda x: x.score, reverse=True)[:beam] for b in active}
+
+            # Prune beam
+            for b in active:
+                B[b] = sorted(A[b], key=lambda x: x.score, reverse=True)[:beam]
+
+            # Drop the cached states which no hypothesis of any beam can reach
+            cache.prune([hyp.y_sequence for b in active for hyp in B[b]])
+
+        return [self.sort_nbest(hyps) for hyps in B]
@@ -26,13 +26,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
 
 import torch
 
 from nemo.collections.asr.modules import rnnt_abstract
 from nemo.collections.asr.parts import rnnt_utils
-from nemo.collections.common.parts.rnn import label_collate
+from nemo.collections.common.parts.rnn import LSTMDropout, label_collate
 from nemo.core.classes import Typing, typecheck
 from nemo.core.neural_types import AcousticEncodedRepresentation, HypothesisType, LengthsType, NeuralType
 
@@ -574,3 +574,198 @@ class GreedyBatchedRNNTInfer(_GreedyRNNTInfer):
                 symbols_added += 1
 
         return label, timesteps
+
+
+class RNNTGreedyDecodeLoop(torch.nn.Module):
+    """Fused batch level greedy decoding loop of an RNNT prediction and joint network, compatible with TorchScript.
+
+    The loop shares the modules of an `RNNTDecoder`, whose prediction network must be the default LSTM
+    (`normalization_mode=None`), and of an `RNNTJoint`. It writes the decoded labels and their timesteps into
+    preallocated [B, T * max_symbols_per_step] tensors, and selects the prediction network states of the samples
+    which emitted a label with `torch.where`, so that no Python list is built and no index tensor is computed while
+    decoding. The encoder projection of the joint is computed once for all timesteps, and the prediction network is
+    only run after a label was emitted.
+
+    The host is synchronized once per symbol step to check whether any sample emitted a label, i.e. once per
+    timestep for frames where every sample predicts blank.
+
+    The loop can be exported with `torch.jit.script(loop)`.
+
+    Args:
+        decoder_model: rnnt_utils.AbstractRNNTDecoder implementation with a `prediction` module dict of an
+            `embed` embedding and an `dec_rnn` LSTM.
+        joint_model: rnnt_utils.AbstractRNNTJoint implementation with `enc`, `pred` and `joint_net` modules.
+        blank_index: int index of the blank token. Can be 0 or len(vocabulary).
+        max_symbols_per_step: int, the maximum number of symbols that can be added to a sequence in a single time
+            step.
+    """
+
+    def __init__(
+        self,
+        decoder_model: rnnt_abstract.AbstractRNNTDecoder,
+        joint_model: rnnt_abstract.AbstractRNNTJoint,
+        blank_index: int,
+        max_symbols_per_step: int,
+    ):
+        super().__init__()
+        if max_symbols_per_step < 1:
+            raise ValueError(f"`max_symbols_per_step` must be positive, got {max_symbols_per_step}")
+
+        dec_rnn = decoder_model.prediction["dec_rnn"]
+        if not isinstance(dec_rnn, LSTMDropout):
+            raise ValueError("Fused greedy decoding only supports prediction networks without normalization.")
+
+        self.embed = decoder_model.prediction["embed"]
+        self.lstm = dec_rnn.lstm
+        self.enc = joint_model.enc
+        self.pred = joint_model.pred
+        self.joint_net = joint_model.joint_net
+
+        self.blank_index = blank_index
+        self.max_symbols = max_symbols_per_step
+        self.num_embeddings = self.embed.num_embeddings
+
+    def _predict(
+        self, label: torch.Tensor, h: torch.Tensor, c: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        # The blank label is fed as a zero vector, as the "start of signal" token of `RNNTDecoder.predict`
+        y = self.embed(label.clamp(max=self.num_embeddings - 1))
+        y = y.masked_fill((label == self.blank_index).unsqueeze(1), 0.0)
+
+        g, (h, c) = self.lstm(y.unsqueeze(0), (h, c))
+        return self.pred(g[0]), h, c
+
+    def forward(
+        self, encoder_output: torch.Tensor, encoded_lengths: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Decodes a batch of encoder outputs.
+
+        Args:
+            encoder_output: A tensor of size (batch, timesteps, features).
+            encoded_lengths: A tensor of size (batch) of the number of valid timesteps of each sample.
+
+        Returns:
+            A tuple of the [B, T * max_symbols_per_step] labels and timesteps of every emitted symbol, and the [B]
+            number of emitted symbols of each sample. Entries past the number of symbols of a sample are undefined.
+        """
+        batch_size, max_time = encoder_output.size(0), encoder_output.size(1)
+        device = encoder_output.device
+        capacity = max_time * self.max_symbols
+
+        # One spare column, written to by samples which do not emit a label
+        labels = torch.full([batch_size, capacity + 1], self.blank_index, dtype=torch.long, device=device)
+        timesteps = torch.zeros([batch_size, capacity + 1], dtype=torch.long, device=device)
+        num_labels = torch.zeros([batch_size], dtype=torch.long, device=device)
+
+        f = self.enc(encoder_output)  # [B, T, H]
+
+        state_size = [self.lstm.num_layers, batch_size, self.lstm.hidden_size]
+        h = torch.zeros(state_size, dtype=f.dtype, device=device)
+        c = torch.zeros(state_size, dtype=f.dtype, device=device)
+        last_label = torch.full([batch_size], self.blank_index, dtype=torch.long, device=device)
+        g, h, c = self._predict(last_label, h, c)
+
+        for time_idx in range(max_time):
+            f_t = f[:, time_idx]
+            active = encoded_lengths > time_idx
+
+            symbols_added = 0
+            while symbols_added < self.max_symbols:
+                k = self.joint_net(f_t + g).argmax(dim=-1)  # [B]
+                emitted = active & (k != self.blank_index)
+
+                position = torch.where(emitted, num_labels, torch.full_like(num_labels, capacity)).unsqueeze(1)
+                labels.scatter_(1, position, k.unsqueeze(1))
+                timesteps.scatter_(1, position, torch.full_like(position, time_idx))
+                num_labels += emitted.long()
+                symbols_added += 1
+
+                if not bool(emitted.any()):
+                    break
+
+                # Only the samples which emitted a label advance their prediction network
+                g_prime, h_prime, c_prime = self._predict(k, h, c)
+                g = torch.where(emitted.unsqueeze(1), g_prime, g)
+                h = torch.where(emitted.view(1, -1, 1), h_prime, h)
+                c = torch.where(emitted.view(1, -1, 1), c_prime, c)
+                active = emitted
+
+        return labels[:, :capacity], timesteps[:, :capacity], num_labels
+
+
+class GreedyFusedBatchedRNNTInfer(_GreedyRNNTInfer):
+    """A batch level greedy transducer decoder, which runs the fused `RNNTGreedyDecodeLoop`.
+
+    Decodes the same labels as `GreedyRNNTInfer` with far fewer kernel launches and host synchronizations than
+    `GreedyBatchedRNNTInfer`. The decoding loop is available as `decode_loop` and can be exported with
+    `torch.jit.script`.
+
+    Args:
+        decoder_model: rnnt_utils.AbstractRNNTDecoder implementation, see `RNNTGreedyDecodeLoop`.
+        joint_model: rnnt_utils.AbstractRNNTJoint implementation, see `RNNTGreedyDecodeLoop`.
+        blank_index: int index of the blank token. Can be 0 or len(vocabulary).
+        max_symbols_per_step: Optional int. The maximum number of symbols that can be added
+            to a sequence in a single time step. Since output buffers are preallocated, it
+            cannot be unlimited, and None is replaced by 10.
+    """
+
+    def __init__(
+        self,
+        decoder_model: rnnt_abstract.AbstractRNNTDecoder,
+        joint_model: rnnt_abstract.AbstractRNNTJoint,
+        blank_index: int,
+        max_symbols_per_step: Optional[int] = None,
+    ):
+        if max_symbols_per_step is None:
+            max_symbols_per_step = 10
+
+        super().__init__(
+            decoder_model=decoder_model,
+            joint_model=joint_model,
+            blank_index=blank_index,
+            max_symbols_per_step=max_symbols_per_step,
+        )
+
+        self.decode_loop = RNNTGreedyDecodeLoop(
+            decoder_model=decoder_model,
+            joint_model=joint_model,
+            blank_index=blank_index,
+            max_symbols_per_step=max_symbols_per_step,
+        )
+
+    @typecheck()
+    def forward(self, encoder_output: torch.Tensor, encoded_lengths: torch.Tensor):
+        """Returns a list of hypotheses given an input batch of the encoder hidden embedding.
+        Output token is generated auto-repressively.
+
+        Args:
+            encoder_output: A tensor of size (batch, features, timesteps).
+            encoded_lengths: list of int representing the length of each sequence
+                output sequence.
+
+        Returns:
+            packed list containing batch number of sentences (Hypotheses).
+        """
+        # Preserve decoder and joint training state
+        decoder_training_state = self.decoder.training
+        joint_training_state = self.joint.training
+
+        with torch.no_grad():
+            encoder_output = encoder_output.transpose(1, 2)  # (B, T, D)
+
+            self.decoder.eval()
+            self.joint.eval()
+
+            labels, timesteps, num_labels = self.decode_loop(encoder_output, encoded_lengths.to(encoder_output.device))
+
+            # Single copy of the results to the host
+            labels, timesteps, num_labels = labels.cpu(), timesteps.cpu(), num_labels.tolist()
+            hypotheses = [labels[idx, :length].tolist() for idx, length in enumerate(num_labels)]
+            timesteps = [timesteps[idx, :length].tolist() for idx, length in enumerate(num_labels)]
+
+            packed_result = pack_hypotheses(hypotheses, timesteps, encoded_lengths)
+
+        self.decoder.train(decoder_training_state)
+        self.joint.train(joint_training_state)
+
+        return (packed_result,)
@@ -26,8 +26,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import torch
 
@@ -48,6 +49,9 @@ class Hypothesis:
     lm_state: (Unused) A dictionary state cache used by an external Language Model.
 
     lm_scores: (Unused) Score of the external Language Model.
+
+    cache_node: The node of `y_sequence` (or of its prefix without the last token) in the prefix trie of an
+        RNNTStateCache, so that the cache entry of the sequence is found without walking the trie from its root.
     """
 
     score: float
@@ -60,6 +64,7 @@ class Hypothesis:
     text: str = None
     timestep: Union[List[int], torch.Tensor] = field(default_factory=list)
     length: int = 0
+    cache_node: Optional[Any] = field(default=None, repr=False, compare=False)
 
 
 @dataclass
@@ -67,3 +72,209 @@ class NBestHypotheses:
     """List of N best hypotheses"""
 
     n_best_hypotheses: Optional[List[Hypothesis]]
+
+
+class _TrieNode:
+    __slots__ = ('parent', 'token', 'children', 'slot', 'depth', 'generation')
+
+    def __init__(self, generation: int, parent: Optional['_TrieNode'] = None, token: Optional[int] = None):
+        self.parent = parent
+        self.token = token
+        self.children = {}
+        self.slot = None
+        self.depth = 0 if parent is None else parent.depth + 1
+        # Generation of the trie the node belongs to, -1 once the node is removed from it.
+        self.generation = generation
+
+
+class RNNTStateCache:
+    """Bounded cache of prediction network outputs and states, used by beam search to score each token sequence once.
+
+    Token sequences are indexed by a prefix trie, and the [1, 1, H] output and [L, 1, H] states of each cached
+    sequence are stored in a slot of preallocated [max_size, H] and [L, max_size, H] tensors, allocated on the
+    device and dtype of the first entry. The cache follows the `get` / `__setitem__` protocol of the plain dict
+    caches accepted by `AbstractRNNTDecoder.score_hypothesis`, and returns copies of the cached tensors.
+
+    The cache holds at most `max_size` sequences. Beam searches call `prune` with the sequences of the live beam
+    after every step. When the cache is full, it first evicts the sequences that are neither one of the last live
+    sequences nor an extension of one, since no hypothesis can reach them anymore, and then the least recently used
+    sequence if none was unreachable. Unreachable sequences are only looked for when a slot is needed, so that the
+    trie is not traversed at every step.
+
+    `get_hypothesis` and `set_hypothesis` keep the trie node of a hypothesis in its `cache_node`, so that a
+    hypothesis extended by one token is looked up from the node of its parent instead of the root.
+
+    Hit and miss counts of `get` are kept in `hits` and `misses`, see `stats`.
+
+    Args:
+        max_size: Maximum number of cached sequences.
+    """
+
+    def __init__(self, max_size: int = 4096):
+        if max_size < 1:
+            raise ValueError(f"`max_size` must be positive, got {max_size}")
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._y = None
+        self._states = None
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        """Removes all entries of the cache. Hit and miss counts are kept."""
+        # Nodes of the previous trie, possibly still held by hypotheses, are no longer valid.
+        self._generation += 1
+        self._root = _TrieNode(self._generation)
+        self._slot_nodes = OrderedDict()  # slot -> trie node, in least recently used order
+        self._free_slots = list(range(self.max_size - 1, -1, -1))
+        self._live_sequences = None
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the hits, misses, hit rate and current number of entries of the cache."""
+        lookups = self.hits + self.misses
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=self.hits / lookups if lookups > 0 else 0.0,
+            size=len(self._slot_nodes),
+        )
+
+    def __len__(self):
+        return len(self._slot_nodes)
+
+    def __contains__(self, sequence: Sequence[int]) -> bool:
+        node = self._find(sequence)
+        return node is not None and node.slot is not None
+
+    def _find(self, sequence: Sequence[int], create: bool = False) -> Optional[_TrieNode]:
+        node = self._root
+        for token in sequence:
+            child = node.children.get(token)
+            if child is None:
+                if not create:
+                    return None
+                child = _TrieNode(self._generation, node, token)
+                node.children[token] = child
+            node = child
+        return node
+
+    def _find_hypothesis(self, hypothesis: Hypothesis, create: bool = False) -> Optional[_TrieNode]:
+        sequence = hypothesis.y_sequence
+        node = hypothesis.cache_node
+        if node is None or node.generation != self._generation or node.depth < len(sequence) - 1:
+            return self._find(sequence, create=create)
+
+        # The node of the hypothesis itself, or of its parent hypothesis, which it extends by one token.
+        if node.depth == len(sequence) and (node.depth == 0 or node.token == sequence[-1]):
+            return node
+        if node.depth == len(sequence) - 1 and (node.depth == 0 or node.token == sequence[-2]):
+            child = node.children.get(sequence[-1])
+            if child is None and create:
+                child = _TrieNode(self._generation, node, sequence[-1])
+                node.children[sequence[-1]] = child
+            return child
+        return self._find(sequence, create=create)
+
+    def get(self, sequence: Sequence[int], default: Any = None) -> Optional[Tuple[torch.Tensor, List[torch.Tensor]]]:
+        """Returns a copy of the ([1, 1, H] output, list of [L, 1, H] states) cached for `sequence`, or `default`."""
+        return self._get(self._find(sequence), default)
+
+    def get_hypothesis(
+        self, hypothesis: Hypothesis, default: Any = None
+    ) -> Optional[Tuple[torch.Tensor, List[torch.Tensor]]]:
+        """Same as `get` for the `y_sequence` of `hypothesis`, looked up from and stored in its `cache_node`."""
+        node = self._find_hypothesis(hypothesis)
+        if node is not None:
+            hypothesis.cache_node = node
+        return self._get(node, default)
+
+    def _get(self, node: Optional[_TrieNode], default: Any) -> Optional[Tuple[torch.Tensor, List[torch.Tensor]]]:
+        if node is None or node.slot is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        slot = node.slot
+        self._slot_nodes.move_to_end(slot)
+        y = self._y[slot : slot + 1].unsqueeze(0).clone()
+        states = [state[:, slot : slot + 1].clone() for state in self._states]
+        return y, states
+
+    def __setitem__(self, sequence: Sequence[int], value: Tuple[torch.Tensor, List[torch.Tensor]]):
+        """Caches the ([1, 1, H] output, list of [L, 1, H] states) of `sequence`."""
+        self._set(lambda create: self._find(sequence, create=create), value)
+
+    def set_hypothesis(self, hypothesis: Hypothesis, value: Tuple[torch.Tensor, List[torch.Tensor]]):
+        """Same as `__setitem__` for the `y_sequence` of `hypothesis`, whose trie node is stored in its `cache_node`."""
+        hypothesis.cache_node = self._set(lambda create: self._find_hypothesis(hypothesis, create=create), value)
+
+    def _set(
+        self, find: Callable[[bool], Optional[_TrieNode]], value: Tuple[torch.Tensor, List[torch.Tensor]]
+    ) -> _TrieNode:
+        y, states = value
+        if (
+            self._y is None
+            or self._y.device != y.device
+            or self._y.dtype != y.dtype
+            or self._y.size(-1) != y.size(-1)
+            or len(self._states) != len(states)
+        ):
+            # (Re)allocate the storage, e.g. when the decoder was moved to another device.
+            self.clear()
+            self._y = y.new_empty(self.max_size, y.size(-1))
+            self._states = [state.new_empty(state.size(0), self.max_size, state.size(-1)) for state in states]
+
+        node = find(False)
+        if node is None or node.slot is None:
+            if not self._free_slots and self._live_sequences is not None:
+                self._evict_unreachable(self._live_sequences)
+                self._live_sequences = None
+            if not self._free_slots:
+                self._evict(next(iter(self._slot_nodes)))
+            # Look the node up after the eviction, which may remove its branch of the trie
+            node = find(True)
+            node.slot = self._free_slots.pop()
+            self._slot_nodes[node.slot] = node
+        else:
+            self._slot_nodes.move_to_end(node.slot)
+
+        self._y[node.slot] = y.reshape(-1)
+        for storage, state in zip(self._states, states):
+            storage[:, node.slot] = state.reshape(state.size(0), -1)
+        return node
+
+    def prune(self, live_sequences: Iterable[Sequence[int]]):
+        """Marks the entries which are neither one of `live_sequences` nor an extension of one as evictable."""
+        # Copy the sequences, hypotheses may extend their lists in place
+        self._live_sequences = [tuple(sequence) for sequence in live_sequences]
+
+    def _evict_unreachable(self, live_sequences: List[Tuple[int, ...]]):
+        live = {id(node) for node in (self._find(sequence) for sequence in live_sequences) if node is not None}
+
+        # Walk the trie from its root without entering the subtrees of live sequences
+        unreachable = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if id(node) in live:
+                continue
+            if node.slot is not None:
+                unreachable.append(node.slot)
+            stack.extend(node.children.values())
+
+        for slot in unreachable:
+            self._evict(slot)
+
+    def _evict(self, slot: int):
+        node = self._slot_nodes.pop(slot)
+        node.slot = None
+        self._free_slots.append(slot)
+
+        # Remove the branch of the trie which no longer leads to any entry
+        while node.parent is not None and node.slot is None and not node.children:
+            del node.parent.children[node.token]
+            node.generation = -1
+            node = node.parent
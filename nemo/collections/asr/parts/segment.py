@@ -35,6 +35,8 @@
 
 import os
 import random
+import wave
+from functools import lru_cache
 
 import librosa
 import numpy as np
@@ -42,12 +44,109 @@ import soundfile as sf
 from kaldiio.matio import read_kaldi
 from kaldiio.utils import open_like_kaldi
 from pydub import AudioSegment as Audio
+from pydub.utils import mediainfo
 
 from nemo.utils import logging
 
 available_formats = sf.available_formats()
 sf_supported_formats = ["." + i.lower() for i in available_formats.keys()]
 
+# Number of audio file headers kept by `get_audio_info`.
+AUDIO_INFO_CACHE_SIZE = 4096
+# Frames skipped per read when seeking in non-seekable Kaldi pipes.
+_PIPE_SKIP_FRAMES = 1 << 16
+
+
+@lru_cache(maxsize=AUDIO_INFO_CACHE_SIZE)
+def _cached_audio_info(audio_file, mtime, size):
+    try:
+        info = sf.info(audio_file)
+    except RuntimeError as e:
+        logging.error(
+            f"Loading audio via SoundFile raised RuntimeError: `{e}`. NeMo will fallback to loading via pydub."
+        )
+        return None
+    return info.samplerate, info.frames, info.channels
+
+
+def get_audio_info(audio_file):
+    """Returns the (sample rate, number of frames, number of channels) header of an audio file readable by
+    SoundFile, or None if SoundFile cannot decode it.
+
+    Headers are cached per process and keyed by path, modification time and size, so segmented corpora which load
+    many short segments of the same long recording only parse its header once. Files which SoundFile fails to
+    decode are remembered as well, so they go straight to the pydub fallback instead of failing every time.
+    """
+    stat = os.stat(audio_file)
+    return _cached_audio_info(audio_file, stat.st_mtime, stat.st_size)
+
+
+@lru_cache(maxsize=AUDIO_INFO_CACHE_SIZE)
+def _cached_probe_duration(audio_file, mtime, size):
+    try:
+        return float(mediainfo(audio_file)['duration'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def get_audio_duration(audio_file):
+    """Returns the duration in seconds of an audio file without decoding its samples whenever possible.
+
+    The duration is read from the SoundFile header, see `get_audio_info`. Other formats are probed with ffprobe
+    through pydub, which only parses the container headers, and the file is decoded only if probing fails.
+    """
+    info = get_audio_info(audio_file)
+    if info is not None:
+        return info[1] / info[0]
+
+    stat = os.stat(audio_file)
+    duration = _cached_probe_duration(audio_file, stat.st_mtime, stat.st_size)
+    if duration is not None:
+        return duration
+
+    logging.warning(f"Could not probe the duration of {audio_file}, it is decoded instead.")
+    return AudioSegment.from_file(audio_file).duration
+
+
+def _read_kaldi_pipe_segment(audio_file, offset=0, duration=0):
+    """Reads the [offset, offset + duration) span of the PCM wav written by a Kaldi pipe command (`cmd |`).
+
+    The stream is not seekable, so the frames before `offset` are read and dropped in small chunks, and the pipe is
+    closed as soon as the requested frames are read instead of decoding the whole recording.
+
+    Returns:
+        A tuple of the sample rate and the int samples, or None if the stream is not PCM wav.
+    """
+    f = open_like_kaldi(audio_file, "rb")
+    try:
+        with wave.open(f, 'rb') as w:
+            sample_rate, sample_width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+            if sample_width not in (2, 4):
+                return None
+            dtype = np.dtype('<i{}'.format(sample_width))
+
+            to_skip = int(offset * sample_rate)
+            while to_skip > 0:
+                skipped = len(w.readframes(min(to_skip, _PIPE_SKIP_FRAMES))) // (sample_width * channels)
+                if skipped == 0:
+                    break
+                to_skip -= skipped
+
+            if duration > 0:
+                data = w.readframes(int(duration * sample_rate))
+            else:
+                # Streamed wav headers often carry a placeholder length, so read until the end of the stream.
+                data = b''.join(iter(lambda: w.readframes(_PIPE_SKIP_FRAMES), b''))
+            samples = np.frombuffer(data, dtype=dtype)
+    except (wave.Error, EOFError):
+        return None
+    finally:
+        f.close()
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    return sample_rate, samples
+
 
 class AudioSegment(object):
     """Monaural audio segment abstraction.
@@ -131,7 +230,11 @@ class AudioSegment(object):
         :return: numpy array of samples
         """
         samples = None
-        if not isinstance(audio_file, str) or os.path.splitext(audio_file)[-1] in sf_supported_formats:
+        use_soundfile = not isinstance(audio_file, str) or os.path.splitext(audio_file)[-1] in sf_supported_formats
+        if use_soundfile and isinstance(audio_file, str):
+            use_soundfile = get_audio_info(audio_file) is not None
+
+        if use_soundfile:
             try:
                 with sf.SoundFile(audio_file, 'r') as f:
                     dtype = 'int32' if int_values else 'float32'
@@ -148,27 +251,32 @@ class AudioSegment(object):
                     f"Loading audio via SoundFile raised RuntimeError: `{e}`. NeMo will fallback to loading via pydub."
                 )
         elif isinstance(audio_file, str) and audio_file.strip()[-1] == "|":
-            f = open_like_kaldi(audio_file, "rb")
-            sample_rate, samples = read_kaldi(f)
-            if offset > 0:
-                samples = samples[int(offset * sample_rate) :]
-            if duration > 0:
-                samples = samples[: int(duration * sample_rate)]
+            result = None
+            if offset > 0 or duration > 0:
+                result = _read_kaldi_pipe_segment(audio_file, offset=offset, duration=duration)
+            if result is not None:
+                sample_rate, samples = result
+            else:
+                f = open_like_kaldi(audio_file, "rb")
+                sample_rate, samples = read_kaldi(f)
+                if offset > 0:
+                    samples = samples[int(offset * sample_rate) :]
+                if duration > 0:
+                    samples = samples[: int(duration * sample_rate)]
             if not int_values:
                 abs_max_value = np.abs(samples).max()
                 samples = np.array(samples, dtype=np.float) / abs_max_value
 
         if samples is None:
-            samples = Audio.from_file(audio_file)
+            # pydub passes the span to ffmpeg (`-ss` / `-t`), so compressed formats only decode the requested frames.
+            samples = Audio.from_file(
+                audio_file, start_second=offset if offset > 0 else None, duration=duration if duration > 0 else None,
+            )
             sample_rate = samples.frame_rate
-            if offset > 0:
-                # pydub does things in milliseconds
-                seconds = offset * 1000
-                samples = samples[int(seconds * sample_rate) :]
-            if duration > 0:
-                seconds = duration * 1000
-                samples = samples[: int(seconds)]
+            channels = samples.channels
             samples = np.array(samples.get_array_of_samples())
+            if channels > 1:
+                samples = samples.reshape(-1, channels)
 
         return cls(samples, sample_rate, target_sr=target_sr, trim=trim, orig_sr=orig_sr)
 
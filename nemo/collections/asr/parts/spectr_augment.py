@@ -13,11 +13,58 @@
 # limitations under the License.
 
 import random
+from typing import Optional
 
 import torch
 import torch.nn as nn
 
 
+def _random_generator(rng: random.Random, device: torch.device) -> torch.Generator:
+    """Returns a torch generator on `device`, seeded from `rng` so that seeding `rng` keeps masks reproducible."""
+    generator = torch.Generator(device=device)
+    generator.manual_seed(rng.getrandbits(63))
+    return generator
+
+
+def _random_spans(
+    num_spans: int,
+    max_width: torch.Tensor,
+    axis_lengths: torch.Tensor,
+    axis_size: int,
+    generator: torch.Generator,
+    start_margin: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    """
+    Draws `num_spans` random spans per sample with the distribution of the loop implementation: the start is drawn
+    uniformly in [0, axis_length - start_margin] and the width independently in [0, max_width], and the span is
+    clipped to the first `axis_lengths` positions of the axis.
+
+    Args:
+        num_spans: Number of spans per sample.
+        max_width: Maximum width of a span, a tensor broadcastable to [B, 1].
+        axis_lengths: Number of valid positions of the axis of every sample, of shape [B].
+        axis_size: Size of the (padded) axis.
+        generator: Torch generator to draw from.
+        start_margin: Number of positions at the end of the axis where spans do not start, a tensor broadcastable
+            to [B, 1]. Defaults to `max_width`.
+
+    Returns:
+        A bool tensor of shape [B, num_spans, axis_size] which is True within the spans.
+    """
+    batch_size = axis_lengths.shape[0]
+    device = axis_lengths.device
+    axis_lengths = axis_lengths.unsqueeze(1)
+    if start_margin is None:
+        start_margin = max_width
+
+    uniform = torch.rand(2, batch_size, num_spans, device=device, generator=generator)
+    start = (uniform[0] * ((axis_lengths - start_margin).clamp(min=0) + 1)).long()
+    end = torch.min(start + (uniform[1] * (max_width + 1)).long(), axis_lengths)
+
+    positions = torch.arange(axis_size, device=device)
+    return (positions >= start.unsqueeze(-1)) & (positions < end.unsqueeze(-1))
+
+
 class SpecAugment(nn.Module):
     """
     Zeroes out(cuts) random continuous horisontal or
@@ -34,10 +81,22 @@ class SpecAugment(nn.Module):
         to be cut in one segment.
         If a float value, defines maximum percentage of timesteps that
         are cut adaptively.
+    use_vectorized_code - draws all the masks of the batch at once and
+        applies them with a single `masked_fill`, instead of looping over
+        every sample and mask. Masks are drawn from the same distribution
+        as the loop, but within the valid frames of samples whose `length`
+        is given, which also scales adaptive time widths.
     """
 
     def __init__(
-        self, freq_masks=0, time_masks=0, freq_width=10, time_width=10, rng=None, mask_value=0.0,
+        self,
+        freq_masks=0,
+        time_masks=0,
+        freq_width=10,
+        time_width=10,
+        rng=None,
+        mask_value=0.0,
+        use_vectorized_code=False,
     ):
         super(SpecAugment, self).__init__()
 
@@ -50,6 +109,7 @@ class SpecAugment(nn.Module):
         self.time_width = time_width
 
         self.mask_value = mask_value
+        self.use_vectorized_code = use_vectorized_code
 
         if isinstance(time_width, int):
             self.adaptive_temporal_width = False
@@ -60,7 +120,10 @@ class SpecAugment(nn.Module):
             self.adaptive_temporal_width = True
 
     @torch.no_grad()
-    def forward(self, x):
+    def forward(self, x, length: Optional[torch.Tensor] = None):
+        if self.use_vectorized_code:
+            return self._forward_vectorized(x, length)
+
         sh = x.shape
 
         if self.adaptive_temporal_width:
@@ -85,6 +148,38 @@ class SpecAugment(nn.Module):
 
         return x
 
+    def _forward_vectorized(self, x: torch.Tensor, length: Optional[torch.Tensor]) -> torch.Tensor:
+        batch_size, num_freqs, num_frames = x.shape
+        if length is None:
+            length = torch.full((batch_size,), num_frames, dtype=torch.long, device=x.device)
+        length = length.to(device=x.device, dtype=torch.long)
+        generator = _random_generator(self._rng, x.device)
+
+        if self.freq_masks > 0:
+            freq_mask = _random_spans(
+                self.freq_masks,
+                torch.tensor(self.freq_width, device=x.device),
+                torch.full_like(length, num_freqs),
+                num_freqs,
+                generator,
+            ).any(dim=1)
+        else:
+            freq_mask = torch.zeros(batch_size, num_freqs, dtype=torch.bool, device=x.device)
+
+        if self.time_masks > 0:
+            if self.adaptive_temporal_width:
+                time_width = (length * self.time_width).long().clamp(min=1).unsqueeze(1)
+            else:
+                time_width = torch.tensor(self.time_width, device=x.device)
+            time_mask = _random_spans(self.time_masks, time_width, length, num_frames, generator).any(dim=1)
+        else:
+            time_mask = torch.zeros(batch_size, num_frames, dtype=torch.bool, device=x.device)
+
+        # Time spans already lie within the valid frames, frequency spans are restricted to them
+        valid_frames = torch.arange(num_frames, device=x.device) < length.unsqueeze(1)
+        mask = (freq_mask.unsqueeze(2) & valid_frames.unsqueeze(1)) | time_mask.unsqueeze(1)
+        return x.masked_fill_(mask, self.mask_value)
+
 
 class SpecCutout(nn.Module):
     """
@@ -95,9 +190,20 @@ class SpecCutout(nn.Module):
     rect_masks - how many rectangular masks should be cut
     rect_freq - maximum size of cut rectangles along the frequency dimension
     rect_time - maximum size of cut rectangles along the time dimension
+    rng - optional random.Random to draw the rectangles from
+    use_vectorized_code - draws all the rectangles of the batch at once and
+        applies them with a single `masked_fill`, instead of looping over
+        every sample and rectangle. Rectangles are drawn from the same
+        distribution as the loop, but within the valid frames of samples
+        whose `length` is given.
+    fix_rect_axes - bounds the size of rectangles by `rect_freq` along the
+        frequency dimension and by `rect_time` along the time dimension.
+        By default the two sizes are swapped, as in earlier versions.
     """
 
-    def __init__(self, rect_masks=0, rect_time=5, rect_freq=20, rng=None):
+    def __init__(
+        self, rect_masks=0, rect_time=5, rect_freq=20, rng=None, use_vectorized_code=False, fix_rect_axes=False
+    ):
         super(SpecCutout, self).__init__()
 
         self._rng = random.Random() if rng is None else rng
@@ -105,9 +211,19 @@ class SpecCutout(nn.Module):
         self.rect_masks = rect_masks
         self.rect_time = rect_time
         self.rect_freq = rect_freq
+        self.use_vectorized_code = use_vectorized_code
+        self.fix_rect_axes = fix_rect_axes
+
+        if fix_rect_axes:
+            self._max_freq_width, self._max_time_width = rect_freq, rect_time
+        else:
+            self._max_freq_width, self._max_time_width = rect_time, rect_freq
 
     @torch.no_grad()
-    def forward(self, x):
+    def forward(self, x, length: Optional[torch.Tensor] = None):
+        if self.use_vectorized_code:
+            return self._forward_vectorized(x, length)
+
         sh = x.shape
 
         for idx in range(sh[0]):
@@ -115,9 +231,41 @@ class SpecCutout(nn.Module):
                 rect_x = self._rng.randint(0, sh[1] - self.rect_freq)
                 rect_y = self._rng.randint(0, sh[2] - self.rect_time)
 
-                w_x = self._rng.randint(0, self.rect_time)
-                w_y = self._rng.randint(0, self.rect_freq)
+                w_x = self._rng.randint(0, self._max_freq_width)
+                w_y = self._rng.randint(0, self._max_time_width)
 
                 x[idx, rect_x : rect_x + w_x, rect_y : rect_y + w_y] = 0.0
 
         return x
+
+    def _forward_vectorized(self, x: torch.Tensor, length: Optional[torch.Tensor]) -> torch.Tensor:
+        if self.rect_masks <= 0:
+            return x
+
+        batch_size, num_freqs, num_frames = x.shape
+        if length is None:
+            length = torch.full((batch_size,), num_frames, dtype=torch.long, device=x.device)
+        length = length.to(device=x.device, dtype=torch.long)
+        generator = _random_generator(self._rng, x.device)
+
+        # [B, rect_masks, F] and [B, rect_masks, T]
+        freq_spans = _random_spans(
+            self.rect_masks,
+            torch.tensor(self._max_freq_width, device=x.device),
+            torch.full_like(length, num_freqs),
+            num_freqs,
+            generator,
+            start_margin=torch.tensor(self.rect_freq, device=x.device),
+        )
+        time_spans = _random_spans(
+            self.rect_masks,
+            torch.tensor(self._max_time_width, device=x.device),
+            length,
+            num_frames,
+            generator,
+            start_margin=torch.tensor(self.rect_time, device=x.device),
+        )
+
+        # Union of the rectangles: [B, F, rect_masks] x [B, rect_masks, T] counts the rectangles covering a bin
+        mask = torch.bmm(freq_spans.transpose(1, 2).float(), time_spans.float()) > 0
+        return x.masked_fill_(mask, 0.0)
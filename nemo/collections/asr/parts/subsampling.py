@@ -30,11 +30,20 @@ class ConvSubsampling(torch.nn.Module):
         feat_out (int): size of the output features
         conv_channels (int): Number of channels for the convolution layers.
         activation (Module): activation function, default is nn.ReLU()
+        is_causal (bool): whether the striding convolutions only look at the current and past frames, which allows to
+            subsample a stream chunk by chunk with `stream_step`. Only supported by striding subsampling.
     """
 
-    def __init__(self, subsampling, subsampling_factor, feat_in, feat_out, conv_channels, activation=nn.ReLU()):
+    def __init__(
+        self, subsampling, subsampling_factor, feat_in, feat_out, conv_channels, activation=nn.ReLU(), is_causal=False
+    ):
         super(ConvSubsampling, self).__init__()
         self._subsampling = subsampling
+        self._feat_in = feat_in
+        self.is_causal = is_causal
+
+        if is_causal and subsampling != 'striding':
+            raise ValueError("Causal subsampling is only supported by striding subsampling!")
 
         if subsampling_factor % 2 != 0:
             raise ValueError("Sampling factor should be a multiply of 2!")
@@ -77,13 +86,16 @@ class ConvSubsampling(torch.nn.Module):
             self._ceil_mode = False
 
             for i in range(self._sampling_num):
+                if is_causal:
+                    # Pad the time axis on the left only, with as many frames as the symmetric padding
+                    layers.append(torch.nn.ConstantPad2d((0, 0, 2 * self._padding, 0), 0.0))
                 layers.append(
                     torch.nn.Conv2d(
                         in_channels=in_channels,
                         out_channels=conv_channels,
                         kernel_size=self._kernel_size,
                         stride=self._stride,
-                        padding=self._padding,
+                        padding=(0, self._padding) if is_causal else self._padding,
                     )
                 )
                 layers.append(activation)
@@ -128,6 +140,62 @@ class ConvSubsampling(torch.nn.Module):
         new_lengths = torch.IntTensor(new_lengths).to(lengths.device)
         return x, new_lengths
 
+    def get_initial_cache_state(self, batch_size, dtype=torch.float32, device=None):
+        """Returns the cache of `stream_step` at the start of a stream, which stands for the left padding.
+
+        Args:
+            batch_size (int): number of streams
+            dtype (torch.dtype): dtype of the cache
+            device (torch.device): device of the cache
+
+        Returns:
+            list of (batch_size, channels, 2 * padding, features) tensors, one per striding convolution
+        """
+        if not self.is_causal:
+            raise ValueError("Only causal subsampling can be computed chunk by chunk.")
+
+        cache = []
+        features = self._feat_in
+        for idx, layer in enumerate(self.conv):
+            if isinstance(layer, torch.nn.ConstantPad2d):
+                conv = self.conv[idx + 1]
+                cache.append(
+                    torch.zeros(batch_size, conv.in_channels, 2 * self._padding, features, dtype=dtype, device=device)
+                )
+                features = calc_length(features, self._padding, self._kernel_size, self._stride, self._ceil_mode)
+        return cache
+
+    def stream_step(self, x, lengths, cache):
+        """Subsamples the next chunk of a stream, which gives the same output as `forward` on the whole stream.
+
+        Args:
+            x (torch.Tensor): (batch, time, features) chunk, of a multiple of the subsampling factor frames except for
+                the last chunk of the stream
+            lengths (torch.Tensor): (batch,) lengths of the chunks
+            cache (list): cache returned by the previous step, or by `get_initial_cache_state` for the first chunk
+
+        Returns:
+            x (torch.Tensor): (batch, subsampled time, feat_out)
+            lengths (torch.Tensor): (batch,) subsampled lengths
+            cache (list): cache for the next step
+        """
+        x = x.unsqueeze(1)
+        new_cache = []
+        for layer in self.conv:
+            if isinstance(layer, torch.nn.ConstantPad2d):
+                # The last frames of the previous chunk replace the padding
+                x = torch.cat([cache[len(new_cache)], x], dim=2)
+                new_cache.append(x[:, :, x.size(2) - 2 * self._padding :])
+            else:
+                x = layer(x)
+        b, c, t, f = x.size()
+        x = self.out(x.transpose(1, 2).contiguous().view(b, t, c * f))
+
+        lengths = lengths.float()
+        for i in range(self._sampling_num):
+            lengths = torch.floor((lengths + 2 * self._padding - self._kernel_size) / self._stride) + 1
+        return x, lengths.int(), new_cache
+
 
 def calc_length(length, padding, kernel_size, stride, ceil_mode):
     """ Calculates the output length of a Tensor passed through a convolution or max pooling layer"""
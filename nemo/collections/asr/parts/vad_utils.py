@@ -16,16 +16,28 @@ import json
 import os
 from itertools import repeat
 from multiprocessing import Pool
+from typing import Dict, Optional
 
 import librosa
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
+import torch
 from pyannote.core import Annotation, Segment
 from pyannote.metrics import detection
+from tqdm import tqdm
 
 from nemo.utils import logging
 
+try:
+    from torch.cuda.amp import autocast
+except ImportError:
+    from contextlib import contextmanager
+
+    @contextmanager
+    def autocast(enabled=None):
+        yield
+
 
 """
 This file contains all the utility functions required for speaker embeddings part in diarization scripts
@@ -166,6 +178,80 @@ def get_vad_stream_status(data):
     return status
 
 
+def generate_vad_frame_pred(
+    vad_model,
+    window_length_in_sec: float,
+    shift_length_in_sec: float,
+    manifest_vad_input: str,
+    out_dir: Optional[str] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Generate the frame level speech probabilities of every audio file of a manifest, by shifting a window of
+    window_length_in_sec by shift_length_in_sec and using the prediction of the window for its frame.
+    The snippets of the files split by prepare_manifest are stitched back together, and predictions stay in memory.
+    Args:
+        vad_model (EncDecClassificationModel): VAD model in eval mode, whose test data is set up with vad_stream on
+            manifest_vad_input.
+        window_length_in_sec (float): length of window for generating the frame.
+        shift_length_in_sec (float): amount of shift of window for generating the frame.
+        manifest_vad_input (str): manifest the test data of vad_model is set up with.
+        out_dir (str): if not None, also write the predictions of every file to out_dir/<name>.frame, one per line.
+    Returns:
+        frame_preds (dict): frame level speech probabilities of every file, keyed by the file name without extension.
+    """
+    time_unit = int(window_length_in_sec / shift_length_in_sec)
+    trunc = int(time_unit / 2)
+    trunc_l = time_unit - trunc
+
+    data = []
+    for line in open(manifest_vad_input, 'r'):
+        file = os.path.basename(json.loads(line)['audio_filepath'])
+        data.append(os.path.splitext(file)[0])
+
+    device = next(vad_model.parameters()).device
+    status = get_vad_stream_status(data)
+    frame_preds = {}
+    snippet_preds = []
+    for i, test_batch in enumerate(tqdm(vad_model.test_dataloader())):
+        test_batch = [x.to(device) for x in test_batch]
+        with autocast():
+            log_probs = vad_model(input_signal=test_batch[0], input_signal_length=test_batch[1])
+            probs = torch.softmax(log_probs, dim=-1)
+            pred = probs[:, 1]
+            if status[i] == 'start':
+                to_save = pred[:-trunc]
+            elif status[i] == 'next':
+                to_save = pred[trunc:-trunc_l]
+            elif status[i] == 'end':
+                to_save = pred[trunc_l:]
+            else:
+                to_save = pred
+            snippet_preds.append(to_save.float().cpu().numpy())
+        del test_batch
+        if status[i] == 'end' or status[i] == 'single':
+            frame_preds[data[i]] = np.concatenate(snippet_preds)
+            snippet_preds = []
+            logging.debug(f"Overall length of prediction of {data[i]} is {len(frame_preds[data[i]])}!")
+
+    if out_dir is not None:
+        write_vad_pred_to_text(frame_preds, out_dir, "frame")
+    return frame_preds
+
+
+def write_vad_pred_to_text(preds: Dict[str, np.ndarray], out_dir: str, extension: str):
+    """
+    Write predictions to out_dir/<name>.<extension>, one per line with 4 decimals, as read by the file based
+    functions of this module.
+    Args:
+        preds (dict): predictions keyed by file name.
+        out_dir (str): directory of the written files.
+        extension (str): extension of the written files, e.g. "frame", "mean" or "median".
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for name, pred in preds.items():
+        np.savetxt(os.path.join(out_dir, name + "." + extension), pred, fmt='%0.4f')
+
+
 def generate_overlap_vad_seq(frame_pred_dir, smoothing_method, overlap, seg_len, shift_len, num_workers):
     """
     Gnerate predictions with overlapping input windows/segments. Then a smoothing filter is applied to decide the label for a frame spanned by multiple windows. 
@@ -211,67 +297,15 @@ def generate_overlap_vad_seq_per_file(frame_filepath, per_args):
     """
     try:
         smoothing_method = per_args['smoothing_method']
-        overlap = per_args['overlap']
-        seg_len = per_args['seg_len']
-        shift_len = per_args['shift_len']
         out_dir = per_args['out_dir']
 
         frame = np.loadtxt(frame_filepath)
         name = os.path.basename(frame_filepath).split(".frame")[0] + "." + smoothing_method
         overlap_filepath = os.path.join(out_dir, name)
 
-        shift = int(shift_len / 0.01)  # number of units of shift
-        seg = int((seg_len / 0.01 + 1))  # number of units of each window/segment
-
-        jump_on_target = int(seg * (1 - overlap))  # jump on target generated sequence
-        jump_on_frame = int(jump_on_target / shift)  # jump on input frame sequence
-
-        if jump_on_frame < 1:
-            raise ValueError(
-                f"Note we jump over frame sequence to generate overlapping input segments. \n \
-            Your input makes jump_on_fram={jump_on_frame} < 1 which is invalid because it cannot jump and will stuck.\n \
-            Please try different seg_len, shift_len and overlap choices. \n \
-            jump_on_target = int(seg * (1 - overlap)) \n \
-            jump_on_frame  = int(jump_on_frame/shift) "
-            )
-
-        target_len = int(len(frame) * shift)
-
-        if smoothing_method == 'mean':
-            preds = np.zeros(target_len)
-            pred_count = np.zeros(target_len)
-
-            for i, og_pred in enumerate(frame):
-                if i % jump_on_frame != 0:
-                    continue
-                start = i * shift
-                end = start + seg
-                preds[start:end] = preds[start:end] + og_pred
-                pred_count[start:end] = pred_count[start:end] + 1
-
-            preds = preds / pred_count
-            last_non_zero_pred = preds[pred_count != 0][-1]
-            preds[pred_count == 0] = last_non_zero_pred
-
-        elif smoothing_method == 'median':
-            preds = [[] for _ in range(target_len)]
-            for i, og_pred in enumerate(frame):
-                if i % jump_on_frame != 0:
-                    continue
-
-                start = i * shift
-                end = start + seg
-                for j in range(start, end):
-                    if j <= target_len - 1:
-                        preds[j].append(og_pred)
-
-            preds = np.array([np.median(l) for l in preds])
-            nan_idx = np.isnan(preds)
-            last_non_nan_pred = preds[~nan_idx][-1]
-            preds[nan_idx] = last_non_nan_pred
-
-        else:
-            raise ValueError("smoothing_method should be either mean or median")
+        preds = generate_overlap_vad_seq_per_tensor(
+            frame, smoothing_method, per_args['overlap'], per_args['seg_len'], per_args['shift_len']
+        )
 
         round_final = np.round(preds, 4)
         np.savetxt(overlap_filepath, round_final, delimiter='\n')
@@ -280,6 +314,78 @@ def generate_overlap_vad_seq_per_file(frame_filepath, per_args):
         raise (e)
 
 
+def generate_overlap_vad_seq_per_tensor(
+    frame: np.ndarray, smoothing_method: str, overlap: float, seg_len: float, shift_len: float
+) -> np.ndarray:
+    """
+    Smooth frame predictions in memory, as generate_overlap_vad_seq does for files. Every jump_on_frame-th frame
+    prediction is spread over the seg target frames its window spans, and every target frame takes the mean or median
+    of the predictions spread over it.
+    Args:
+        frame (np.ndarray): frame predictions of a file.
+        smoothing_method (str): median or mean smoothing filter.
+        overlap (float): amounts of overlap of adjacent windows.
+        seg_len (float): length of window for generating the frame.
+        shift_len (float): amount of shift of window for generating the frame.
+    Returns:
+        preds (np.ndarray): smoothed predictions.
+    """
+    shift = int(shift_len / 0.01)  # number of units of shift
+    seg = int((seg_len / 0.01 + 1))  # number of units of each window/segment
+
+    jump_on_target = int(seg * (1 - overlap))  # jump on target generated sequence
+    jump_on_frame = int(jump_on_target / shift)  # jump on input frame sequence
+
+    if jump_on_frame < 1:
+        raise ValueError(
+            f"Note we jump over frame sequence to generate overlapping input segments. \n \
+        Your input makes jump_on_fram={jump_on_frame} < 1 which is invalid because it cannot jump and will stuck.\n \
+        Please try different seg_len, shift_len and overlap choices. \n \
+        jump_on_target = int(seg * (1 - overlap)) \n \
+        jump_on_frame  = int(jump_on_frame/shift) "
+        )
+
+    target_len = int(len(frame) * shift)
+
+    # Windows of the used frame predictions span [starts, starts + seg) on the target sequence
+    window_preds = np.asarray(frame, dtype=np.float64)[::jump_on_frame]
+    step = jump_on_frame * shift
+    starts = np.arange(len(window_preds)) * step
+
+    if smoothing_method == 'mean':
+        ends = np.minimum(starts + seg, target_len)
+        preds = np.zeros(target_len + 1)
+        pred_count = np.zeros(target_len + 1)
+        np.add.at(preds, starts, window_preds)
+        np.add.at(preds, ends, -window_preds)
+        np.add.at(pred_count, starts, 1)
+        np.add.at(pred_count, ends, -1)
+        preds = np.cumsum(preds)[:target_len]
+        pred_count = np.cumsum(pred_count)[:target_len]
+
+        covered = pred_count > 0
+        preds[covered] = preds[covered] / pred_count[covered]
+        preds[~covered] = preds[covered][-1]
+
+    elif smoothing_method == 'median':
+        # The windows spanning a target frame are the last ceil(seg / step) ones starting at or before it
+        target = np.arange(target_len)
+        windows = target[:, None] // step - np.arange(-(-seg // step))[None, :]
+        valid = (windows >= 0) & (windows < len(window_preds))
+        valid &= target[:, None] < np.where(valid, windows, 0) * step + seg
+        spread_preds = np.where(valid, window_preds[np.clip(windows, 0, len(window_preds) - 1)], np.nan)
+
+        covered = valid.any(axis=1)
+        preds = np.full(target_len, np.nan)
+        preds[covered] = np.nanmedian(spread_preds[covered], axis=1)
+        preds[~covered] = preds[covered][-1]
+
+    else:
+        raise ValueError("smoothing_method should be either mean or median")
+
+    return preds
+
+
 def generate_vad_segment_table(vad_pred_dir, threshold, shift_len, num_workers):
     """
     Convert frame level prediction to speech segment in start and end times format.
@@ -321,34 +427,12 @@ def generate_vad_segment_table_per_file(pred_filepath, per_args):
     """
     See discription in generate_overlap_vad_seq.
     """
-    threshold = per_args['threshold']
-    shift_len = per_args['shift_len']
     out_dir = per_args['out_dir']
 
     name = pred_filepath.split("/")[-1].rsplit(".", 1)[0]
 
     sequence = np.loadtxt(pred_filepath)
-    start = 0
-    start_list = [0]
-    dur_list = []
-    state_list = []
-    current_state = "non-speech"
-    for i in range(len(sequence) - 1):
-        current_state = "non-speech" if sequence[i] <= threshold else "speech"
-        next_state = "non-speech" if sequence[i + 1] <= threshold else "speech"
-        if next_state != current_state:
-            dur = i * shift_len + shift_len - start  # shift_len for handling joint
-            state_list.append(current_state)
-            dur_list.append(dur)
-
-            start = (i + 1) * shift_len
-            start_list.append(start)
-
-    dur_list.append((i + 1) * shift_len + shift_len - start)
-    state_list.append(current_state)
-
-    seg_table = pd.DataFrame({'start': start_list, 'dur': dur_list, 'vad': state_list})
-    seg_speech_table = seg_table[seg_table['vad'] == 'speech']
+    seg_speech_table = generate_vad_segment_table_per_tensor(sequence, per_args['threshold'], per_args['shift_len'])
 
     save_name = name + ".txt"
     save_path = os.path.join(out_dir, save_name)
@@ -356,6 +440,28 @@ def generate_vad_segment_table_per_file(pred_filepath, per_args):
     return save_path
 
 
+def generate_vad_segment_table_per_tensor(sequence: np.ndarray, threshold: float, shift_len: float) -> pd.DataFrame:
+    """
+    Convert frame level predictions in memory to speech segments in start and end times format.
+    Args:
+        sequence (np.ndarray): frame level predictions of a file.
+        threshold (float): threshold for prediction score (from 0 to 1).
+        shift_len (float): amount of shift of window for generating the frame.
+    Returns:
+        seg_speech_table (pd.DataFrame): start, dur and vad ("speech") columns of the speech segments.
+    """
+    speech = np.asarray(sequence) > threshold
+
+    # A segment starts at the first frame and at every change of state, and ends before the next one starts
+    bounds = np.concatenate([[0], np.nonzero(speech[1:] != speech[:-1])[0] + 1, [len(speech)]])
+    start_list = bounds[:-1] * shift_len
+    dur_list = (bounds[1:] - 1) * shift_len + shift_len - start_list  # shift_len for handling joint
+    state_list = np.where(speech[bounds[:-1]], "speech", "non-speech")
+
+    seg_table = pd.DataFrame({'start': start_list, 'dur': dur_list, 'vad': state_list})
+    return seg_table[seg_table['vad'] == 'speech']
+
+
 def vad_construct_pyannote_object_per_file(vad_table_filepath, groundtruth_RTTM_file):
     """
     Construct pyannote object for evaluation.
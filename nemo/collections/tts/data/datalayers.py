@@ -50,6 +50,7 @@ from torch.nn.utils.rnn import pad_sequence
 from tqdm import tqdm
 
 from nemo.collections.asr.parts import collections, parsers
+from nemo.collections.asr.parts.collate import pad_sequences
 from nemo.collections.asr.parts.segment import AudioSegment
 from nemo.core.classes import Dataset
 from nemo.core.neural_types.elements import *
@@ -119,28 +120,15 @@ class AudioDataset(Dataset):
         tensors corresponding to the audio and audio_length.
         """
 
-        def find_max_len(seq, index):
-            max_len = -1
-            for item in seq:
-                if item[index].size(0) > max_len:
-                    max_len = item[index].size(0)
-            return max_len
-
-        batch_size = len(batch)
-
         audio_signal, audio_lengths = None, None
         if batch[0][0] is not None:
-            if self.n_segments > 0:
-                max_audio_len = self.n_segments
-            else:
-                max_audio_len = find_max_len(batch, 0)
-
-            audio_signal = torch.zeros(batch_size, max_audio_len, dtype=torch.float)
-            audio_lengths = []
-            for i, sample in enumerate(batch):
-                audio_signal[i].narrow(0, 0, sample[0].size(0)).copy_(sample[0])
-                audio_lengths.append(sample[1])
-            audio_lengths = torch.tensor(audio_lengths, dtype=torch.long)
+            max_audio_len = self.n_segments if self.n_segments > 0 else None
+            audio_signal, audio_lengths = pad_sequences(
+                [sample[0] for sample in batch],
+                max_length=max_audio_len,
+                dtype=torch.float,
+                lengths=torch.stack([sample[1] for sample in batch]),
+            )
 
         return audio_signal, audio_lengths
 
@@ -0,0 +1,118 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks the in-tree CTC prefix beam search against greedy decoding.
+
+With --model and --manifest, the log probabilities of a character based CTC model on the audio of the manifest are
+decoded, and the WER of both decoders is reported. Otherwise random log probabilities with peaky, CTC like
+distributions are decoded, which only measures speed.
+
+Usage:
+python benchmark_ctc_beam_search.py [--model=QuartzNet15x5Base-En --manifest=dev_clean.json] \
+    [--beam_widths 1 8 32] [--lm_path=lm.arpa --alpha=0.5 --beta=1.0] [--num_processes=4]
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import torch
+
+from nemo.collections.asr.metrics.wer import WER, word_error_rate
+from nemo.collections.asr.parts.ctc_beam_decoding import CTCPrefixBeamSearch
+
+parser = argparse.ArgumentParser(description="Benchmark CTC prefix beam search against greedy decoding")
+parser.add_argument("--model", default=None, type=str, help="Path to a .nemo file or name of a pretrained model.")
+parser.add_argument("--manifest", default=None, type=str, help="Manifest of the audio to transcribe with --model.")
+parser.add_argument("--batch_size", default=16, type=int, help="Batch size of the acoustic model.")
+parser.add_argument("--beam_widths", default=[1, 8, 32], type=int, nargs='+', help="Beam widths to benchmark.")
+parser.add_argument("--lm_path", default=None, type=str, help="Optional ARPA language model.")
+parser.add_argument("--alpha", default=0.5, type=float, help="Weight of the language model.")
+parser.add_argument("--beta", default=1.0, type=float, help="Word bonus used with the language model.")
+parser.add_argument("--num_processes", default=1, type=int, help="Number of processes of the beam search.")
+parser.add_argument("--num_utterances", default=64, type=int, help="Number of random utterances.")
+parser.add_argument("--num_frames", default=500, type=int, help="Number of frames of random utterances.")
+parser.add_argument("--seed", default=0, type=int, help="Seed of random utterances.")
+
+VOCAB = [" ", "a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k", "l", "m"]
+VOCAB += ["n", "o", "p", "q", "r", "s", "t", "u", "v", "w", "x", "y", "z", "'"]
+
+
+def random_log_probs(args):
+    rng = np.random.RandomState(args.seed)
+    logits = rng.randn(args.num_utterances, args.num_frames, len(VOCAB) + 1) * 3.0
+    logits[:, :, -1] += 4.0  # Mostly blank frames
+    log_probs = logits - np.logaddexp.reduce(logits, axis=-1, keepdims=True)
+    return VOCAB, list(log_probs.astype(np.float32)), None
+
+
+def model_log_probs(args):
+    from nemo.collections.asr.models import EncDecCTCModel
+
+    if args.model.endswith('.nemo'):
+        model = EncDecCTCModel.restore_from(args.model, map_location='cpu')
+    else:
+        model = EncDecCTCModel.from_pretrained(args.model, map_location='cpu')
+    if torch.cuda.is_available():
+        model = model.cuda()
+
+    with open(args.manifest, 'r') as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    audio_files = [entry['audio_filepath'] for entry in entries]
+    log_probs = model.transcribe(audio_files, batch_size=args.batch_size, logprobs=True)
+    return list(model.decoder.vocabulary), [lp.cpu().numpy() for lp in log_probs], [e['text'] for e in entries]
+
+
+def main():
+    args = parser.parse_args()
+    if (args.model is None) != (args.manifest is None):
+        raise ValueError("--model and --manifest have to be provided together.")
+    vocab, log_probs, references = model_log_probs(args) if args.model else random_log_probs(args)
+    num_frames = sum(len(lp) for lp in log_probs)
+    print(f"Decoding {len(log_probs)} utterances of {num_frames} frames in total")
+
+    wer = WER(vocabulary=vocab)
+    start = time.time()
+    greedy = []
+    for lp in log_probs:
+        predictions = torch.from_numpy(lp).argmax(dim=-1, keepdim=True).T
+        greedy += wer.ctc_decoder_predictions_tensor(predictions)
+    elapsed = time.time() - start
+    report = f"greedy: {elapsed:.3f} s, {1000 * elapsed / num_frames:.4f} ms/frame"
+    if references is not None:
+        report += f", WER {word_error_rate(greedy, references):.4f}"
+    print(report)
+
+    for beam_width in args.beam_widths:
+        search = CTCPrefixBeamSearch(
+            vocab=vocab,
+            beam_width=beam_width,
+            alpha=args.alpha,
+            beta=args.beta,
+            lm_path=args.lm_path,
+            num_processes=args.num_processes,
+        )
+        start = time.time()
+        beams = search.decode_batch(log_probs)
+        elapsed = time.time() - start
+        report = f"beam {beam_width}: {elapsed:.3f} s, {1000 * elapsed / num_frames:.4f} ms/frame"
+        if references is not None:
+            report += f", WER {word_error_rate([b[0][1] for b in beams], references):.4f}"
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Builds the memory-mapped manifest indexes used by ASR datasets with `use_manifest_index: true`.
+
+Indexes are built automatically on first use, but with very large manifests it is preferable to build them once
+ahead of training instead of on the first rank that opens the dataset.
+
+Usage:
+python build_manifest_index.py --manifest=train_manifest_1.json,train_manifest_2.json [--index_dir=/path/to/indexes]
+"""
+
+import argparse
+import os
+
+from nemo.collections.asr.parts.manifest_index import ManifestIndex
+
+parser = argparse.ArgumentParser(description="Build memory-mapped indexes of ASR manifests")
+parser.add_argument("--manifest", required=True, type=str, help="Comma-separated paths to manifests.")
+parser.add_argument("--index_dir", default=None, type=str, help="Directory to store the indexes in.")
+parser.add_argument("--force", action="store_true", help="Rebuild indexes even if they are up to date.")
+
+
+def main():
+    args = parser.parse_args()
+    for manifest_file in args.manifest.split(','):
+        if args.force:
+            manifest_file = os.path.abspath(os.path.expanduser(manifest_file))
+            ManifestIndex.build(manifest_file, ManifestIndex.get_index_path(manifest_file, args.index_dir))
+        index = ManifestIndex(manifest_file, args.index_dir)
+        print(f"{manifest_file}: {len(index)} entries indexed in {index.index_path}")
+
+
+if __name__ == '__main__':
+    main()
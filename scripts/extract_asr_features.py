@@ -0,0 +1,121 @@
+# Copyright (c) 2020, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Precomputes the features of an ASR dataset with the preprocessor of a model and writes them to a sharded,
+memory-mappable feature store, together with a manifest pointing at the features of every utterance.
+
+Features are computed without dithering, so this is meant for runs where augmentation is only applied at the
+spectrogram level. Train with the written manifest and `use_feature_store: true` in the dataset config; the model
+then feeds the features straight to the encoder and skips the STFT.
+
+Usage:
+python extract_asr_features.py --manifest=train_manifest.json --output_dir=/path/to/features \
+    (--config=quartznet_15x5.yaml | --model=/path/to/model.nemo) [--shard_size=10000] [--dtype=float16]
+"""
+
+import argparse
+import json
+import os
+
+import torch
+from omegaconf import OmegaConf
+
+from nemo.collections.asr.models import ASRModel
+from nemo.collections.asr.modules import AudioToMelSpectrogramPreprocessor
+from nemo.collections.asr.parts.feature_store import FeatureStoreWriter
+from nemo.collections.asr.parts.features import WaveformFeaturizer
+from nemo.collections.asr.parts.manifest import parse_item
+
+parser = argparse.ArgumentParser(description="Precompute ASR features into a sharded feature store")
+parser.add_argument("--manifest", required=True, type=str, help="Path to the manifest of the audio dataset.")
+parser.add_argument("--output_dir", required=True, type=str, help="Directory to write the shards and manifest to.")
+parser.add_argument("--config", default=None, type=str, help="Model config yaml with a `model.preprocessor` section.")
+parser.add_argument("--model", default=None, type=str, help="Path to a .nemo file or name of a pretrained model.")
+parser.add_argument("--shard_size", default=10000, type=int, help="Number of utterances per shard.")
+parser.add_argument("--dtype", default='float16', choices=['float16', 'float32'], help="Storage dtype of features.")
+parser.add_argument("--batch_size", default=32, type=int, help="Number of utterances featurized at once.")
+
+
+def get_preprocessor(args):
+    if (args.config is None) == (args.model is None):
+        raise ValueError("Exactly one of --config and --model has to be provided.")
+
+    if args.config is not None:
+        cfg = OmegaConf.load(args.config)
+        preprocessor_cfg = cfg.model.preprocessor if 'model' in cfg else cfg.preprocessor
+        preprocessor = AudioToMelSpectrogramPreprocessor.from_config_dict(preprocessor_cfg)
+    else:
+        if args.model.endswith('.nemo'):
+            model = ASRModel.restore_from(args.model, map_location='cpu')
+        else:
+            model = ASRModel.from_pretrained(args.model, map_location='cpu')
+        preprocessor_cfg = model.cfg.preprocessor
+        preprocessor = model.preprocessor
+
+    # Stored features must be deterministic, and padding is applied when batches are collated.
+    preprocessor.featurizer.dither = 0.0
+    preprocessor.featurizer.pad_to = 0
+    return preprocessor.eval(), preprocessor_cfg
+
+
+def featurize(preprocessor, featurizer, items, device):
+    signals = [
+        featurizer.process(item['audio_file'], offset=item['offset'] or 0, duration=item['duration']) for item in items
+    ]
+    lengths = torch.tensor([signal.shape[0] for signal in signals], dtype=torch.long)
+    batch = torch.zeros(len(signals), int(lengths.max()))
+    for row, signal in zip(batch, signals):
+        row[: signal.shape[0]] = signal
+
+    features, features_lengths = preprocessor(input_signal=batch.to(device), length=lengths.to(device))
+    features = features.cpu().numpy()
+    return [feature[:, :length] for feature, length in zip(features, features_lengths.tolist())]
+
+
+def main():
+    args = parser.parse_args()
+    preprocessor, preprocessor_cfg = get_preprocessor(args)
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    preprocessor = preprocessor.to(device)
+    featurizer = WaveformFeaturizer(sample_rate=preprocessor._sample_rate)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    OmegaConf.save(preprocessor_cfg, os.path.join(args.output_dir, 'preprocessor.yaml'))
+    manifest_path = os.path.join(args.output_dir, 'manifest.json')
+
+    with open(args.manifest, 'r') as f:
+        lines = [line for line in f if line.strip()]
+
+    num_frames = 0
+    with FeatureStoreWriter(args.output_dir, shard_size=args.shard_size, dtype=args.dtype) as writer, open(
+        manifest_path, 'w'
+    ) as fout:
+        for start in range(0, len(lines), args.batch_size):
+            batch_lines = lines[start : start + args.batch_size]
+            items = [parse_item(line, args.manifest) for line in batch_lines]
+            for line, features in zip(batch_lines, featurize(preprocessor, featurizer, items, device)):
+                entry = json.loads(line)
+                entry.update(writer.add(features))
+                num_frames += features.shape[-1]
+                fout.write(json.dumps(entry) + '\n')
+
+    print(
+        f"Wrote {num_frames} frames of {len(lines)} utterances to {len(writer.shard_paths)} shards in {args.output_dir}"
+    )
+    print(f"Manifest written to {manifest_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -170,6 +170,16 @@ class TestEncDecClassificationModel:
         assert len(results) == 2
         assert results[0].shape == torch.Size([len(model.cfg.labels)])
 
+    @pytest.mark.unit
+    def test_transcription_empty(self, speech_classification_model):
+        model = speech_classification_model.eval()
+        assert model.transcribe([]) == []
+
+        # One empty tensor of labels per top k
+        model._accuracy.top_k = [1, 5]
+        results = model.transcribe([])
+        assert [result.shape for result in results] == [torch.Size([0, 5])] * 2
+
     @pytest.mark.unit
     def test_EncDecClassificationDatasetConfig_for_AudioToSpeechLabelDataset(self):
         # ignore some additional arguments as dataclass is generic
@@ -224,6 +224,15 @@ class TestEncDecCTCModel:
             'batch_size',
             'tarred_audio_filepaths',
             'shuffle',
+            'use_bucketing',
+            'num_buckets',
+            'bucket_boundaries',
+            'max_batch_duration',
+            'bucketing_seed',
+            'batching_buffer_size',
+            'use_feature_store',
+            'feature_pad_to',
+            'augment_on_device',
             'pin_memory',
             'drop_last',
             'tarred_shard_strategy',
@@ -259,6 +268,15 @@ class TestEncDecCTCModel:
             'num_workers',
             'batch_size',
             'shuffle',
+            'use_bucketing',
+            'num_buckets',
+            'bucket_boundaries',
+            'max_batch_duration',
+            'bucketing_seed',
+            'batching_buffer_size',
+            'use_feature_store',
+            'feature_pad_to',
+            'augment_on_device',
             'pin_memory',
             'drop_last',
             'parser',
@@ -269,6 +287,10 @@ class TestEncDecCTCModel:
             'eos_id',
             'blank_index',
             'global_rank',
+            'use_audio_cache',
+            'audio_cache_dir',
+            'audio_cache_max_bytes',
+            'audio_cache_dtype',
             'world_size',
             'load_audio',
         ]
@@ -12,14 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import copy
+import glob
+import json
+import os
+import tarfile
 
+import numpy as np
 import pytest
+import pytorch_lightning as pl
+import soundfile as sf
 import torch
 from omegaconf import DictConfig, OmegaConf, open_dict
 
 import nemo.collections.asr as nemo_asr
 from nemo.collections.asr.data import audio_to_text
 from nemo.collections.asr.models import EncDecCTCModel, configs
+from nemo.collections.asr.parts import bulk_transcription
 from nemo.utils.config_utils import assert_dataclass_signature_match, update_model_config
 
 
@@ -145,6 +153,139 @@ class TestEncDecCTCModel:
         # fully connected + bias
         assert asr_model.num_weights == nw1 + 3 * (asr_model.decoder._feat_in + 1)
 
+    @pytest.mark.unit
+    def test_transcribe_chunked(self, asr_model, tmp_path):
+        audio_file = str(tmp_path / 'audio.wav')
+        sf.write(audio_file, np.random.RandomState(0).uniform(-0.5, 0.5, size=16000 * 5), 16000)
+
+        full_logprobs = asr_model.transcribe([audio_file], logprobs=True)[0]
+        chunked_logprobs = asr_model.transcribe(
+            [audio_file], batch_size=2, logprobs=True, chunk_len_in_secs=1.5, chunk_context_in_secs=0.5
+        )[0]
+        assert chunked_logprobs.shape[1] == full_logprobs.shape[1]
+        assert abs(chunked_logprobs.shape[0] - full_logprobs.shape[0]) <= 2
+
+        partial_transcripts = list(
+            asr_model.transcribe_chunked(audio_file, chunk_len_in_secs=1.5, chunk_context_in_secs=0.5, batch_size=2)
+        )
+        # One transcript per chunk, each one extending the previous one
+        assert len(partial_transcripts) == 4
+        for previous, current in zip(partial_transcripts[:-1], partial_transcripts[1:]):
+            assert current.startswith(previous)
+
+        transcript = asr_model.transcribe([audio_file], chunk_len_in_secs=1.5, chunk_context_in_secs=0.5)[0]
+        assert transcript == partial_transcripts[-1]
+
+    @pytest.mark.unit
+    def test_stream_transcripts_matches_full_decoding(self, asr_model):
+        log_probs = torch.randn(1, 37, asr_model.decoder.num_classes_with_blank).log_softmax(dim=-1)
+        # Repeat some frames so that labels are collapsed across chunk boundaries
+        log_probs = log_probs.repeat_interleave(2, dim=1)
+        full_transcript = asr_model._wer.ctc_decoder_predictions_tensor(
+            log_probs.argmax(dim=-1), predictions_len=torch.tensor([log_probs.shape[1]])
+        )[0]
+
+        for chunk_len in [1, 5, 16, log_probs.shape[1]]:
+            chunks = torch.split(log_probs[0], chunk_len)
+            partial_transcripts = list(asr_model._stream_transcripts(iter(chunks)))
+            assert len(partial_transcripts) == len(chunks)
+            assert partial_transcripts[-1] == full_transcript
+
+    @pytest.mark.unit
+    def test_transcribe_sorted_batches(self, asr_model, tmp_path):
+        audio_files = []
+        rng = np.random.RandomState(0)
+        for idx, duration in enumerate([0.5, 2.0, 1.0, 1.5, 0.75]):
+            audio_file = str(tmp_path / f'audio_{idx}.wav')
+            sf.write(audio_file, rng.uniform(-0.5, 0.5, size=int(16000 * duration)), 16000)
+            audio_files.append(audio_file)
+
+        expected = [asr_model.transcribe([audio_file], batch_size=1, logprobs=True)[0] for audio_file in audio_files]
+        for kwargs in [{'batch_size': 2}, {'max_batch_duration': 3.0}]:
+            logprobs = asr_model.transcribe(audio_files, logprobs=True, **kwargs)
+            assert len(logprobs) == len(audio_files)
+            for file_logprobs, file_expected in zip(logprobs, expected):
+                assert file_logprobs.shape == file_expected.shape
+                assert torch.allclose(file_logprobs, file_expected, atol=1e-5)
+
+        transcripts = asr_model.transcribe(audio_files, max_batch_duration=3.0)
+        assert transcripts == [asr_model.transcribe([audio_file])[0] for audio_file in audio_files]
+
+    @pytest.mark.unit
+    def test_tarred_training_data_limit_train_batches(self, asr_model, tmp_path):
+        rng = np.random.RandomState(0)
+        manifest_path = str(tmp_path / 'manifest.json')
+        with open(manifest_path, 'w') as manifest, tarfile.open(str(tmp_path / 'audio.tar'), 'w') as tar:
+            for i, duration in enumerate(rng.uniform(0.5, 1.5, size=24)):
+                audio_path = str(tmp_path / f'utt_{i}.wav')
+                sf.write(audio_path, rng.uniform(-0.5, 0.5, size=int(16000 * duration)), 16000)
+                tar.add(audio_path, arcname=f'utt_{i}.wav')
+                manifest.write(json.dumps({'audio_filepath': f'utt_{i}.wav', 'duration': duration, 'text': 'a'}))
+                manifest.write('\n')
+
+        config = {
+            'manifest_filepath': manifest_path,
+            'tarred_audio_filepaths': str(tmp_path / 'audio.tar'),
+            'is_tarred': True,
+            'sample_rate': 16000,
+            'labels': asr_model.decoder.vocabulary,
+            'batch_size': 4,
+            'shuffle': False,
+        }
+        for max_batch_duration in [None, 3.0]:
+            asr_model.set_trainer(pl.Trainer(limit_train_batches=1.0, logger=False, checkpoint_callback=False))
+            asr_model.setup_training_data({**config, 'max_batch_duration': max_batch_duration})
+            if max_batch_duration is None:
+                assert asr_model._trainer.limit_train_batches == 24 // 4
+            else:
+                # The dataset yields the packed batches itself
+                assert asr_model._trainer.limit_train_batches == len(asr_model._train_dl.dataset) > 24 // 4
+
+    @pytest.mark.unit
+    def test_bulk_transcription(self, asr_model, tmp_path):
+        audio_files = []
+        rng = np.random.RandomState(0)
+        manifest = str(tmp_path / 'manifest.json')
+        with open(manifest, 'w') as f:
+            for idx, duration in enumerate([0.5, 2.0, 1.0, 1.5, 0.75]):
+                audio_file = str(tmp_path / f'audio_{idx}.wav')
+                sf.write(audio_file, rng.uniform(-0.5, 0.5, size=int(16000 * duration)), 16000)
+                audio_files.append(audio_file)
+                f.write(json.dumps({'audio_filepath': audio_file, 'duration': duration}) + '\n')
+        expected = dict(zip(audio_files, asr_model.transcribe(audio_files)))
+
+        output_dir = str(tmp_path / 'output')
+        for shard_id in range(2):
+            bulk_transcription.transcribe_manifest_shard(
+                asr_model, manifest, output_dir, shard_id=shard_id, num_shards=2, batch_size=2, num_workers=0
+            )
+
+        def read_transcripts():
+            transcripts = {}
+            for path in glob.glob(os.path.join(output_dir, '*.jsonl')):
+                with open(path, 'r') as f:
+                    for line in f:
+                        entry = json.loads(line)
+                        assert entry['audio_filepath'] not in transcripts
+                        transcripts[entry['audio_filepath']] = entry['pred_text']
+            return transcripts
+
+        assert read_transcripts() == expected
+
+        # Simulate a crash in the middle of writing the last line of a shard, and resume it
+        shard_path = os.path.join(output_dir, 'transcripts_0_of_2.jsonl')
+        with open(shard_path, 'r') as f:
+            lines = f.readlines()
+        with open(shard_path, 'w') as f:
+            f.writelines(lines[:-1] + [lines[-1][:10]])
+        assert len(bulk_transcription.read_completed_keys(output_dir)) == len(audio_files) - 1
+
+        num_done = bulk_transcription.transcribe_manifest_shard(
+            asr_model, manifest, output_dir, shard_id=0, num_shards=2, num_workers=0
+        )
+        assert num_done == 1
+        assert read_transcripts() == expected
+
     @pytest.mark.unit
     def test_dataclass_instantiation(self, asr_model):
         model_cfg = configs.EncDecCTCModelConfig()
@@ -222,6 +363,15 @@ class TestEncDecCTCModel:
             'batch_size',
             'tarred_audio_filepaths',
             'shuffle',
+            'use_bucketing',
+            'num_buckets',
+            'bucket_boundaries',
+            'max_batch_duration',
+            'bucketing_seed',
+            'batching_buffer_size',
+            'use_feature_store',
+            'feature_pad_to',
+            'augment_on_device',
             'pin_memory',
             'drop_last',
             'tarred_shard_strategy',
@@ -253,9 +403,22 @@ class TestEncDecCTCModel:
             'num_workers',
             'batch_size',
             'shuffle',
+            'use_bucketing',
+            'num_buckets',
+            'bucket_boundaries',
+            'max_batch_duration',
+            'bucketing_seed',
+            'batching_buffer_size',
+            'use_feature_store',
+            'feature_pad_to',
+            'augment_on_device',
             'pin_memory',
             'drop_last',
             'global_rank',
+            'use_audio_cache',
+            'audio_cache_dir',
+            'audio_cache_max_bytes',
+            'audio_cache_dtype',
             'world_size',
             'use_start_end_token',
             'load_audio',
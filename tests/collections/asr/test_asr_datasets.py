@@ -12,13 +12,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
+import random
+import tarfile
 
+import numpy as np
 import pytest
+import soundfile
 import torch
 
-from nemo.collections.asr.data.audio_to_text import TarredAudioToBPEDataset, TarredAudioToCharDataset
+from nemo.collections.asr.data import audio_to_text_dataset
+from nemo.collections.asr.data.audio_to_text import (
+    AudioToCharDataset,
+    TarredAudioToBPEDataset,
+    TarredAudioToCharDataset,
+)
+from nemo.collections.asr.data.feature_to_text import FeatureToCharDataset
+from nemo.collections.asr.data.samplers import DurationBucketingBatchSampler
+from nemo.collections.asr.parts import collections, parsers, segment
+from nemo.collections.asr.parts.audio_bank import AudioBank
+from nemo.collections.asr.parts.audio_cache import DecodedAudioCache
+from nemo.collections.asr.parts.collate import speech_collate
+from nemo.collections.asr.parts.feature_store import FeatureStoreWriter
 from nemo.collections.asr.parts.features import WaveformFeaturizer
+from nemo.collections.asr.parts.manifest_index import ManifestIndex
+from nemo.collections.asr.parts.perturb import NoisePerturbation, SpeedPerturbation
+from nemo.collections.asr.parts.perturb_batch import process_batch_augmentations
+from nemo.collections.asr.parts.segment import AudioSegment, get_audio_info
 from nemo.collections.common import tokenizers
 
 
@@ -106,3 +127,408 @@ class TestASRDatasets:
         for _ in ds_list_load:
             count += 1
         assert count == 32
+
+    @pytest.mark.unit
+    def test_tarred_dataset_dynamic_batching(self, test_data_dir):
+        manifest_path = os.path.abspath(os.path.join(test_data_dir, 'asr/tarred_an4/tarred_audio_manifest.json'))
+        tarpath = os.path.abspath(os.path.join(test_data_dir, 'asr/tarred_an4/audio_{0..1}.tar'))
+
+        max_batch_duration = 16.0
+        ds = TarredAudioToCharDataset(
+            audio_tar_filepaths=tarpath,
+            manifest_filepath=manifest_path,
+            labels=self.labels,
+            sample_rate=16000,
+            max_batch_duration=max_batch_duration,
+            batching_buffer_size=8,
+        )
+        num_batches = 0
+        for audio, audio_len, _, _ in ds:
+            assert audio.shape[0] == 1 or audio.shape[0] * audio.shape[1] <= max_batch_duration * 16000
+            assert audio.shape[1] == audio_len.max().item()
+            num_batches += 1
+        assert num_batches == len(ds)
+
+    @pytest.mark.unit
+    def test_tarred_dataset_dynamic_batching_ranks_in_lockstep(self, tmpdir):
+        sample_rate = 16000
+        rng = np.random.RandomState(0)
+        manifest_path = os.path.join(tmpdir, 'manifest.json')
+        with open(manifest_path, 'w') as manifest:
+            for shard in range(2):
+                with tarfile.open(os.path.join(tmpdir, f'audio_{shard}.tar'), 'w') as tar:
+                    # The shards hold very different durations, so they pack into different numbers of batches.
+                    for i in range(12):
+                        name = f'utt_{shard}_{i}.wav'
+                        duration = rng.uniform(0.2, 0.6) if shard == 0 else rng.uniform(1.0, 3.0)
+                        audio_path = os.path.join(tmpdir, name)
+                        soundfile.write(audio_path, rng.randn(int(duration * sample_rate)) * 0.1, sample_rate)
+                        tar.add(audio_path, arcname=name)
+                        entry = {'audio_filepath': name, 'duration': duration, 'text': 'a b'}
+                        manifest.write(json.dumps(entry) + '\n')
+
+        num_batches = []
+        for rank in range(2):
+            ds = TarredAudioToCharDataset(
+                audio_tar_filepaths=os.path.join(tmpdir, 'audio_{0..1}.tar'),
+                manifest_filepath=manifest_path,
+                labels=self.labels,
+                sample_rate=sample_rate,
+                global_rank=rank,
+                world_size=2,
+                max_batch_duration=3.0,
+                batching_buffer_size=4,
+            )
+            num_batches.append(sum(1 for _ in ds))
+        assert num_batches == [len(ds) // 2] * 2
+
+    @pytest.mark.unit
+    def test_indexed_manifest_matches_eager_collection(self, tmpdir):
+        manifest_path = os.path.join(tmpdir, 'manifest.json')
+        with open(manifest_path, 'w') as f:
+            for i in range(10):
+                entry = {'audio_filepath': f'/data/utt_{i}.wav', 'duration': 1.0 + i, 'text': f'utterance {i} ab'}
+                if i % 3 == 0:
+                    entry['offset'] = 0.5
+                f.write(json.dumps(entry) + '\n')
+
+        parser = parsers.make_parser(labels=self.labels, name='en')
+        kwargs = dict(min_duration=2.0, max_duration=9.0, index_by_file_id=True)
+        eager = collections.ASRAudioText(manifest_path, parser=parser, **kwargs)
+        indexed = collections.IndexedASRAudioText(manifest_path, parser=parser, index_dir=str(tmpdir), **kwargs)
+
+        assert len(indexed) == len(eager) == 8
+        assert list(indexed) == list(eager)
+        for file_id, idx in eager.mapping.items():
+            assert file_id in indexed.mapping
+            assert indexed.mapping[file_id] == idx
+        assert 'utt_0' not in indexed.mapping
+
+        # The index is reused once built.
+        index_path = indexed.indexes[0].index_path
+        mtime = os.path.getmtime(os.path.join(index_path, 'meta.json'))
+        collections.IndexedASRAudioText(manifest_path, parser=parser, index_dir=str(tmpdir))
+        assert os.path.getmtime(os.path.join(index_path, 'meta.json')) == mtime
+
+        # A changed manifest replaces the build the index links to, while open indexes keep reading the previous one.
+        old_index = indexed.indexes[0]
+        old_build_path = os.path.realpath(index_path)
+        with open(manifest_path, 'a') as f:
+            f.write(json.dumps({'audio_filepath': '/data/utt_10.wav', 'duration': 3.0, 'text': 'ab'}) + '\n')
+        new_index = ManifestIndex(manifest_path, index_dir=str(tmpdir))
+        assert os.path.islink(index_path) and os.path.exists(old_build_path)
+        assert len(new_index) == 11 and new_index.find_file_id('utt_10') == 10
+        assert len(old_index) == 10 and old_index.find_file_id('utt_4') == 4
+        assert old_index.find_file_id('utt_10') == -1
+
+        # The previous build is only reclaimed by the next rebuild, once readers moved on.
+        new_build_path = os.path.realpath(index_path)
+        os.utime(manifest_path, (0, 0))
+        ManifestIndex(manifest_path, index_dir=str(tmpdir))
+        assert not os.path.exists(old_build_path) and os.path.exists(new_build_path)
+
+        ds = AudioToCharDataset(
+            manifest_filepath=manifest_path,
+            labels=self.labels,
+            sample_rate=16000,
+            load_audio=False,
+            use_manifest_index=True,
+            manifest_index_dir=str(tmpdir),
+        )
+        expected_tokens = collections.ASRAudioText(manifest_path, parser=parser)[0].text_tokens
+        _, _, tokens, tokens_len = ds[0]
+        assert tokens.tolist() == expected_tokens
+        assert tokens_len.item() == len(expected_tokens)
+
+    @pytest.mark.unit
+    def test_duration_bucketing_batch_sampler(self):
+        durations = np.random.RandomState(0).uniform(1.0, 20.0, size=1000)
+
+        world_size = 3
+        samplers = [
+            DurationBucketingBatchSampler(durations, batch_size=16, num_buckets=8, num_replicas=world_size, rank=rank)
+            for rank in range(world_size)
+        ]
+        batches = [list(sampler) for sampler in samplers]
+        assert len(set(len(rank_batches) for rank_batches in batches)) == 1
+        seen = sorted(idx for rank_batches in batches for batch in rank_batches for idx in batch)
+        assert set(seen) == set(range(len(durations)))
+        assert all(len(batch) <= 16 for rank_batches in batches for batch in rank_batches)
+
+        report = samplers[0].report_padding(batch_size=16)
+        assert report['padding_ratio_after'] < report['padding_ratio_before']
+
+        # Next epoch is reshuffled.
+        assert list(samplers[0]) != batches[0]
+
+        sampler = DurationBucketingBatchSampler(durations, max_batch_duration=120.0, num_buckets=8)
+        for batch in sampler:
+            assert len(batch) == 1 or len(batch) * durations[batch].max() <= 120.0
+        assert sum(len(batch) for batch in sampler) == len(durations)
+
+    @pytest.mark.unit
+    def test_audio_to_text_dataloader_bucketing(self):
+        class DummyDataset(torch.utils.data.Dataset):
+            collection = [type('Entry', (), {'duration': duration})() for duration in np.linspace(1.0, 20.0, 64)]
+            collate_fn = staticmethod(lambda batch: batch)
+
+            def __len__(self):
+                return len(self.collection)
+
+            def __getitem__(self, idx):
+                return idx
+
+        config = {'batch_size': 8, 'shuffle': True, 'use_bucketing': True, 'num_buckets': 4}
+        dataloader = audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config, dataset=DummyDataset(), shuffle=True, global_rank=0, world_size=1
+        )
+        assert isinstance(dataloader.batch_sampler, DurationBucketingBatchSampler)
+
+        # Lightning would replace the batch sampler under DDP.
+        trainer = type('Trainer', (), {'replace_sampler_ddp': True})()
+        with pytest.raises(ValueError):
+            audio_to_text_dataset.get_audio_to_text_dataloader(
+                config=config, dataset=DummyDataset(), shuffle=True, global_rank=0, world_size=2, trainer=trainer
+            )
+        trainer.replace_sampler_ddp = False
+        dataloader = audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config, dataset=DummyDataset(), shuffle=True, global_rank=1, world_size=2, trainer=trainer
+        )
+        assert dataloader.batch_sampler.rank == 1
+
+        # Without bucketing, `max_batch_duration` is ignored and batches hold `batch_size` utterances.
+        config = {'batch_size': 8, 'shuffle': False, 'max_batch_duration': 30.0}
+        dataloader = audio_to_text_dataset.get_audio_to_text_dataloader(
+            config=config, dataset=DummyDataset(), shuffle=False, global_rank=0, world_size=1
+        )
+        assert [len(batch) for batch in dataloader] == [8] * 8
+
+    @pytest.mark.unit
+    def test_speech_collate(self):
+        lengths = [(16000, 5), (8000, 12), (12000, 1)]
+        batch = [
+            (torch.randn(n), torch.tensor(n).long(), torch.randint(1, 28, (m,)).long(), torch.tensor(m).long())
+            for n, m in lengths
+        ]
+
+        audio, audio_len, tokens, tokens_len = speech_collate(batch, pad_id=-1)
+        assert audio.shape == (3, 16000) and tokens.shape == (3, 12)
+        assert audio_len.tolist() == [n for n, _ in lengths]
+        assert tokens_len.tolist() == [m for _, m in lengths]
+        for i, (sig, sig_len, tok, tok_len) in enumerate(batch):
+            assert torch.equal(audio[i, :sig_len], sig)
+            assert (audio[i, sig_len:] == 0).all()
+            assert torch.equal(tokens[i, :tok_len], tok)
+            assert (tokens[i, tok_len:] == -1).all()
+
+        # Lengths returned by the dataset take precedence over the tensor shapes.
+        batch = [(torch.randn(10), torch.tensor(6).long(), torch.ones(4).long(), torch.tensor(3).long())]
+        audio, audio_len, tokens, tokens_len = speech_collate(batch, pad_id=0)
+        assert audio.shape == (1, 6) and audio_len.tolist() == [6]
+        assert tokens.tolist() == [[1, 1, 1]] and tokens_len.tolist() == [3]
+
+        # Scalar labels are stacked and audio can be absent.
+        labels = [(None, None, torch.tensor(i).long(), torch.tensor(1).long()) for i in range(3)]
+        audio, audio_len, tokens, tokens_len = speech_collate(labels, pad_id=0)
+        assert audio is None and audio_len is None
+        assert tokens.tolist() == [0, 1, 2]
+
+    @pytest.mark.unit
+    def test_audio_segment_partial_read(self, tmpdir):
+        sample_rate = 16000
+        samples = (np.random.RandomState(0).randn(2 * sample_rate) * 3000).astype(np.int16)
+        audio_path = os.path.join(tmpdir, 'audio.wav')
+        soundfile.write(audio_path, samples, sample_rate)
+        start, end = int(0.5 * sample_rate), int(1.25 * sample_rate)
+
+        segment = AudioSegment.from_file(audio_path, offset=0.5, duration=0.75, int_values=True)
+        assert np.allclose(segment.samples, samples[start:end] / 2 ** 15)
+        assert get_audio_info(audio_path) == (sample_rate, len(samples), 1)
+
+        # Kaldi pipes only read up to the end of the requested span.
+        segment = AudioSegment.from_file(f'cat {audio_path} |', offset=0.5, duration=0.75)
+        expected = samples[start:end] / np.abs(samples[start:end]).max()
+        assert np.allclose(segment.samples, expected, atol=1e-6)
+
+    @pytest.mark.unit
+    def test_audio_duration_probe(self, tmpdir, monkeypatch):
+        sample_rate = 16000
+        audio_path = os.path.join(tmpdir, 'audio.wav')
+        soundfile.write(audio_path, np.zeros(int(1.5 * sample_rate)), sample_rate)
+        assert segment.get_audio_duration(audio_path) == 1.5
+
+        # Formats which SoundFile cannot read are probed instead of decoded.
+        other_path = os.path.join(tmpdir, 'audio.m4a')
+        with open(other_path, 'wb') as f:
+            f.write(b'not a soundfile format')
+        monkeypatch.setattr(segment, 'mediainfo', lambda audio_file: {'duration': '2.5'})
+        monkeypatch.setattr(segment.AudioSegment, 'from_file', None)
+        assert segment.get_audio_duration(other_path) == 2.5
+
+    @pytest.mark.unit
+    def test_decoded_audio_cache(self, tmpdir):
+        sample_rate = 16000
+        audio_path = os.path.join(tmpdir, 'audio.wav')
+        soundfile.write(audio_path, np.random.RandomState(0).uniform(-0.5, 0.5, sample_rate), sample_rate)
+
+        cache = DecodedAudioCache(cache_dir=os.path.join(tmpdir, 'cache'), max_bytes=50000)
+        featurizer = WaveformFeaturizer(sample_rate=8000, cache=cache)
+        first = featurizer.process(audio_path, offset=0.25, duration=0.5)
+        second = featurizer.process(audio_path, offset=0.25, duration=0.5)
+        assert torch.equal(first, second)
+        assert cache.stats() == dict(hits=1, misses=1, hit_rate=0.5)
+
+        # Other segments of the same file are cached separately, and the oldest entries are evicted over budget.
+        for offset in [0.0, 0.1, 0.2, 0.3, 0.4]:
+            featurizer.process(audio_path, offset=offset, duration=0.5)
+        entries, num_bytes = cache._scan()
+        assert num_bytes <= cache.max_bytes
+        assert len(entries) < 6
+
+        # The budget is shared by all processes using the cache directory.
+        other_cache = DecodedAudioCache(cache_dir=cache.cache_dir, max_bytes=cache.max_bytes)
+        other_featurizer = WaveformFeaturizer(sample_rate=8000, cache=other_cache)
+        for offset in [0.05, 0.15, 0.25, 0.35, 0.45]:
+            featurizer.process(audio_path, offset=offset, duration=0.5)
+            other_featurizer.process(audio_path, offset=offset + 0.01, duration=0.5)
+            entries, num_bytes = cache._scan()
+            assert num_bytes <= cache.max_bytes
+        with cache._lock() as fd:
+            assert cache._read_num_bytes(fd) == num_bytes
+
+        int16_cache = DecodedAudioCache(cache_dir=os.path.join(tmpdir, 'cache16'), dtype='int16')
+        featurizer = WaveformFeaturizer(sample_rate=8000, cache=int16_cache)
+        featurizer.process(audio_path)
+        assert torch.allclose(featurizer.process(audio_path), featurizer.process(audio_path), atol=1 / 2 ** 15)
+        assert int16_cache.hits == 2
+
+    @pytest.mark.unit
+    def test_feature_store_dataset(self, tmpdir):
+        rng = np.random.RandomState(0)
+        features = [rng.randn(64, num_frames).astype(np.float32) for num_frames in [37, 100, 12, 55, 80]]
+        manifest_path = os.path.join(tmpdir, 'manifest.json')
+        with FeatureStoreWriter(str(tmpdir), shard_size=2, dtype='float32') as writer, open(manifest_path, 'w') as f:
+            for i, feature in enumerate(features):
+                entry = dict(audio_filepath=f'{i}.wav', duration=feature.shape[1] / 100, text='hello world')
+                entry.update(writer.add(feature))
+                f.write(json.dumps(entry) + '\n')
+        assert len(writer.shard_paths) == 3
+
+        dataset = FeatureToCharDataset(manifest_path, labels=list("abcdefghijklmnopqrstuvwxyz '"), max_duration=0.9)
+        assert len(dataset) == 4
+        for i, feature in enumerate([features[0], features[2], features[3], features[4]]):
+            assert np.array_equal(dataset[i][0].numpy(), feature)
+
+        signal, signal_len, tokens, tokens_len = dataset.collate_fn([dataset[i] for i in range(len(dataset))])
+        assert signal.shape == (4, 64, 80) and signal_len.tolist() == [37, 12, 55, 80]
+        assert (signal[1, :, 12:] == 0).all()
+        assert tokens.shape == (4, 11)
+
+    @pytest.mark.unit
+    def test_batch_augmentor(self):
+        torch.manual_seed(0)
+        lengths = torch.tensor([16000, 8000, 12000])
+        signal = torch.randn(3, 16000) * (torch.arange(16000)[None, :] < lengths[:, None])
+
+        augmentor = process_batch_augmentations(
+            {
+                'shift': {'prob': 1.0, 'min_shift_ms': 100.0, 'max_shift_ms': 100.0},
+                'speed': {'prob': 1.0, 'sr': 16000, 'resample_type': 'kaiser_fast', 'min_speed_rate': 1.1},
+            },
+            sample_rate=16000,
+            seed=0,
+        )
+        perturbed, perturbed_lengths = augmentor(signal, lengths)
+        assert perturbed_lengths.tolist() == [17600, 8800, 13200]
+        assert perturbed.shape == (3, 17600)
+        assert (perturbed[1, 8800:] == 0).all() and (perturbed[2, 13200:] == 0).all()
+
+        # Shortened rows are written to a new batch, not to the batch of the caller.
+        original = signal.clone()
+        augmentor = process_batch_augmentations(
+            {'speed': {'prob': 1.0, 'sr': 16000, 'resample_type': 'kaiser_fast', 'max_speed_rate': 0.9}},
+            sample_rate=16000,
+        )
+        perturbed, perturbed_lengths = augmentor(signal, lengths)
+        assert perturbed_lengths.tolist() == [14400, 7200, 10800]
+        assert torch.equal(signal, original)
+
+        # Samples which do not draw a perturbation are left untouched.
+        augmentor = process_batch_augmentations({'gain': {'prob': 0.5}}, sample_rate=16000, seed=0)
+        perturbed, perturbed_lengths = augmentor(signal.repeat(8, 1), lengths.repeat(8))
+        unchanged = [torch.equal(row, original) for row, original in zip(perturbed, signal.repeat(8, 1))]
+        assert 0 < sum(unchanged) < 24
+        assert torch.equal(perturbed_lengths, lengths.repeat(8))
+
+        # Parameters are drawn on the device and in the dtype of the batch, reproducibly for a given seed.
+        config = {'white_noise': {'prob': 1.0}, 'gain': {'prob': 1.0}}
+        first, _ = process_batch_augmentations(config, sample_rate=16000, seed=1)(signal.double(), lengths)
+        second, _ = process_batch_augmentations(config, sample_rate=16000, seed=1)(signal.double(), lengths)
+        assert first.dtype == torch.float64 and torch.equal(first, second)
+
+        with pytest.raises(KeyError):
+            process_batch_augmentations({'time_stretch': {'prob': 1.0}})
+
+    @pytest.mark.unit
+    def test_noise_perturbation_bank(self, tmpdir):
+        sample_rate = 16000
+        rng = np.random.RandomState(0)
+        manifest_path = os.path.join(tmpdir, 'noise.json')
+        with open(manifest_path, 'w') as f:
+            for i, duration in enumerate([0.5, 1.0, 2.0]):
+                audio_path = os.path.join(tmpdir, f'noise{i}.wav')
+                soundfile.write(audio_path, rng.uniform(-0.5, 0.5, int(duration * sample_rate)), sample_rate)
+                f.write(json.dumps(dict(audio_filepath=audio_path, duration=duration, text='')) + '\n')
+
+        bank_dir = os.path.join(tmpdir, 'bank')
+        perturbation = NoisePerturbation(manifest_path, use_bank=True, bank_dir=bank_dir)
+        assert len(perturbation._bank) == 3 and len(os.listdir(bank_dir)) == 1
+        noise, noise_rms = perturbation.get_one_noise_sample_and_rms(sample_rate)
+        assert noise_rms == pytest.approx(noise.rms_db, abs=1e-4)
+
+        # Banks are read back memory-mapped from the shared file.
+        bank = AudioBank(perturbation._manifest, sample_rate, bank_dir=bank_dir)
+        assert isinstance(bank._samples, np.memmap)
+        assert np.array_equal(bank.rms_db, perturbation._bank.rms_db)
+        assert bank._lengths.sum() == len(bank._samples)
+
+        # The seed of the subset of recordings is part of the bank key.
+        AudioBank(perturbation._manifest, sample_rate, bank_dir=bank_dir, seed=1)
+        assert len(os.listdir(bank_dir)) == 2
+
+        # Recordings replaced in place are not read from the stale bank.
+        soundfile.write(os.path.join(tmpdir, 'noise0.wav'), np.zeros(sample_rate // 2), sample_rate)
+        bank = AudioBank(perturbation._manifest, sample_rate, bank_dir=bank_dir)
+        assert len(os.listdir(bank_dir)) == 3 and not np.array_equal(bank.rms_db, perturbation._bank.rms_db)
+
+        # Corpora larger than the cap keep the subset of recordings which fits.
+        bank = AudioBank(perturbation._manifest, sample_rate, max_bytes=4 * 3 * sample_rate // 2)
+        assert bank.num_bytes <= 4 * 3 * sample_rate // 2 and 0 < len(bank) < 3
+
+        audio = AudioSegment(rng.uniform(-0.5, 0.5, sample_rate), sample_rate)
+        original = audio.samples.copy()
+        perturbation.perturb(audio)
+        assert audio.num_samples == sample_rate and not np.array_equal(audio.samples, original)
+
+    @pytest.mark.unit
+    def test_speed_perturbation_polyphase(self):
+        sample_rate = 16000
+        time = np.arange(2 * sample_rate) / sample_rate
+        samples = np.sin(2 * np.pi * 440 * time).astype(np.float32)
+
+        # Filters of all discrete rates but 1.0 are built upfront.
+        perturbation = SpeedPerturbation(sample_rate, 'polyphase', rng=random.Random(0))
+        assert sorted(perturbation._filters) == [(9, 10), (11, 10), (19, 20), (21, 20)]
+
+        lengths = [16000, 8000, 12345, 32000, 4000, 20000]
+        segments = [AudioSegment(samples[:length].copy(), sample_rate) for length in lengths]
+        perturbation.perturb_batch(segments)
+
+        # Batched perturbation matches perturbing the segments one by one with the same rates.
+        perturbation = SpeedPerturbation(sample_rate, 'polyphase', rng=random.Random(0))
+        for length, batched in zip(lengths, segments):
+            segment = AudioSegment(samples[:length].copy(), sample_rate)
+            perturbation.perturb(segment)
+            assert segment.num_samples == batched.num_samples
+            assert segment.samples.dtype == np.float32
+            assert np.allclose(segment.samples, batched.samples, atol=1e-5)
@@ -0,0 +1,117 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import subprocess
+import sys
+import textwrap
+
+import pytest
+import torch
+
+from nemo.collections.asr.losses import rnnt_pytorch
+from nemo.collections.asr.losses.rnnt import RNNTLoss
+
+
+def reference_rnnt_loss(acts, labels, act_lens, label_lens, blank):
+    """Per-node forward recursion over the log softmax, differentiable by autograd."""
+    log_probs = acts.log_softmax(dim=-1)
+    costs = []
+    for b in range(acts.shape[0]):
+        T, U = int(act_lens[b]), int(label_lens[b]) + 1
+        alphas = {(0, 0): torch.zeros((), dtype=acts.dtype)}
+        for t in range(T):
+            for u in range(U):
+                if t == 0 and u == 0:
+                    continue
+                paths = []
+                if t > 0:
+                    paths.append(alphas[(t - 1, u)] + log_probs[b, t - 1, u, blank])
+                if u > 0:
+                    paths.append(alphas[(t, u - 1)] + log_probs[b, t, u - 1, labels[b, u - 1]])
+                alphas[(t, u)] = torch.logsumexp(torch.stack(paths), dim=0)
+        costs.append(-(alphas[(T - 1, U - 1)] + log_probs[b, T - 1, U - 1, blank]))
+    return torch.stack(costs)
+
+
+class TestRNNTLoss:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('use_numba', [True, False])
+    @pytest.mark.parametrize('fused_log_softmax', [True, False])
+    def test_rnnt_loss_matches_reference(self, monkeypatch, use_numba, fused_log_softmax):
+        if use_numba and not rnnt_pytorch.HAVE_NUMBA:
+            pytest.skip('Numba is not installed')
+        monkeypatch.setattr(rnnt_pytorch, 'HAVE_NUMBA', use_numba)
+
+        torch.manual_seed(0)
+        B, T, U, V = 3, 7, 4, 6
+        acts = torch.randn(B, T, U + 1, V, dtype=torch.float64, requires_grad=True)
+        labels = torch.randint(0, V - 1, size=(B, U))
+        act_lens = torch.tensor([7, 5, 3])
+        label_lens = torch.tensor([4, 2, 3])
+
+        expected = reference_rnnt_loss(acts, labels, act_lens, label_lens, blank=V - 1)
+        (expected_grad,) = torch.autograd.grad(expected.sum(), acts)
+
+        inputs = acts if fused_log_softmax else acts.log_softmax(dim=-1)
+        costs = rnnt_pytorch.rnnt_loss(
+            inputs, labels, act_lens, label_lens, blank=V - 1, reduction=None, fused_log_softmax=fused_log_softmax
+        )
+        (grad,) = torch.autograd.grad(costs.sum(), acts)
+
+        assert torch.allclose(costs, expected)
+        assert torch.allclose(grad, expected_grad)
+
+    @pytest.mark.unit
+    def test_rnnt_loss_module(self):
+        torch.manual_seed(0)
+        B, T, U, V = 2, 6, 3, 5
+        acts = torch.randn(B, T, U + 1, V + 1)
+        targets = torch.randint(0, V, size=(B, U))
+        input_lengths = torch.tensor([6, 4])
+        target_lengths = torch.tensor([3, 1])
+
+        costs = RNNTLoss(num_classes=V, reduction=None, backend='pytorch')(
+            log_probs=acts, targets=targets, input_lengths=input_lengths, target_lengths=target_lengths
+        )
+        expected = reference_rnnt_loss(acts, targets, input_lengths, target_lengths, blank=V)
+        assert torch.allclose(costs, expected, atol=1e-5)
+
+        for reduction, expected_loss in [('mean_batch', expected.mean()), ('sum', expected.sum())]:
+            loss = RNNTLoss(num_classes=V, reduction=reduction, backend='pytorch')(
+                log_probs=acts, targets=targets, input_lengths=input_lengths, target_lengths=target_lengths
+            )
+            assert torch.allclose(loss, expected_loss, atol=1e-5)
+
+    @pytest.mark.unit
+    def test_rnnt_loss_then_fork_exits(self):
+        # Forked dataloader workers must not hang the interpreter at exit once the CPU loss has run
+        script = textwrap.dedent(
+            """
+            import torch
+            from nemo.collections.asr.losses.rnnt import RNNTLoss
+
+            acts = torch.randn(2, 6, 4, 4)
+            RNNTLoss(num_classes=3, backend='pytorch')(
+                log_probs=acts,
+                targets=torch.randint(0, 3, size=(2, 3)),
+                input_lengths=torch.tensor([6, 4]),
+                target_lengths=torch.tensor([3, 1]),
+            )
+            for _ in torch.utils.data.DataLoader(list(range(8)), num_workers=2):
+                pass
+            print('done')
+            """
+        )
+        result = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE, timeout=300)
+        assert result.returncode == 0 and result.stdout.decode().strip().endswith('done')
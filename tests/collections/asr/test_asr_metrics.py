@@ -133,3 +133,25 @@ class TestWordErrorRate:
                     )
                     < 1e-6
                 )
+
+    @pytest.mark.unit
+    def test_wer_ctc_decoding_batch(self):
+        wer = WER(vocabulary=self.vocabulary, batch_dim_index=0, use_cer=False, ctc_decode=True)
+        blank_id = len(self.vocabulary)
+
+        predictions = torch.randint(0, blank_id + 1, size=(8, 64))
+        predictions[:, ::3] = blank_id
+        predictions[:, 10:20] = predictions[:, 10:11]
+        predictions_len = torch.randint(0, 65, size=(8,))
+
+        expected = []
+        for prediction, length in zip(predictions.tolist(), predictions_len.tolist()):
+            decoded, previous = [], blank_id
+            for p in prediction[:length]:
+                if p != previous and p != blank_id:
+                    decoded.append(self.vocabulary[p])
+                previous = p
+            expected.append(''.join(decoded))
+
+        assert wer.ctc_decoder_predictions_tensor(predictions, predictions_len=predictions_len) == expected
+        assert wer.ctc_decoder_predictions_tensor(predictions[:, :0]) == [''] * 8
@@ -12,12 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
+import random
+
+import numpy as np
 import pytest
 import torch
 from omegaconf import OmegaConf
 
 from nemo.collections.asr import modules
-from nemo.collections.asr.parts.rnnt_utils import Hypothesis
+from nemo.collections.asr.losses.rnnt import RNNTLoss
+from nemo.collections.asr.parts import rnnt_beam_decoding, rnnt_greedy_decoding
+from nemo.collections.asr.parts.rnnt_utils import Hypothesis, RNNTStateCache
 from nemo.utils import config_utils
 
 
@@ -125,6 +131,65 @@ class TestASRModulesBasicTests:
 
         assert res.shape == res0[0].shape
 
+    @pytest.mark.unit
+    @pytest.mark.parametrize('time_width', [25, 0.2])
+    def test_SpectrogramAugmentation_vectorized(self, time_width):
+        batch_size, num_freqs, num_frames = 8, 64, 200
+        length = torch.tensor([200, 150, 100, 50, 10, 1, 120, 180])
+        padding = (torch.arange(num_frames)[None, :] >= length[:, None]).unsqueeze(1).expand(-1, num_freqs, -1)
+
+        def augment(seed, **kwargs):
+            instance = modules.SpectrogramAugmentation(
+                rng=random.Random(seed), mask_value=-1.0, use_vectorized_code=True, **kwargs
+            )
+            return instance(input_spec=torch.ones(batch_size, num_freqs, num_frames), length=length)
+
+        for kwargs in [
+            {'freq_masks': 2, 'time_masks': 10, 'freq_width': 27, 'time_width': time_width},
+            {'rect_masks': 5, 'rect_time': 25, 'rect_freq': 20},
+        ]:
+            res = augment(0, **kwargs)
+            # Masks are drawn, but never land in the padding
+            assert (res != 1.0).any()
+            assert (res[padding] == 1.0).all()
+            # Seeding the rng makes masks reproducible
+            assert torch.equal(res, augment(0, **kwargs))
+            assert not torch.equal(res, augment(1, **kwargs))
+
+        # Frequency masks span all the valid frames, time masks all the frequencies
+        res = augment(0, freq_masks=2, time_masks=10, freq_width=27, time_width=time_width)
+        for idx in range(batch_size):
+            masked = res[idx, :, : length[idx]] == -1.0
+            freq_rows = masked.all(dim=1)
+            time_cols = masked.all(dim=0)
+            assert torch.equal(masked, freq_rows[:, None] | time_cols[None, :])
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('fix_rect_axes', [False, True])
+    def test_SpectrogramAugmentation_vectorized_matches_loop(self, fix_rect_axes):
+        batch_size, num_freqs, num_frames = 1024, 64, 100
+
+        def augment(use_vectorized_code, **kwargs):
+            instance = modules.SpectrogramAugmentation(
+                rng=random.Random(0), mask_value=0.0, use_vectorized_code=use_vectorized_code, **kwargs
+            )
+            return instance(input_spec=torch.ones(batch_size, num_freqs, num_frames)) == 0.0
+
+        # A single rectangle per sample, much longer along one axis than along the other
+        rect_kwargs = dict(rect_masks=1, rect_time=30, rect_freq=4, fix_rect_axes=fix_rect_axes)
+        max_freq_width, max_time_width = (4, 30) if fix_rect_axes else (30, 4)
+        for use_vectorized_code in [False, True]:
+            masked = augment(use_vectorized_code, **rect_kwargs)
+            freq_widths, time_widths = masked.any(dim=2).sum(dim=1), masked.any(dim=1).sum(dim=1)
+            assert freq_widths.max() <= max_freq_width and time_widths.max() <= max_time_width
+            assert max(freq_widths.max(), time_widths.max()) > 4
+
+        # Both implementations draw masks from the same distribution
+        for kwargs in [{'freq_masks': 2, 'time_masks': 2, 'freq_width': 27, 'time_width': 0.2}, rect_kwargs]:
+            loop_fraction = augment(False, **kwargs).float().mean()
+            vectorized_fraction = augment(True, **kwargs).float().mean()
+            assert abs(loop_fraction - vectorized_fraction) < 0.15 * loop_fraction
+
     @pytest.mark.unit
     def test_SpectrogramAugmentationr_config(self):
         # Test that dataclass matches signature of module
@@ -288,3 +353,416 @@ class TestASRModulesBasicTests:
 
         # assert vocab size
         assert jointnet.num_classes_with_blank == vocab_size + 1
+
+    @pytest.mark.unit
+    def test_RNNTJoint_fused_loss(self):
+        vocab_size = 10
+        batchsize, max_t, max_u = 5, 17, 6
+        encoder_hidden, pred_hidden, joint_hidden = 16, 8, 12
+
+        def make_joint(dropout, **fused_kwargs):
+            torch.manual_seed(0)
+            joint = modules.RNNTJoint(
+                jointnet={
+                    'encoder_hidden': encoder_hidden,
+                    'pred_hidden': pred_hidden,
+                    'joint_hidden': joint_hidden,
+                    'activation': 'relu',
+                    'dropout': dropout,
+                },
+                num_classes=vocab_size,
+                **fused_kwargs,
+            )
+            if joint.fuse_loss_wer:
+                joint.set_loss(RNNTLoss(num_classes=vocab_size, backend='pytorch'))
+            return joint
+
+        torch.manual_seed(1)
+        enc = torch.randn(batchsize, encoder_hidden, max_t)
+        dec = torch.randn(batchsize, pred_hidden, max_u + 1)
+        transcripts = torch.randint(0, vocab_size, size=(batchsize, max_u))
+        enc_lens = torch.tensor([17, 12, 9, 17, 4])
+        transcript_lens = torch.tensor([6, 3, 6, 1, 2])
+
+        def loss_and_grads(joint, fused):
+            enc_input = enc.clone().requires_grad_()
+            torch.manual_seed(2)
+            if fused:
+                loss, _, _, _ = joint(
+                    encoder_outputs=enc_input,
+                    decoder_outputs=dec,
+                    encoder_lengths=enc_lens,
+                    transcripts=transcripts,
+                    transcript_lengths=transcript_lens,
+                )
+            else:
+                loss = RNNTLoss(num_classes=vocab_size, backend='pytorch')(
+                    log_probs=joint(encoder_outputs=enc_input, decoder_outputs=dec),
+                    targets=transcripts,
+                    input_lengths=enc_lens,
+                    target_lengths=transcript_lens,
+                )
+            # Checkpointing only supports .backward()
+            loss.backward()
+            grads = [enc_input.grad] + [param.grad for param in joint.parameters()]
+            return loss.detach(), grads
+
+        expected_loss, expected_grads = loss_and_grads(make_joint(0.0), fused=False)
+        for fused_kwargs in [{}, {'fused_recompute': True}, {'fused_recompute': True, 'fused_time_chunk_size': 5}]:
+            joint = make_joint(0.0, experimental_fuse_loss_wer=True, fused_batch_size=2, **fused_kwargs)
+            loss, grads = loss_and_grads(joint, fused=True)
+            assert torch.allclose(loss, expected_loss, atol=1e-5)
+            for grad, expected_grad in zip(grads, expected_grads):
+                assert torch.allclose(grad, expected_grad, atol=1e-5)
+
+        # Dropout masks are replayed when the joint is recomputed
+        expected_loss, expected_grads = loss_and_grads(
+            make_joint(0.5, experimental_fuse_loss_wer=True, fused_batch_size=2), fused=True
+        )
+        joint = make_joint(0.5, experimental_fuse_loss_wer=True, fused_batch_size=2, fused_recompute=True)
+        loss, grads = loss_and_grads(joint, fused=True)
+        assert torch.allclose(loss, expected_loss, atol=1e-5)
+        for grad, expected_grad in zip(grads, expected_grads):
+            assert torch.allclose(grad, expected_grad, atol=1e-5)
+
+    @pytest.mark.unit
+    def test_RNNTBatchedBeamSearch(self):
+        torch.manual_seed(0)
+        vocab_size = 8
+        encoder_hidden = 16
+        pred_hidden = 8
+
+        prednet = modules.RNNTDecoder.from_config_dict(
+            OmegaConf.create(
+                {
+                    '_target_': 'nemo.collections.asr.modules.RNNTDecoder',
+                    'prednet': {'pred_hidden': pred_hidden, 'pred_rnn_layers': 1},
+                    'vocab_size': vocab_size,
+                    'blank_as_pad': True,
+                }
+            )
+        )
+        jointnet = modules.RNNTJoint.from_config_dict(
+            OmegaConf.create(
+                {
+                    '_target_': 'nemo.collections.asr.modules.RNNTJoint',
+                    'num_classes': vocab_size,
+                    'vocabulary': [str(x) for x in range(vocab_size)],
+                    'jointnet': {
+                        'encoder_hidden': encoder_hidden,
+                        'pred_hidden': pred_hidden,
+                        'joint_hidden': 16,
+                        'activation': 'relu',
+                    },
+                }
+            )
+        )
+
+        encoder_output = torch.randn(3, encoder_hidden, 12) * 2  # [B, D, T]
+        encoded_lengths = torch.tensor([12, 7, 0])
+
+        for return_best_hypothesis in [True, False]:
+            kwargs = dict(beam_size=3, return_best_hypothesis=return_best_hypothesis, tsd_max_sym_exp_per_step=3)
+            batched = rnnt_beam_decoding.BeamBatchedRNNTInfer(prednet, jointnet, **kwargs)
+            batched_hyps = batched(encoder_output=encoder_output, encoded_lengths=encoded_lengths)[0]
+
+            # Batched search gives the same hypotheses as decoding every sample on its own
+            single = rnnt_beam_decoding.BeamRNNTInfer(prednet, jointnet, search_type='tsd', **kwargs)
+            single_hyps = single(encoder_output=encoder_output, encoded_lengths=encoded_lengths)[0]
+
+            assert len(batched_hyps) == 3
+            for batched_hyp, single_hyp in zip(batched_hyps, single_hyps):
+                if return_best_hypothesis:
+                    batched_hyp, single_hyp = [batched_hyp], [single_hyp]
+                else:
+                    batched_hyp, single_hyp = batched_hyp.n_best_hypotheses, single_hyp.n_best_hypotheses
+                assert [h.y_sequence for h in batched_hyp] == [h.y_sequence for h in single_hyp]
+                assert [h.timestep for h in batched_hyp] == [h.timestep for h in single_hyp]
+                assert [h.score for h in batched_hyp] == pytest.approx([h.score for h in single_hyp], abs=1e-4)
+
+    @pytest.mark.unit
+    def test_RNNTStateCache(self):
+        cache = RNNTStateCache(max_size=3)
+
+        def entry(value):
+            return torch.full([1, 1, 4], float(value)), [torch.full([2, 1, 4], float(value))]
+
+        assert cache.get((0,)) is None
+        for value, sequence in enumerate([(0,), (0, 1), (0, 1, 2)]):
+            cache[sequence] = entry(value)
+        assert len(cache) == 3 and (0, 1) in cache
+
+        # Cached values are copies of the stored states
+        y, states = cache.get((0, 1))
+        assert torch.equal(y, entry(1)[0]) and torch.equal(states[0], entry(1)[1][0])
+        y.fill_(-1.0)
+        assert torch.equal(cache.get((0, 1))[0], entry(1)[0])
+
+        # The least recently used sequence is evicted once the cache is full
+        cache[(0, 2)] = entry(3)
+        assert len(cache) == 3 and (0,) not in cache and (0, 1, 2) in cache
+
+        # Sequences which do not extend a live sequence are evicted first, the least recently used one was (0, 1, 2)
+        cache.prune([(0, 1)])
+        cache[(1,)] = entry(4)
+        assert (0, 1) in cache and (0, 1, 2) in cache and (1,) in cache and (0, 2) not in cache
+
+        stats = cache.stats()
+        assert stats['hits'] == 2 and stats['misses'] == 1 and stats['size'] == 3
+        assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+        # Hypotheses keep their trie node, from which their one token extensions are looked up
+        hyp = Hypothesis(score=0.0, y_sequence=[0, 1])
+        assert torch.equal(cache.get_hypothesis(hyp)[0], entry(1)[0]) and hyp.cache_node.depth == 2
+        new_hyp = Hypothesis(score=0.0, y_sequence=hyp.y_sequence + [3], cache_node=hyp.cache_node)
+        assert cache.get_hypothesis(new_hyp) is None and new_hyp.cache_node is hyp.cache_node
+        cache.set_hypothesis(new_hyp, entry(5))
+        assert new_hyp.cache_node.depth == 3 and torch.equal(cache.get((0, 1, 3))[0], entry(5)[0])
+
+        cache.clear()
+        assert len(cache) == 0 and cache.get((0, 1)) is None and cache.get_hypothesis(new_hyp) is None
+
+    @pytest.mark.unit
+    def test_RNNTGreedyFusedDecoding(self):
+        torch.manual_seed(0)
+        vocab_size = 8
+        encoder_hidden = 16
+        pred_hidden = 8
+
+        for blank_as_pad in [True, False]:
+            prednet = modules.RNNTDecoder.from_config_dict(
+                OmegaConf.create(
+                    {
+                        '_target_': 'nemo.collections.asr.modules.RNNTDecoder',
+                        'prednet': {'pred_hidden': pred_hidden, 'pred_rnn_layers': 2},
+                        'vocab_size': vocab_size,
+                        'blank_as_pad': blank_as_pad,
+                    }
+                )
+            )
+            jointnet = modules.RNNTJoint.from_config_dict(
+                OmegaConf.create(
+                    {
+                        '_target_': 'nemo.collections.asr.modules.RNNTJoint',
+                        'num_classes': vocab_size,
+                        'vocabulary': [str(x) for x in range(vocab_size)],
+                        'jointnet': {
+                            'encoder_hidden': encoder_hidden,
+                            'pred_hidden': pred_hidden,
+                            'joint_hidden': 16,
+                            'activation': 'relu',
+                        },
+                    }
+                )
+            )
+
+            encoder_output = torch.randn(4, encoder_hidden, 20) * 2  # [B, D, T]
+            encoded_lengths = torch.tensor([20, 13, 1, 0])
+            kwargs = dict(blank_index=vocab_size, max_symbols_per_step=3)
+
+            fused = rnnt_greedy_decoding.GreedyFusedBatchedRNNTInfer(prednet, jointnet, **kwargs)
+            fused_hyps = fused(encoder_output=encoder_output, encoded_lengths=encoded_lengths)[0]
+
+            # Fused decoding gives the same labels as decoding every sample on its own
+            single = rnnt_greedy_decoding.GreedyRNNTInfer(prednet, jointnet, **kwargs)
+            single_hyps = single(encoder_output=encoder_output, encoded_lengths=encoded_lengths)[0]
+
+            assert len(fused_hyps) == 4
+            for fused_hyp, single_hyp in zip(fused_hyps, single_hyps):
+                assert fused_hyp.y_sequence.tolist() == single_hyp.y_sequence.tolist()
+                assert fused_hyp.timestep == single_hyp.timestep
+
+            # The decoding loop can be scripted
+            scripted = torch.jit.script(fused.decode_loop)
+            outputs = fused.decode_loop(encoder_output.transpose(1, 2), encoded_lengths)
+            scripted_outputs = scripted(encoder_output.transpose(1, 2), encoded_lengths)
+            assert outputs[0].shape == (4, 60)
+            for output, scripted_output in zip(outputs, scripted_outputs):
+                assert torch.equal(output, scripted_output)
+
+    @pytest.mark.unit
+    def test_CTCPrefixBeamSearchDecoder(self, tmp_path):
+        vocab = [' ', 'a', 'c', 't', 'u']
+
+        def log_probs(text, ambiguous):
+            # One frame per character, followed by a blank frame. The character of `ambiguous` is either of two
+            frames = []
+            for char in text:
+                frame = np.full(len(vocab) + 1, 0.01)
+                for label, prob in zip(ambiguous.get(char, char), [0.5, 0.45]):
+                    frame[vocab.index(label)] = prob if char in ambiguous else 0.9
+                frames += [frame / frame.sum(), np.full(len(vocab) + 1, 0.01)]
+                frames[-1][-1] = 0.95
+            return torch.log(torch.tensor(frames, dtype=torch.float)).unsqueeze(0)
+
+        lp = log_probs('cat', {'a': 'ua'})
+        lp_length = torch.tensor([lp.shape[1]])
+
+        decoder = modules.CTCPrefixBeamSearchDecoder(vocab=vocab, beam_width=8, input_tensor=True)
+        beams = decoder(log_probs=lp, log_probs_length=lp_length)[0]
+        assert beams[0][1] == 'cut' and beams[1][1] == 'cat'
+
+        # Merged prefixes: '' has probability 0.36, 'a' has 0.64 from three alignments
+        decoder = modules.CTCPrefixBeamSearchDecoder(vocab=['a'], beam_width=4, input_tensor=True)
+        beams = decoder(log_probs=torch.tensor([[[0.4, 0.6], [0.4, 0.6]]]).log(), log_probs_length=torch.tensor([2]))
+        assert [text for _, text in beams[0]] == ['a', '']
+        assert math.exp(beams[0][0][0]) == pytest.approx(0.64, abs=1e-5)
+
+        # The language model prefers 'cat'
+        lm_path = tmp_path / 'lm.arpa'
+        lm_path.write_text(
+            '\\data\\\nngram 1=4\nngram 2=1\n\n\\1-grams:\n-1.0\t<s>\t-0.3\n-0.5\t</s>\n-0.3\tcat\t-0.2\n-2.0\tcut\t-0.2\n\n'
+            '\\2-grams:\n-0.1\t<s> cat\n\n\\end\\\n'
+        )
+        decoder = modules.CTCPrefixBeamSearchDecoder(
+            vocab=vocab, beam_width=8, alpha=1.0, lm_path=str(lm_path), input_tensor=True
+        )
+        assert decoder(log_probs=lp, log_probs_length=lp_length)[0][0][1] == 'cat'
+
+        # Hotwords are boosted, and batches decoded in parallel give the same results
+        lp = torch.cat([log_probs('cat', {'a': 'au'}), log_probs('cat', {'a': 'ua'})])
+        decoder = modules.CTCPrefixBeamSearchDecoder(
+            vocab=vocab, beam_width=8, hotwords=['cat'], hotword_weight=3.0, num_cpus=2, input_tensor=True
+        )
+        beams = decoder(log_probs=lp, log_probs_length=torch.tensor([6, 6]))
+        assert [utterance[0][1] for utterance in beams] == ['cat', 'cat']
+
+        # The process pool is kept across batches until the search is closed
+        pool = decoder.search._pool
+        assert decoder(log_probs=lp, log_probs_length=torch.tensor([6, 6])) == beams
+        assert decoder.search._pool is pool
+        decoder.search.close()
+        assert decoder.search._pool is None
+
+    @pytest.mark.unit
+    def test_ConformerEncoder_streaming(self):
+        torch.manual_seed(0)
+        encoder = modules.ConformerEncoder(
+            feat_in=16,
+            n_layers=2,
+            d_model=32,
+            n_heads=2,
+            conv_kernel_size=7,
+            att_context_size=[8, 3],
+            causal_downsampling=True,
+            causal_convolutions=True,
+        ).eval()
+        assert encoder.streaming_chunk_size == 16
+
+        length = 101
+        audio_signal = torch.randn(2, 16, length)
+        with torch.no_grad():
+            outputs, encoded_lengths = encoder(audio_signal=audio_signal, length=torch.tensor([length, length]))
+
+            state = encoder.get_initial_cache_state(batch_size=2)
+            chunk_outputs = []
+            for start in range(0, length, encoder.streaming_chunk_size):
+                chunk = audio_signal[:, :, start : start + encoder.streaming_chunk_size]
+                chunk_output, chunk_lengths, state = encoder.stream_step(
+                    chunk, torch.tensor([chunk.size(-1)] * 2), state
+                )
+                # The caches do not grow with the stream
+                assert state.att_cache.shape == (2, 2, 2, 2, 8, 16)
+                assert state.conv_cache.shape == (2, 2, 32, 6)
+                chunk_outputs.append(chunk_output[:, :, : chunk_lengths[0]])
+            streamed_outputs = torch.cat(chunk_outputs, dim=-1)
+
+        assert streamed_outputs.shape == outputs.shape
+        assert torch.allclose(streamed_outputs, outputs, atol=1e-5)
+
+        with pytest.raises(ValueError):
+            modules.ConformerEncoder(feat_in=16, n_layers=1, d_model=32, n_heads=2).get_initial_cache_state()
+
+    @pytest.mark.unit
+    def test_ConvASREncoder_streaming(self):
+        torch.manual_seed(0)
+
+        def block(**kwargs):
+            cfg = dict(filters=32, repeat=1, kernel=[5], stride=[1], dilation=[1], dropout=0.0, residual=False)
+            cfg.update(kwargs)
+            return cfg
+
+        jasper = [
+            block(kernel=[11], stride=[2], separable=True),
+            block(repeat=2, kernel=[7], residual=True, separable=True),
+            block(kernel=[3], dilation=[2], residual=True, residual_dense=True, groups=2),
+            block(repeat=2, kernel=[5], stride=[2], stride_last=True, residual=True, residual_mode='stride_add'),
+            block(filters=48, kernel=[1]),
+        ]
+        encoder = modules.ConvASREncoder(jasper=jasper, activation='relu', feat_in=16).eval()
+
+        length = 157
+        audio_signal = torch.randn(2, 16, length)
+        with torch.no_grad():
+            outputs, _ = encoder(audio_signal=audio_signal, length=torch.tensor([length, length]))
+
+            for chunk_size in [1, 8, 13]:
+                state = encoder.get_initial_cache_state()
+                chunk_outputs = []
+                for start in range(0, length, chunk_size):
+                    chunk = audio_signal[:, :, start : start + chunk_size]
+                    chunk_output, state = encoder.stream_step(chunk, state, flush=start + chunk_size >= length)
+                    chunk_outputs.append(chunk_output)
+                    # Only the frames needed by the next outputs are buffered
+                    assert all(buffer.size(-1) <= 20 for block_state in state for buffer in block_state.conv_buffers)
+                streamed_outputs = torch.cat(chunk_outputs, dim=-1)
+
+                assert streamed_outputs.shape == outputs.shape
+                assert torch.allclose(streamed_outputs, outputs, atol=1e-5)
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('se', [False, True])
+    def test_ConvASREncoder_trim_and_pack_padding(self, se):
+        def block(**kwargs):
+            cfg = dict(filters=32, repeat=1, kernel=[5], stride=[1], dilation=[1], dropout=0.0, residual=False, se=se)
+            cfg.update(kwargs)
+            return cfg
+
+        jasper = [
+            block(kernel=[11], stride=[2], separable=True),
+            block(repeat=2, kernel=[7], residual=True, separable=True),
+            block(kernel=[3], dilation=[2], residual=True, residual_dense=True, groups=2),
+            block(repeat=2, kernel=[5], stride=[2], stride_last=True, residual=True, residual_mode='stride_add'),
+            block(filters=48, kernel=[1]),
+        ]
+
+        def make_encoder(**kwargs):
+            torch.manual_seed(0)
+            return modules.ConvASREncoder(jasper=jasper, activation='relu', feat_in=16, **kwargs).eval()
+
+        # Padded well beyond the longest sequence, with a long outlier
+        length = torch.tensor([300, 41, 97, 45, 90, 43])
+        audio_signal = torch.randn(6, 16, 320)
+        with torch.no_grad():
+            outputs, encoded_lengths = make_encoder()(audio_signal=audio_signal, length=length)
+            # Every sequence encoded on its own, without padding
+            single_outputs = [
+                make_encoder()(audio_signal=audio_signal[idx : idx + 1, :, :seq_len], length=length[idx : idx + 1])[0]
+                for idx, seq_len in enumerate(length.tolist())
+            ]
+            # By default, squeeze-and-excitation keeps pooling over the padded length of the batch
+            assert se != torch.allclose(outputs[1, :, : encoded_lengths[1]], single_outputs[1][0], atol=1e-5)
+
+            for kwargs in [{'trim_padding': True}, {'pack_padding_ratio': 0.0}, {'pack_padding_ratio': 0.25}]:
+                encoder = make_encoder(**kwargs)
+                if 'pack_padding_ratio' in kwargs:
+                    groups = encoder._get_packing_groups(length.tolist())
+                    assert sorted(idx for group in groups for idx in group) == list(range(6))
+                    assert groups[0] == [0]
+
+                trimmed_outputs, trimmed_lengths = encoder(audio_signal=audio_signal, length=length)
+                assert torch.equal(trimmed_lengths, encoded_lengths)
+                assert trimmed_outputs.size(-1) == encoded_lengths.max() < outputs.size(-1)
+                for idx, encoded_length in enumerate(encoded_lengths):
+                    assert torch.allclose(trimmed_outputs[idx, :, :encoded_length], single_outputs[idx][0], atol=1e-5)
+
+        assert make_encoder(pack_padding_ratio=0.25)._get_packing_groups([300, 41, 97, 45, 90, 43]) == [
+            [0],
+            [2, 4],
+            [3, 5, 1],
+        ]
+
+        # Windowed squeeze-and-excitation depends on the padded length
+        jasper[0].update(se=True, se_context_size=16)
+        with pytest.raises(ValueError):
+            make_encoder(trim_padding=True)
@@ -21,14 +21,6 @@ from nemo.collections.asr.models import EncDecRNNTModel
 from nemo.collections.asr.parts import rnnt_beam_decoding as beam_decode
 from nemo.collections.asr.parts import rnnt_greedy_decoding as greedy_decode
 
-try:
-    from warprnnt_pytorch import RNNTLoss
-
-    WARP_RNNT_AVAILABLE = True
-
-except (ImportError, ModuleNotFoundError):
-    WARP_RNNT_AVAILABLE = False
-
 
 @pytest.fixture()
 def asr_model():
@@ -96,11 +88,6 @@ def asr_model():
 
 
 class TestEncDecRNNTModel:
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_constructor(self, asr_model):
         asr_model.train()
@@ -110,11 +97,6 @@ class TestEncDecRNNTModel:
         instance2 = EncDecRNNTModel.from_config_dict(confdict)
         assert isinstance(instance2, EncDecRNNTModel)
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_forward(self, asr_model):
         asr_model = asr_model.eval()
@@ -146,11 +128,6 @@ class TestEncDecRNNTModel:
         diff = torch.max(torch.abs(logprobs_instance - logprobs_batch))
         assert diff <= 1e-6
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_vocab_change(self, asr_model):
         old_vocab = copy.deepcopy(asr_model.joint.vocabulary)
@@ -169,11 +146,11 @@ class TestEncDecRNNTModel:
         joint_joint = 3 * (asr_model.joint.joint_hidden + 1)
         assert asr_model.num_weights == (nw1 + (pred_embedding + joint_joint))
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
+    @pytest.mark.unit
+    def test_transcribe_empty(self, asr_model):
+        best_hypotheses, all_hypotheses = asr_model.transcribe([])
+        assert best_hypotheses == [] and all_hypotheses is None
+
     @pytest.mark.unit
     def test_decoding_change(self, asr_model):
         assert isinstance(asr_model.decoding.decoding, greedy_decode.GreedyBatchedRNNTInfer)
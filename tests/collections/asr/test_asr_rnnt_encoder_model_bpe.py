@@ -25,14 +25,6 @@ from nemo.collections.asr.models.rnnt_bpe_models import EncDecRNNTBPEModel
 from nemo.collections.asr.parts import rnnt_beam_decoding as beam_decode
 from nemo.collections.asr.parts import rnnt_greedy_decoding as greedy_decode
 
-try:
-    from warprnnt_pytorch import RNNTLoss
-
-    WARP_RNNT_AVAILABLE = True
-
-except (ImportError, ModuleNotFoundError):
-    WARP_RNNT_AVAILABLE = False
-
 
 @pytest.fixture()
 def asr_model(test_data_dir):
@@ -94,11 +86,6 @@ def asr_model(test_data_dir):
 
 
 class TestEncDecRNNTBPEModel:
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_constructor(self, asr_model):
         asr_model.train()
@@ -108,11 +95,6 @@ class TestEncDecRNNTBPEModel:
         instance2 = EncDecRNNTBPEModel.from_config_dict(confdict)
         assert isinstance(instance2, EncDecRNNTBPEModel)
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_forward(self, asr_model):
         asr_model = asr_model.eval()
@@ -144,11 +126,6 @@ class TestEncDecRNNTBPEModel:
         diff = torch.max(torch.abs(logits_instance - logprobs_batch))
         assert diff <= 1e-6
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_save_restore_artifact(self, asr_model):
         asr_model.train()
@@ -163,11 +140,6 @@ class TestEncDecRNNTBPEModel:
 
             assert len(new_model.tokenizer.tokenizer.get_vocab()) == 128
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_vocab_change(self, test_data_dir, asr_model):
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -194,11 +166,6 @@ class TestEncDecRNNTBPEModel:
             joint_joint = 3 * (asr_model.joint.joint_hidden + 1)
             assert asr_model.num_weights == (nw1 + (pred_embedding + joint_joint))
 
-    @pytest.mark.skipif(
-        not WARP_RNNT_AVAILABLE,
-        reason='RNNTLoss has not been compiled. Please compile and install '
-        'RNNT Loss first before running this test',
-    )
     @pytest.mark.unit
     def test_decoding_change(self, asr_model):
         assert isinstance(asr_model.decoding.decoding, greedy_decode.GreedyBatchedRNNTInfer)
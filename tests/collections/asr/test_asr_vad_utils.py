@@ -0,0 +1,57 @@
+# Copyright (c) 2021, NVIDIA CORPORATION.  All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+import pytest
+
+from nemo.collections.asr.parts.vad_utils import (
+    generate_overlap_vad_seq_per_tensor,
+    generate_vad_segment_table_per_tensor,
+)
+
+
+def reference_overlap_vad_seq(frame, smoothing_method, seg, jump_on_frame):
+    """Spreads every used frame prediction over its window one target frame at a time."""
+    spread_preds = [[] for _ in range(len(frame))]
+    for i in range(0, len(frame), jump_on_frame):
+        for j in range(i, min(i + seg, len(frame))):
+            spread_preds[j].append(frame[i])
+    reduce = np.mean if smoothing_method == 'mean' else np.median
+    preds = [reduce(p) if p else None for p in spread_preds]
+    last = [p for p in preds if p is not None][-1]
+    return np.array([last if p is None else p for p in preds])
+
+
+class TestVADUtils:
+    @pytest.mark.unit
+    @pytest.mark.parametrize('smoothing_method', ['mean', 'median'])
+    @pytest.mark.parametrize('seg_len, overlap', [(0.15, 0.875), (0.63, 0.875), (0.63, 0.5)])
+    def test_overlap_vad_seq(self, smoothing_method, seg_len, overlap):
+        frame = np.random.RandomState(0).rand(157)
+        preds = generate_overlap_vad_seq_per_tensor(frame, smoothing_method, overlap, seg_len, shift_len=0.01)
+
+        seg = int(seg_len / 0.01 + 1)
+        expected = reference_overlap_vad_seq(frame, smoothing_method, seg, jump_on_frame=int(seg * (1 - overlap)))
+        assert np.allclose(preds, expected)
+
+    @pytest.mark.unit
+    def test_vad_segment_table(self):
+        sequence = np.array([0.1, 0.9, 0.8, 0.2, 0.6, 0.6, 0.6, 0.3, 0.9])
+        table = generate_vad_segment_table_per_tensor(sequence, threshold=0.5, shift_len=0.01)
+
+        assert np.allclose(table['start'], [0.01, 0.04, 0.08])
+        assert np.allclose(table['dur'], [0.02, 0.03, 0.01])
+        assert (table['vad'] == 'speech').all()
+
+        assert len(generate_vad_segment_table_per_tensor(np.array([0.2]), threshold=0.5, shift_len=0.01)) == 0